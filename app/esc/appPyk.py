@@ -19,6 +19,8 @@ from elasticsearch import Elasticsearch
 from fastapi import Response
 from pymongo import MongoClient
 from cmm.config import MONGO_URI
+from esc.es_templates import get_ranking_body
+from esc.history_chart import HISTORY_MAX_BUCKETS, get_history_series, get_history_figure_html
 
 # MongoDB 연결
 MONGO_CLIENT_ESC = MongoClient(MONGO_URI)
@@ -696,33 +698,8 @@ async def get_total_rank_top1(response: Response, t: str = Query(None)):
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
 
     try:
-        # trade_summary 인덱스를 사용하여 실시간 자산 가치 계산
-        body = {
-            "size": 0,
-            "aggs": {
-                "top_earner": {
-                    "terms": {
-                        "field": "user_id", # .keyword가 필요하면 user_id.keyword
-                        "size": 1,
-                        "order": { "total_valuation": "desc" }
-                    },
-                    "aggs": {
-                        "total_valuation": {
-                            "sum": {
-                                "script": {
-                                    # 실현손익(매도-매수) + 평가손익(보유량 * 현재가)
-                                    "source": """
-                                        double realized = doc['total_sell_amt'].value - doc['total_buy_amt'].value;
-                                        double hold_qty = doc['total_buy_qty'].value - doc['total_sell_qty'].value;
-                                        return realized + (hold_qty * doc['current_price'].value);
-                                    """
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
+        # trade_summary 인덱스의 사전계산 필드(total_valuation = 실현손익 + 보유량 * 현재가)를 합산만 함 (스크립트 없음)
+        body = get_ranking_body(in_size=1)
         
         # trade_summary 인덱스에서 조회 (기존 history 인덱스보다 훨씬 정확함)
         res = es.search(index="trade_summary", body=body)
@@ -752,41 +729,18 @@ async def get_total_rank_top1(response: Response, t: str = Query(None)):
 
 # 새 엔드포인트: trade_esc_history 모든 데이터 기반 차트
 @APP_ESC.get("/esc/api/chart/trade_history", response_class=HTMLResponse)
-def get_trade_history_chart():
-    # OpenSearch 쿼리: 모든 데이터 가져오기 (size=1000 제한, 대량이면 aggregation 사용)
-    body = {
-        "query": {"match_all": {}},
-        "size": 1000,  # 모든 데이터지만 안전하게 제한
-        "sort": [{"timestamp": {"order": "asc"}}]  # timestamp 필드 가정
-    }
-    res = es.search(index="trade_esc_history", body=body)
-    hits = res['hits']['hits']
-    
-    if not hits:
+def get_trade_history_chart(in_start: str = Query(None), in_end: str = Query(None),
+                            in_points: int = Query(500, ge=10, le=HISTORY_MAX_BUCKETS), in_ticker: str = Query(None)):
+    # date_histogram 집계 (기간에 맞춘 버킷 평균 + LTTB) → 이력 건수와 무관하게 최대 in_points 개 점
+    try:
+        series = get_history_series(es, in_start, in_end, in_points, in_ticker)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"기간 형식 오류 (YYYY-MM-DD[ HH:MM:SS]): {e}")
+    if not series["dates"]:
         return HTMLResponse("<div>데이터가 없습니다.</div>")
     
-    # 데이터 추출 (필드 가정: timestamp, rate, ticker 등)
-    dates = [hit['_source'].get('timestamp') for hit in hits]
-    rates = [hit['_source'].get('rate', 0) for hit in hits]  # 수익률 예시
-    tickers = [hit['_source'].get('ticker') for hit in hits]
-    
-    # Plotly 차트 생성 (라인 차트 예시)
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=dates, y=rates, mode='lines+markers',
-        text=tickers,  # 호버 시 ticker 표시
-        name='수익률 추이'
-    ))
-    fig.update_layout(
-        title="Trade History: 전체 수익률 추이",
-        xaxis_title="날짜",
-        yaxis_title="수익률 (%)",
-        height=500,
-        template="plotly_white"
-    )
-    
     # HTML로 리턴 (클라이언트에서 embed 가능)
-    return HTMLResponse(fig.to_html(full_html=False, include_plotlyjs='cdn'))
+    return HTMLResponse(get_history_figure_html(series))
 
 # 비슷하게 trade_summary 차트 (예: 요약 바 차트)
 @APP_ESC.get("/esc/api/chart/trade_summary", response_class=HTMLResponse)
@@ -2,6 +2,8 @@ import os
 import json
 import uuid
 from pathlib import Path
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, Request, Form, Query
 from fastapi.templating import Jinja2Templates
 from openai import OpenAI
@@ -15,10 +17,31 @@ from fastapi.responses import HTMLResponse
 import numpy as np
 from fastapi import HTTPException
 from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from elasticsearch import Elasticsearch
 from fastapi import Response
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from cmm.config import MONGO_URI
+from esc.es_templates import get_ranking_body
+from esc.es_sync import set_backfill_summary
+from esc.user_cache import UserStateCache
+from esc.bar_store import BarStore, PERIOD_DAYS
+from esc.chart_cache import ChartPayloadCache, UncacheablePayload, get_etag_response, get_no_store_response, get_series_payload
+from esc.history_chart import HISTORY_MAX_BUCKETS, HISTORY_RAW_MAX_SIZE, get_history_series, get_history_page, get_history_figure_html
+from esc.order_book import OrderBookManager
+from esc.quote_service import QuoteService
+from esc.leaderboard import Leaderboard
+from esc.intent_parser import IntentParser
+from esc.ledger import PortfolioLedger
+from esc.live_push import LiveValuationHub
+from esc.rate_limit import UserRequestLimiter, OutboundBudget, BudgetExceededError
+from esc.replay import SimClock, ReplayEngine, get_store_ticks, get_csv_ticks
+from esc.backtest import STRATEGY_PARAMS, SignalBuilder, get_price_matrix, get_param_grid, get_grid_result, get_replay_account, get_rebalance_account
+import asyncio
+import threading
+import time
+import requests
 
 # MongoDB 연결
 MONGO_CLIENT_ESC = MongoClient(MONGO_URI)
@@ -55,10 +78,98 @@ load_dotenv(dotenv_path=ENV_PATH_ESC)
 AI_CLIENT_ESC = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 USERS_COMM = DB_COMM.users
 USERS_ESC = DB_ESC.users_esc
+TRADE_SUMMARY_ESC = DB_COMM.trade_summary_esc
 print(f"\n✅ MONGO_CLIENT_ESC: 연결성공")
 
+# 최초 방문 동시 요청에도 유저 문서가 1건만 생기도록 user_id 유니크 인덱스 보장
+try:
+    USERS_ESC.create_index("user_id", unique=True)
+except Exception as e:
+    print(f"⚠️ users_esc.user_id 유니크 인덱스 생성 실패: {e}")
+try:
+    TRADE_SUMMARY_ESC.create_index([("user_id", 1), ("code", 1)], unique=True)
+except Exception as e:
+    print(f"⚠️ trade_summary_esc (user_id, code) 유니크 인덱스 생성 실패: {e}")
+
+# 유저 상태 캐시 (history 제외, 주문 체결 시 갱신/무효화)
+INITIAL_CASH_ESC = 10000000
+USER_STATE_CACHE = UserStateCache(in_ttl_sec=int(os.getenv("ESC_USER_CACHE_TTL", "30")))
+USER_PROJECTION_ESC = {"history": 0}
+ORDER_RETRY_ESC = 3   # 캐시 스냅샷이 DB 와 달라 조건부 갱신이 빗나갔을 때 DB 를 다시 읽어 재시도하는 횟수
+
+# 모의투자 시계 (리플레이 중에는 재생 중인 과거 시각을 돌려줌)
+CLOCK_ESC = SimClock()
+
+# 주문/체결 이벤트 원장 (users_esc 상태의 감사 기록, 스냅샷 + 이후 이벤트로 시점별 상태 복원)
+LEDGER_ESC = PortfolioLedger(DB_ESC.ledger_events_esc, DB_ESC.ledger_snapshots_esc, USERS_ESC,
+                             in_snapshot_every=int(os.getenv("ESC_LEDGER_SNAPSHOT_EVERY", "200")))
+
+# 전체 수익 순위표 (주문 체결/시세 변경 시 증분 갱신, 서버 시작 시 몽고DB 로 재구성)
+LEADERBOARD_ESC = Leaderboard()
+
+# 단순 주문("삼성전자 10주 매수") 로컬 해석기 (종목명 사전은 1시간마다 재적재)
+INTENT_PARSER_ESC = IntentParser(lambda: DB_COMM.stock_master.find({}, {"_id": 0, "code": 1, "name": 1, "market": 1}))
+
+# 일봉 로컬 저장소 (차트용 과거 시세는 빠진 꼬리 구간만 야후에서 받음)
+BAR_STORE_ESC = BarStore()
+
+# 차트 JSON 캐시 (키: (차트종류, 티커, 기간, 점개수) → 직렬화 본문 + ETag)
+CHART_CACHE_ESC = ChartPayloadCache(in_ttl_sec=int(os.getenv("ESC_CHART_CACHE_TTL", "300")))
+CHART_CLIENT_MAX_AGE_ESC = 300   # 브라우저 캐시 시간(초)
+CHART_BATCH_MAX_ESC = 50         # 일괄 차트 조회 최대 종목 수
+CHART_POOL_ESC = ThreadPoolExecutor(max_workers=8)
+HISTORY_POINTS_ESC = 500         # 수익률 추이 차트 기본 최대 점 개수
+
+# 수익률 팝업 응답 캐시 (1위 사용자 거래이력 1회 집계 결과, 1위 사용자 체결 시 무효화 / 그 외 1위 교체는 TTL 로 반영)
+POPUP_CACHE_ESC = ChartPayloadCache(in_ttl_sec=int(os.getenv("ESC_POPUP_CACHE_TTL", "30")), in_max_size=4)
+POPUP_MAX_DOCS_ESC = 500
+POPUP_LOCK_ESC = threading.Lock()
+POPUP_STATE_ESC = {"uid": None, "settle_until": 0.0}
+# 1위 체결로 무효화한 뒤 ES 동기화(sync_to_es --watch)가 새 거래를 색인하기 전까지는 짧게만 캐시
+POPUP_SETTLE_SEC_ESC = float(os.getenv("ESC_POPUP_SETTLE_SEC", "5"))
+POPUP_SETTLE_TTL_ESC = 1
+
+# 리포트 앱(pyk.lzegg.appEsc) 체결 알림: 체결한 사용자를 모아 주기마다 /apiEsc/report_tradeEvent 호출 (비우면 사용 안 함)
+#   예) ESC_REPORT_EVENT_URL=http://127.0.0.1:8001/apiEsc/report_tradeEvent
+#   주기(초)는 ES 동기화 반영 시간보다 길게 잡아, 리포트가 재계산할 때 방금 체결이 색인되어 있도록 함
+REPORT_EVENT_URL_ESC = os.getenv("ESC_REPORT_EVENT_URL", "")
+REPORT_EVENT_SEC_ESC = float(os.getenv("ESC_REPORT_EVENT_SEC", "3"))
+REPORT_EVENT_MAX_USERS_ESC = 50   # 한 주기에 이보다 많으면 사용자별 대신 전체 알림 1회
+REPORT_EVENT_LOCK_ESC = threading.Lock()
+REPORT_EVENT_PENDING_ESC = set()
+
+# 백테스트 제한 (저장소에 적재된 일봉만 사용, 적재는 python -m esc.bar_store --backfill)
+BACKTEST_MAX_TICKERS_ESC = 300
+BACKTEST_MAX_COMBOS_ESC = 5000
+BACKTEST_WORKERS_ESC = int(os.getenv("ESC_BACKTEST_WORKERS", "0"))
+
+# 채팅 요청 제한 (사용자별 토큰 버킷 + 동시 처리 수) 및 외부 API 호출 예산 (프로세스 공용)
+CHAT_LIMITER_ESC = UserRequestLimiter(
+    in_rate_per_min=float(os.getenv("ESC_CHAT_RATE_PER_MIN", "20")),
+    in_burst=int(os.getenv("ESC_CHAT_BURST", "5")),
+    in_max_concurrent=int(os.getenv("ESC_CHAT_MAX_CONCURRENT", "1"))
+)
+LLM_BUDGET_ESC = OutboundBudget("OpenAI", float(os.getenv("ESC_LLM_CALLS_PER_MIN", "120")),
+                                int(os.getenv("ESC_LLM_BURST", "20")), float(os.getenv("ESC_LLM_MAX_WAIT_SEC", "5")))
+QUOTE_BUDGET_ESC = OutboundBudget("야후 시세", float(os.getenv("ESC_YAHOO_CALLS_PER_MIN", "300")),
+                                  int(os.getenv("ESC_YAHOO_BURST", "30")), float(os.getenv("ESC_YAHOO_MAX_WAIT_SEC", "3")))
+# 대기주문/실시간 평가 시세 폴러 전용 예산 (채팅 시세 조회와 나눠 써서 한쪽이 몰려도 다른 쪽이 굶지 않음)
+POLL_BUDGET_ESC = OutboundBudget("야후 시세(폴링)", float(os.getenv("ESC_YAHOO_POLL_CALLS_PER_MIN", "120")),
+                                 int(os.getenv("ESC_YAHOO_POLL_BURST", "20")), float(os.getenv("ESC_YAHOO_POLL_MAX_WAIT_SEC", "1")))
+
 APP_ESC = FastAPI()
 
+@APP_ESC.exception_handler(BudgetExceededError)
+async def get_budget_exceeded_response(request: Request, exc: BudgetExceededError):
+    """
+    # 설명 : 외부 API 호출 예산 초과 시 429 + Retry-After 응답 (모든 경로 공통)
+    """
+    retry_after = max(1, int(exc.retry_after + 0.999))
+    return JSONResponse(status_code=429, headers={"Retry-After": str(retry_after)}, content={
+        "response": f"현재 요청이 많아 {exc.name} 조회를 잠시 제한하고 있습니다. {retry_after}초 후 다시 시도해주세요.",
+        "retry_after": retry_after
+    })
+
 # 경로 설정
 CURRENT_DIR_ESC = os.path.dirname(os.path.abspath(__file__))
 TEMPLATE_PATH = os.path.join(CURRENT_DIR_ESC, "templates")
@@ -72,13 +183,14 @@ if not os.path.exists(STATIC_PATH):
 APP_ESC.mount("/staticEsc", StaticFiles(directory=STATIC_PATH), name="static")
 TEMPLATES_ESC = Jinja2Templates(directory=TEMPLATE_PATH)
 
-def get_stock_info_esc(in_ticker):
+def get_stock_info_esc(in_ticker, in_budget=None):
     """
     # 설명 : get_stock_info_esc - 모의투자-주식최근시세 가져오기
-    # 입력 : in_ticker - 주식종목코드
-    # 출력 : out_price-주식종목최근시세 (없을 경우 None)
+    # 입력 : in_ticker - 주식종목코드, in_budget - 호출 예산 (없으면 채팅/주문용 QUOTE_BUDGET_ESC)
+    # 출력 : out_price-주식종목최근시세 (없을 경우 None, 예산 초과 시 BudgetExceededError)
     # 소스 : 금융데이터 라이브러리 yfinance
     """
+    (in_budget or QUOTE_BUDGET_ESC).acquire()
     try:
         if in_ticker.isdigit(): in_ticker = f"{in_ticker}.KS"
         stock = yf.Ticker(in_ticker)
@@ -95,65 +207,115 @@ def get_user_status(in_userId):
     """
     # 설명 : get_user_status - 모의투자-유저 상태 확인 및 초기화
     # 입력 : in_userId - 사용자id
-    # 출력 : user - json 정보
-    # 소스 : 몽고DB mock_trading_db.users
+    # 출력 : user - json 정보 (history 제외)
+    # 소스 : 몽고DB mock_trading_db.users, ykpark.users_esc
     """
-    # 1. 나의 전용 DB에서 유저 조회
-    user = USERS_ESC.find_one({"user_id": in_userId})
+    # 1. 캐시 조회 (warm 호출은 몽고DB 왕복 없음)
+    user = USER_STATE_CACHE.get(in_userId)
+    if user:
+        return user
+
+    # 2. 나의 전용 DB에서 유저 조회
+    user = USERS_ESC.find_one({"user_id": in_userId}, USER_PROJECTION_ESC)
 
-    # 2. 내 DB에 유저가 없는 경우 (최초 방문)
+    # 3. 내 DB에 유저가 없는 경우 (최초 방문)
     if not user:
-        # 공용 DB에서 원본 유저 정보 확인
-        comm_user = USERS_COMM.find_one({"user_id": in_userId})
-        
-        # [에러 처리] 사용자가 DB에 아예 없는 경우
-        if not comm_user:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"해당 사용자({in_userId})를 찾을 수 없습니다. 서비스 가입이 필요합니다."
-            )
-        
-        # [기초자산 결정] 공용 DB에 있으면 그 값을, 없으면 기본값 10,000,000원 사용
-        initial_cash = comm_user.get("cash_esc", 10000000)
-
-        # [필드 추가] cash_esc ( 모의투자 기초 자산 ) 정보만 체크해서 없으면 업데이트
-        if "cash_esc" not in comm_user:
-            USERS_COMM.update_one(
-                {"user_id": in_userId}, 
-                {"$set": {"cash_esc": initial_cash}} # 초기 자산 설정
-            )
-            print(f"✅ 공용 DB에 기초자산({initial_cash:,.0f}원) 갱신 완료")
-
-        # 업데이트 후 최신 객체 다시 가져오기
-        comm_user = USERS_COMM.find_one({"user_id": in_userId})
-
-        # 모의투자 사용자 계정 생성
-        new_user_data = {
-            "user_id": in_userId,
-            "cash_esc": initial_cash,  # 내 DB 전용 잔액 필드명
-            "portfolio": {},
-            "history": [],             # 거래 내역을 담을 리스트 추가
-            "created_at": datetime.now()
-        }
-        USERS_ESC.insert_one(new_user_data)
-        user = new_user_data
-        print(f"✅ {in_userId}님의 기초자산을 내 DB로 복사 완료")
+        user = set_provision_user(in_userId)
+
+    # 4. 원장이 없는 계좌는 현재 상태를 원장 기준 이벤트로 기록 (최초 1회)
+    if "ledger_seq" not in user:
+        try:
+            user = LEDGER_ESC.set_open(in_userId, CLOCK_ESC.get_now(), USER_PROJECTION_ESC) \
+                or USERS_ESC.find_one({"user_id": in_userId}, USER_PROJECTION_ESC)
+        except Exception as e:
+            print(f"❌ 원장 기준 이벤트 기록 실패 ({in_userId}): {e}")
+
+    USER_STATE_CACHE.put(in_userId, user)
     return user
 
-def set_buy_stock(in_userId, in_ticker, in_quantity):
+def set_provision_user(in_userId):
+    """
+    # 설명 : set_provision_user - 모의투자 계정 최초 생성 (멱등 upsert, 동시 요청 안전)
+    # 입력 : in_userId - 사용자id
+    # 출력 : user - 생성(또는 기존) 유저 정보
+    # 소스 : 몽고DB mock_trading_db.users, ykpark.users_esc
+    """
+    # 공용 DB에서 원본 유저 정보 확인
+    comm_user = USERS_COMM.find_one({"user_id": in_userId}, {"cash_esc": 1})
+
+    # [에러 처리] 사용자가 DB에 아예 없는 경우
+    if not comm_user:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"해당 사용자({in_userId})를 찾을 수 없습니다. 서비스 가입이 필요합니다."
+        )
+
+    # [기초자산 결정] 공용 DB에 있으면 그 값을, 없으면 기본값 10,000,000원 사용
+    initial_cash = comm_user.get("cash_esc", INITIAL_CASH_ESC)
+
+    # [필드 추가] cash_esc 가 없을 때만 갱신 (조건부 업데이트라 중복 실행해도 결과 동일)
+    if "cash_esc" not in comm_user:
+        USERS_COMM.update_one(
+            {"user_id": in_userId, "cash_esc": {"$exists": False}},
+            {"$set": {"cash_esc": initial_cash}}
+        )
+
+    # 모의투자 사용자 계정 생성: $setOnInsert 라 이미 있으면 아무것도 바꾸지 않음
+    try:
+        user = USERS_ESC.find_one_and_update(
+            {"user_id": in_userId},
+            {"$setOnInsert": {
+                "user_id": in_userId,
+                "cash_esc": initial_cash,  # 내 DB 전용 잔액 필드명
+                "portfolio": {},
+                "history": [],             # 거래 내역을 담을 리스트
+                "created_at": datetime.now()
+            }},
+            projection=USER_PROJECTION_ESC,
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # 동시에 들어온 다른 요청이 먼저 생성한 경우
+        user = USERS_ESC.find_one({"user_id": in_userId}, USER_PROJECTION_ESC)
+    print(f"✅ {in_userId}님의 모의투자 계정 준비 완료")
+    return user
+
+def get_replay_block_message(in_userId):
+    """
+    # 설명 : get_replay_block_message - 리플레이 중 실계좌 주문 차단 (재생 시세/시계로 실계좌가 체결되지 않도록)
+    # 입력 : in_userId - 사용자id
+    # 출력 : 차단 메시지 (주문 가능하면 None)
+    """
+    if REPLAY_ESC.is_active() and not in_userId.startswith(REPLAY_USER_PREFIX_ESC):
+        return (f"과거 시세 리플레이가 진행 중이라 실계좌 주문이 잠시 중지되었습니다. "
+                f"(리플레이 참가 계정 '{REPLAY_USER_PREFIX_ESC}*' 만 주문 가능)")
+    return None
+
+def set_buy_stock(in_userId, in_ticker, in_quantity, in_price=None):
     """
     # 설명 : set_buy_stock - 모의투자-주식 매수
-    # 입력 : in_userId-사용자id, in_ticker-종목코드, in_quantity-수량
+    # 입력 : in_userId-사용자id, in_ticker-종목코드, in_quantity-수량, in_price-체결가(대기주문 체결 시, 없으면 현재가)
     # 출력 : out_val-처리결과 메시지
     # 소스 : 몽고DB ykpark.users_esc
     """
     ticker = in_ticker
     if ticker.isdigit(): ticker = f"{ticker}.KS"
+    blocked = get_replay_block_message(in_userId)
+    if blocked: return blocked
+
+    # 리플레이 중 시장가 주문은 재생 중인 시세로 체결
+    if not in_price and CLOCK_ESC.is_simulated():
+        in_price = QUOTE_SERVICE_ESC.get_last_price(ticker)
+        if not in_price: return "리플레이 중인 종목이 아닙니다."
 
-    # 1. 시세 및 유저 정보 
-    info = get_stock_info_with_name(ticker)
-    price = info['price']
-    stock_name = info['name']
+    # 1. 시세 및 유저 정보 (대기주문 체결이면 트리거 시세로 체결)
+    if in_price:
+        price, stock_name = in_price, ticker
+    else:
+        info = get_stock_info_with_name(ticker)
+        price = info['price']
+        stock_name = info['name']
 
     if not price or price == 0:
         # get_stock_info_esc로 재시도 (백업)
@@ -161,87 +323,203 @@ def set_buy_stock(in_userId, in_ticker, in_quantity):
         if not price: return "시세 정보를 가져올 수 없습니다."
     
     total_cost = price * in_quantity
-    user = get_user_status(in_userId)
-    if user.get('cash_esc', 0) < total_cost: 
-        return f"잔액이 부족합니다. (필요: {total_cost:,.0f}원 / 잔액: {user.get('cash_esc', 0):,.0f}원)"
-    
-    # 3. 포트폴리오 데이터 준비
     db_ticker = ticker.replace(".", "_")
-    portfolio = user.get("portfolio", {})
-    stock_data = portfolio.get(db_ticker, {"qty": 0, "avg_price": 0})
-    
-    new_qty = stock_data['qty'] + in_quantity
-    new_avg = round(((stock_data['avg_price'] * stock_data['qty']) + (price * in_quantity)) / new_qty, 2)
-
-    # 4. ESC DB 업데이트 (잔액 차감 및 포트폴리오 갱신)
-    USERS_ESC.update_one(
-        {"user_id": in_userId},
-        {
-            "$inc": {"cash_esc": -total_cost}, 
-            "$set": {f"portfolio.{db_ticker}": {"qty": new_qty, "avg_price": round(new_avg)}}
-        }
-    )
+    user = get_user_status(in_userId)
+    for attempt in range(ORDER_RETRY_ESC):
+        if attempt:
+            # 캐시가 오래됐거나 다른 주문이 먼저 체결됨 → DB 에서 다시 읽어 재계산
+            USER_STATE_CACHE.invalidate(in_userId)
+            user = get_user_status(in_userId)
+        if user.get('cash_esc', 0) < total_cost: 
+            return f"잔액이 부족합니다. (필요: {total_cost:,.0f}원 / 잔액: {user.get('cash_esc', 0):,.0f}원)"
+
+        # 3. 포트폴리오 데이터 준비
+        stock_data = user.get("portfolio", {}).get(db_ticker)
+        held = stock_data or {"qty": 0, "avg_price": 0}
+        new_qty = held['qty'] + in_quantity
+        new_avg = round(((held['avg_price'] * held['qty']) + (price * in_quantity)) / new_qty, 2)
+
+        # 4. ESC DB 업데이트 (잔액 차감 및 포트폴리오 갱신)
+        #    잔액 조건과 함께 계산에 쓴 보유수량(신규 종목이면 미보유)을 필터에 걸어, 그 사이 다른 체결이 있었으면
+        #    덮어쓰지 않고 다시 읽는다 (수량/평단을 통째로 $set 하므로 앞선 체결 수량 유실 방지)
+        qty_guard = ({f"portfolio.{db_ticker}.qty": stock_data['qty']} if stock_data
+                     else {f"portfolio.{db_ticker}": {"$exists": False}})
+        updated = USERS_ESC.find_one_and_update(
+            {"user_id": in_userId, "cash_esc": {"$gte": total_cost}, **qty_guard},
+            {
+                "$inc": {"cash_esc": -total_cost, "ledger_seq": 1},
+                "$set": {f"portfolio.{db_ticker}": {"qty": new_qty, "avg_price": round(new_avg)}}
+            },
+            projection=USER_PROJECTION_ESC,
+            return_document=ReturnDocument.AFTER
+        )
+        if updated:
+            break
+    else:
+        USER_STATE_CACHE.invalidate(in_userId)
+        return "주문이 동시에 처리되어 반영하지 못했습니다. 다시 시도해주세요."
+    USER_STATE_CACHE.put(in_userId, updated)
+    LIVE_HUB_ESC.set_portfolio(in_userId, updated.get("portfolio"), updated.get("cash_esc"))
+    LEDGER_ESC.set_append(in_userId, updated["ledger_seq"], "buy", CLOCK_ESC.get_now(),
+                          ticker=ticker, quantity=in_quantity, price=price, avg_price=round(new_avg))
+    set_trade_summary(in_userId, ticker, "매수", in_quantity, price, round(new_avg), new_qty)
     # 5. 거래 이력 저장 (필요 시 주석 해제)
     set_saveHistory(in_userId, "매수", ticker, in_quantity, price, f"{ticker} 매수 완료")
     out_val = f"✅ <b>{stock_name}</b>({ticker}) {in_quantity}주 매수 완료!\n- 매수가: {price:,.0f}원\n- 총 소요: {total_cost:,.0f}원"
     return out_val
 
-def set_sell_stock(in_userId, in_ticker, in_quantity):
+def set_sell_stock(in_userId, in_ticker, in_quantity, in_price=None):
     """
     # 설명 : set_sell_stock - 모의투자-주식 매도
-    # 입력 : in_userId-사용자id, in_ticker-종목코드, in_quantity-수량
+    # 입력 : in_userId-사용자id, in_ticker-종목코드, in_quantity-수량, in_price-체결가(대기주문 체결 시, 없으면 현재가)
     # 출력 : out_val-처리결과 메시지
     # 소스 : 몽고DB ykpark.users_esc
     """
     ticker = in_ticker
     if ticker.isdigit(): ticker = f"{ticker}.KS"
+    blocked = get_replay_block_message(in_userId)
+    if blocked: return blocked
+
+    # 리플레이 중 시장가 주문은 재생 중인 시세로 체결
+    if not in_price and CLOCK_ESC.is_simulated():
+        in_price = QUOTE_SERVICE_ESC.get_last_price(ticker)
+        if not in_price: return "리플레이 중인 종목이 아닙니다."
 
-    # 1. 시세 조회 및 유저 정보 가져오기
-    info = get_stock_info_with_name(ticker)
-    price = get_stock_info_esc(ticker)
-    stock_name = info['name']
+    # 1. 시세 조회 및 유저 정보 가져오기 (대기주문 체결이면 트리거 시세로 체결)
+    if in_price:
+        price, stock_name = in_price, ticker
+    else:
+        info = get_stock_info_with_name(ticker)
+        price = get_stock_info_esc(ticker)
+        stock_name = info['name']
 
     if not price or price == 0:
         # get_stock_info_esc로 재시도 (백업)
         price = get_stock_info_esc(ticker)
         if not price: return "시세 정보를 가져올 수 없습니다."
 
-    user = get_user_status(in_userId)
-
+    total_receive = price * in_quantity
     db_ticker = ticker.replace(".", "_")
-    stock_data = user.get("portfolio", {}).get(db_ticker)
-    
-    # 2. 보유 수량 체크
-    if not stock_data or stock_data['qty'] < in_quantity: 
-        return f"보유 수량이 부족합니다. (보유: {stock_data['qty'] if stock_data else 0}주)"
+    user = get_user_status(in_userId)
+    for attempt in range(ORDER_RETRY_ESC):
+        if attempt:
+            # 캐시가 오래됐거나 다른 주문이 먼저 체결됨 → DB 에서 다시 읽어 재계산
+            USER_STATE_CACHE.invalidate(in_userId)
+            user = get_user_status(in_userId)
+        stock_data = user.get("portfolio", {}).get(db_ticker)
 
-    total_receive = price * in_quantity
-    new_qty = stock_data['qty'] - in_quantity
+        # 2. 보유 수량 체크
+        if not stock_data or stock_data['qty'] < in_quantity: 
+            return f"보유 수량이 부족합니다. (보유: {stock_data['qty'] if stock_data else 0}주)"
+        new_qty = stock_data['qty'] - in_quantity
 
-    if new_qty > 0:
-        # 수량이 남은 경우: 잔액 증가($inc) 및 수량 업데이트($set)
-        USERS_ESC.update_one(
-            {"user_id": in_userId}, 
-            {
-                "$inc": {"cash_esc": total_receive}, 
-                "$set": {f"portfolio.{db_ticker}.qty": new_qty}
+        # 계산에 쓴 보유수량을 그대로 필터에 걸어, 그 사이 다른 체결이 있었으면 다시 읽는다
+        # (초과 매도 방지 + 전량/일부 매도 판단과 원장/요약에 넘기는 체결 후 수량이 실제와 어긋나지 않도록)
+        qty_filter = {"user_id": in_userId, f"portfolio.{db_ticker}.qty": stock_data['qty']}
+        if new_qty > 0:
+            # 수량이 남은 경우: 잔액 증가($inc) 및 수량 업데이트($inc)
+            update = {
+                "$inc": {"cash_esc": total_receive, f"portfolio.{db_ticker}.qty": -in_quantity, "ledger_seq": 1}
             }
-        )
-    else:
-        # 전량 매도인 경우: 잔액 증가($inc) 및 해당 종목 삭제($unset)
-        USERS_ESC.update_one(
-            {"user_id": in_userId}, 
-            {
-                "$inc": {"cash_esc": total_receive}, 
+        else:
+            # 전량 매도인 경우: 잔액 증가($inc) 및 해당 종목 삭제($unset)
+            update = {
+                "$inc": {"cash_esc": total_receive, "ledger_seq": 1},
                 "$unset": {f"portfolio.{db_ticker}": ""}
             }
+        updated = USERS_ESC.find_one_and_update(
+            qty_filter, update,
+            projection=USER_PROJECTION_ESC,
+            return_document=ReturnDocument.AFTER
         )
+        if updated:
+            break
+    else:
+        USER_STATE_CACHE.invalidate(in_userId)
+        return "주문이 동시에 처리되어 반영하지 못했습니다. 다시 시도해주세요."
+    USER_STATE_CACHE.put(in_userId, updated)
+    LIVE_HUB_ESC.set_portfolio(in_userId, updated.get("portfolio"), updated.get("cash_esc"))
+    LEDGER_ESC.set_append(in_userId, updated["ledger_seq"], "sell", CLOCK_ESC.get_now(),
+                          ticker=ticker, quantity=in_quantity, price=price, avg_price=stock_data.get('avg_price', 0))
+    set_trade_summary(in_userId, ticker, "매도", in_quantity, price, stock_data.get('avg_price', 0), new_qty)
 
     # 4. 이력 저장
     set_saveHistory(in_userId, "매도", ticker, in_quantity, price, f"{ticker} 매도 완료")
     out_val = f"✅ <b>{stock_name}</b>({ticker}) {in_quantity}주 매도 완료! (+{total_receive:,.0f}원)"
     return out_val
 
+def set_trade_summary(in_userId, in_ticker, in_type, in_quantity, in_price, in_avg_price, in_hold_qty):
+    """
+    # 설명 : set_trade_summary - 주문 체결 시 (유저, 종목) 누적 요약을 $inc upsert 1회로 갱신
+    # 입력 : in_userId-사용자id, in_ticker-티커, in_type-매수/매도, in_quantity-수량, in_price-체결가,
+    #       in_avg_price-평균단가 (매수: 체결 후 / 매도: 체결 전), in_hold_qty-체결 후 보유수량
+    # 출력 : None
+    # 소스 : 몽고DB mock_trading_db.trade_summary_esc
+    """
+    code = in_ticker.split(".")[0]
+    amount = in_price * in_quantity
+    if in_type == "매수":
+        inc = {"total_buy_qty": in_quantity, "total_buy_amt": amount,
+               "holding_qty": in_quantity, "cost_basis": amount, "realized_pnl": 0}
+        setv = {"avg_cost": in_avg_price}
+    else:
+        inc = {"total_sell_qty": in_quantity, "total_sell_amt": amount,
+               "realized_pnl": (in_price - in_avg_price) * in_quantity}
+        if in_hold_qty > 0:
+            inc.update({"holding_qty": -in_quantity, "cost_basis": -in_avg_price * in_quantity})
+            setv = {"avg_cost": in_avg_price}
+        else:
+            # 전량 매도: 부동소수 누적 오차 없이 0 으로 정리
+            setv = {"avg_cost": 0, "holding_qty": 0, "cost_basis": 0}
+    setv["updated_at"] = CLOCK_ESC.get_now()
+
+    try:
+        TRADE_SUMMARY_ESC.update_one(
+            {"user_id": in_userId, "code": code},
+            {"$inc": inc, "$set": setv},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"❌ 거래 요약 갱신 실패 ({in_userId}, {code}): {e}")
+
+    # 순위표 반영 (체결가를 해당 종목의 최신 시세로 간주)
+    LEADERBOARD_ESC.on_price(code, in_price)
+    LEADERBOARD_ESC.on_trade(in_userId, code, "buy" if in_type == "매수" else "sell", in_quantity, in_price)
+    set_popup_invalidate(in_userId)
+    set_report_notify(in_userId)
+
+def set_report_notify(in_userId):
+    """
+    # 설명 : set_report_notify - 리포트 앱에 알릴 체결 사용자 등록 (전송은 run_report_notifier 가 주기마다 묶어서)
+    # 입력 : in_userId - 체결한 사용자id
+    """
+    if not REPORT_EVENT_URL_ESC:
+        return
+    with REPORT_EVENT_LOCK_ESC:
+        REPORT_EVENT_PENDING_ESC.add(in_userId)
+
+async def run_report_notifier(in_interval_sec):
+    """
+    # 설명 : run_report_notifier - 모인 체결 사용자를 리포트 앱 /apiEsc/report_tradeEvent 로 전송 (리포트 캐시 무효화)
+    #        실패한 알림은 버림 (리포트 앱의 주기 확인으로 늦게라도 반영됨)
+    # 입력 : in_interval_sec - 전송 주기(초)
+    """
+    while True:
+        await asyncio.sleep(in_interval_sec)
+        with REPORT_EVENT_LOCK_ESC:
+            users = set(REPORT_EVENT_PENDING_ESC)
+            REPORT_EVENT_PENDING_ESC.clear()
+        if not users:
+            continue
+        targets = [None] if len(users) > REPORT_EVENT_MAX_USERS_ESC else sorted(users)
+        for user_id in targets:
+            try:
+                res = await asyncio.to_thread(requests.post, REPORT_EVENT_URL_ESC,
+                                              params={"in_userId": user_id} if user_id else None, timeout=3)
+                res.raise_for_status()
+            except Exception as e:
+                print(f"❌ 리포트 체결 알림 실패 ({user_id or '전체'}): {e}")
+
 def set_saveHistory(in_userId, in_type, in_ticker=None, in_quantity=0, in_price=0, in_result_msg=""):
     """
     # 설명 : 모의투자-이력 저장 (MongoDB 저장)
@@ -250,7 +528,7 @@ def set_saveHistory(in_userId, in_type, in_ticker=None, in_quantity=0, in_price=
     # 소스 : 몽고DB ykpark.users_esc
     """
     entry = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": CLOCK_ESC.get_now().strftime("%Y-%m-%d %H:%M:%S"),
         "category": "TRADE" if in_ticker else "CHAT", 
         "type": in_type,
         "ticker": in_ticker,
@@ -275,20 +553,8 @@ def get_stock_chart_html(in_ticker):
     """
     try:
 
-        # 1. 티커 형식 보정
-        ticker = in_ticker.upper()
-        if ticker.isdigit():
-            # 보통 6자리 숫자는 한국 주식 (기본 코스피로 시도)
-            ticker = f"{ticker}.KS"
-
-        # 2. 데이터 가져오기 (보정된 ticker 변수 사용)
-        stock = yf.Ticker(ticker)
-        df = stock.history(period="1mo")
-        if df.empty and ".KS" in ticker:
-            # 코스피(.KS)로 안될 경우 코스닥(.KQ)으로 한 번 더 시도
-            ticker = ticker.replace(".KS", ".KQ")
-            stock = yf.Ticker(ticker)
-            df = stock.history(period="1mo")
+        # 1~2. 티커 형식 보정(.KS → .KQ 재시도 포함) 및 일봉 저장소에서 데이터 가져오기
+        ticker, df = BAR_STORE_ESC.get_history_df(in_ticker, "1mo")
         if df.empty:
             return "<div style='padding:20px; text-align:center;'>차트 데이터를 불러올 수 없습니다. (종목코드 확인 필요)</div>"
         
@@ -323,6 +589,7 @@ def get_stock_info_with_name(in_ticker):
     # 입력 : in_ticker-종목코드
     # 출력 : 종멱명, 가격 리턴
     """
+    QUOTE_BUDGET_ESC.acquire()
     try:
         stock = yf.Ticker(in_ticker)
         # info에서 shortName(종목명)을 가져옵니다.
@@ -332,6 +599,168 @@ def get_stock_info_with_name(in_ticker):
     except:
         return {"name": in_ticker, "price": 0}
     
+# AI 주문 해석용 함수 정의 (로컬 해석기가 확신하지 못한 메시지만 사용)
+AI_ORDER_FUNCTIONS_ESC = [
+    {
+        "name": "set_buy_stock_api", 
+        "parameters": {
+            "type": "object", 
+            "properties": {
+                "in_ticker": {"type": "string"}, 
+                "in_quantity": {"type": "integer"}
+            }, 
+            "required": ["in_ticker", "in_quantity"]
+        }
+    },
+    {
+        "name": "set_sell_stock_api", 
+        "parameters": {
+            "type": "object", 
+            "properties": {
+                "in_ticker": {"type": "string"}, 
+                "in_quantity": {"type": "integer"}
+            }, 
+            "required": ["in_ticker", "in_quantity"]
+        }
+    }
+]
+
+def get_ai_order_message(in_userId, in_message):
+    """
+    # 설명 : get_ai_order_message - AI 함수 호출로 주문 의도 해석 (호출 시간은 로컬 해석기 통계에 기록)
+    # 입력 : in_userId-사용자id, in_message-사용자 메시지
+    # 출력 : AI 응답 메시지 (function_call 또는 content)
+    # 소스 : OpenAI gpt-4o-mini
+    """
+    LLM_BUDGET_ESC.acquire()
+    start = time.perf_counter()
+    ai_res = AI_CLIENT_ESC.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {
+                "role": "system", 
+                "content": (
+                    f"당신은 주식 거래 전문가입니다. 사용자는 {in_userId}입니다. "
+                    "종목 코드를 추출할 때 반드시 최신 정보를 바탕으로 정확한 6자리 숫자를 찾으세요. "
+                    "예: 삼성전자는 005930.KS, 한국전력은 015760.KS입니다. "  # 가이드 추가
+                    "만약 사용자가 보유한 종목의 코드를 정확히 모른다면, '자산 현황'에 표시된 티커를 우선적으로 참고하세요."
+                )
+            },
+            {"role": "user", "content": in_message}
+        ],
+        functions=AI_ORDER_FUNCTIONS_ESC, 
+        function_call="auto"
+    )
+    INTENT_PARSER_ESC.set_record("llm", time.perf_counter() - start)
+    return ai_res.choices[0].message
+
+# 처리결과 메시지가 이 접두어로 시작하면 체결 성공
+ORDER_OK_PREFIX_ESC = "✅"
+
+def set_fill_pending_order(in_order, in_price):
+    """
+    # 설명 : set_fill_pending_order - 조건이 충족된 대기 주문을 트리거 시세로 체결
+    # 입력 : in_order - 대기 주문 dict, in_price - 트리거 시세
+    # 출력 : (성공여부, 처리결과 메시지)
+    """
+    if in_order["side"] == "buy":
+        result = set_buy_stock(in_order["user_id"], in_order["ticker"], in_order["quantity"], in_price)
+    else:
+        result = set_sell_stock(in_order["user_id"], in_order["ticker"], in_order["quantity"], in_price)
+    return result.startswith(ORDER_OK_PREFIX_ESC), result
+
+# 지정가/스탑 대기 주문장 + 시세 폴러 (대기 주문이 있는 종목만 종목당 1번 조회)
+ORDER_BOOK_ESC = OrderBookManager(DB_ESC.pending_orders_esc, set_fill_pending_order)
+# 리플레이 세션 전용 대기 주문장 (메모리 전용, 재생 종료 시 폐기)
+REPLAY_ORDER_BOOK_ESC = OrderBookManager(None, set_fill_pending_order)
+QUOTE_SERVICE_ESC = QuoteService(lambda in_ticker: get_stock_info_esc(in_ticker, POLL_BUDGET_ESC))
+
+def get_order_book(in_replay=None):
+    """
+    # 설명 : get_order_book - 지금 주문/시세를 받을 대기 주문장 (리플레이 중이면 리플레이 전용 주문장)
+    # 입력 : in_replay - 리플레이 여부 (None 이면 현재 재생 상태)
+    # 출력 : OrderBookManager
+    """
+    if in_replay is None:
+        in_replay = REPLAY_ESC.is_active()
+    return REPLAY_ORDER_BOOK_ESC if in_replay else ORDER_BOOK_ESC
+
+# 재생 시세는 리플레이 주문장으로만 → 실계좌 대기주문이 과거 시세로 체결되지 않음
+QUOTE_SERVICE_ESC.subscribe(lambda in_ticker, in_price: get_order_book().on_quote(in_ticker, in_price))
+QUOTE_SERVICE_ESC.add_watch_source(ORDER_BOOK_ESC.get_watch_tickers)
+QUOTE_SERVICE_ESC.subscribe(lambda in_ticker, in_price: LEADERBOARD_ESC.on_price(in_ticker.split(".")[0], in_price))
+
+# 실시간 평가금액/순위 푸시 (구독자 보유 종목만 폴링 대상에 추가, 전송은 LIVE_FLUSH_SEC_ESC 마다 묶어서)
+LIVE_HUB_ESC = LiveValuationHub(LEADERBOARD_ESC, QUOTE_SERVICE_ESC.get_last_price)
+QUOTE_SERVICE_ESC.subscribe(LIVE_HUB_ESC.on_quote)
+QUOTE_SERVICE_ESC.add_watch_source(LIVE_HUB_ESC.get_watch_tickers)
+LIVE_FLUSH_SEC_ESC = float(os.getenv("ESC_LIVE_FLUSH_SEC", "1"))
+LIVE_HEARTBEAT_SEC_ESC = 15
+
+def set_rebuild_leaderboard():
+    """
+    # 설명 : set_rebuild_leaderboard - 거래 요약과 종목 마스터 종가로 순위표 전체 재구성
+    # 입력 : None
+    # 출력 : 순위표 사용자 수
+    # 소스 : 몽고DB mock_trading_db.trade_summary_esc, mock_trading_db.stock_master
+    """
+    prices = {s['code']: s.get('close', 0) for s in DB_COMM.stock_master.find({}, {"code": 1, "close": 1})}
+    summaries = TRADE_SUMMARY_ESC.find({}, {"_id": 0, "user_id": 1, "code": 1, "total_buy_qty": 1,
+                                            "total_buy_amt": 1, "total_sell_qty": 1, "total_sell_amt": 1})
+    return LEADERBOARD_ESC.set_rebuild(summaries, prices)
+
+QUOTE_POLL_SEC_ESC = int(os.getenv("ESC_QUOTE_POLL_SEC", "10"))
+
+# 과거 시세 리플레이 (재생 중에는 실시간 폴링 중지, 주문/순위표는 재생 시세와 시계로 동작)
+# - 재생 중에는 REPLAY_USER_PREFIX_ESC 로 시작하는 참가 계정만 주문 가능 (실계좌 주문은 안내 메시지로 거부)
+# - 참가 계정의 지정가/스탑 주문은 REPLAY_ORDER_BOOK_ESC 에만 쌓이고, 실계좌 대기주문은 재생 중 체결되지 않음
+# - 종료(중지/완료/오류) 시 리플레이 주문장 폐기, 과거 시세 제거, 순위표 재구성, 실시간 평가금액 재계산
+REPLAY_USER_PREFIX_ESC = os.getenv("ESC_REPLAY_USER_PREFIX", "replay_")
+
+def set_replay_cleanup(in_tickers):
+    """
+    # 설명 : set_replay_cleanup - 리플레이 종료 정리 (실시간 폴링 재개 전에 호출)
+    # 입력 : in_tickers - 재생한 티커 리스트
+    # 출력 : None
+    """
+    dropped = REPLAY_ORDER_BOOK_ESC.set_clear()
+    QUOTE_SERVICE_ESC.set_forget(in_tickers)
+    users = set_rebuild_leaderboard()
+    LIVE_HUB_ESC.set_reprice(in_tickers)
+    print(f"✅ 리플레이 종료 정리: 대기주문 {dropped}건 폐기, 순위표 {users}명 재구성")
+
+REPLAY_ESC = ReplayEngine(QUOTE_SERVICE_ESC, CLOCK_ESC, set_replay_cleanup)
+REPLAY_DIR_ESC = os.getenv("ESC_REPLAY_DIR", os.path.join(CURRENT_DIR_ESC, "data", "replay"))
+
+@APP_ESC.on_event("startup")
+async def set_startup_order_book():
+    """
+    # 설명 : 서버 시작 시 대기 주문 복구 및 시세 폴러 시작
+    """
+    try:
+        ORDER_BOOK_ESC.set_indexes()
+        count = ORDER_BOOK_ESC.set_recover()
+        print(f"✅ 대기 주문 {count}건 복구 완료")
+    except Exception as e:
+        print(f"❌ 대기 주문 복구 실패: {e}")
+    try:
+        LEDGER_ESC.set_indexes()
+    except Exception as e:
+        print(f"❌ 원장 인덱스 생성 실패: {e}")
+    try:
+        # 보유수량/원가 필드 도입 전 문서 보정 (보정할 문서가 없으면 조회만 하고 끝남)
+        print(f"✅ 거래 요약 보정 완료: {set_backfill_summary(TRADE_SUMMARY_ESC)}건")
+    except Exception as e:
+        print(f"❌ 거래 요약 보정 실패: {e}")
+    try:
+        print(f"✅ 순위표 재구성 완료: {set_rebuild_leaderboard()}명")
+    except Exception as e:
+        print(f"❌ 순위표 재구성 실패: {e}")
+    asyncio.create_task(QUOTE_SERVICE_ESC.run_poller(QUOTE_POLL_SEC_ESC))
+    asyncio.create_task(LIVE_HUB_ESC.run_flusher(LIVE_FLUSH_SEC_ESC))
+    if REPORT_EVENT_URL_ESC:
+        asyncio.create_task(run_report_notifier(REPORT_EVENT_SEC_ESC))
+
 # --- FastAPI 경로 ---
 
 @APP_ESC.get("/")
@@ -351,16 +780,41 @@ def get_chat_page(request: Request):
 
 @APP_ESC.post("/esc/chatEsc")
 async def chatEsc(
+    request: Request,
     in_message: str = Form(...),
     in_user_id: str = Form(None),
     in_invest_amount: str = Form("10000000")
 ):
     """
-    # 설명 : 모의투자-챗봇 채팅 메시지
+    # 설명 : 모의투자-챗봇 채팅 메시지 (사용자별 요청 제한 후 워커 스레드에서 처리)
     # 입력 : request
-    # 출력 : response json
+    # 출력 : response json (제한 시 429 + Retry-After)
     # 소스 : 
     """
+    if in_user_id and in_user_id != "null":
+        limit_key = in_user_id
+    else:
+        # 비로그인 요청은 접속 주소별로 제한 (한 클라이언트가 다른 비로그인 사용자의 한도까지 쓰지 않도록)
+        limit_key = f"anonymous:{request.client.host if request.client else 'unknown'}"
+    ok, reason, retry_after = CHAT_LIMITER_ESC.try_acquire(limit_key)
+    if not ok:
+        retry_after = max(1, int(retry_after + 0.999))
+        message = "이전 요청을 처리하고 있습니다. 잠시 후 다시 시도해주세요." if reason == "concurrency" \
+            else f"요청이 너무 많습니다. {retry_after}초 후 다시 시도해주세요."
+        return JSONResponse(status_code=429, headers={"Retry-After": str(retry_after)},
+                            content={"response": message, "retry_after": retry_after})
+    try:
+        # 몽고DB/야후/OpenAI 호출이 모두 블로킹이므로 이벤트 루프를 막지 않도록 스레드에서 실행
+        return await asyncio.to_thread(get_chat_response, in_message, in_user_id)
+    finally:
+        CHAT_LIMITER_ESC.release(limit_key)
+
+def get_chat_response(in_message, in_user_id):
+    """
+    # 설명 : get_chat_response - 채팅 메시지 처리 (잔고 조회 / 로컬 해석 주문 / AI 주문)
+    # 입력 : in_message-사용자 메시지, in_user_id-사용자id
+    # 출력 : response json
+    """
     try:
         user_id = in_user_id
         if not user_id or user_id == "null":
@@ -422,96 +876,219 @@ async def chatEsc(
             html += "</div></div>"
             return {"response": html}
 
-        # 2. AI 및 주문 처리
-        functions = [
-            {
-                "name": "set_buy_stock_api", 
-                "parameters": {
-                    "type": "object", 
-                    "properties": {
-                        "in_ticker": {"type": "string"}, 
-                        "in_quantity": {"type": "integer"}
-                    }, 
-                    "required": ["in_ticker", "in_quantity"]
-                }
-            },
-            {
-                "name": "set_sell_stock_api", 
-                "parameters": {
-                    "type": "object", 
-                    "properties": {
-                        "in_ticker": {"type": "string"}, 
-                        "in_quantity": {"type": "integer"}
-                    }, 
-                    "required": ["in_ticker", "in_quantity"]
-                }
-            }
-        ]
-
-        ai_res = AI_CLIENT_ESC.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": (
-                        f"당신은 주식 거래 전문가입니다. 사용자는 {user_id}입니다. "
-                        "종목 코드를 추출할 때 반드시 최신 정보를 바탕으로 정확한 6자리 숫자를 찾으세요. "
-                        "예: 삼성전자는 005930.KS, 한국전력은 015760.KS입니다. "  # 가이드 추가
-                        "만약 사용자가 보유한 종목의 코드를 정확히 모른다면, '자산 현황'에 표시된 티커를 우선적으로 참고하세요."
-                    )
-                },
-                {"role": "user", "content": in_message}
-            ],
-            functions=functions, 
-            function_call="auto"
-        )
-
-        ai_msg = ai_res.choices[0].message
-
-        if ai_msg.function_call:
+        # 2. 단순 주문은 로컬 해석 후 바로 처리, 나머지만 AI 호출
+        parse_start = time.perf_counter()
+        intent = INTENT_PARSER_ESC.get_intent(in_message)
+        if intent:
+            INTENT_PARSER_ESC.set_record("fast", time.perf_counter() - parse_start)
+            func_name = "set_buy_stock_api" if intent["side"] == "buy" else "set_sell_stock_api"
+            ticker = intent["ticker"]
+            qty = intent["quantity"]
+        else:
+            ai_msg = get_ai_order_message(user_id, in_message)
+            if not ai_msg.function_call:
+                # AI 일반 응답 저장
+                ans_content = ai_msg.content if ai_msg.content else "죄송합니다. 요청을 이해하지 못했습니다."
+                set_saveHistory(user_id, "답변", in_result_msg=ans_content)
+                return {"response": ans_content}
+            func_name = ai_msg.function_call.name
             args = json.loads(ai_msg.function_call.arguments)
             ticker = args.get('in_ticker')
             qty = args.get('in_quantity')
-            
-            # 차트 생성
-            # chart_html = get_stock_chart_html(ticker)
-            
-            if ai_msg.function_call.name == "set_buy_stock_api":
-                result = set_buy_stock(user_id, ticker, qty)
-                bg, border, title = "#ebf5fb", "#aed6f1", "✅ 모의투자 매수 완료"
-                icon = "📈"  # 여기서 icon 정의
-                color = "#e74c3c" # 강조색 (빨강)
-            else:
-                result = set_sell_stock(user_id, ticker, qty)
-                bg, border, title = "#fef9e7", "#f9e79f", "💰 모의투자 매도 완료"
-                icon = "📉"  # 여기서 icon 정의
-                color = "#3498db" # 강조색 (파랑)
-            # 차트 대신 요약 카드를 반환
-            res_html = f"""
-                    <div style="padding: 15px; border-radius: 12px; background: {bg}; border: 2px solid {border}; font-family: 'Malgun Gothic', sans-serif;">
-                        <div style="font-size: 1.1em; font-weight: bold; margin-bottom: 8px; color: #2c3e50; display: flex; align-items: center;">
-                            <span style="font-size: 1.3em; margin-right: 8px;">{icon}</span> 
-                            <span style="color: {color};">{title}</span>
-                        </div>
-                        <div style="color: #34495e; line-height: 1.6;">
-                            <strong>{result}</strong>
-                        </div>
-                        <div style="margin-top: 10px; font-size: 0.85em; color: #7f8c8d; border-top: 1px dotted {border}; padding-top: 8px;">
-                            실시간 시세가 반영된 결과입니다.
-                        </div>
-                    </div>
-            """
-            set_saveHistory(user_id, "답변", in_result_msg=result)
-            return {"response": res_html}
 
-        # 2. AI 일반 응답 저장
-        ans_content = ai_msg.content if ai_msg.content else "죄송합니다. 요청을 이해하지 못했습니다."
-        set_saveHistory(user_id, "답변", in_result_msg=ans_content)
-        return {"response": ans_content}
+        # 차트 생성
+        # chart_html = get_stock_chart_html(ticker)
+        
+        if func_name == "set_buy_stock_api":
+            result = set_buy_stock(user_id, ticker, qty)
+            bg, border, title = "#ebf5fb", "#aed6f1", "✅ 모의투자 매수 완료"
+            icon = "📈"  # 여기서 icon 정의
+            color = "#e74c3c" # 강조색 (빨강)
+        else:
+            result = set_sell_stock(user_id, ticker, qty)
+            bg, border, title = "#fef9e7", "#f9e79f", "💰 모의투자 매도 완료"
+            icon = "📉"  # 여기서 icon 정의
+            color = "#3498db" # 강조색 (파랑)
+        # 차트 대신 요약 카드를 반환
+        res_html = f"""
+                <div style="padding: 15px; border-radius: 12px; background: {bg}; border: 2px solid {border}; font-family: 'Malgun Gothic', sans-serif;">
+                    <div style="font-size: 1.1em; font-weight: bold; margin-bottom: 8px; color: #2c3e50; display: flex; align-items: center;">
+                        <span style="font-size: 1.3em; margin-right: 8px;">{icon}</span> 
+                        <span style="color: {color};">{title}</span>
+                    </div>
+                    <div style="color: #34495e; line-height: 1.6;">
+                        <strong>{result}</strong>
+                    </div>
+                    <div style="margin-top: 10px; font-size: 0.85em; color: #7f8c8d; border-top: 1px dotted {border}; padding-top: 8px;">
+                        실시간 시세가 반영된 결과입니다.
+                    </div>
+                </div>
+        """
+        set_saveHistory(user_id, "답변", in_result_msg=result)
+        return {"response": res_html}
+    except BudgetExceededError as e:
+        return {"response": f"현재 요청이 많아 {e.name} 호출을 잠시 제한하고 있습니다. {max(1, round(e.retry_after))}초 후 다시 시도해주세요.",
+                "retry_after": max(1, round(e.retry_after))}
     except Exception as e:
         print(f"🔥 서버 내부 에러: {e}")
         return {"response": f"죄송합니다. 처리 중 오류가 발생했습니다. (사유: {str(e)})"}
     
+@APP_ESC.post("/esc/order")
+def set_order_esc(
+    in_user_id: str = Form(...),
+    in_ticker: str = Form(...),
+    in_side: str = Form(...),
+    in_quantity: int = Form(..., gt=0),
+    in_order_type: str = Form("market"),
+    in_price: float = Form(None)
+):
+    """
+    # 설명 : 모의투자-주문 접수 (시장가는 즉시 체결, 지정가/스탑은 대기 주문 등록)
+    # 입력 : in_user_id-사용자id, in_ticker-종목코드, in_side-buy/sell, in_quantity-수량,
+    #       in_order_type-market/limit/stop, in_price-지정가/스탑가
+    # 출력 : response json (시장가: 처리결과, 대기주문: 주문정보)
+    # 소스 : 몽고DB ykpark.users_esc, ykpark.pending_orders_esc
+    """
+    ticker = in_ticker.upper()
+    if ticker.isdigit(): ticker = f"{ticker}.KS"
+    get_user_status(in_user_id)
+
+    if in_order_type == "market":
+        if in_side == "buy":
+            return {"response": set_buy_stock(in_user_id, ticker, in_quantity)}
+        if in_side == "sell":
+            return {"response": set_sell_stock(in_user_id, ticker, in_quantity)}
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 주문입니다: {in_side}")
+
+    if not in_price:
+        raise HTTPException(status_code=400, detail="지정가/스탑 주문은 가격(in_price)이 필요합니다.")
+    blocked = get_replay_block_message(in_user_id)
+    if blocked:
+        raise HTTPException(status_code=409, detail=blocked)
+    try:
+        order = get_order_book().set_order(in_user_id, ticker, in_side, in_order_type, in_quantity, in_price,
+                                         in_now=CLOCK_ESC.get_now())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    LEDGER_ESC.set_audit(in_user_id, "order", order["created_at"], order_id=order["order_id"], ticker=ticker,
+                         side=in_side, order_type=in_order_type, quantity=in_quantity, price=order["price"])
+    return {"response": "대기 주문이 접수되었습니다.", "order": order}
+
+@APP_ESC.post("/esc/order/cancel")
+def set_cancel_order_esc(in_user_id: str = Form(...), in_order_id: str = Form(...)):
+    """
+    # 설명 : 모의투자-대기 주문 취소
+    # 입력 : in_user_id-사용자id, in_order_id-주문번호
+    # 출력 : response json
+    """
+    order = ORDER_BOOK_ESC.set_cancel(in_user_id, in_order_id) or REPLAY_ORDER_BOOK_ESC.set_cancel(in_user_id, in_order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="취소할 대기 주문이 없습니다.")
+    LEDGER_ESC.set_audit(in_user_id, "cancel", CLOCK_ESC.get_now(), order_id=in_order_id, ticker=order["ticker"])
+    return {"response": "대기 주문이 취소되었습니다.", "order": order}
+
+@APP_ESC.post("/esc/replay/start")
+def set_replay_start(
+    in_tickers: str = Form(..., description="종목코드 목록 (쉼표 구분)"),
+    in_start: str = Form(..., description="재생 시작일 (YYYY-MM-DD)"),
+    in_end: str = Form(None, description="재생 종료일 (없으면 시작일 하루)"),
+    in_speed: float = Form(60.0, ge=0, description="배속 (0 이면 대기 없이 최대 속도)"),
+    in_source: str = Form("store", description="store: 일봉 저장소, csv: 증권사 차트 내보내기 파일"),
+    in_intrabar: bool = Form(True),
+    in_max_gap_sec: int = Form(3600, ge=0)
+):
+    """
+    # 설명 : 모의투자-과거 시세 리플레이 시작 (수업용 과거 장 재현, 파이프라인 부하 시험)
+    #        재생 중에는 참가 계정(ESC_REPLAY_USER_PREFIX, 기본 replay_)만 주문 가능하고 실계좌 주문은 거부,
+    #        실계좌 대기주문은 재생 시세로 체결되지 않음
+    # 입력 : in_tickers-종목코드 목록, in_start/in_end-재생 구간, in_speed-배속, in_source-시세 출처,
+    #       in_intrabar-일봉을 시가/고가/저가/종가로 펼칠지, in_max_gap_sec-건너뛸 공백(초)
+    # 출력 : 재생 상태 json
+    # 소스 : 일봉 로컬 저장소 또는 ESC_REPLAY_DIR 의 {티커}.csv
+    """
+    if in_source not in ("store", "csv"):
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 시세 출처입니다: {in_source}")
+    end = in_end or in_start
+    tickers = [t if "." in t else f"{t}.KS" for t in
+               (c.strip().upper() for c in in_tickers.split(",")) if t]
+    series = []
+    for ticker in tickers:
+        if in_source == "store":
+            times, prices = get_store_ticks(BAR_STORE_ESC, ticker, in_start, end, in_intrabar)
+            series.append((ticker, times, prices))
+            continue
+        candidates = [os.path.join(REPLAY_DIR_ESC, f"{name}.csv") for name in (ticker, ticker.split(".")[0])]
+        path = next((p for p in candidates if os.path.exists(p)), None)
+        if path is None:
+            raise HTTPException(status_code=404, detail=f"{ticker} 시세 파일이 없습니다. ({REPLAY_DIR_ESC})")
+        _, times, prices = get_csv_ticks(path, in_start, end)
+        series.append((ticker, times, prices))
+    try:
+        return REPLAY_ESC.set_start(series, in_speed, in_max_gap_sec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@APP_ESC.post("/esc/replay/stop")
+def set_replay_stop():
+    """
+    # 설명 : 모의투자-리플레이 중지 (시계는 실제 시각으로, 리플레이 대기주문 폐기, 순위표/실시간 평가 복원 후 시세 폴링 재개)
+    """
+    return REPLAY_ESC.set_stop()
+
+@APP_ESC.get("/apiEsc/replay-status")
+async def get_replay_status():
+    """
+    # 설명 : 모의투자-리플레이 진행 상태 (재생/체결 처리율, 지연, 시뮬레이션 시각)
+    """
+    return {"replay": REPLAY_ESC.get_status(), "order_book": ORDER_BOOK_ESC.get_stats(),
+            "replay_order_book": REPLAY_ORDER_BOOK_ESC.get_stats(), "replay_user_prefix": REPLAY_USER_PREFIX_ESC,
+            "leaderboard_users": len(LEADERBOARD_ESC), "sim_now": CLOCK_ESC.get_now().strftime("%Y-%m-%d %H:%M:%S")}
+
+@APP_ESC.get("/apiEsc/orders")
+def get_orders_esc(in_userId: str = Query(...)):
+    """
+    # 설명 : 모의투자-사용자 대기 주문 목록
+    # 입력 : in_userId-사용자id
+    # 출력 : 대기 주문 리스트
+    """
+    return ORDER_BOOK_ESC.get_user_orders(in_userId) + REPLAY_ORDER_BOOK_ESC.get_user_orders(in_userId)
+
+@APP_ESC.get("/apiEsc/order-book-stats")
+def get_order_book_stats():
+    """
+    # 설명 : 모의투자-대기 주문장 통계
+    # 입력 : None
+    # 출력 : 종목 수, 대기 주문 수, 체결/거부 건수, 시세 배포 건수
+    """
+    return {**ORDER_BOOK_ESC.get_stats(), "quotes_published": QUOTE_SERVICE_ESC.publish_count,
+            "quotes_budget_skipped": QUOTE_SERVICE_ESC.budget_skipped}
+
+@APP_ESC.get("/apiEsc/portfolio-at")
+def get_portfolio_at(in_userId: str = Query(...), in_at: str = Query(None, description="YYYY-MM-DD HH:MM:SS")):
+    """
+    # 설명 : 모의투자-원장으로 복원한 현재/특정 시점 예수금과 보유종목
+    # 입력 : in_userId-사용자id, in_at-기준 실제시각 (없으면 현재, 리플레이 체결도 기록된 시각 기준)
+    # 출력 : {user_id, seq, ts, recorded_at, cash_esc, portfolio, replayed}
+    # 소스 : 몽고DB ykpark.ledger_snapshots_esc, ykpark.ledger_events_esc
+    """
+    try:
+        at = datetime.strptime(in_at, "%Y-%m-%d %H:%M:%S") if in_at else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"시각 형식이 올바르지 않습니다: {in_at}")
+    state = LEDGER_ESC.get_state(in_userId, in_at=at)
+    if state is None:
+        raise HTTPException(status_code=404, detail="해당 시점의 원장 기록이 없습니다.")
+    return state
+
+@APP_ESC.get("/apiEsc/ledger-verify")
+def get_ledger_verify(in_userId: str = Query(None)):
+    """
+    # 설명 : 모의투자-원장 전체 재생 결과와 users_esc 상태 비교
+    # 입력 : in_userId-사용자id (없으면 전체)
+    # 출력 : {checked, ok, missing_ledger, mismatches}
+    """
+    return LEDGER_ESC.get_verify(in_userId)
+
 @APP_ESC.get("/esc/initEsc")
 async def initEsc(in_userId: str = Query(None), in_phone: str = Query(...)):
     """
@@ -526,90 +1103,269 @@ async def initEsc(in_userId: str = Query(None), in_phone: str = Query(...)):
     get_user_status(userId)
     return {"message": f"🌟 {userId}님 환영합니다!\n현재 10,000,000원의 투자금이 설정되었습니다.", "userId": userId}
 
-@APP_ESC.get("/apiEsc/popup-status")
-async def get_popup_status(in_userId: str = Query(...)):
+def get_popup_payload():
     """
-    # 설명 : 모의투자-수익률 팝업용 데이터 제공 (Elasticsearch 연동 버전)
-    # 입력 : in_userId - 사용자id
-    # 출력 : response - 엘라스틱서치 trade_esc_history 기반 자산 분석 리스트
+    # 설명 : get_popup_payload - 수익률 1위 사용자와 그 거래이력을 ES 검색 1회로 조회해 팝업 목록으로 가공
+    #        uid 별 max(rate) 내림차순 terms 1건 + top_hits 로 해당 사용자 문서를 같은 요청에서 받음
+    #        (top_hits 500건은 인덱스 설정 max_inner_result_window 필요, esc.es_templates 에서 등록)
+    # 출력 : (1위 사용자id, 팝업 목록)
+    # 소스 : Elasticsearch trade_esc_history
     """
-    try:
-        index_name = "trade_esc_history"
-        
-        # 1위 유저 식별
-        top_res = es.search(index=index_name, body={
-            "size": 1,
-            "query": {"exists": {"field": "rate"}},
-            "sort": [{"rate": {"order": "desc"}}]
-        })
-        if not top_res['hits']['hits']: return []
-        target_uid = top_res['hits']['hits'][0]['_source'].get('uid')
+    res = es.search(index="trade_esc_history", body={
+        "size": 0,
+        "aggs": {
+            "top_user": {
+                "terms": {"field": "uid", "size": 1, "order": {"max_rate": "desc"}},
+                "aggs": {
+                    "max_rate": {"max": {"field": "rate"}},
+                    "docs": {"top_hits": {"size": POPUP_MAX_DOCS_ESC, "_source": {
+                        "includes": ["buy_dt", "sn", "ticker", "buy_p", "sell_p", "rate", "qty"]}}}
+                }
+            }
+        }
+    })
+    buckets = res.get('aggregations', {}).get('top_user', {}).get('buckets', [])
+    if not buckets or buckets[0]['max_rate'].get('value') is None:
+        return None, []
+    target_uid = buckets[0]['key']
 
-        # 해당 유저의 모든 데이터 가져오기
-        res = es.search(index=index_name, body={
-            "size": 500,
-            "query": { "match_phrase": { "uid": target_uid } }
-        })
-        
-        user_hits = res['hits']['hits']
-        processed_data = []
+    processed_data = []
+    for h in buckets[0]['docs']['hits']['hits']:
+        s = h['_source']
+        try:
+            # 모든 수치형 데이터에 대해 None 체크 수행
+            buy_p = s.get('buy_p')
+            sell_p = s.get('sell_p')
+            rate = s.get('rate')
+            qty = s.get('qty')
 
-        for h in user_hits:
-            s = h['_source']
-            try:
-                # 모든 수치형 데이터에 대해 None 체크 수행
-                buy_p = s.get('buy_p')
-                sell_p = s.get('sell_p')
-                rate = s.get('rate')
-                qty = s.get('qty')
-
-                processed_data.append({
-                    "date": s.get('buy_dt', '2025-01-01'),
-                    "name": s.get('sn', '알 수 없음'),
-                    "ticker": s.get('ticker', '005930.KS'),
-                    "code": s.get('ticker', '005930.KS'),
-                    "buyPrice": float(buy_p) if buy_p is not None else 0.0,
-                    "quantity": int(qty) if qty is not None else 0,
-                    "currentPrice": float(sell_p) if sell_p is not None else (float(buy_p) if buy_p is not None else 0.0),
-                    "returnRate": float(rate) if rate is not None else 0.0
-                })
-            except (ValueError, TypeError):
-                continue
+            processed_data.append({
+                "date": s.get('buy_dt', '2025-01-01'),
+                "name": s.get('sn', '알 수 없음'),
+                "ticker": s.get('ticker', '005930.KS'),
+                "code": s.get('ticker', '005930.KS'),
+                "buyPrice": float(buy_p) if buy_p is not None else 0.0,
+                "quantity": int(qty) if qty is not None else 0,
+                "currentPrice": float(sell_p) if sell_p is not None else (float(buy_p) if buy_p is not None else 0.0),
+                "returnRate": float(rate) if rate is not None else 0.0
+            })
+        except (ValueError, TypeError):
+            continue
+    return target_uid, processed_data
+
+def set_popup_invalidate(in_userId):
+    """
+    # 설명 : set_popup_invalidate - 캐시된 팝업의 1위 사용자가 체결하면 팝업 캐시 삭제
+    #        체결은 ES 동기화 작업자가 색인한 뒤에야 조회되므로, 이후 POPUP_SETTLE_SEC_ESC 동안은
+    #        POPUP_SETTLE_TTL_ESC 초만 캐시해 동기화 전 결과가 TTL 내내 남지 않게 함
+    # 입력 : in_userId - 체결한 사용자id
+    """
+    if POPUP_STATE_ESC["uid"] == in_userId:
+        POPUP_STATE_ESC["settle_until"] = time.monotonic() + POPUP_SETTLE_SEC_ESC
+        POPUP_CACHE_ESC.invalidate("popup_status")
 
+@APP_ESC.get("/apiEsc/popup-status")
+def get_popup_status(request: Request, in_userId: str = Query(...)):
+    """
+    # 설명 : 모의투자-수익률 팝업용 데이터 제공 (Elasticsearch 연동 버전, 서버 캐시 + ETag)
+    # 입력 : in_userId - 사용자id
+    # 출력 : response - 엘라스틱서치 trade_esc_history 기반 자산 분석 리스트
+    """
+    def build():
+        target_uid, processed_data = get_popup_payload()
+        POPUP_STATE_ESC["uid"] = target_uid
         print(f"✅ [DEBUG] {target_uid} 유저의 데이터 {len(processed_data)}건 가공 완료")
         return processed_data
 
+    try:
+        # 적중은 잠금 없이 반환, 미스일 때만 1건 생성하고 동시에 열린 팝업은 그 결과를 기다림
+        ttl = POPUP_SETTLE_TTL_ESC if time.monotonic() < POPUP_STATE_ESC["settle_until"] else None
+        body, etag = POPUP_CACHE_ESC.get_or_build(("popup_status",), build, ttl, POPUP_LOCK_ESC)
     except Exception as e:
+        # 오류 결과는 캐시하지 않음
         print(f"🔥 팝업 상태 API 에러: {e}")
         return []
+    return get_etag_response(request, body, etag, in_max_age=0)
     
-# 2. 특정 종목의 과거 차트 데이터 가져오기 (Plotly용)
-@APP_ESC.get("/apiEsc/stock-chart-data")
-async def get_stock_chart_data(in_code: str = Query(...)):
+def get_close_series(in_code, in_period="1y"):
     """
-    # 설명 : 모의투자-특정종목의 과거 차트 데이터 가져오기
-    # 입력 : in_code-종목코드
-    # 출력 : response-차트 데이터
+    # 설명 : get_close_series - 종목 종가 시계열 (팝업 라인 차트용)
+    # 입력 : in_code-종목코드, in_period-기간
+    # 출력 : {"dates": [...], "closes": [...]} 또는 {"error": 사유}
+    # 소스 : 일봉 저장소 (없는 구간만 yfinance 조회)
     """
     try:
-        # 매수 시점 전후의 데이터를 보여주기 위해 기간 설정
-        stock = yf.Ticker(in_code)
-        # 성공 사례가 3월이므로 2024년 전체 데이터를 가져오거나 최근 1년치를 가져옴
-        # df = stock.history(start="2024-01-01", end="2024-12-31")
-        df = stock.history(period="1y") # 고정 날짜 대신 최근 1년치 데이터 가져오기
+        # 매수 시점 전후의 데이터를 보여주기 위해 최근 1년치 (일봉 저장소에 없는 구간만 야후 조회)
+        _, df = BAR_STORE_ESC.get_history_df(in_code, in_period)
         
         if df.empty:
             return {"error": "데이터가 없습니다."}
         
         df = df.dropna(subset=['Close'])
-        chart_data = {
+        return {
             "dates": df.index.strftime('%Y-%m-%d').tolist(),
             "closes": [float(x) for x in df['Close'].tolist()]
         }
-        return chart_data
     except Exception as e:
         return {"error": str(e)}
 
+def get_cacheable_close_series(in_code, in_period="1y"):
+    """
+    # 설명 : get_cacheable_close_series - 캐시 빌더용 get_close_series (오류 결과는 UncacheablePayload 로 올려 저장하지 않음)
+    """
+    payload = get_close_series(in_code, in_period)
+    if "error" in payload:
+        raise UncacheablePayload(payload)
+    return payload
+
+# 2. 특정 종목의 과거 차트 데이터 가져오기 (Plotly용)
+@APP_ESC.get("/apiEsc/stock-chart-data")
+def get_stock_chart_data(request: Request, in_code: str = Query(...)):
+    """
+    # 설명 : 모의투자-특정종목의 과거 차트 데이터 가져오기
+    # 입력 : in_code-종목코드
+    # 출력 : response-차트 데이터 (Cache-Control/ETag 지원, 캐시 무력화용 t 파라미터 불필요, 오류는 캐시하지 않음)
+    """
+    try:
+        body, etag = CHART_CACHE_ESC.get_or_build(("closes", in_code.upper(), "1y"),
+                                                  lambda: get_cacheable_close_series(in_code, "1y"))
+    except UncacheablePayload as e:
+        return get_no_store_response(e.payload)
+    return get_etag_response(request, body, etag, in_max_age=CHART_CLIENT_MAX_AGE_ESC)
+
+@APP_ESC.get("/apiEsc/stock-chart-batch")
+def get_stock_chart_batch(
+    request: Request,
+    in_codes: List[str] = Query(..., description="종목코드 목록 (반복 또는 쉼표 구분)"),
+    in_period: str = Query("1y")
+):
+    """
+    # 설명 : 모의투자-여러 종목 과거 차트 데이터 일괄 조회 (팝업 보유종목 차트용)
+    # 입력 : in_codes-종목코드 목록, in_period-기간
+    # 출력 : {"period": 기간, "series": {종목코드: {"dates", "closes"} 또는 {"error"}}}
+    # 소스 : 일봉 저장소 (저장소에 없는 종목은 동시에 조회)
+    """
+    if in_period not in PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 기간입니다: {in_period}")
+    codes = sorted({c.strip() for item in in_codes for c in item.split(",") if c.strip()})
+    if not codes:
+        raise HTTPException(status_code=400, detail="종목코드를 1개 이상 입력하세요.")
+    if len(codes) > CHART_BATCH_MAX_ESC:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {CHART_BATCH_MAX_ESC}개 종목까지 조회할 수 있습니다.")
+
+    def build():
+        # 종목별 결과도 캐시에 넣어 단건 API 와 공유 (오류 종목은 캐시하지 않음)
+        def run(in_code):
+            try:
+                body, _ = CHART_CACHE_ESC.get_or_build(
+                    ("closes", in_code.upper(), in_period), lambda: get_cacheable_close_series(in_code, in_period))
+            except UncacheablePayload as e:
+                return e.payload
+            return json.loads(body)
+        series = dict(zip(codes, CHART_POOL_ESC.map(run, codes)))
+        payload = {"period": in_period, "series": series}
+        if any("error" in item for item in series.values()):
+            # 일부 종목이 실패한 묶음은 저장하지 않음 (다음 요청에서 실패 종목만 다시 조회)
+            raise UncacheablePayload(payload)
+        return payload
+
+    try:
+        body, etag = CHART_CACHE_ESC.get_or_build(("batch", tuple(codes), in_period), build)
+    except UncacheablePayload as e:
+        return get_no_store_response(e.payload)
+    return get_etag_response(request, body, etag, in_max_age=CHART_CLIENT_MAX_AGE_ESC)
+
+@APP_ESC.get("/apiEsc/backtest")
+def get_backtest(
+    in_strategy: str = Query(..., description="ma_cross / rsi / rebalance"),
+    in_codes: List[str] = Query(..., description="종목코드 목록 (반복 또는 쉼표 구분)"),
+    in_grid: str = Query(..., description='파라미터 그리드 JSON (예: {"fast":[5,10],"slow":[60,120]})'),
+    in_period: str = Query("2y"),
+    in_fee: float = Query(0.0, ge=0, lt=0.1),
+    in_top: int = Query(10, ge=1, le=100)
+):
+    """
+    # 설명 : 모의투자-전략 백테스트 (파라미터 그리드 전체를 벡터화 계산, 1위 조합은 계정 구조로 재생)
+    # 입력 : in_strategy-전략명, in_codes-종목코드 목록, in_grid-파라미터 그리드, in_period-기간, in_fee-수수료율, in_top-상위 조합 수
+    # 출력 : {"combos": 조합 수, "results": 상위 조합 지표, "best": {"params", "account": {cash_esc, portfolio, history}}}
+    # 소스 : 일봉 저장소
+    """
+    if in_strategy not in STRATEGY_PARAMS:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 전략입니다: {in_strategy}")
+    if in_period not in PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 기간입니다: {in_period}")
+    codes = sorted({c.strip().upper() for item in in_codes for c in item.split(",") if c.strip()})
+    if not codes or len(codes) > BACKTEST_MAX_TICKERS_ESC:
+        raise HTTPException(status_code=400, detail=f"종목코드는 1~{BACKTEST_MAX_TICKERS_ESC}개까지 입력할 수 있습니다.")
+    try:
+        grid = json.loads(in_grid)
+        combos = get_param_grid(in_strategy, grid)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"파라미터 그리드 오류: {e}")
+    if not combos or len(combos) > BACKTEST_MAX_COMBOS_ESC:
+        raise HTTPException(status_code=400, detail=f"파라미터 조합은 1~{BACKTEST_MAX_COMBOS_ESC}개까지 가능합니다.")
+
+    tickers = [c if "." in c else f"{c}.KS" for c in codes]
+    dates, tickers, close = get_price_matrix(BAR_STORE_ESC, tickers, in_period)
+    if len(dates) < 2:
+        raise HTTPException(status_code=404, detail="저장소에 일봉 데이터가 없습니다.")
+    df = get_grid_result(close, in_strategy, grid, in_fee, BACKTEST_WORKERS_ESC)
+
+    params = {name: df[name].iloc[0].item() for name in STRATEGY_PARAMS[in_strategy]}
+    if in_strategy == "rebalance":
+        account = get_rebalance_account(dates, tickers, close, params["every"], in_fee, INITIAL_CASH_ESC)
+    else:
+        account = get_replay_account(dates, tickers, close, SignalBuilder(close).get_signal(in_strategy, params),
+                                     INITIAL_CASH_ESC)
+    return {
+        "strategy": in_strategy,
+        "period": in_period,
+        "tickers": tickers,
+        "start": dates[0].strftime("%Y-%m-%d"),
+        "end": dates[-1].strftime("%Y-%m-%d"),
+        "combos": len(df),
+        "results": json.loads(df.head(in_top).to_json(orient="records")),
+        "best": {"params": params, "account": account}
+    }
+
+@APP_ESC.get("/apiEsc/chart-series")
+def get_chart_series(
+    request: Request,
+    in_code: str = Query(...),
+    in_period: str = Query("1mo"),
+    in_points: int = Query(None, ge=3, le=5000)
+):
+    """
+    # 설명 : 모의투자-종목 시세 차트용 컬럼형 JSON (클라이언트에서 Plotly 로 렌더링)
+    # 입력 : in_code-종목코드, in_period-기간(5d/1mo/3mo/6mo/1y/2y/5y/10y), in_points-최대 점 개수(LTTB 다운샘플)
+    # 출력 : {ticker, period, count, dates, open, high, low, close, volume} (ETag/304 지원, 빈 결과는 캐시하지 않음)
+    """
+    if in_period not in PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 기간입니다: {in_period}")
+
+    def build():
+        ticker, df = BAR_STORE_ESC.get_history_df(in_code, in_period)
+        if df.empty:
+            # 일시적인 시세 조회 실패일 수 있으므로 TTL 동안 빈 차트를 내주지 않도록 저장하지 않음
+            raise UncacheablePayload({"ticker": ticker, "period": in_period, "count": 0, "dates": []})
+        return get_series_payload(ticker, in_period, df, in_points)
+
+    try:
+        body, etag = CHART_CACHE_ESC.get_or_build(("series", in_code.upper(), in_period, in_points), build)
+    except UncacheablePayload as e:
+        return get_no_store_response(e.payload)
+    return get_etag_response(request, body, etag)
+
+@APP_ESC.get("/apiEsc/chart-cache-stats")
+async def get_chart_cache_stats():
+    """
+    # 설명 : 모의투자-차트 JSON 캐시 및 일봉 저장소 통계
+    # 입력 : None
+    # 출력 : 캐시 통계
+    """
+    return {"chart_cache": CHART_CACHE_ESC.get_stats(), "popup_cache": POPUP_CACHE_ESC.get_stats(),
+            "bar_store": BAR_STORE_ESC.get_stats()}
+
 @APP_ESC.get("/show-popupEsc", response_class=HTMLResponse)
 async def get_popup_page(in_userId: str):
     """
@@ -695,34 +1451,19 @@ async def get_total_rank_top1(response: Response, t: str = Query(None)):
     # 캐시 방지 헤더 설정
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
 
-    try:
-        # trade_summary 인덱스를 사용하여 실시간 자산 가치 계산
-        body = {
-            "size": 0,
-            "aggs": {
-                "top_earner": {
-                    "terms": {
-                        "field": "user_id", # .keyword가 필요하면 user_id.keyword
-                        "size": 1,
-                        "order": { "total_valuation": "desc" }
-                    },
-                    "aggs": {
-                        "total_valuation": {
-                            "sum": {
-                                "script": {
-                                    # 실현손익(매도-매수) + 평가손익(보유량 * 현재가)
-                                    "source": """
-                                        double realized = doc['total_sell_amt'].value - doc['total_buy_amt'].value;
-                                        double hold_qty = doc['total_buy_qty'].value - doc['total_sell_qty'].value;
-                                        return realized + (hold_qty * doc['current_price'].value);
-                                    """
-                                }
-                            }
-                        }
-                    }
-                }
-            }
+    # 메모리 순위표가 준비되어 있으면 ES 집계 없이 바로 응답
+    top = LEADERBOARD_ESC.get_top(1)
+    if top:
+        return {
+            "error": False,
+            "user_id": top[0]["user_id"],
+            "user_name": top[0]["user_id"],
+            "total_profit": int(top[0]["total_profit"])
         }
+
+    try:
+        # trade_summary 인덱스의 사전계산 필드(total_valuation = 실현손익 + 보유량 * 현재가)를 합산만 함 (스크립트 없음)
+        body = get_ranking_body(in_size=1)
         
         # trade_summary 인덱스에서 조회 (기존 history 인덱스보다 훨씬 정확함)
         res = es.search(index="trade_summary", body=body)
@@ -750,43 +1491,136 @@ async def get_total_rank_top1(response: Response, t: str = Query(None)):
         print(f"❌ [RANKING ERROR] {str(e)}")
         return {"error": True, "message": str(e)}
 
+@APP_ESC.get("/apiEsc/rank-top")
+async def get_rank_top(in_n: int = Query(10, ge=1, le=100)):
+    """
+    # 설명 : get_rank_top - 전체 수익금 상위 N 명
+    # 입력 : in_n - 조회 인원
+    # 출력 : [{rank, user_id, total_profit}]
+    # 소스 : 메모리 순위표
+    """
+    return LEADERBOARD_ESC.get_top(in_n)
+
+@APP_ESC.get("/apiEsc/rank")
+async def get_rank(in_userId: str = Query(...), in_radius: int = Query(0, ge=0, le=50)):
+    """
+    # 설명 : get_rank - 사용자 순위 및 앞뒤 순위 (in_radius 명)
+    # 입력 : in_userId - 사용자id, in_radius - 앞뒤로 함께 볼 인원
+    # 출력 : {rank, user_id, total_profit, total_users, neighbors}
+    # 소스 : 메모리 순위표
+    """
+    rank = LEADERBOARD_ESC.get_rank(in_userId)
+    if not rank:
+        raise HTTPException(status_code=404, detail=f"{in_userId}님의 순위 정보가 없습니다.")
+    if in_radius:
+        rank["neighbors"] = LEADERBOARD_ESC.get_around(rank["rank"], in_radius)
+    return rank
+
+@APP_ESC.get("/apiEsc/intent-stats")
+async def get_intent_stats():
+    """
+    # 설명 : get_intent_stats - 채팅 주문 로컬 해석 적중률 및 LLM 호출 절감 시간
+    # 입력 : None
+    # 출력 : {names, fast_hits, llm_calls, hit_rate, avg_fast_ms, avg_llm_ms, est_saved_ms}
+    """
+    return INTENT_PARSER_ESC.get_stats()
+
+@APP_ESC.get("/apiEsc/live-stream")
+async def get_live_stream(request: Request, in_userId: str = Query(...)):
+    """
+    # 설명 : get_live_stream - 평가금액/순위/1위 변경 실시간 푸시 (Server-Sent Events)
+    #        이벤트: snapshot(접속 직후 전체), valuation(바뀐 종목 + 합계), rank(순위 변경), top1(1위 변경)
+    # 입력 : in_userId - 사용자id
+    # 출력 : text/event-stream
+    # 소스 : QuoteService 공용 시세, 메모리 순위표
+    """
+    user = await asyncio.to_thread(get_user_status, in_userId)
+    queue = LIVE_HUB_ESC.set_subscribe(in_userId, user.get("portfolio", {}), user.get("cash_esc", 0),
+                                       asyncio.get_running_loop())
+
+    def get_sse(in_event):
+        return f"event: {in_event['type']}\ndata: {json.dumps(in_event, ensure_ascii=False, default=str)}\n\n"
+
+    async def stream():
+        try:
+            yield get_sse(LIVE_HUB_ESC.get_snapshot(in_userId))
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=LIVE_HEARTBEAT_SEC_ESC)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # 프록시 유휴 연결 끊김 방지
+                    continue
+                yield get_sse(event)
+        finally:
+            LIVE_HUB_ESC.set_unsubscribe(in_userId, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@APP_ESC.get("/apiEsc/live-stats")
+async def get_live_stats():
+    """
+    # 설명 : get_live_stats - 실시간 푸시 구독자/감시 종목/전송 건수
+    """
+    return LIVE_HUB_ESC.get_stats()
+
+@APP_ESC.get("/apiEsc/es-sync-status")
+def get_es_sync_status():
+    """
+    # 설명 : get_es_sync_status - 몽고DB → ES 변경 스트림 동기화 작업자 상태 (지연/배치/오류 지표)
+    # 출력 : {running, updated_sec_ago, metrics}
+    # 소스 : 몽고DB mock_trading_db.es_sync_state (esc.sync_to_es --watch 가 배치마다 기록)
+    """
+    doc = DB_COMM.es_sync_state.find_one({"_id": "mongo_to_es"}, {"resume_token": 0})
+    if not doc:
+        return {"running": False, "message": "동기화 작업자 기록이 없습니다."}
+    ago = (datetime.now() - doc["updated_at"]).total_seconds()
+    # 변경이 없어도 대기 주기마다 토큰을 저장하므로 오래 갱신이 없으면 작업자 중지로 판단
+    return {"running": ago < 60, "updated_sec_ago": round(ago, 1), "metrics": doc.get("metrics", {})}
+
+@APP_ESC.get("/apiEsc/limiter-stats")
+async def get_limiter_stats():
+    """
+    # 설명 : get_limiter_stats - 채팅 요청 제한/외부 API 예산 통계 (허용, 제한, 대기, 거절 건수)
+    """
+    return {"chat": CHAT_LIMITER_ESC.get_stats(),
+            "outbound": [LLM_BUDGET_ESC.get_stats(), QUOTE_BUDGET_ESC.get_stats(), POLL_BUDGET_ESC.get_stats()]}
+
+@APP_ESC.get("/apiEsc/user-cache-stats")
+async def get_user_cache_stats():
+    """
+    # 설명 : get_user_cache_stats - 유저 상태 캐시 적중률 조회
+    # 입력 : None
+    # 출력 : 캐시 통계 (size, hits, misses, invalidations, hit_rate)
+    """
+    return USER_STATE_CACHE.get_stats()
+
 # 새 엔드포인트: trade_esc_history 모든 데이터 기반 차트
 @APP_ESC.get("/esc/api/chart/trade_history", response_class=HTMLResponse)
-def get_trade_history_chart():
-    # OpenSearch 쿼리: 모든 데이터 가져오기 (size=1000 제한, 대량이면 aggregation 사용)
-    body = {
-        "query": {"match_all": {}},
-        "size": 1000,  # 모든 데이터지만 안전하게 제한
-        "sort": [{"timestamp": {"order": "asc"}}]  # timestamp 필드 가정
-    }
-    res = es.search(index="trade_esc_history", body=body)
-    hits = res['hits']['hits']
-    
-    if not hits:
+def get_trade_history_chart(
+    in_start: str = Query(None, description="시작 (YYYY-MM-DD[ HH:MM:SS], 없으면 처음부터)"),
+    in_end: str = Query(None, description="끝 (없으면 마지막까지)"),
+    in_points: int = Query(HISTORY_POINTS_ESC, ge=10, le=HISTORY_MAX_BUCKETS, description="최대 점 개수 (LTTB)"),
+    in_ticker: str = Query(None)
+):
+    """
+    # 설명 : get_trade_history_chart - 전체 수익률 추이 차트 (기간 자동 버킷 평균 + 5~95% 구간, 건수 제한 없음)
+    # 입력 : in_start/in_end - 기간, in_points - 최대 점 개수, in_ticker - 종목 필터
+    # 출력 : HTML (plotly)
+    # 소스 : Elasticsearch trade_esc_history (date_histogram 집계)
+    """
+    series = get_trade_history_series(in_start, in_end, in_points, in_ticker)
+    if not series["dates"]:
         return HTMLResponse("<div>데이터가 없습니다.</div>")
-    
-    # 데이터 추출 (필드 가정: timestamp, rate, ticker 등)
-    dates = [hit['_source'].get('timestamp') for hit in hits]
-    rates = [hit['_source'].get('rate', 0) for hit in hits]  # 수익률 예시
-    tickers = [hit['_source'].get('ticker') for hit in hits]
-    
-    # Plotly 차트 생성 (라인 차트 예시)
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=dates, y=rates, mode='lines+markers',
-        text=tickers,  # 호버 시 ticker 표시
-        name='수익률 추이'
-    ))
-    fig.update_layout(
-        title="Trade History: 전체 수익률 추이",
-        xaxis_title="날짜",
-        yaxis_title="수익률 (%)",
-        height=500,
-        template="plotly_white"
-    )
-    
     # HTML로 리턴 (클라이언트에서 embed 가능)
-    return HTMLResponse(fig.to_html(full_html=False, include_plotlyjs='cdn'))
+    return HTMLResponse(get_history_figure_html(series))
+
+def get_trade_history_series(in_start, in_end, in_points, in_ticker):
+    """ 수익률 추이 집계 (기간 형식 오류는 400) """
+    try:
+        return get_history_series(es, in_start, in_end, in_points, in_ticker)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"기간 형식 오류 (YYYY-MM-DD[ HH:MM:SS]): {e}")
 
 # 비슷하게 trade_summary 차트 (예: 요약 바 차트)
 @APP_ESC.get("/esc/api/chart/trade_summary", response_class=HTMLResponse)
@@ -823,4 +1657,79 @@ def get_stock_master_chart():
     fig = go.Figure(data=go.Bar(x=keys, y=counts))
     fig.update_layout(title="Stock Master: 가격 분포 히스토그램")
     
-    return HTMLResponse(fig.to_html(full_html=False, include_plotlyjs='cdn'))
\ No newline at end of file
+    return HTMLResponse(fig.to_html(full_html=False, include_plotlyjs='cdn'))
+
+@APP_ESC.get("/esc/api/chart/trade_summary/data")
+def get_trade_summary_chart_data(request: Request):
+    """
+    # 설명 : 모의투자-사용자별 총 수익 차트 데이터 (컬럼형 JSON, ETag 지원)
+    # 입력 : request
+    # 출력 : {users, total_profits}
+    # 소스 : Elasticsearch trade_summary
+    """
+    def build():
+        res = es.search(index="trade_summary", body={"query": {"match_all": {}}, "size": 1000})
+        hits = res['hits']['hits']
+        return {
+            "users": [hit['_source'].get('user_id') for hit in hits],
+            "total_profits": [hit['_source'].get('total_profit', 0) for hit in hits]
+        }
+    body, etag = CHART_CACHE_ESC.get_or_build(("trade_summary",), build, in_ttl_sec=60)
+    return get_etag_response(request, body, etag)
+
+@APP_ESC.get("/esc/api/chart/stock_master/data")
+def get_stock_master_chart_data(request: Request):
+    """
+    # 설명 : 모의투자-종목 가격 분포 히스토그램 데이터 (컬럼형 JSON, ETag 지원)
+    # 입력 : request
+    # 출력 : {keys, counts}
+    # 소스 : Elasticsearch stock_master
+    """
+    def build():
+        res = es.search(index="stock_master", body={
+            "size": 0,
+            "aggs": {"price_buckets": {"histogram": {"field": "price", "interval": 10000}}}
+        })
+        buckets = res['aggregations']['price_buckets']['buckets']
+        return {"keys": [b['key'] for b in buckets], "counts": [b['doc_count'] for b in buckets]}
+    body, etag = CHART_CACHE_ESC.get_or_build(("stock_master",), build, in_ttl_sec=600)
+    return get_etag_response(request, body, etag)
+
+@APP_ESC.get("/esc/api/chart/trade_history/data")
+def get_trade_history_chart_data(
+    request: Request,
+    in_start: str = Query(None),
+    in_end: str = Query(None),
+    in_points: int = Query(HISTORY_POINTS_ESC, ge=10, le=HISTORY_MAX_BUCKETS),
+    in_ticker: str = Query(None)
+):
+    """
+    # 설명 : 모의투자-전체 수익률 추이 차트 데이터 (컬럼형 JSON, ETag 지원)
+    #        기간 길이에 맞춰 버킷 크기를 고르고(최대 1,000 버킷) in_points 개 이하로 LTTB 다운샘플
+    # 입력 : request, in_start/in_end - 기간, in_points - 최대 점 개수, in_ticker - 종목 필터
+    # 출력 : {interval, start, end, total, count, dates, rates, p5, p50, p95, counts}
+    # 소스 : Elasticsearch trade_esc_history (date_histogram 집계)
+    """
+    body, etag = CHART_CACHE_ESC.get_or_build(
+        ("trade_history", in_start, in_end, in_points, in_ticker),
+        lambda: get_trade_history_series(in_start, in_end, in_points, in_ticker), in_ttl_sec=60)
+    return get_etag_response(request, body, etag)
+
+@APP_ESC.get("/esc/api/chart/trade_history/raw")
+def get_trade_history_raw(
+    in_start: str = Query(None),
+    in_end: str = Query(None),
+    in_size: int = Query(200, ge=1, le=HISTORY_RAW_MAX_SIZE),
+    in_after: str = Query(None, description="이전 응답의 next 커서"),
+    in_ticker: str = Query(None)
+):
+    """
+    # 설명 : 모의투자-수익률 추이 원본 체결 조회 (차트 버킷 상세, PIT + search_after 페이지)
+    # 입력 : in_start/in_end - 기간 (보통 버킷 구간), in_size - 페이지 크기, in_after - 다음 페이지 커서, in_ticker - 종목 필터
+    # 출력 : {items, next}
+    # 소스 : Elasticsearch trade_esc_history
+    """
+    try:
+        return get_history_page(es, in_start, in_end, in_size, in_after, in_ticker)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"기간/커서 형식 오류: {e}")
@@ -0,0 +1,383 @@
+import os
+import sys
+import time
+import json
+import argparse
+import itertools
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# 전략별 파라미터 이름 (그리드는 {이름: 값 리스트} 형태)
+STRATEGY_PARAMS = {
+    "ma_cross": ("fast", "slow"),           # 단기 이동평균 > 장기 이동평균 이면 보유
+    "rsi": ("period", "low", "high"),       # RSI < low 진입, RSI > high 청산
+    "rebalance": ("every",)                 # every 거래일마다 전 종목 동일비중 재조정
+}
+# 창 길이/주기 파라미터 (1 이상 정수만 허용)
+WINDOW_PARAMS = ("fast", "slow", "period", "every")
+TRADING_DAYS = 252
+GRID_CHUNK = 64   # 한 번에 계산할 파라미터 조합 수 (메모리: 조합 × 일수 × 종목수 × 4바이트)
+
+def get_price_matrix(in_store, in_tickers, in_period="2y", in_refresh=False):
+    """
+    # 설명 : get_price_matrix - 일봉 저장소의 종가를 (일자 × 종목) 행렬로 정렬
+    # 입력 : in_store - BarStore, in_tickers - 티커 리스트, in_period - 기간, in_refresh - 야후 꼬리 갱신 여부
+    # 출력 : (dates, tickers, close) - close 는 앞 값으로 채움, 상장 전은 NaN
+    # 소스 : 일봉 로컬 저장소 (esc.bar_store)
+    """
+    series = {}
+    for ticker in in_tickers:
+        bars = in_store.get_bars(ticker, in_period, in_refresh=in_refresh)
+        if len(bars):
+            series[ticker] = pd.Series(bars["close"], index=pd.DatetimeIndex(bars["date"]))
+    if not series:
+        return pd.DatetimeIndex([]), [], np.empty((0, 0))
+    df = pd.DataFrame(series).sort_index().ffill()
+    return df.index, list(df.columns), df.to_numpy(dtype="f8")
+
+def get_param_grid(in_strategy, in_grid):
+    """
+    # 설명 : get_param_grid - 파라미터 그리드를 조합 리스트로 전개 (의미 없는 조합 제외)
+    # 입력 : in_strategy - 전략명, in_grid - {파라미터명: 값 리스트}
+    # 출력 : 조합 dict 리스트
+    """
+    names = STRATEGY_PARAMS.get(in_strategy)
+    if names is None:
+        raise ValueError(f"지원하지 않는 전략입니다: {in_strategy}")
+    missing = [n for n in names if n not in in_grid]
+    if missing:
+        raise ValueError(f"파라미터가 없습니다: {missing}")
+    for name in names:
+        if not isinstance(in_grid[name], list) or not in_grid[name]:
+            raise ValueError(f"{name} 는 값 리스트여야 합니다.")
+        if name in WINDOW_PARAMS and any(isinstance(v, bool) or not isinstance(v, int) or v < 1 for v in in_grid[name]):
+            raise ValueError(f"{name} 는 1 이상의 정수여야 합니다: {in_grid[name]}")
+    combos = [dict(zip(names, values)) for values in itertools.product(*(in_grid[n] for n in names))]
+    if in_strategy == "ma_cross":
+        combos = [c for c in combos if c["fast"] < c["slow"]]
+    elif in_strategy == "rsi":
+        combos = [c for c in combos if c["low"] < c["high"]]
+    return combos
+
+def get_moving_average(in_close, in_window):
+    """ 누적합 기반 단순이동평균 (창이 다 차기 전/결측 포함 구간은 NaN) """
+    filled = np.nan_to_num(in_close)
+    csum = np.cumsum(filled, axis=0)
+    out = np.full_like(in_close, np.nan)
+    out[in_window - 1:] = csum[in_window - 1:]
+    out[in_window:] -= csum[:-in_window]
+    out /= in_window
+    # 창 안에 상장 전(NaN) 구간이 섞이면 무효
+    valid = np.cumsum(~np.isnan(in_close), axis=0)
+    count = valid.copy()
+    count[in_window:] -= valid[:-in_window]
+    out[count < in_window] = np.nan
+    return out
+
+def get_rsi(in_close, in_period):
+    """ Wilder RSI (지수평활, 종목별 열 단위 계산) """
+    diff = pd.DataFrame(in_close).diff()
+    gain = diff.clip(lower=0).ewm(alpha=1 / in_period, adjust=False, min_periods=in_period).mean()
+    loss = (-diff.clip(upper=0)).ewm(alpha=1 / in_period, adjust=False, min_periods=in_period).mean()
+    rsi = 100 - 100 / (1 + gain / loss.replace(0, np.nan))
+    rsi[(loss == 0) & (gain > 0)] = 100
+    return rsi.to_numpy(dtype="f8")
+
+def get_last_index(in_mask):
+    """ 시간축(0) 기준으로 in_mask 가 마지막으로 True 였던 일자 인덱스 (없으면 -1) """
+    t = np.arange(in_mask.shape[0], dtype=np.int32)[:, None]
+    idx = np.where(in_mask, t, np.int32(-1))
+    return np.maximum.accumulate(idx, axis=0, out=idx)
+
+class SignalBuilder:
+    """
+    # 설명 : SignalBuilder - 전략 조합별 보유 신호(일자 × 종목, 0/1) 생성
+    #        이동평균/RSI 는 창 길이별로 1번만 계산해 여러 조합이 공유한다.
+    # 입력 : in_close - (일자 × 종목) 종가 행렬
+    # 출력 : 신호 생성기 객체
+    """
+    def __init__(self, in_close):
+        self.close = in_close
+        self._ma = {}
+        self._rsi = {}
+
+    def _get_ma(self, in_window):
+        if in_window not in self._ma:
+            self._ma[in_window] = get_moving_average(self.close, int(in_window))
+        return self._ma[in_window]
+
+    def _get_rsi(self, in_period):
+        if in_period not in self._rsi:
+            self._rsi[in_period] = get_rsi(self.close, int(in_period))
+        return self._rsi[in_period]
+
+    def get_signal(self, in_strategy, in_params):
+        """
+        # 설명 : 조합 1개의 보유 신호 (당일 종가로 판단해 종가에 체결, 다음 거래일 수익부터 반영)
+        # 출력 : (일자 × 종목) bool 배열
+        """
+        if in_strategy == "ma_cross":
+            with np.errstate(invalid="ignore"):
+                return self._get_ma(in_params["fast"]) > self._get_ma(in_params["slow"])
+        if in_strategy == "rsi":
+            rsi = self._get_rsi(in_params["period"])
+            # 마지막 과매도(진입) 시점이 마지막 과매수(청산) 시점보다 뒤면 보유 중
+            with np.errstate(invalid="ignore"):
+                return get_last_index(rsi < in_params["low"]) > get_last_index(rsi > in_params["high"])
+        raise ValueError(f"신호 기반 전략이 아닙니다: {in_strategy}")
+
+def get_metrics(in_equity, in_trades):
+    """
+    # 설명 : get_metrics - 자산곡선(조합 × 일자, 시작 1.0)으로 성과 지표 계산
+    # 출력 : 지표 dict 리스트
+    """
+    equity = np.asarray(in_equity, dtype="f8")
+    days = max(equity.shape[1] - 1, 1)
+    total = equity[:, -1] - 1
+    cagr = np.power(np.maximum(equity[:, -1], 1e-12), TRADING_DAYS / days) - 1
+    mdd = (equity / np.maximum.accumulate(equity, axis=1) - 1).min(axis=1)
+    daily = equity[:, 1:] / equity[:, :-1] - 1
+    std = daily.std(axis=1)
+    sharpe = np.where(std > 0, daily.mean(axis=1) / np.where(std > 0, std, 1) * np.sqrt(TRADING_DAYS), 0.0)
+    return [{"total_return": round(float(total[i]), 6), "cagr": round(float(cagr[i]), 6),
+             "mdd": round(float(mdd[i]), 6), "sharpe": round(float(sharpe[i]), 4), "trades": int(in_trades[i])}
+            for i in range(len(equity))]
+
+def get_signal_equity(in_close, in_signals, in_fee_rate=0.0):
+    """
+    # 설명 : get_signal_equity - 신호 조합 묶음의 자산곡선 (종목별로 자금을 균등 배정한 슬롯 모델)
+    #        슬롯 = 초기자금 / 종목수, 신호가 켜진 날 다음날부터 전액 보유, 꺼지면 현금
+    #        log 수익률 누적합으로 계산해 조합/일자/종목 축을 한 번에 처리
+    # 입력 : in_close - (일자 × 종목), in_signals - (조합 × 일자 × 종목) bool, in_fee_rate - 매매 1회 수수료율
+    # 출력 : (equity (조합 × 일자), trades (조합,))
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        log_ret = np.log(in_close[1:] / in_close[:-1])
+    # 누적 구간이 수백 일 수준이라 float32 로도 충분 (메모리/시간 절반)
+    log_ret = np.nan_to_num(log_ret, nan=0.0, posinf=0.0, neginf=0.0).astype(np.float32)
+    changes = np.empty(in_signals.shape, dtype=bool)
+    changes[:, 0] = in_signals[:, 0]
+    np.not_equal(in_signals[:, 1:], in_signals[:, :-1], out=changes[:, 1:])
+    trades = changes.sum(axis=(1, 2))
+    inc = np.zeros(in_signals.shape, dtype=np.float32)
+    np.multiply(in_signals[:, :-1], log_ret, out=inc[:, 1:])
+    if in_fee_rate:
+        inc += changes * np.float32(np.log1p(-in_fee_rate))
+    np.cumsum(inc, axis=1, out=inc)
+    slot_equity = np.exp(inc, out=inc)
+    return slot_equity.mean(axis=2), trades
+
+def get_rebalance_equity(in_close, in_every, in_fee_rate=0.0):
+    """
+    # 설명 : get_rebalance_equity - in_every 거래일마다 상장 종목 동일비중 재조정 자산곡선
+    # 입력 : in_close - (일자 × 종목), in_every - 재조정 주기(거래일), in_fee_rate - 수수료율
+    # 출력 : (equity (일자,), 재조정 횟수)
+    """
+    n_days = in_close.shape[0]
+    equity = np.ones(n_days)
+    starts = list(range(0, n_days - 1, int(in_every)))
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else n_days - 1
+        base = in_close[start]
+        listed = ~np.isnan(base)
+        if not listed.any():
+            equity[start + 1:end + 1] = equity[start]
+            continue
+        # 구간 동안은 매수 후 보유 → 종목별 가격비의 평균
+        ratio = in_close[start + 1:end + 1, listed] / base[listed]
+        value = equity[start] * (1 - in_fee_rate) * np.nanmean(ratio, axis=1)
+        equity[start + 1:end + 1] = value
+    return equity, len(starts)
+
+def _get_chunk_result(in_close, in_strategy, in_combos, in_fee_rate):
+    """ 조합 묶음 1개 계산 (프로세스 풀 작업 단위) """
+    if in_strategy == "rebalance":
+        curves, trades = zip(*(get_rebalance_equity(in_close, c["every"], in_fee_rate) for c in in_combos))
+        return get_metrics(np.vstack(curves), trades)
+    builder = SignalBuilder(in_close)
+    out = []
+    for i in range(0, len(in_combos), GRID_CHUNK):
+        chunk = in_combos[i:i + GRID_CHUNK]
+        signals = np.stack([builder.get_signal(in_strategy, c) for c in chunk])
+        equity, trades = get_signal_equity(in_close, signals, in_fee_rate)
+        out.extend(get_metrics(equity, trades))
+    return out
+
+def get_grid_result(in_close, in_strategy, in_grid, in_fee_rate=0.0, in_workers=0):
+    """
+    # 설명 : get_grid_result - 파라미터 그리드 전체 백테스트
+    # 입력 : in_close - (일자 × 종목) 종가, in_strategy - 전략명, in_grid - {파라미터명: 값 리스트},
+    #       in_fee_rate - 수수료율, in_workers - 프로세스 수 (0/1 이면 현재 프로세스에서 실행)
+    # 출력 : 조합별 파라미터 + 지표 DataFrame (total_return 내림차순)
+    """
+    combos = get_param_grid(in_strategy, in_grid)
+    if not combos or in_close.shape[0] < 2:
+        return pd.DataFrame()
+    if in_workers and in_workers > 1 and len(combos) > GRID_CHUNK:
+        # 이동평균/RSI 공유 효과를 살리도록 조합을 연속 구간으로 나눔
+        size = -(-len(combos) // in_workers)
+        parts = [combos[i:i + size] for i in range(0, len(combos), size)]
+        with ProcessPoolExecutor(max_workers=in_workers) as pool:
+            futures = [pool.submit(_get_chunk_result, in_close, in_strategy, p, in_fee_rate) for p in parts]
+            metrics = [m for f in futures for m in f.result()]
+    else:
+        metrics = _get_chunk_result(in_close, in_strategy, combos, in_fee_rate)
+    df = pd.DataFrame([{**c, **m} for c, m in zip(combos, metrics)])
+    return df.sort_values("total_return", ascending=False).reset_index(drop=True)
+
+def get_replay_account(in_dates, in_tickers, in_close, in_signal, in_cash=10000000):
+    """
+    # 설명 : get_replay_account - 선택한 조합 1개를 정수 주식수로 재생해 모의투자 계정 구조로 변환
+    #        (슬롯 모델: 종목별 초기자금 / 종목수, 신호 on → 당일 종가 매수, off → 당일 종가 전량 매도)
+    # 입력 : in_dates, in_tickers, in_close - get_price_matrix 결과, in_signal - (일자 × 종목) bool, in_cash - 초기 예수금
+    # 출력 : {cash_esc, portfolio, history} - users_esc 문서와 같은 구조
+    """
+    n_tickers = len(in_tickers)
+    slot_cash = np.full(n_tickers, in_cash / max(n_tickers, 1))
+    qty = np.zeros(n_tickers, dtype=np.int64)
+    avg = np.zeros(n_tickers)
+    history = []
+    held = np.asarray(in_signal, dtype=np.int8)
+    # t 일 종가 신호 변화 → t 일 종가 체결 (get_signal_equity 와 같은 가정)
+    change_days, change_cols = np.nonzero(np.diff(held, axis=0, prepend=0))
+    for t, j in zip(change_days, change_cols):
+        price = in_close[t, j]
+        if np.isnan(price):
+            continue
+        ticker = in_tickers[j]
+        stamp = pd.Timestamp(in_dates[t]).strftime("%Y-%m-%d %H:%M:%S")
+        if held[t, j] and qty[j] == 0:
+            buy_qty = int(slot_cash[j] // price)
+            if buy_qty <= 0:
+                continue
+            slot_cash[j] -= buy_qty * price
+            qty[j], avg[j] = buy_qty, price
+            in_type, trade_qty = "매수", buy_qty
+        elif not held[t, j] and qty[j] > 0:
+            slot_cash[j] += qty[j] * price
+            in_type, trade_qty = "매도", int(qty[j])
+            qty[j], avg[j] = 0, 0.0
+        else:
+            continue
+        history.append({
+            "timestamp": stamp, "category": "TRADE", "type": in_type, "ticker": ticker,
+            "quantity": trade_qty, "price": round(float(price), 2),
+            "message": f"{ticker} {in_type} 완료 (백테스트)"
+        })
+    portfolio = {in_tickers[j].replace(".", "_"): {"qty": int(qty[j]), "avg_price": round(float(avg[j]))}
+                 for j in range(n_tickers) if qty[j] > 0}
+    last = np.nan_to_num(in_close[-1]) if len(in_close) else np.zeros(n_tickers)
+    return {
+        "cash_esc": round(float(slot_cash.sum())),
+        "portfolio": portfolio,
+        "history": history,
+        "total_valuation": round(float(slot_cash.sum() + (qty * last).sum()))
+    }
+
+def get_rebalance_account(in_dates, in_tickers, in_close, in_every, in_fee_rate=0.0, in_cash=10000000):
+    """
+    # 설명 : get_rebalance_account - 재조정 전략 1개 조합을 정수 주식수로 재생해 모의투자 계정 구조로 변환
+    #        (get_rebalance_equity 와 같은 가정: in_every 거래일마다 당일 종가로 총자산에서 수수료를 떼고
+    #         상장 종목 동일비중으로 맞춤, 마지막 거래일에는 재조정하지 않음)
+    # 입력 : in_dates, in_tickers, in_close - get_price_matrix 결과, in_every - 재조정 주기(거래일),
+    #       in_fee_rate - 수수료율, in_cash - 초기 예수금
+    # 출력 : {cash_esc, portfolio, history, total_valuation} - users_esc 문서와 같은 구조
+    """
+    n_days, n_tickers = in_close.shape
+    cash = float(in_cash)
+    qty = np.zeros(n_tickers, dtype=np.int64)
+    avg = np.zeros(n_tickers)
+    history = []
+    for t in range(0, n_days - 1, int(in_every)):
+        price = in_close[t]
+        listed = ~np.isnan(price)
+        if not listed.any():
+            continue
+        total = cash + float((qty[listed] * price[listed]).sum())
+        cash -= total * in_fee_rate
+        target = np.zeros(n_tickers, dtype=np.int64)
+        target[listed] = np.floor(total * (1 - in_fee_rate) / listed.sum() / price[listed]).astype(np.int64)
+        stamp = pd.Timestamp(in_dates[t]).strftime("%Y-%m-%d %H:%M:%S")
+        diff = target - qty
+        # 매도 먼저 체결해 매수 자금 확보
+        for j in list(np.flatnonzero(diff < 0)) + list(np.flatnonzero(diff > 0)):
+            trade_qty = int(abs(diff[j]))
+            if diff[j] > 0:
+                cash -= trade_qty * price[j]
+                avg[j] = (avg[j] * qty[j] + price[j] * trade_qty) / (qty[j] + trade_qty)
+                in_type = "매수"
+            else:
+                cash += trade_qty * price[j]
+                in_type = "매도"
+            qty[j] = target[j]
+            if qty[j] == 0:
+                avg[j] = 0.0
+            history.append({
+                "timestamp": stamp, "category": "TRADE", "type": in_type, "ticker": in_tickers[j],
+                "quantity": trade_qty, "price": round(float(price[j]), 2),
+                "message": f"{in_tickers[j]} {in_type} 완료 (백테스트 재조정)"
+            })
+    portfolio = {in_tickers[j].replace(".", "_"): {"qty": int(qty[j]), "avg_price": round(float(avg[j]))}
+                 for j in range(n_tickers) if qty[j] > 0}
+    last = np.nan_to_num(in_close[-1]) if n_days else np.zeros(n_tickers)
+    return {
+        "cash_esc": round(cash),
+        "portfolio": portfolio,
+        "history": history,
+        "total_valuation": round(cash + float((qty * last).sum()))
+    }
+
+def get_synthetic_close(in_days=500, in_tickers=300, in_seed=42):
+    """
+    # 설명 : get_synthetic_close - 벤치마크용 랜덤워크 종가 (일부 종목은 중간 상장)
+    # 출력 : (dates, tickers, close)
+    """
+    rnd = np.random.default_rng(in_seed)
+    log_ret = rnd.normal(0.0003, 0.02, size=(in_days, in_tickers))
+    close = 10000 * np.exp(np.cumsum(log_ret, axis=0))
+    late = rnd.integers(0, in_days // 2, size=in_tickers // 10)
+    for j, start in enumerate(late):
+        close[:start, j] = np.nan
+    dates = pd.bdate_range(end=datetime.now().date(), periods=in_days)
+    return dates, [f"{i:06d}.KS" for i in range(in_tickers)], close
+
+if __name__ == "__main__":
+    # 실행 예) python app/esc/backtest.py --bench --workers 4
+    #         python app/esc/backtest.py --strategy ma_cross --grid '{"fast":[5,10,20],"slow":[60,120]}' --tickers 005930.KS 000660.KS
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description="모의투자 벡터화 백테스트")
+    parser.add_argument("--strategy", default="ma_cross", choices=list(STRATEGY_PARAMS))
+    parser.add_argument("--grid", help="파라미터 그리드 JSON")
+    parser.add_argument("--tickers", nargs="*", help="대상 티커 (없으면 stock_master 전체)")
+    parser.add_argument("--period", default="2y")
+    parser.add_argument("--fee", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--bench", action="store_true", help="랜덤워크 500일 × 300종목으로 측정")
+    args = parser.parse_args()
+
+    if args.bench:
+        dates, tickers, close = get_synthetic_close()
+        grids = {"ma_cross": {"fast": list(range(2, 62, 2)), "slow": list(range(20, 260, 5))},
+                 "rsi": {"period": [7, 14, 21], "low": list(range(10, 45, 2)), "high": list(range(55, 95, 2))},
+                 "rebalance": {"every": [1, 5, 10, 21, 63]}}
+        for strategy, grid in grids.items():
+            t0 = time.perf_counter()
+            df = get_grid_result(close, strategy, grid, args.fee, args.workers)
+            sec = time.perf_counter() - t0
+            print(f"{strategy:>10}: {len(df)}개 조합 × {close.shape[1]}종목 × {close.shape[0]}일 → {sec:.2f}초")
+        sys.exit(0)
+
+    from esc.bar_store import BarStore, get_master_tickers
+    if args.tickers:
+        tickers = args.tickers
+    else:
+        from pymongo import MongoClient
+        from cmm.config import MONGO_URI
+        tickers = get_master_tickers(MongoClient(MONGO_URI).mock_trading_db)
+    dates, tickers, close = get_price_matrix(BarStore(), tickers, args.period)
+    grid = json.loads(args.grid) if args.grid else {"fast": [5, 10, 20], "slow": [60, 120]}
+    df = get_grid_result(close, args.strategy, grid, args.fee, args.workers)
+    print(df.head(args.top).to_string())
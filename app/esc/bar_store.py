@@ -0,0 +1,291 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+# 일봉 1건 레코드 구조 (종목별 .npy 파일 하나에 날짜순으로 저장)
+BAR_DTYPE = np.dtype([
+    ("date", "datetime64[D]"),
+    ("open", "f8"), ("high", "f8"), ("low", "f8"), ("close", "f8"),
+    ("volume", "f8")
+])
+
+# 기간 문자열(yfinance period 형식) → 일수
+PERIOD_DAYS = {"5d": 5, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827, "10y": 3653}
+
+BAR_DIR_ESC = os.getenv("ESC_BAR_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bars"))
+BAR_DEFAULT_PERIOD = os.getenv("ESC_BAR_DEFAULT_PERIOD", "2y")
+BAR_REFRESH_SEC = int(os.getenv("ESC_BAR_REFRESH_SEC", "600"))
+
+def get_period_start(in_period, in_today=None):
+    """
+    # 설명 : get_period_start - 기간 문자열을 시작일자로 변환
+    # 입력 : in_period - 기간 (5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y), in_today - 기준일
+    # 출력 : 시작일자 (datetime.date)
+    """
+    today = in_today or date.today()
+    days = PERIOD_DAYS.get(in_period)
+    if days is None:
+        raise ValueError(f"지원하지 않는 기간입니다: {in_period}")
+    return today - timedelta(days=days)
+
+def get_yahoo_bars(in_ticker, in_start, in_end=None):
+    """
+    # 설명 : get_yahoo_bars - yfinance 일봉 조회 후 BAR_DTYPE 배열로 변환
+    # 입력 : in_ticker - 야후 티커, in_start - 시작일자, in_end - 종료일자(미포함, 없으면 오늘까지)
+    # 출력 : BAR_DTYPE 배열 (데이터 없으면 길이 0)
+    # 소스 : 금융데이터 라이브러리 yfinance
+    """
+    end = in_end or (date.today() + timedelta(days=1))
+    # 수정주가는 배당 때마다 과거 봉이 바뀌므로 원주가로 저장 (과거 봉 불변 전제)
+    df = yf.Ticker(in_ticker).history(start=in_start.isoformat(), end=end.isoformat(), auto_adjust=False)
+    return get_bars_from_df(df)
+
+def get_bars_from_df(in_df):
+    """
+    # 설명 : get_bars_from_df - yfinance DataFrame 을 BAR_DTYPE 배열로 변환
+    # 입력 : in_df - Open/High/Low/Close/Volume 컬럼과 날짜 인덱스를 가진 DataFrame
+    # 출력 : BAR_DTYPE 배열
+    """
+    if in_df is None or in_df.empty:
+        return np.empty(0, dtype=BAR_DTYPE)
+    df = in_df.dropna(subset=["Close"])
+    index = df.index.tz_localize(None) if getattr(df.index, "tz", None) is not None else df.index
+    out = np.empty(len(df), dtype=BAR_DTYPE)
+    out["date"] = index.values.astype("datetime64[D]")
+    out["open"] = df["Open"].to_numpy(dtype="f8")
+    out["high"] = df["High"].to_numpy(dtype="f8")
+    out["low"] = df["Low"].to_numpy(dtype="f8")
+    out["close"] = df["Close"].to_numpy(dtype="f8")
+    out["volume"] = df["Volume"].to_numpy(dtype="f8") if "Volume" in df else 0.0
+    return out
+
+def get_bars_df(in_bars):
+    """
+    # 설명 : get_bars_df - BAR_DTYPE 배열을 yfinance history() 와 같은 모양의 DataFrame 으로 변환
+    # 입력 : in_bars - BAR_DTYPE 배열
+    # 출력 : DataFrame (Open/High/Low/Close/Volume, DatetimeIndex)
+    """
+    return pd.DataFrame({
+        "Open": in_bars["open"], "High": in_bars["high"], "Low": in_bars["low"],
+        "Close": in_bars["close"], "Volume": in_bars["volume"]
+    }, index=pd.DatetimeIndex(in_bars["date"].astype("datetime64[ns]"), name="Date"))
+
+def get_merged_bars(in_old, in_new):
+    """
+    # 설명 : get_merged_bars - 기존 봉과 새로 받은 봉 병합 (같은 날짜는 새 봉으로 교체)
+    # 입력 : in_old - 기존 배열, in_new - 신규 배열
+    # 출력 : 날짜순 정렬/중복 제거된 배열
+    """
+    if len(in_new) == 0:
+        return in_old
+    if len(in_old) == 0:
+        merged = in_new
+    else:
+        # 새 배열을 뒤에 붙이고 날짜별 마지막 항목만 남김
+        merged = np.concatenate([in_old, in_new])
+    order = np.argsort(merged["date"], kind="stable")
+    merged = merged[order]
+    keep = np.ones(len(merged), dtype=bool)
+    keep[:-1] = merged["date"][1:] != merged["date"][:-1]
+    return merged[keep]
+
+class BarStore:
+    """
+    # 설명 : BarStore - 종목별 일봉 로컬 저장소 (종목별 .npy 컬럼형 파일 + 프로세스 메모리 캐시)
+    #        과거 봉은 바뀌지 않으므로 마지막 저장일 이후(당일 포함)만 야후에서 추가로 받는다.
+    #        종목당 수십 KB 라 메모리에 통째로 올린다. (mmap 은 윈도우에서 파일 교체가 막혀 사용하지 않음)
+    # 입력 : in_dir - 저장 폴더, in_fetcher - (ticker, start, end) → BAR_DTYPE 배열 함수
+    # 출력 : 저장소 객체
+    # 소스 : 금융데이터 라이브러리 yfinance
+    """
+    def __init__(self, in_dir=BAR_DIR_ESC, in_fetcher=get_yahoo_bars, in_refresh_sec=BAR_REFRESH_SEC):
+        self.dir = in_dir
+        self.fetcher = in_fetcher
+        self.refresh_sec = in_refresh_sec
+        self._mem = {}          # ticker → (bars, meta)
+        self._checked = {}      # ticker → 마지막 꼬리 갱신 시각(monotonic)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self.fetch_count = 0
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _get_lock(self, in_ticker):
+        with self._locks_guard:
+            return self._locks.setdefault(in_ticker, threading.Lock())
+
+    def _get_paths(self, in_ticker):
+        name = in_ticker.replace("/", "_")
+        return os.path.join(self.dir, f"{name}.npy"), os.path.join(self.dir, f"{name}.json")
+
+    def _load(self, in_ticker):
+        """ 메모리 → 디스크 순으로 조회 """
+        if in_ticker in self._mem:
+            return self._mem[in_ticker]
+        npy_path, meta_path = self._get_paths(in_ticker)
+        if not os.path.exists(npy_path):
+            return np.empty(0, dtype=BAR_DTYPE), {}
+        bars = np.load(npy_path)
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        self._mem[in_ticker] = (bars, meta)
+        return bars, meta
+
+    def _save(self, in_ticker, in_bars, in_meta):
+        """ 임시파일에 쓴 뒤 교체 (읽는 쪽이 깨진 파일을 보지 않도록) """
+        npy_path, meta_path = self._get_paths(in_ticker)
+        tmp_path = npy_path + ".tmp.npy"
+        np.save(tmp_path, np.ascontiguousarray(in_bars))
+        os.replace(tmp_path, npy_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(in_meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._mem[in_ticker] = (in_bars, in_meta)
+
+    def set_refresh(self, in_ticker, in_start, in_force=False):
+        """
+        # 설명 : set_refresh - 부족한 구간(앞쪽 과거 / 마지막 저장일 이후)만 받아 저장
+        # 입력 : in_ticker - 야후 티커, in_start - 필요한 시작일자, in_force - 갱신주기 무시 여부
+        # 출력 : BAR_DTYPE 배열
+        """
+        with self._get_lock(in_ticker):
+            bars, meta = self._load(in_ticker)
+            covered_from = date.fromisoformat(meta["covered_from"]) if meta.get("covered_from") else None
+            today = date.today()
+            new_parts = []
+
+            # 1. 앞쪽(과거) 구간이 모자라면 그 구간만 추가로 받음 (최초 조회 시에는 오늘까지 전체)
+            first_fetch = covered_from is None
+            if first_fetch or in_start < covered_from:
+                new_parts.append(self.fetcher(in_ticker, in_start, covered_from))
+                self.fetch_count += 1
+                if first_fetch:
+                    self._checked[in_ticker] = time.monotonic()
+                covered_from = in_start
+
+            # 2. 꼬리 구간: 마지막 봉(당일 봉은 장중 변할 수 있어 다시 받음)부터 오늘까지
+            checked_at = self._checked.get(in_ticker)
+            stale = checked_at is None or (time.monotonic() - checked_at) >= self.refresh_sec
+            if not first_fetch and (in_force or stale):
+                tail_start = bars["date"][-1].astype(object) if len(bars) else covered_from
+                new_parts.append(self.fetcher(in_ticker, tail_start, None))
+                self.fetch_count += 1
+                self._checked[in_ticker] = time.monotonic()
+
+            if new_parts:
+                merged = bars
+                for part in new_parts:
+                    merged = get_merged_bars(merged, part)
+                meta = {"covered_from": covered_from.isoformat(), "updated_at": today.isoformat()}
+                self._save(in_ticker, merged, meta)
+                bars = self._mem[in_ticker][0]
+            return bars
+
+    def get_bars(self, in_ticker, in_period="1y", in_refresh=True):
+        """
+        # 설명 : get_bars - 기간별 일봉 조회 (반복 요청은 디스크/메모리에서 제공)
+        # 입력 : in_ticker - 야후 티커, in_period - 기간, in_refresh - 꼬리 갱신 여부
+        # 출력 : BAR_DTYPE 배열 (해당 기간)
+        """
+        start = get_period_start(in_period)
+        if in_refresh:
+            bars = self.set_refresh(in_ticker, start)
+        else:
+            bars, _ = self._load(in_ticker)
+        idx = np.searchsorted(bars["date"], np.datetime64(start, "D"), side="left")
+        return bars[idx:]
+
+    def get_history_df(self, in_ticker, in_period="1y"):
+        """
+        # 설명 : get_history_df - yf.Ticker(...).history(period=...) 대체 함수
+        # 입력 : in_ticker - 종목코드(숫자 6자리면 .KS, 없으면 .KQ 로 재시도), in_period - 기간
+        # 출력 : (실제 티커, DataFrame)
+        """
+        ticker = in_ticker.upper()
+        candidates = [f"{ticker}.KS", f"{ticker}.KQ"] if ticker.isdigit() else [ticker]
+        if ticker.endswith(".KS"):
+            candidates.append(ticker.replace(".KS", ".KQ"))
+        for cand in candidates:
+            bars = self.get_bars(cand, in_period)
+            if len(bars):
+                return cand, get_bars_df(bars)
+        return candidates[0], get_bars_df(np.empty(0, dtype=BAR_DTYPE))
+
+    def get_stats(self):
+        """
+        # 설명 : 저장소 상태 (메모리 보관 종목 수, 야후 호출 횟수)
+        """
+        return {"tickers_in_memory": len(self._mem), "fetch_count": self.fetch_count, "dir": self.dir}
+
+def get_master_tickers(in_db):
+    """
+    # 설명 : get_master_tickers - 종목 마스터에서 야후 티커 목록 생성
+    # 입력 : in_db - 몽고DB mock_trading_db
+    # 출력 : 티커 리스트 (KOSDAQ 은 .KQ, 그 외 .KS)
+    # 소스 : 몽고DB mock_trading_db.stock_master
+    """
+    tickers = []
+    for s in in_db["stock_master"].find({}, {"code": 1, "market": 1}):
+        code = str(s.get("code", "")).strip()
+        if not code:
+            continue
+        suffix = ".KQ" if "KOSDAQ" in str(s.get("market", "")).upper() else ".KS"
+        tickers.append(code if "." in code else f"{code}{suffix}")
+    return tickers
+
+def set_backfill(in_store, in_tickers, in_period=BAR_DEFAULT_PERIOD, in_workers=8):
+    """
+    # 설명 : set_backfill - 여러 종목 일봉 일괄 적재 (이미 받은 구간은 건너뜀)
+    # 입력 : in_store - BarStore, in_tickers - 티커 리스트, in_period - 기간, in_workers - 동시 실행 수
+    # 출력 : (성공 종목 수, 실패 종목 수)
+    """
+    start = get_period_start(in_period)
+    ok, fail = 0, 0
+
+    def run(in_ticker):
+        try:
+            return len(in_store.set_refresh(in_ticker, start, in_force=True)) > 0
+        except Exception as e:
+            print(f"❌ {in_ticker} 적재 실패: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=in_workers) as pool:
+        for i, result in enumerate(pool.map(run, in_tickers), 1):
+            ok, fail = (ok + 1, fail) if result else (ok, fail + 1)
+            if i % 100 == 0:
+                print(f"   > {i}/{len(in_tickers)} 종목 완료...")
+    return ok, fail
+
+if __name__ == "__main__":
+    # 실행 예) python -m esc.bar_store --backfill --period 2y --workers 8   (app 폴더에서)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description="모의투자 일봉 저장소 일괄 적재")
+    parser.add_argument("--backfill", action="store_true", help="stock_master 전체 종목 적재")
+    parser.add_argument("--tickers", nargs="*", help="특정 티커만 적재 (예: 005930.KS)")
+    parser.add_argument("--period", default=BAR_DEFAULT_PERIOD)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    store = BarStore()
+    if args.tickers:
+        tickers = args.tickers
+    elif args.backfill:
+        from pymongo import MongoClient
+        from cmm.config import MONGO_URI
+        tickers = get_master_tickers(MongoClient(MONGO_URI).mock_trading_db)
+    else:
+        parser.error("--backfill 또는 --tickers 를 지정하세요.")
+
+    print(f"📦 {len(tickers)}개 종목 일봉 적재 시작 (기간: {args.period})")
+    t0 = time.perf_counter()
+    ok, fail = set_backfill(store, tickers, args.period, args.workers)
+    print(f"✅ 적재 완료: 성공 {ok} / 실패 {fail} ({time.perf_counter() - t0:.1f}초)")
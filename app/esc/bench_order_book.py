@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from esc.order_book import OrderBookManager
+
+def get_bench_result(in_orders=100000, in_tickers=2000, in_quotes=200000, in_seed=42):
+    """
+    # 설명 : get_bench_result - 대기 주문장 벤치마크 (메모리 전용, DB/체결 함수 없음)
+    # 입력 : in_orders-대기 주문 수, in_tickers-종목 수, in_quotes-시세 이벤트 수, in_seed-난수 시드
+    # 출력 : 측정 결과 dict
+    """
+    rnd = random.Random(in_seed)
+    tickers = [f"{i:06d}.KS" for i in range(in_tickers)]
+    base = {t: rnd.uniform(5000, 500000) for t in tickers}
+    manager = OrderBookManager()
+
+    # 1. 대기 주문 적재: 현재가 ±10% 범위의 지정가/스탑 주문
+    t0 = time.perf_counter()
+    for i in range(in_orders):
+        t = tickers[i % in_tickers]
+        side = rnd.choice(("buy", "sell"))
+        otype = rnd.choice(("limit", "stop"))
+        price = base[t] * rnd.uniform(0.9, 1.1)
+        manager.set_order(f"user_{i % 5000:04d}", t, side, otype, 1, price)
+    add_sec = time.perf_counter() - t0
+
+    # 2. 시세 이벤트: 종목별 랜덤워크 (틱당 ±0.5%)
+    prices = dict(base)
+    fills = 0
+    t0 = time.perf_counter()
+    for _ in range(in_quotes):
+        t = tickers[rnd.randrange(in_tickers)]
+        prices[t] *= 1 + rnd.uniform(-0.005, 0.005)
+        fills += len(manager.on_quote(t, prices[t]))
+    quote_sec = time.perf_counter() - t0
+
+    return {
+        "orders": in_orders, "tickers": in_tickers, "quotes": in_quotes, "fills": fills,
+        "add_us_per_order": round(add_sec / in_orders * 1e6, 2),
+        "quote_us_per_event": round(quote_sec / in_quotes * 1e6, 2),
+        "quotes_per_sec": int(in_quotes / quote_sec),
+        "open_orders_left": manager.get_stats()["open_orders"]
+    }
+
+if __name__ == "__main__":
+    # 실행 예) python app/esc/bench_order_book.py --orders 100000 --tickers 2000
+    parser = argparse.ArgumentParser(description="지정가/스탑 대기 주문장 벤치마크")
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--tickers", type=int, default=2000)
+    parser.add_argument("--quotes", type=int, default=200000)
+    args = parser.parse_args()
+    result = get_bench_result(args.orders, args.tickers, args.quotes)
+    for k, v in result.items():
+        print(f"{k:>20}: {v}")
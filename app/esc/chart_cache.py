@@ -0,0 +1,168 @@
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+from fastapi import Response
+
+CHART_CACHE_TTL_ESC = 300
+
+class UncacheablePayload(Exception):
+    """
+    # 설명 : UncacheablePayload - 캐시/공개 캐시 없이 그대로 응답할 payload (오류 결과 등)
+    #        get_or_build 의 in_builder 가 raise 하면 저장하지 않고 호출 측까지 전달됨
+    # 입력 : in_payload - 응답 payload dict
+    """
+    def __init__(self, in_payload):
+        super().__init__(str(in_payload.get("error", "")) if isinstance(in_payload, dict) else "")
+        self.payload = in_payload
+
+def get_lttb_indices(in_x, in_y, in_threshold):
+    """
+    # 설명 : get_lttb_indices - LTTB(Largest-Triangle-Three-Buckets) 다운샘플링 인덱스 계산
+    # 입력 : in_x - x 값 배열(숫자), in_y - y 값 배열, in_threshold - 남길 점 개수
+    # 출력 : 남길 원본 인덱스 배열 (첫/마지막 점 포함, 오름차순)
+    """
+    n = len(in_y)
+    if in_threshold >= n or in_threshold < 3:
+        return np.arange(n)
+    x = np.asarray(in_x, dtype="f8")
+    y = np.asarray(in_y, dtype="f8")
+    # 첫/마지막 점을 제외한 구간을 (threshold - 2)개 버킷으로 나눔
+    every = (n - 2) / (in_threshold - 2)
+    out = np.empty(in_threshold, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    prev = 0
+    for i in range(in_threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # 다음 버킷의 평균점 (마지막 버킷은 끝점)
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:nxt_end].mean() if nxt_end > end else x[-1]
+        avg_y = y[end:nxt_end].mean() if nxt_end > end else y[-1]
+        # 이전 선택점-후보점-다음 평균점 삼각형 넓이가 최대인 후보 선택
+        area = np.abs((x[prev] - avg_x) * (y[start:end] - y[prev]) - (x[prev] - x[start:end]) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        out[i + 1] = prev
+    return out
+
+class ChartPayloadCache:
+    """
+    # 설명 : ChartPayloadCache - 직렬화된 차트 JSON 과 ETag 를 키별로 보관하는 서버 캐시
+    # 입력 : in_ttl_sec - 유지 시간(초), in_max_size - 최대 보관 개수
+    # 출력 : 캐시 객체
+    """
+    def __init__(self, in_ttl_sec=CHART_CACHE_TTL_ESC, in_max_size=2000):
+        self.ttl_sec = in_ttl_sec
+        self.max_size = in_max_size
+        self._store = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_fresh(self, in_key):
+        """ 만료 전 항목 (body, etag) 또는 None """
+        with self._lock:
+            item = self._store.get(in_key)
+            if item and item[0] > time.monotonic():
+                self.hits += 1
+                return item[1], item[2]
+        return None
+
+    def get_or_build(self, in_key, in_builder, in_ttl_sec=None, in_build_lock=None):
+        """
+        # 설명 : 캐시에 있으면 그대로, 없거나 만료되면 in_builder() 결과를 직렬화해 저장
+        # 입력 : in_key - 캐시 키 (예: ("series", ticker, period, points)), in_builder - payload dict 생성 함수,
+        #       in_ttl_sec - 이 항목만의 유지 시간, in_build_lock - 지정하면 미스일 때만 잠근 뒤 다시 확인하고
+        #       1건만 생성 (적중은 잠금 없이 바로 반환, 동시 미스는 생성 결과를 기다림)
+        # 출력 : (body bytes, etag)
+        """
+        cached = self._get_fresh(in_key)
+        if cached:
+            return cached
+        if in_build_lock is None:
+            return self._set_build(in_key, in_builder, in_ttl_sec)
+        with in_build_lock:
+            cached = self._get_fresh(in_key)
+            if cached:
+                return cached
+            return self._set_build(in_key, in_builder, in_ttl_sec)
+
+    def _set_build(self, in_key, in_builder, in_ttl_sec=None):
+        """ in_builder() 결과 직렬화 후 저장 """
+        now = time.monotonic()
+        with self._lock:
+            self.misses += 1
+        payload = in_builder()
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        with self._lock:
+            if len(self._store) >= self.max_size and in_key not in self._store:
+                self._store.pop(min(self._store, key=lambda k: self._store[k][0]), None)
+            self._store[in_key] = (now + (in_ttl_sec or self.ttl_sec), body, etag)
+        return body, etag
+
+    def invalidate(self, in_prefix=None):
+        """
+        # 설명 : 키 첫 요소(차트 종류)가 in_prefix 인 항목 삭제 (None 이면 전체)
+        """
+        with self._lock:
+            if in_prefix is None:
+                self._store.clear()
+                return
+            for key in [k for k in self._store if k and k[0] == in_prefix]:
+                self._store.pop(key, None)
+
+    def get_stats(self):
+        """
+        # 설명 : 캐시 적중률 통계
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {"size": len(self._store), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+def get_no_store_response(in_payload):
+    """
+    # 설명 : get_no_store_response - 캐시하면 안 되는 payload(오류 등) JSON 응답 (브라우저/프록시 저장 금지)
+    # 입력 : in_payload - 응답 payload
+    # 출력 : Response
+    """
+    body = json.dumps(in_payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-store"})
+
+def get_etag_response(in_request, in_body, in_etag, in_max_age=60):
+    """
+    # 설명 : get_etag_response - If-None-Match 가 같으면 304, 아니면 JSON 본문 응답
+    # 입력 : in_request - FastAPI Request, in_body - JSON bytes, in_etag - ETag, in_max_age - 브라우저 캐시 시간(초)
+    # 출력 : Response
+    """
+    headers = {"ETag": in_etag, "Cache-Control": f"public, max-age={in_max_age}"}
+    if_none_match = in_request.headers.get("if-none-match", "")
+    if in_etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(content=in_body, media_type="application/json", headers=headers)
+
+def get_series_payload(in_ticker, in_period, in_df, in_points=None):
+    """
+    # 설명 : get_series_payload - 일봉 DataFrame 을 컬럼형 JSON payload 로 변환 (선택적 LTTB 다운샘플)
+    # 입력 : in_ticker - 티커, in_period - 기간, in_df - Open/High/Low/Close/Volume DataFrame, in_points - 최대 점 개수
+    # 출력 : payload dict (dates/open/high/low/close/volume 배열)
+    """
+    df = in_df.dropna(subset=["Close"])
+    closes = df["Close"].to_numpy(dtype="f8")
+    idx = np.arange(len(df))
+    if in_points and len(df) > in_points:
+        idx = get_lttb_indices(idx, closes, in_points)
+    df = df.iloc[idx]
+    return {
+        "ticker": in_ticker,
+        "period": in_period,
+        "count": len(df),
+        "dates": df.index.strftime("%Y-%m-%d").tolist(),
+        "open": np.round(df["Open"].to_numpy(dtype="f8"), 2).tolist(),
+        "high": np.round(df["High"].to_numpy(dtype="f8"), 2).tolist(),
+        "low": np.round(df["Low"].to_numpy(dtype="f8"), 2).tolist(),
+        "close": np.round(df["Close"].to_numpy(dtype="f8"), 2).tolist(),
+        "volume": df["Volume"].to_numpy(dtype="f8").astype(np.int64).tolist()
+    }
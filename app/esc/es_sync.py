@@ -0,0 +1,297 @@
+import time
+from datetime import datetime
+from elasticsearch import helpers
+from pymongo.errors import OperationFailure, PyMongoError
+from esc.es_templates import get_valuation_fields
+
+# 몽고DB 컬렉션 → ES 인덱스
+SYNC_TARGETS = {
+    "trade_summary_esc": "trade_summary",
+    "trade_esc_history": "trade_esc_history",
+    "stock_master": "stock_master",
+}
+SYNC_STATE_ID = "mongo_to_es"
+# 재개 토큰이 oplog 밖으로 밀려났거나(286) 유효하지 않을 때(260, 280) → 전체 재동기화
+RESYNC_ERROR_CODES = (260, 280, 286)
+
+def get_summary_source(in_doc, in_current_price):
+    """
+    # 설명 : get_summary_source - trade_summary_esc 문서를 ES trade_summary 문서로 변환 (현재가 역정규화)
+    # 입력 : in_doc - trade_summary_esc 문서, in_current_price - 종목 현재가
+    # 출력 : (ES _id, _source)
+    """
+    code = in_doc['code']
+    source = {
+        "user_id": in_doc['user_id'],
+        "code": code,
+        "total_buy_qty": in_doc.get('total_buy_qty', 0),
+        "total_buy_amt": in_doc.get('total_buy_amt', 0),
+        "total_sell_qty": in_doc.get('total_sell_qty', 0),
+        "total_sell_amt": in_doc.get('total_sell_amt', 0),
+        # 주문 시점에 갱신되는 누적값 (없는 과거 문서는 합계로 보정)
+        "holding_qty": in_doc.get('holding_qty', in_doc.get('total_buy_qty', 0) - in_doc.get('total_sell_qty', 0)),
+        "avg_cost": in_doc.get('avg_cost', 0),
+        # 실현손익을 모르는 과거 문서는 None → get_valuation_fields/수집 파이프라인이 합계로 추정
+        "realized_pnl": in_doc.get('realized_pnl'),
+        "current_price": in_current_price,
+        "mongo_id": str(in_doc['_id']) if '_id' in in_doc else None   # 삭제 이벤트(문서키만 옴) 처리용
+    }
+    # 순위 집계용 사전계산 필드 (holdings, realized_pnl, total_valuation)
+    source.update(get_valuation_fields(source))
+    return f"{in_doc['user_id']}_{code}", source
+
+def set_backfill_summary(in_collection):
+    """
+    # 설명 : set_backfill_summary - 체결 시 $inc 로만 쌓이는 보유수량/원가/실현손익 필드를 누적 합계로 보정 (1회성, 재실행 안전)
+    #        대상: holding_qty/cost_basis 가 없거나 holding_qty ≠ 매수수량 - 매도수량 이거나 realized_pnl 이 없는 문서
+    #        holding_qty = 매수수량 - 매도수량, cost_basis = holding_qty × 평균단가(avg_cost, 없으면 매수평균)
+    #        realized_pnl = 매도금액 - 매도수량 × 매수평균 (추정치) - 필드 도입 전 문서의 값은 일부 체결만 반영돼 덮어씀
+    #        (비워 두면 다음 체결의 $inc 로 값이 생기면서 그 전 손익이 추정에서 빠지므로 반드시 채움)
+    #        읽은 holding_qty 를 조건으로 걸어 그 사이 체결된 문서는 건너뜀 (다음 실행에서 다시 보정)
+    # 입력 : in_collection - trade_summary_esc
+    # 출력 : 보정한 문서 수
+    # 소스 : 몽고DB mock_trading_db.trade_summary_esc
+    """
+    fixed = 0
+    for doc in in_collection.find({}, {"total_buy_qty": 1, "total_buy_amt": 1, "total_sell_qty": 1, "total_sell_amt": 1,
+                                       "holding_qty": 1, "cost_basis": 1, "avg_cost": 1, "realized_pnl": 1}):
+        buy_qty, sell_qty = doc.get("total_buy_qty") or 0, doc.get("total_sell_qty") or 0
+        holding = buy_qty - sell_qty
+        stale = "cost_basis" not in doc or doc.get("holding_qty") != holding
+        if not stale and doc.get("realized_pnl") is not None:
+            continue
+        update = {"$set": {"realized_pnl": get_valuation_fields({**doc, "realized_pnl": None})["realized_pnl"]}}
+        if stale:
+            avg = doc.get("avg_cost") or ((doc.get("total_buy_amt") or 0) / buy_qty if buy_qty else 0)
+            update["$set"].update({"holding_qty": holding, "cost_basis": holding * avg if holding > 0 else 0,
+                                   "avg_cost": avg if holding > 0 else 0})
+        guard = {"holding_qty": doc["holding_qty"]} if "holding_qty" in doc else {"holding_qty": {"$exists": False}}
+        fixed += in_collection.update_one({"_id": doc["_id"], **guard}, update).modified_count
+    return fixed
+
+def get_plain_source(in_doc):
+    """ _id 를 뺀 문서 (ES _id 는 몽고 _id 문자열) """
+    return str(in_doc['_id']), {k: v for k, v in in_doc.items() if k != '_id'}
+
+class ChangeStreamSync:
+    """
+    # 설명 : ChangeStreamSync - 몽고DB 변경 스트림을 따라가며 ES 에 증분 반영하는 상주 작업자
+    #        DB 단위 스트림 1개로 3개 컬렉션을 구독하고, in_batch_size 건 또는 in_flush_sec 초마다 bulk 전송
+    #        ES 반영이 끝난 뒤에만 재개 토큰을 저장 → 재시작 시 마지막 배치 이후부터 이어감
+    #        (중간에 죽으면 저장 전 배치만 다시 적용되며, 색인/삭제는 _id 기준이라 같은 결과)
+    #        재개 토큰이 없거나 oplog 에서 밀려난 경우에만 스트림을 먼저 열어 둔 뒤 전체 재동기화
+    # 입력 : in_db - mock_trading_db, in_es - ES 클라이언트, in_state - 상태(재개 토큰/지표) 컬렉션,
+    #       in_batch_size - 배치 최대 건수, in_flush_sec - 배치 최대 대기 시간(초)
+    # 출력 : 작업자 객체
+    # 소스 : 몽고DB mock_trading_db.trade_summary_esc, trade_esc_history, stock_master
+    """
+    def __init__(self, in_db, in_es, in_state=None, in_batch_size=500, in_flush_sec=1.0):
+        self.db = in_db
+        self.es = in_es
+        self.state = in_state if in_state is not None else in_db.es_sync_state
+        self.batch_size = in_batch_size
+        self.flush_sec = in_flush_sec
+        self.prices = {}         # code → 현재가 (trade_summary 역정규화용)
+        self._actions = {}       # (index, _id) → bulk action (같은 문서 여러 변경은 마지막 것만)
+        self._deletes = set()    # 삭제된 trade_summary_esc 의 mongo_id
+        self._price_changes = {} # code → 새 현재가 (해당 종목 trade_summary 문서 current_price 갱신)
+        self._first_at = None
+        self._oldest_cluster_time = None
+        self.metrics = {"events": 0, "by_collection": {}, "batches": 0, "indexed": 0, "deleted": 0,
+                        "errors": 0, "full_resyncs": 0, "lag_sec": 0.0, "max_lag_sec": 0.0,
+                        "last_flush_ms": 0.0, "last_flush_at": None, "started_at": datetime.now()}
+
+    # --- 재개 토큰 ---
+    def get_resume_token(self):
+        doc = self.state.find_one({"_id": SYNC_STATE_ID}, {"resume_token": 1})
+        return (doc or {}).get("resume_token")
+
+    def set_resume_token(self, in_token):
+        self.state.update_one({"_id": SYNC_STATE_ID}, {"$set": {
+            "resume_token": in_token, "updated_at": datetime.now(), "metrics": self.metrics}}, upsert=True)
+
+    # --- 전체 재동기화 ---
+    def set_load_prices(self):
+        self.prices = {s['code']: s.get('close', 0) for s in self.db.stock_master.find({}, {"code": 1, "close": 1})}
+
+    def set_full_resync(self):
+        """
+        # 설명 : set_full_resync - 3개 컬렉션 전체를 ES 로 다시 색인 (최초 실행/재개 불가 시에만)
+        # 출력 : 색인 건수
+        """
+        self.set_load_prices()
+        count = 0
+        actions = []
+        for coll, index in SYNC_TARGETS.items():
+            for doc in self.db[coll].find():
+                doc_id, source = get_summary_source(doc, self.prices.get(doc['code'], 0)) \
+                    if coll == "trade_summary_esc" else get_plain_source(doc)
+                actions.append({"_index": index, "_id": doc_id, "_source": source})
+                if len(actions) >= 1000:
+                    count += self._set_bulk(actions)
+                    actions = []
+        if actions:
+            count += self._set_bulk(actions)
+        self.metrics["full_resyncs"] += 1
+        print(f"✅ 전체 재동기화 완료: {count}건")
+        return count
+
+    # --- 변경 이벤트 → 배치 ---
+    def set_change(self, in_change):
+        """
+        # 설명 : set_change - 변경 이벤트 1건을 배치에 반영 (같은 문서의 연속 변경은 마지막 상태만 전송)
+        # 입력 : in_change - 변경 스트림 이벤트 (fullDocument=updateLookup)
+        """
+        coll = in_change.get("ns", {}).get("coll")
+        index = SYNC_TARGETS.get(coll)
+        op = in_change.get("operationType")
+        if index is None or op not in ("insert", "update", "replace", "delete"):
+            return
+        self.metrics["events"] += 1
+        self.metrics["by_collection"][coll] = self.metrics["by_collection"].get(coll, 0) + 1
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        cluster_time = in_change.get("clusterTime")
+        if cluster_time is not None and self._oldest_cluster_time is None:
+            self._oldest_cluster_time = cluster_time.time
+
+        key_id = str(in_change["documentKey"]["_id"])
+        doc = in_change.get("fullDocument")
+        if op == "delete" or doc is None:
+            # updateLookup 시점에 이미 지워진 문서도 삭제로 처리
+            if coll == "trade_summary_esc":
+                self._deletes.add(key_id)
+            else:
+                self._actions[(index, key_id)] = {"_op_type": "delete", "_index": index, "_id": key_id}
+            return
+
+        if coll == "trade_summary_esc":
+            doc_id, source = get_summary_source(doc, self.prices.get(doc['code'], 0))
+            self._deletes.discard(key_id)
+        else:
+            doc_id, source = get_plain_source(doc)
+            if coll == "stock_master" and self.prices.get(doc.get('code')) != doc.get('close', 0):
+                self.prices[doc['code']] = doc.get('close', 0)
+                self._price_changes[doc['code']] = doc.get('close', 0)
+        self._actions[(index, doc_id)] = {"_index": index, "_id": doc_id, "_source": source}
+
+    def is_flush_due(self):
+        pending = len(self._actions) + len(self._deletes) + len(self._price_changes)
+        if not pending:
+            return False
+        return pending >= self.batch_size or time.monotonic() - self._first_at >= self.flush_sec
+
+    def _set_bulk(self, in_actions):
+        ok, errors = helpers.bulk(self.es, in_actions, raise_on_error=False, raise_on_exception=False)
+        for err in errors:
+            # 없는 문서 삭제(404)는 정상
+            item = next(iter(err.values()))
+            if item.get("status") != 404:
+                self.metrics["errors"] += 1
+                print(f"❌ ES 반영 실패: {item}")
+        return ok
+
+    def set_flush(self):
+        """
+        # 설명 : set_flush - 모아 둔 색인/삭제/현재가 갱신을 ES 로 전송
+        # 출력 : 전송 건수
+        """
+        start = time.perf_counter()
+        actions = list(self._actions.values())
+        summary_index = SYNC_TARGETS["trade_summary_esc"]
+        for action in actions:
+            # 같은 배치 안에서 현재가가 바뀌었을 수 있으므로 전송 직전 값으로 맞춤
+            if action["_index"] == summary_index and "_source" in action:
+                action["_source"]["current_price"] = self.prices.get(action["_source"]["code"], 0)
+                action["_source"].update(get_valuation_fields(action["_source"]))
+        sent = self._set_bulk(actions) if actions else 0
+        self.metrics["indexed"] += sum(1 for a in actions if a.get("_op_type") != "delete")
+        self.metrics["deleted"] += sum(1 for a in actions if a.get("_op_type") == "delete")
+
+        if self._deletes:
+            self.es.delete_by_query(index=summary_index, conflicts="proceed",
+                                    body={"query": {"terms": {"mongo_id": sorted(self._deletes)}}})
+            self.metrics["deleted"] += len(self._deletes)
+        if self._price_changes:
+            # 종목 현재가가 바뀌면 그 종목을 가진 요약 문서 전체를 요청 1번으로 갱신
+            self.es.update_by_query(index=summary_index, conflicts="proceed", body={
+                "query": {"terms": {"code": sorted(self._price_changes)}},
+                "script": {"lang": "painless", "source": """
+                    ctx._source.current_price = params.prices[ctx._source.code];
+                    double holdings = ctx._source.total_buy_qty - ctx._source.total_sell_qty;
+                    ctx._source.total_valuation = (ctx._source.total_sell_amt - ctx._source.total_buy_amt)
+                        + holdings * ctx._source.current_price;
+                """,
+                           "params": {"prices": self._price_changes}}
+            })
+
+        if self._oldest_cluster_time is not None:
+            lag = max(0.0, time.time() - self._oldest_cluster_time)
+            self.metrics["lag_sec"] = round(lag, 3)
+            self.metrics["max_lag_sec"] = max(self.metrics["max_lag_sec"], round(lag, 3))
+        self.metrics["batches"] += 1
+        self.metrics["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.metrics["last_flush_at"] = datetime.now()
+        self._set_clear()
+        return sent
+
+    def _set_clear(self):
+        self._actions, self._deletes, self._price_changes = {}, set(), {}
+        self._first_at, self._oldest_cluster_time = None, None
+
+    def _get_stream(self, in_token):
+        pipeline = [{"$match": {"ns.coll": {"$in": list(SYNC_TARGETS)}}}]
+        return self.db.watch(pipeline, full_document="updateLookup", resume_after=in_token,
+                             max_await_time_ms=int(self.flush_sec * 1000), batch_size=self.batch_size)
+
+    def run(self, in_force_full=False, in_max_idle_loops=None):
+        """
+        # 설명 : run - 상주 동기화 루프 (재개 토큰부터 이어가고, 불가하면 전체 재동기화 후 이어감)
+        # 입력 : in_force_full - 토큰이 있어도 전체 재동기화, in_max_idle_loops - 빈 대기 N번 후 종료(점검용)
+        """
+        token = None if in_force_full else self.get_resume_token()
+        while True:
+            try:
+                if token is None:
+                    # 스트림을 먼저 열어 재동기화 도중의 변경도 놓치지 않음
+                    stream = self._get_stream(None)
+                    self.set_full_resync()
+                    self.set_resume_token(stream.resume_token)
+                else:
+                    self.set_load_prices()
+                    stream = self._get_stream(token)
+                print(f"🔄 변경 스트림 구독 시작 (배치 {self.batch_size}건 / {self.flush_sec}초)")
+                idle = 0
+                with stream:
+                    while stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            idle += 1
+                            if in_max_idle_loops is not None and idle >= in_max_idle_loops and not self.is_flush_due():
+                                return
+                        else:
+                            idle = 0
+                            if change.get("operationType") in ("invalidate", "drop", "dropDatabase", "rename"):
+                                raise OperationFailure("변경 스트림 무효화", code=260)
+                            self.set_change(change)
+                        if self.is_flush_due():
+                            self.set_flush()
+                            token = stream.resume_token
+                            self.set_resume_token(token)
+                        elif change is None and stream.resume_token != token:
+                            # 변경이 없어도 토큰을 전진시켜 oplog 밖으로 밀려나지 않게 함
+                            token = stream.resume_token
+                            self.set_resume_token(token)
+            except OperationFailure as e:
+                if e.code in RESYNC_ERROR_CODES:
+                    print(f"⚠️ 재개 토큰 사용 불가({e.code}) → 전체 재동기화")
+                    token = None
+                    self._set_clear()
+                    continue
+                raise
+            except PyMongoError as e:
+                # 일시적 연결 오류: 저장된 토큰부터 다시 시작
+                print(f"❌ 변경 스트림 오류, 5초 후 재시도: {e}")
+                self._set_clear()
+                token = self.get_resume_token()
+                time.sleep(5)
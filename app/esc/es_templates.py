@@ -0,0 +1,221 @@
+import time
+import random
+import argparse
+import statistics
+from elasticsearch import helpers
+
+# 날짜 필드 허용 형식 (몽고 datetime → ISO, 과거 문서의 "YYYY-MM-DD HH:MM:SS" 문자열 모두 수용)
+DATE_FORMAT = "strict_date_optional_time||yyyy-MM-dd HH:mm:ss||yyyy-MM-dd||epoch_millis"
+# 가격/금액은 원 단위 소수 2자리까지 정수로 저장 (double 대비 디스크/집계 비용 절감)
+PRICE_TYPE = {"type": "scaled_float", "scaling_factor": 100}
+DATE_TYPE = {"type": "date", "format": DATE_FORMAT, "ignore_malformed": True}  # 빈 문자열 등 과거 값은 색인만 건너뜀
+
+VALUATION_PIPELINE_ID = "trade_summary_valuation"
+# 색인 시점에 보유수량/실현손익/총평가손익을 계산해 필드로 저장 → 순위 집계는 스크립트 없이 sum/정렬만
+VALUATION_PIPELINE = {
+    "description": "trade_summary 보유수량(holdings), 실현손익(realized_pnl), 총평가손익(total_valuation) 계산",
+    "processors": [{
+        "script": {
+            "lang": "painless",
+            "source": """
+                double buyQty = ctx.total_buy_qty == null ? 0 : ctx.total_buy_qty;
+                double sellQty = ctx.total_sell_qty == null ? 0 : ctx.total_sell_qty;
+                double buyAmt = ctx.total_buy_amt == null ? 0 : ctx.total_buy_amt;
+                double sellAmt = ctx.total_sell_amt == null ? 0 : ctx.total_sell_amt;
+                double price = ctx.current_price == null ? 0 : ctx.current_price;
+                double holdings = buyQty - sellQty;
+                ctx.holdings = holdings;
+                if (ctx.realized_pnl == null) {
+                    ctx.realized_pnl = sellAmt - sellQty * (buyQty > 0 ? buyAmt / buyQty : 0);
+                }
+                ctx.total_valuation = (sellAmt - buyAmt) + holdings * price;
+            """
+        }
+    }]
+}
+
+# 인덱스 템플릿 (인덱스를 지우고 다시 만들거나 첫 색인으로 자동 생성될 때 적용)
+INDEX_TEMPLATES = {
+    "esc_trade_summary": {
+        "index_patterns": ["trade_summary*"],
+        "priority": 100,
+        "template": {
+            "settings": {"index": {"default_pipeline": VALUATION_PIPELINE_ID}},
+            "mappings": {"properties": {
+                "user_id": {"type": "keyword"},
+                "code": {"type": "keyword"},
+                "mongo_id": {"type": "keyword"},
+                "total_buy_qty": {"type": "long"},
+                "total_sell_qty": {"type": "long"},
+                "holding_qty": {"type": "long"},
+                "holdings": {"type": "long"},
+                "total_buy_amt": PRICE_TYPE,
+                "total_sell_amt": PRICE_TYPE,
+                "avg_cost": PRICE_TYPE,
+                "current_price": PRICE_TYPE,
+                "realized_pnl": PRICE_TYPE,
+                "total_valuation": PRICE_TYPE,
+                "updated_at": DATE_TYPE
+            }}
+        }
+    },
+    "esc_trade_history": {
+        "index_patterns": ["trade_esc_history*"],
+        "priority": 100,
+        "template": {
+            # 수익률 팝업: 1위 사용자 문서를 top_hits 로 최대 500건 함께 받음 (기본 한도 100)
+            "settings": {"index": {"max_inner_result_window": 500}},
+            "mappings": {"properties": {
+                "uid": {"type": "keyword"},
+                "user_id": {"type": "keyword"},
+                "ticker": {"type": "keyword"},
+                "code": {"type": "keyword"},
+                "sn": {"type": "keyword"},
+                "buy_p": PRICE_TYPE,
+                "sell_p": PRICE_TYPE,
+                "price": PRICE_TYPE,
+                "qty": {"type": "long"},
+                "rate": {"type": "float"},
+                "buy_dt": DATE_TYPE,
+                "timestamp": DATE_TYPE
+            }}
+        }
+    },
+    "esc_stock_master": {
+        "index_patterns": ["stock_master*"],
+        "priority": 100,
+        "template": {
+            "mappings": {"properties": {
+                "code": {"type": "keyword"},
+                "name": {"type": "keyword", "fields": {"text": {"type": "text"}}},
+                "market": {"type": "keyword"},
+                "close": PRICE_TYPE,
+                "updated_at": DATE_TYPE
+            }}
+        }
+    }
+}
+
+def get_valuation_fields(in_source):
+    """
+    # 설명 : get_valuation_fields - 동기화 시점 계산 (수집 파이프라인과 같은 식, 파이프라인 없는 클러스터 대비)
+    # 입력 : in_source - trade_summary _source (current_price 포함)
+    # 출력 : {holdings, realized_pnl, total_valuation}
+    """
+    buy_qty, sell_qty = in_source.get("total_buy_qty") or 0, in_source.get("total_sell_qty") or 0
+    buy_amt, sell_amt = in_source.get("total_buy_amt") or 0, in_source.get("total_sell_amt") or 0
+    holdings = buy_qty - sell_qty
+    realized = in_source.get("realized_pnl")
+    if realized is None:
+        realized = sell_amt - sell_qty * (buy_amt / buy_qty if buy_qty else 0)
+    return {"holdings": holdings, "realized_pnl": realized,
+            "total_valuation": (sell_amt - buy_amt) + holdings * (in_source.get("current_price") or 0)}
+
+def set_install(in_es):
+    """
+    # 설명 : set_install - 수집 파이프라인 + 인덱스 템플릿 등록 (여러 번 실행해도 같은 결과)
+    #        이미 만들어진 인덱스의 매핑은 바뀌지 않으므로, 기존 인덱스는 삭제 후 재동기화(migration/sync_to_es) 필요
+    # 입력 : in_es - ES 클라이언트
+    # 출력 : 등록한 템플릿 이름 목록
+    """
+    in_es.ingest.put_pipeline(id=VALUATION_PIPELINE_ID, body=VALUATION_PIPELINE)
+    for name, body in INDEX_TEMPLATES.items():
+        in_es.indices.put_index_template(name=name, body=body)
+    # 동적 설정은 이미 있는 인덱스에도 바로 적용
+    in_es.indices.put_settings(index="trade_esc_history*", body={"index": {"max_inner_result_window": 500}},
+                               allow_no_indices=True)
+    return list(INDEX_TEMPLATES)
+
+def get_ranking_body(in_size=1, in_scripted=False):
+    """
+    # 설명 : get_ranking_body - 사용자별 총평가손익 순위 집계 본문
+    # 입력 : in_size - 상위 인원, in_scripted - True 면 예전 방식(문서마다 painless 계산, 비교용)
+    # 출력 : search body (aggs.top_earner.buckets[].total_valuation.value, 동점은 user_id 순)
+    """
+    if in_scripted:
+        metric = {"script": {"source": """
+            double realized = doc['total_sell_amt'].value - doc['total_buy_amt'].value;
+            double hold_qty = doc['total_buy_qty'].value - doc['total_sell_qty'].value;
+            return realized + (hold_qty * doc['current_price'].value);
+        """}}
+    else:
+        metric = {"field": "total_valuation"}
+    return {
+        "size": 0,
+        "aggs": {"top_earner": {
+            # 동점이면 사용자id 오름차순 (로컬 SQLite 집계와 같은 순서)
+            "terms": {"field": "user_id", "size": in_size, "order": [{"total_valuation": "desc"}, {"_key": "asc"}]},
+            "aggs": {"total_valuation": {"sum": metric}}
+        }}
+    }
+
+def get_bench_docs(in_index, in_users, in_codes, in_seed=7):
+    """ 벤치마크용 가상 trade_summary 문서 (사용자 × 보유종목) """
+    rnd = random.Random(in_seed)
+    for u in range(in_users):
+        for c in rnd.sample(range(2000), in_codes):
+            buy_qty = rnd.randint(1, 500)
+            sell_qty = rnd.randint(0, buy_qty)
+            avg = rnd.uniform(1000, 200000)
+            source = {"user_id": f"user_{u:06d}", "code": f"{c:06d}",
+                      "total_buy_qty": buy_qty, "total_buy_amt": round(buy_qty * avg, 2),
+                      "total_sell_qty": sell_qty, "total_sell_amt": round(sell_qty * avg * rnd.uniform(0.8, 1.2), 2),
+                      "current_price": round(avg * rnd.uniform(0.7, 1.3), 2)}
+            yield {"_index": in_index, "_id": f"{source['user_id']}_{source['code']}", "_source": source}
+
+def get_benchmark(in_es, in_index="trade_summary_bench", in_users=20000, in_codes=10, in_runs=20, in_top=10, in_keep=False):
+    """
+    # 설명 : get_benchmark - 스크립트 집계 vs 사전계산 필드 집계 응답시간 비교 (같은 인덱스, 같은 결과 검증)
+    #        in_index 는 trade_summary* 패턴이라 템플릿/파이프라인이 그대로 적용됨
+    # 입력 : in_es - ES 클라이언트, in_index - 임시 인덱스, in_users/in_codes - 사용자 수/사용자당 종목 수,
+    #       in_runs - 반복 횟수, in_top - 상위 인원, in_keep - 끝나도 인덱스 유지
+    # 출력 : {docs, scripted: {p50_ms, mean_ms}, precomputed: {...}, speedup, same_ranking}
+    """
+    set_install(in_es)
+    if in_es.indices.exists(index=in_index):
+        in_es.indices.delete(index=in_index)
+    in_es.indices.create(index=in_index)
+    docs, _ = helpers.bulk(in_es, get_bench_docs(in_index, in_users, in_codes), chunk_size=2000, request_timeout=120)
+    in_es.indices.refresh(index=in_index)
+    in_es.indices.forcemerge(index=in_index, max_num_segments=1, request_timeout=300)
+
+    result = {"docs": docs}
+    rankings = {}
+    try:
+        for name, scripted in (("scripted", True), ("precomputed", False)):
+            body = get_ranking_body(in_top, scripted)
+            in_es.search(index=in_index, body=body, request_cache=False)  # 워밍업
+            took = []
+            for _ in range(in_runs):
+                start = time.perf_counter()
+                res = in_es.search(index=in_index, body=body, request_cache=False, request_timeout=120)
+                took.append((time.perf_counter() - start) * 1000)
+            buckets = res["aggregations"]["top_earner"]["buckets"]
+            rankings[name] = [(b["key"], round(b["total_valuation"]["value"])) for b in buckets]
+            result[name] = {"p50_ms": round(statistics.median(took), 1), "mean_ms": round(statistics.mean(took), 1),
+                            "es_took_ms": res["took"]}
+    finally:
+        if not in_keep:
+            in_es.indices.delete(index=in_index)
+    result["speedup"] = round(result["scripted"]["p50_ms"] / max(result["precomputed"]["p50_ms"], 0.001), 2)
+    # scaled_float(소수 2자리) 반올림으로 합계는 소수점 아래가 다를 수 있어 사용자 순서만 비교
+    result["same_ranking"] = [k for k, _ in rankings["scripted"]] == [k for k, _ in rankings["precomputed"]]
+    return result
+
+if __name__ == "__main__":
+    # 실행 예) cd app && python -m esc.es_templates --install
+    #         cd app && python -m esc.es_templates --bench --users 20000 --codes 10
+    parser = argparse.ArgumentParser(description="ES 인덱스 템플릿/수집 파이프라인 등록 및 순위 집계 벤치마크")
+    parser.add_argument("--install", action="store_true", help="템플릿/파이프라인 등록")
+    parser.add_argument("--bench", action="store_true", help="스크립트 vs 사전계산 집계 벤치마크")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--codes", type=int, default=10, help="사용자당 보유 종목 수")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="벤치마크 인덱스 유지")
+    args = parser.parse_args()
+
+    from esc.sync_to_es import es
+    if args.install:
+        print(f"✅ 템플릿 등록: {set_install(es)} (파이프라인 {VALUATION_PIPELINE_ID})")
+    if args.bench:
+        print(get_benchmark(es, in_users=args.users, in_codes=args.codes, in_runs=args.runs, in_keep=args.keep))
@@ -0,0 +1,193 @@
+import json
+import base64
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import numpy as np
+import plotly.graph_objects as go
+from elasticsearch.exceptions import NotFoundError
+from esc.chart_cache import get_lttb_indices
+
+HISTORY_INDEX = "trade_esc_history"
+HISTORY_MAX_BUCKETS = 1000      # 어떤 기간이든 집계 버킷은 이 개수 이하
+HISTORY_RAW_MAX_SIZE = 1000     # 원본 조회 1페이지 최대 건수
+HISTORY_PIT_KEEP_ALIVE = "5m"   # 원본 조회 point in time 유지 시간 (다음 페이지 요청마다 연장)
+HISTORY_TIME_ZONE = "Asia/Seoul"
+DATE_FMT = "%Y-%m-%d %H:%M:%S"
+# 자동 선택 후보 버킷 크기 (초, ES fixed_interval)
+HISTORY_INTERVALS = [(60, "1m"), (300, "5m"), (900, "15m"), (1800, "30m"), (3600, "1h"), (10800, "3h"),
+                     (21600, "6h"), (43200, "12h"), (86400, "1d"), (604800, "7d"), (2592000, "30d")]
+
+def get_interval(in_start, in_end, in_max_buckets=HISTORY_MAX_BUCKETS):
+    """
+    # 설명 : get_interval - 기간을 in_max_buckets 개 이하로 나누는 가장 작은 버킷 크기
+    # 입력 : in_start, in_end - datetime
+    # 출력 : ES fixed_interval 문자열 (예: "1h")
+    """
+    span = max((in_end - in_start).total_seconds(), 1)
+    for seconds, interval in HISTORY_INTERVALS:
+        if span / seconds <= in_max_buckets:
+            return interval
+    return HISTORY_INTERVALS[-1][1]
+
+def get_bounds(in_start, in_end):
+    """ "YYYY-MM-DD[ HH:MM:SS]" → datetime (끝을 날짜만 주면 그 날 끝까지) """
+    start = datetime.fromisoformat(in_start) if in_start else None
+    end = datetime.fromisoformat(in_end) if in_end else None
+    if end is not None and len(in_end) <= 10:
+        end += timedelta(days=1) - timedelta(seconds=1)
+    return start, end
+
+def get_time_range(in_es, in_start=None, in_end=None, in_ticker=None):
+    """
+    # 설명 : get_time_range - 요청 기간 (빠진 쪽은 인덱스의 최소/최대 timestamp 로 채움)
+    # 입력 : in_start, in_end - "YYYY-MM-DD[ HH:MM:SS]" 또는 None
+    # 출력 : (시작 datetime, 끝 datetime) 또는 (None, None) (데이터 없음)
+    """
+    start, end = get_bounds(in_start, in_end)
+    if start is None or end is None:
+        res = in_es.search(index=HISTORY_INDEX, body={
+            "size": 0, "query": get_history_query(None, None, in_ticker),
+            "aggs": {"first": {"min": {"field": "timestamp"}}, "last": {"max": {"field": "timestamp"}}}
+        })
+        aggs = res.get("aggregations", {})
+        if aggs.get("first", {}).get("value") is None:
+            return None, None
+        # min/max value 는 epoch ms → 버킷/기간 필터와 같은 시간대의 시각으로 변환
+        tz = ZoneInfo(HISTORY_TIME_ZONE)
+        start = start or datetime.fromtimestamp(aggs["first"]["value"] / 1000, tz).replace(tzinfo=None)
+        end = end or datetime.fromtimestamp(aggs["last"]["value"] / 1000, tz).replace(tzinfo=None)
+    return start, end
+
+def get_history_query(in_start, in_end, in_ticker=None):
+    """ 기간/종목 필터 (수익률이 있는 체결만) """
+    filters = [{"exists": {"field": "rate"}}]
+    if in_start is not None or in_end is not None:
+        cond = {"format": "yyyy-MM-dd HH:mm:ss", "time_zone": HISTORY_TIME_ZONE}
+        if in_start is not None:
+            cond["gte"] = in_start.strftime(DATE_FMT)
+        if in_end is not None:
+            cond["lte"] = in_end.strftime(DATE_FMT)
+        filters.append({"range": {"timestamp": cond}})
+    if in_ticker:
+        filters.append({"term": {"ticker": in_ticker}})
+    return {"bool": {"filter": filters}}
+
+def get_history_series(in_es, in_start=None, in_end=None, in_points=None, in_ticker=None,
+                       in_max_buckets=HISTORY_MAX_BUCKETS):
+    """
+    # 설명 : get_history_series - 기간 수익률 추이 (date_histogram 버킷별 평균/백분위, 선택적 LTTB)
+    #        기간 길이와 무관하게 ES 는 최대 in_max_buckets 개 버킷만 돌려주고, in_points 가 있으면 LTTB 로 더 줄임
+    # 입력 : in_es - ES 클라이언트, in_start/in_end - 기간 (없으면 전체), in_points - 최대 점 개수, in_ticker - 종목 필터
+    # 출력 : {interval, start, end, total, count, dates, rates(평균), p5, p50, p95, counts}
+    # 소스 : Elasticsearch trade_esc_history
+    """
+    start, end = get_time_range(in_es, in_start, in_end, in_ticker)
+    empty = {"interval": None, "start": None, "end": None, "total": 0, "count": 0,
+             "dates": [], "rates": [], "p5": [], "p50": [], "p95": [], "counts": []}
+    if start is None:
+        return empty
+    interval = get_interval(start, end, in_max_buckets)
+    res = in_es.search(index=HISTORY_INDEX, body={
+        "size": 0,
+        "query": get_history_query(start, end, in_ticker),
+        "aggs": {"by_time": {
+            "date_histogram": {"field": "timestamp", "fixed_interval": interval, "min_doc_count": 1,
+                               "time_zone": HISTORY_TIME_ZONE, "format": "yyyy-MM-dd HH:mm:ss"},
+            "aggs": {"avg_rate": {"avg": {"field": "rate"}},
+                     "pct_rate": {"percentiles": {"field": "rate", "percents": [5, 50, 95]}}}
+        }}
+    })
+    buckets = res.get("aggregations", {}).get("by_time", {}).get("buckets", [])
+    if not buckets:
+        return {**empty, "interval": interval, "start": start.strftime(DATE_FMT), "end": end.strftime(DATE_FMT)}
+
+    keys = np.array([b["key"] for b in buckets], dtype="f8")
+    rates = np.array([b["avg_rate"]["value"] for b in buckets], dtype="f8")
+    idx = np.arange(len(buckets))
+    if in_points and len(buckets) > in_points:
+        idx = get_lttb_indices(keys, rates, in_points)
+
+    def pct(in_bucket, in_key):
+        value = in_bucket["pct_rate"]["values"].get(in_key)
+        return round(value, 4) if value is not None else None
+
+    picked = [buckets[i] for i in idx]
+    return {
+        "interval": interval,
+        "start": start.strftime(DATE_FMT),
+        "end": end.strftime(DATE_FMT),
+        "total": int(sum(b["doc_count"] for b in buckets)),
+        "count": len(picked),
+        "dates": [b["key_as_string"] for b in picked],
+        "rates": np.round(rates[idx], 4).tolist(),
+        "p5": [pct(b, "5.0") for b in picked],
+        "p50": [pct(b, "50.0") for b in picked],
+        "p95": [pct(b, "95.0") for b in picked],
+        "counts": [b["doc_count"] for b in picked]
+    }
+
+def get_cursor(in_pit_id, in_sort_values):
+    """ (point in time id, search_after 정렬값) → URL 에 실을 수 있는 커서 문자열 """
+    cursor = {"pit": in_pit_id, "after": in_sort_values}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode("utf-8")).decode("ascii")
+
+def get_history_page(in_es, in_start=None, in_end=None, in_size=200, in_after=None, in_ticker=None):
+    """
+    # 설명 : get_history_page - 원본 체결 이력 페이지 (point in time + timestamp, _shard_doc 순 search_after, 버킷 상세 조회용)
+    #        from/size 와 달리 페이지가 깊어져도 비용이 같고 10,000건 제한이 없음
+    #        첫 페이지에서 연 PIT 로 모든 페이지를 같은 시점 기준으로 읽고, 마지막 페이지에서 닫음
+    #        (_id 정렬은 fielddata 를 써서 폐기 예정 → PIT 의 _shard_doc 을 동점 정렬키로 사용)
+    # 입력 : in_start/in_end - 기간, in_size - 페이지 크기, in_after - 이전 응답의 next 커서, in_ticker - 종목 필터
+    # 출력 : {items: [{timestamp, uid, ticker, sn, rate, qty, buy_p, sell_p}], next: 다음 커서 또는 None}
+    # 소스 : Elasticsearch trade_esc_history
+    """
+    start, end = get_bounds(in_start, in_end)
+    size = max(1, min(in_size, HISTORY_RAW_MAX_SIZE))
+    cursor = json.loads(base64.urlsafe_b64decode(in_after.encode("ascii"))) if in_after else None
+    if cursor is not None and not (isinstance(cursor, dict) and cursor.get("pit") and cursor.get("after")):
+        raise ValueError("지원하지 않는 커서입니다. 첫 페이지부터 다시 조회하세요.")
+    pit_id = cursor["pit"] if cursor else in_es.open_point_in_time(index=HISTORY_INDEX, keep_alive=HISTORY_PIT_KEEP_ALIVE)["id"]
+    body = {
+        "size": size,
+        "query": get_history_query(start, end, in_ticker),
+        "pit": {"id": pit_id, "keep_alive": HISTORY_PIT_KEEP_ALIVE},
+        "sort": [{"timestamp": "asc"}, {"_shard_doc": "asc"}],
+        "_source": ["timestamp", "uid", "ticker", "sn", "rate", "qty", "buy_p", "sell_p"]
+    }
+    if cursor:
+        body["search_after"] = cursor["after"]
+    try:
+        res = in_es.search(body=body)   # PIT 검색은 인덱스를 지정하지 않음
+    except NotFoundError:
+        raise ValueError("커서가 만료되었습니다. 첫 페이지부터 다시 조회하세요.")
+    hits = res["hits"]["hits"]
+    pit_id = res.get("pit_id", pit_id)   # 응답마다 PIT id 가 바뀔 수 있음
+    if len(hits) < size:
+        in_es.close_point_in_time(body={"id": pit_id})
+        return {"items": [h["_source"] for h in hits], "next": None}
+    return {"items": [h["_source"] for h in hits], "next": get_cursor(pit_id, hits[-1]["sort"])}
+
+def get_history_figure_html(in_series):
+    """
+    # 설명 : get_history_figure_html - 수익률 추이 차트 (버킷 평균 선 + 5~95% 구간 띠)
+    # 입력 : in_series - get_history_series 결과
+    # 출력 : plotly HTML 조각 (plotly.js 는 CDN)
+    """
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=in_series["dates"], y=in_series["p95"], mode='lines', line=dict(width=0),
+                             hoverinfo='skip', showlegend=False))
+    fig.add_trace(go.Scatter(x=in_series["dates"], y=in_series["p5"], mode='lines', line=dict(width=0),
+                             fill='tonexty', fillcolor='rgba(99,110,250,0.15)', name='5~95%'))
+    fig.add_trace(go.Scatter(
+        x=in_series["dates"], y=in_series["rates"], mode='lines+markers' if in_series["count"] <= 200 else 'lines',
+        customdata=in_series["counts"], hovertemplate='%{x}<br>평균 %{y:.2f}%<br>%{customdata}건<extra></extra>',
+        name='수익률 추이'
+    ))
+    fig.update_layout(
+        title=f"Trade History: 전체 수익률 추이 ({in_series['interval']} 평균, {in_series['total']:,}건)",
+        xaxis_title="날짜",
+        yaxis_title="수익률 (%)",
+        height=500,
+        template="plotly_white"
+    )
+    return fig.to_html(full_html=False, include_plotlyjs='cdn')
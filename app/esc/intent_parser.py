@@ -0,0 +1,232 @@
+import re
+import time
+import threading
+
+# 매수/매도 동사 (명령형/의지형만, 공백을 지운 나머지 문장 끝에 있어야 함, "살까?" 같은 질문은 LLM 으로 넘김)
+ORDER_ENDING = r"(?:해|해줘|해주세요|해줄래|해주라|하자|할게|할께|하겠습니다|합니다|요)?"
+BUY_VERB = r"(?:매수|구매|구입)" + ORDER_ENDING + r"|사(?:줘|주세요|줄래|주라|라|자|겠습니다|겠어|께|게|요)|살(?:래|게|께)"
+SELL_VERB = r"(?:매도|매각|처분)" + ORDER_ENDING + r"|팔(?:아|아줘|아주세요|어|게|께|래|자|겠습니다)"
+# 종목/수량을 지운 나머지 = (조사/부사) + 동사 + (문장부호) 일 때만 주문으로 봄
+ORDER_FILLER = r"(?:을|를|은|는|만|좀|지금|바로)*"
+ORDER_TAIL = r"[.!~]*"
+BUY_ORDER_PATTERN = re.compile(ORDER_FILLER + r"(?:" + BUY_VERB + r")" + ORDER_TAIL)
+SELL_ORDER_PATTERN = re.compile(ORDER_FILLER + r"(?:" + SELL_VERB + r")" + ORDER_TAIL)
+
+# 확신할 수 없는 표현 (가격 조건/비율/전량/부정/질문/취소·대기·주문 관리/과거형) → LLM
+UNSURE_PATTERN = re.compile(r"원에|원\s*(?:이하|이상)|이하|이상|되면|%|퍼센트|프로|전량|전부|모두|절반|반만|말고|하지\s*마|안\s*(?:사|팔)|\?|까\s*$|얼마|추천"
+                            r"|취소|대기|주문|예약|정정|했|었|였|았|샀|됐|어제|아까|지난")
+
+# 수량: 숫자(1,000 포함) 또는 한글 수사 + "주" ("주세요/주문/주식" 등은 제외)
+QTY_SUFFIX = r"\s*주(?!세요|시|실|고|어|라|면|식|문|가|의|려)"
+DIGIT_QTY_PATTERN = re.compile(r"(\d[\d,]*)" + QTY_SUFFIX)
+KOREAN_QTY_PATTERN = re.compile(r"(?:^|\s)([일이삼사오육칠팔구십백천만영공한두세네하나둘셋넷다섯여섯일곱여덟아홉열스물무서른마흔쉰]+)" + QTY_SUFFIX)
+CODE_PATTERN = re.compile(r"(?<!\d)(\d{6})(?:\.(KS|KQ))?(?!\d)", re.IGNORECASE)
+
+SINO_DIGITS = {"영": 0, "공": 0, "일": 1, "이": 2, "삼": 3, "사": 4, "오": 5, "육": 6, "칠": 7, "팔": 8, "구": 9}
+SINO_UNITS = {"십": 10, "백": 100, "천": 1000}
+NATIVE_TENS = {"열": 10, "스물": 20, "스무": 20, "서른": 30, "마흔": 40, "쉰": 50}
+NATIVE_ONES = {"하나": 1, "한": 1, "둘": 2, "두": 2, "셋": 3, "세": 3, "넷": 4, "네": 4,
+               "다섯": 5, "여섯": 6, "일곱": 7, "여덟": 8, "아홉": 9}
+
+def get_korean_number(in_text):
+    """
+    # 설명 : get_korean_number - 한글 수사를 정수로 변환 (예: 삼십오 → 35, 천이백 → 1200, 스물두 → 22)
+    # 입력 : in_text - 한글 수사
+    # 출력 : 정수 또는 None (해석 불가)
+    """
+    # 고유어 수사 (열~쉰 + 하나~아홉)
+    for tens_word, tens in list(NATIVE_TENS.items()) + [("", 0)]:
+        if not in_text.startswith(tens_word):
+            continue
+        rest = in_text[len(tens_word):]
+        if not rest and tens:
+            return tens
+        if rest in NATIVE_ONES:
+            return tens + NATIVE_ONES[rest]
+    # 한자어 수사 (만 단위까지)
+    total, section, digit = 0, 0, None
+    for ch in in_text:
+        if ch in SINO_DIGITS:
+            if digit is not None:
+                return None
+            digit = SINO_DIGITS[ch]
+        elif ch in SINO_UNITS:
+            section += (1 if digit is None else digit) * SINO_UNITS[ch]
+            digit = None
+        elif ch == "만":
+            total += (section + (digit or 0) or 1) * 10000
+            section, digit = 0, None
+        else:
+            return None
+    value = total + section + (digit or 0)
+    return value or None
+
+class IntentParser:
+    """
+    # 설명 : IntentParser - "삼성전자 10주 매수", "005930 5주 팔아줘" 같은 단순 주문을 LLM 없이 해석
+    #        종목(이름/코드) 1개 + 수량 1개 + 문장 끝의 명령형 매수/매도 동사만 있을 때 결과를 돌려주고,
+    #        나머지는 None 을 돌려줘 기존 LLM 경로를 타게 한다.
+    # 입력 : in_loader - 종목 마스터 문서({code, name, market}) 반복자를 돌려주는 함수
+    #       in_refresh_sec - 종목명 사전 재적재 주기(초)
+    # 출력 : 파서 객체
+    # 소스 : 몽고DB mock_trading_db.stock_master
+    """
+    def __init__(self, in_loader=None, in_refresh_sec=3600):
+        self.loader = in_loader
+        self.refresh_sec = in_refresh_sec
+        self.names = {}          # 정규화된 종목명 → 티커
+        self.codes = {}          # 종목코드 → 티커 (시장 구분 접미사 결정용)
+        self.name_lengths = []   # 긴 이름 우선 탐색용 길이 목록 (내림차순)
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+        # 통계 (fast: 로컬 해석 성공, llm: LLM 호출)
+        self.fast_count = 0
+        self.fast_sec = 0.0
+        self.llm_count = 0
+        self.llm_sec = 0.0
+        self.miss_parse_sec = 0.0
+
+    @staticmethod
+    def _get_normalized(in_text):
+        return re.sub(r"\s+", "", str(in_text)).lower()
+
+    def set_names(self, in_docs):
+        """
+        # 설명 : set_names - 종목 마스터 문서로 종목명 사전 구성
+        # 입력 : in_docs - {code, name, market} 반복자
+        # 출력 : 사전 크기
+        """
+        names, codes = {}, {}
+        for doc in in_docs:
+            code, name = str(doc.get("code", "")).strip(), doc.get("name")
+            if not code or not name:
+                continue
+            suffix = ".KQ" if "KOSDAQ" in str(doc.get("market", "")).upper() else ".KS"
+            codes[code.split(".")[0]] = code if "." in code else f"{code}{suffix}"
+            key = self._get_normalized(name)
+            # 동사/수사와 겹치기 쉬운 1글자 이름은 제외
+            if len(key) >= 2:
+                names[key] = code if "." in code else f"{code}{suffix}"
+        with self._lock:
+            self.names, self.codes = names, codes
+            self.name_lengths = sorted({len(k) for k in names}, reverse=True)
+            self.loaded_at = time.time()
+        return len(names)
+
+    def _set_refresh_if_stale(self):
+        if self.loader is None or time.time() - self.loaded_at < self.refresh_sec:
+            return
+        try:
+            self.set_names(self.loader())
+        except Exception as e:
+            self.loaded_at = time.time()  # 실패해도 매 요청마다 재시도하지 않음
+            print(f"❌ 종목명 사전 적재 실패: {e}")
+
+    def _get_stock(self, in_message):
+        """ 메시지에서 종목 1개 찾기 → (티커, 메시지에서 종목 부분을 지운 나머지) 또는 None """
+        codes = {(m.group(1), (m.group(2) or "").upper()) for m in CODE_PATTERN.finditer(in_message)}
+        if len(codes) > 1:
+            return None
+        if codes:
+            code, suffix = codes.pop()
+            if suffix:
+                ticker = f"{code}.{suffix}"
+            else:
+                ticker = self.codes.get(code, f"{code}.KS")
+            return ticker, CODE_PATTERN.sub(" ", in_message)
+
+        # 종목명: 공백을 지운 메시지에서 가장 긴 이름부터 탐색, 서로 다른 종목이 2개 이상이면 포기
+        text = self._get_normalized(in_message)
+        with self._lock:
+            names, lengths = self.names, self.name_lengths
+        found, covered = {}, [False] * len(text)
+        for length in lengths:
+            for i in range(len(text) - length + 1):
+                if any(covered[i:i + length]):
+                    continue
+                ticker = names.get(text[i:i + length])
+                if ticker:
+                    found[ticker] = text[i:i + length]
+                    covered[i:i + length] = [True] * length
+        if len(found) != 1:
+            return None
+        ticker, key = found.popitem()
+        # 원문에서 종목명(공백 포함 가능)을 지워 수량 해석 시 "삼성"의 "삼" 같은 수사 오인을 막음
+        rest = re.sub(r"\s*".join(map(re.escape, key)), " ", in_message, flags=re.IGNORECASE)
+        return ticker, rest
+
+    @staticmethod
+    def _get_quantity(in_text):
+        """ 수량 1개 찾기 → (수량, 수량 부분을 지운 나머지) 또는 None """
+        found = [(int(m.group(1).replace(",", "")), m.span()) for m in DIGIT_QTY_PATTERN.finditer(in_text)]
+        found += [(get_korean_number(m.group(1)), m.span()) for m in KOREAN_QTY_PATTERN.finditer(in_text)]
+        if len(found) != 1 or not found[0][0] or found[0][0] <= 0:
+            return None
+        value, (start, end) = found[0]
+        return value, in_text[:start] + " " + in_text[end:]
+
+    def get_intent(self, in_message):
+        """
+        # 설명 : get_intent - 단순 매수/매도 명령 해석
+        # 입력 : in_message - 사용자 메시지
+        # 출력 : {side: buy/sell, ticker, quantity} 또는 None (LLM 으로 넘길 메시지)
+        """
+        start = time.perf_counter()
+        intent = self._get_intent(str(in_message or "").strip())
+        if intent is None:
+            self.miss_parse_sec += time.perf_counter() - start
+        return intent
+
+    def _get_intent(self, in_message):
+        if not in_message or len(in_message) > 60:
+            return None
+        self._set_refresh_if_stale()
+        stock = self._get_stock(in_message)
+        if stock is None:
+            return None
+        # 불확실 표현은 종목명을 지운 나머지에서 확인 ("에코프로비엠" 의 "프로" 같은 오인 방지)
+        ticker, rest = stock
+        if UNSURE_PATTERN.search(rest):
+            return None
+        found = self._get_quantity(rest)
+        if found is None:
+            return None
+        quantity, rest = found
+        # 종목/수량 외에는 명령형 매수/매도 동사만 남아야 함 (예: "매수 대기", "매수 취소해줘" 는 불일치)
+        rest = re.sub(r"\s+", "", rest)
+        is_buy, is_sell = bool(BUY_ORDER_PATTERN.fullmatch(rest)), bool(SELL_ORDER_PATTERN.fullmatch(rest))
+        if is_buy == is_sell:
+            return None
+        return {"side": "buy" if is_buy else "sell", "ticker": ticker, "quantity": quantity}
+
+    def set_record(self, in_path, in_elapsed_sec):
+        """
+        # 설명 : set_record - 처리 경로별 소요시간 기록
+        # 입력 : in_path - fast(로컬 해석 후 주문 전까지) / llm(LLM 호출), in_elapsed_sec - 소요시간(초)
+        """
+        with self._lock:
+            if in_path == "fast":
+                self.fast_count += 1
+                self.fast_sec += in_elapsed_sec
+            else:
+                self.llm_count += 1
+                self.llm_sec += in_elapsed_sec
+
+    def get_stats(self):
+        """
+        # 설명 : 로컬 해석 적중률 및 절감 시간 추정
+        #        절감시간 = 적중 건수 × 평균 LLM 호출 시간 - (적중 해석 시간 + 실패한 해석 시간)
+        """
+        with self._lock:
+            total = self.fast_count + self.llm_count
+            avg_llm = self.llm_sec / self.llm_count if self.llm_count else 0.0
+            saved = self.fast_count * avg_llm - self.fast_sec - self.miss_parse_sec
+            return {
+                "names": len(self.names),
+                "fast_hits": self.fast_count,
+                "llm_calls": self.llm_count,
+                "hit_rate": round(self.fast_count / total, 4) if total else 0.0,
+                "avg_fast_ms": round(self.fast_sec / self.fast_count * 1000, 3) if self.fast_count else 0.0,
+                "avg_llm_ms": round(avg_llm * 1000, 1),
+                "est_saved_ms": round(saved * 1000, 1) if self.llm_count else None
+            }
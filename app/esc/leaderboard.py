@@ -0,0 +1,249 @@
+import random
+import threading
+
+class IndexableSkipList:
+    """
+    # 설명 : IndexableSkipList - 순위(rank) 조회가 가능한 스킵리스트 (각 링크에 건너뛰는 노드 수 저장)
+    #        삽입/삭제/순위 조회/순위로 조회 모두 평균 O(log n)
+    # 입력 : in_max_level - 최대 레벨, in_seed - 난수 시드
+    # 출력 : 스킵리스트 객체 (키는 비교 가능한 값, 중복 불가)
+    """
+    def __init__(self, in_max_level=32, in_seed=None):
+        self.max_level = in_max_level
+        self._rnd = random.Random(in_seed)
+        # 노드: [key, next 리스트, width 리스트]
+        self.head = [None, [None] * in_max_level, [0] * in_max_level]
+        self.level = 1
+        self.size = 0
+
+    def _get_random_level(self):
+        level = 1
+        while level < self.max_level and self._rnd.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, in_key):
+        """
+        # 설명 : 키 삽입
+        """
+        update = [None] * self.max_level
+        rank = [0] * self.max_level
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            rank[i] = rank[i + 1] if i + 1 < self.level else 0
+            while node[1][i] is not None and node[1][i][0] < in_key:
+                rank[i] += node[2][i]
+                node = node[1][i]
+            update[i] = node
+        level = self._get_random_level()
+        if level > self.level:
+            # 새로 쓰는 상위 레벨은 head 가 끝(전체 길이)까지 건너뛰는 상태
+            for i in range(self.level, level):
+                rank[i] = 0
+                update[i] = self.head
+                self.head[2][i] = self.size
+            self.level = level
+        new = [in_key, [None] * level, [0] * level]
+        for i in range(level):
+            new[1][i] = update[i][1][i]
+            update[i][1][i] = new
+            # 새 노드 앞뒤로 width 분할
+            new[2][i] = update[i][2][i] - (rank[0] - rank[i])
+            update[i][2][i] = rank[0] - rank[i] + 1
+        for i in range(level, self.level):
+            update[i][2][i] += 1
+        self.size += 1
+
+    def remove(self, in_key):
+        """
+        # 설명 : 키 삭제
+        # 출력 : 삭제 여부
+        """
+        update = [None] * self.max_level
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            while node[1][i] is not None and node[1][i][0] < in_key:
+                node = node[1][i]
+            update[i] = node
+        target = node[1][0]
+        if target is None or target[0] != in_key:
+            return False
+        for i in range(self.level):
+            if update[i][1][i] is target:
+                update[i][2][i] += target[2][i] - 1
+                update[i][1][i] = target[1][i]
+            else:
+                update[i][2][i] -= 1
+        while self.level > 1 and self.head[1][self.level - 1] is None:
+            self.level -= 1
+        self.size -= 1
+        return True
+
+    def get_rank(self, in_key):
+        """
+        # 설명 : 키의 0부터 시작하는 순위
+        # 출력 : 순위 또는 None (없는 키)
+        """
+        node = self.head
+        rank = 0
+        for i in range(self.level - 1, -1, -1):
+            while node[1][i] is not None and node[1][i][0] <= in_key:
+                rank += node[2][i]
+                node = node[1][i]
+            if node is not self.head and node[0] == in_key:
+                return rank - 1
+        return None
+
+    def get_range(self, in_start, in_count):
+        """
+        # 설명 : 순위 in_start(0부터)부터 in_count 개 키 조회
+        # 출력 : 키 리스트
+        """
+        if in_start < 0 or in_start >= self.size or in_count <= 0:
+            return []
+        node = self.head
+        remaining = in_start + 1
+        for i in range(self.level - 1, -1, -1):
+            while node[1][i] is not None and node[2][i] <= remaining:
+                remaining -= node[2][i]
+                node = node[1][i]
+        out = []
+        while node is not None and len(out) < in_count:
+            out.append(node[0])
+            node = node[1][0]
+        return out
+
+    def __len__(self):
+        return self.size
+
+class Leaderboard:
+    """
+    # 설명 : Leaderboard - 사용자별 총 평가손익 순위표 (주문/시세 이벤트로 증분 갱신)
+    #        평가손익 = Σ(매도금액 - 매수금액) + Σ(보유수량 × 현재가)  ← ES 랭킹 스크립트와 같은 식
+    #        시세 변경 시 해당 종목 보유자 점수만 갱신하고, 스킵리스트 재정렬은 조회 시점에 몰아서 수행
+    #        (시세가 초당 수백 건 들어와도 조회 사이에 바뀐 사용자만 1번씩 O(log n) 재정렬)
+    # 입력 : None
+    # 출력 : 순위표 객체
+    """
+    def __init__(self):
+        self._list = IndexableSkipList()
+        self._lock = threading.Lock()
+        self.scores = {}      # user_id → 평가손익
+        self.positions = {}   # user_id → {code: [보유수량, 순현금흐름(매도-매수)]}
+        self.holders = {}     # code → {user_id}
+        self.prices = {}      # code → 현재가
+        self._ranked = {}     # user_id → 스킵리스트에 반영된 평가손익
+        self._dirty = set()   # 점수가 바뀌었지만 아직 재정렬하지 않은 user_id
+
+    def _set_score(self, in_userId, in_score):
+        self.scores[in_userId] = in_score
+        self._dirty.add(in_userId)
+
+    def _set_flush(self):
+        """ 점수가 바뀐 사용자만 스킵리스트에서 재정렬 (lock 보유 상태에서 호출) """
+        for user_id in self._dirty:
+            old, new = self._ranked.get(user_id), self.scores[user_id]
+            if old == new:
+                continue
+            if old is not None:
+                self._list.remove((-old, user_id))
+            self._list.insert((-new, user_id))
+            self._ranked[user_id] = new
+        self._dirty.clear()
+
+    def _get_user_score(self, in_userId):
+        return sum(cash + qty * self.prices.get(code, 0.0)
+                   for code, (qty, cash) in self.positions.get(in_userId, {}).items())
+
+    def set_rebuild(self, in_summaries, in_prices):
+        """
+        # 설명 : set_rebuild - trade_summary_esc 문서와 종목 현재가로 전체 재구성 (서버 시작 시)
+        # 입력 : in_summaries - {user_id, code, total_buy_qty, total_buy_amt, total_sell_qty, total_sell_amt} 반복자
+        #       in_prices - {code: 현재가}
+        # 출력 : 사용자 수
+        """
+        with self._lock:
+            self._list = IndexableSkipList()
+            self.scores, self.positions, self.holders = {}, {}, {}
+            self._ranked, self._dirty = {}, set()
+            self.prices = {k: float(v or 0) for k, v in in_prices.items()}
+            for doc in in_summaries:
+                user_id, code = doc["user_id"], doc["code"]
+                qty = doc.get("total_buy_qty", 0) - doc.get("total_sell_qty", 0)
+                cash = doc.get("total_sell_amt", 0) - doc.get("total_buy_amt", 0)
+                self.positions.setdefault(user_id, {})[code] = [qty, cash]
+                if qty:
+                    self.holders.setdefault(code, set()).add(user_id)
+            for user_id in self.positions:
+                self._set_score(user_id, self._get_user_score(user_id))
+            self._set_flush()
+            return len(self.scores)
+
+    def on_trade(self, in_userId, in_code, in_side, in_quantity, in_price):
+        """
+        # 설명 : on_trade - 체결 1건 반영 (해당 유저만 재정렬)
+        # 입력 : in_userId-사용자id, in_code-종목코드, in_side-buy/sell, in_quantity-수량, in_price-체결가
+        """
+        with self._lock:
+            if in_code not in self.prices:
+                self.prices[in_code] = float(in_price)
+            pos = self.positions.setdefault(in_userId, {}).setdefault(in_code, [0, 0.0])
+            sign = 1 if in_side == "buy" else -1
+            pos[0] += sign * in_quantity
+            pos[1] -= sign * in_quantity * in_price
+            if pos[0]:
+                self.holders.setdefault(in_code, set()).add(in_userId)
+            else:
+                self.holders.get(in_code, set()).discard(in_userId)
+            # 보유가치 변화(현재가 기준)와 현금흐름 변화를 합산
+            delta = sign * in_quantity * (self.prices[in_code] - in_price)
+            self._set_score(in_userId, self.scores.get(in_userId, 0.0) + delta)
+
+    def on_price(self, in_code, in_price):
+        """
+        # 설명 : on_price - 종목 현재가 변경 반영 (보유자만 재정렬)
+        # 입력 : in_code-종목코드, in_price-현재가
+        """
+        with self._lock:
+            old = self.prices.get(in_code, 0.0)
+            self.prices[in_code] = float(in_price)
+            diff = float(in_price) - old
+            if not diff:
+                return
+            for user_id in self.holders.get(in_code, ()):
+                qty = self.positions[user_id][in_code][0]
+                self._set_score(user_id, self.scores[user_id] + qty * diff)
+
+    def get_top(self, in_n=10):
+        """
+        # 설명 : 상위 N 명 [{rank, user_id, total_profit}]
+        """
+        with self._lock:
+            self._set_flush()
+            return [{"rank": i + 1, "user_id": u, "total_profit": -s}
+                    for i, (s, u) in enumerate(self._list.get_range(0, in_n))]
+
+    def get_rank(self, in_userId):
+        """
+        # 설명 : 사용자 순위 (1부터), 없으면 None
+        """
+        with self._lock:
+            self._set_flush()
+            score = self.scores.get(in_userId)
+            if score is None:
+                return None
+            return {"rank": self._list.get_rank((-score, in_userId)) + 1, "user_id": in_userId,
+                    "total_profit": score, "total_users": len(self._list)}
+
+    def get_around(self, in_rank, in_radius=5):
+        """
+        # 설명 : 순위 in_rank(1부터) 앞뒤 in_radius 명
+        """
+        with self._lock:
+            self._set_flush()
+            start = max(0, in_rank - 1 - in_radius)
+            keys = self._list.get_range(start, in_radius * 2 + 1)
+            return [{"rank": start + i + 1, "user_id": u, "total_profit": -s} for i, (s, u) in enumerate(keys)]
+
+    def __len__(self):
+        return len(self.scores)
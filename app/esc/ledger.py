@@ -0,0 +1,292 @@
+import argparse
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# 이벤트 구분 (open: 계좌 기준 상태, buy/sell: 체결, order/cancel: 대기주문 접수/취소 - 상태 변화 없음)
+STATE_EVENT_TYPES = ("open", "buy", "sell")
+AUDIT_EVENT_TYPES = ("order", "cancel")
+CASH_TOLERANCE = 0.5   # 예수금 비교 허용 오차(원) - 부동소수 누적 오차
+
+def get_applied_state(in_state, in_event):
+    """
+    # 설명 : get_applied_state - 상태에 이벤트 1건 적용 (users_esc 갱신식과 같은 계산)
+    # 입력 : in_state - {seq, ts, cash_esc, portfolio}, in_event - 원장 이벤트
+    # 출력 : 같은 상태 객체 (제자리 갱신)
+    """
+    etype = in_event["type"]
+    if etype == "open":
+        in_state["cash_esc"] = in_event["cash_esc"]
+        in_state["portfolio"] = {k: dict(v) for k, v in (in_event.get("portfolio") or {}).items()}
+    elif etype in ("buy", "sell"):
+        db_ticker = in_event["ticker"].replace(".", "_")
+        amount = in_event["price"] * in_event["quantity"]
+        stock = in_state["portfolio"].get(db_ticker, {"qty": 0, "avg_price": 0})
+        if etype == "buy":
+            in_state["cash_esc"] -= amount
+            in_state["portfolio"][db_ticker] = {"qty": stock["qty"] + in_event["quantity"],
+                                                "avg_price": in_event["avg_price"]}
+        else:
+            in_state["cash_esc"] += amount
+            qty = stock["qty"] - in_event["quantity"]
+            if qty > 0:
+                in_state["portfolio"][db_ticker] = {"qty": qty, "avg_price": stock["avg_price"]}
+            else:
+                in_state["portfolio"].pop(db_ticker, None)
+    in_state["seq"] = in_event["seq"]
+    in_state["ts"] = in_event["ts"]
+    in_state["recorded_at"] = in_event.get("recorded_at", in_event["ts"])
+    return in_state
+
+def get_state_diff(in_state, in_user):
+    """
+    # 설명 : get_state_diff - 원장 재생 상태와 users_esc 문서 비교
+    # 입력 : in_state - 재생 상태, in_user - users_esc 문서
+    # 출력 : 차이 목록 (같으면 빈 리스트)
+    """
+    diffs = []
+    if abs(in_state["cash_esc"] - in_user.get("cash_esc", 0)) > CASH_TOLERANCE:
+        diffs.append({"field": "cash_esc", "ledger": in_state["cash_esc"], "users_esc": in_user.get("cash_esc")})
+    ledger_pf, user_pf = in_state["portfolio"], in_user.get("portfolio") or {}
+    for db_ticker in sorted(set(ledger_pf) | set(user_pf)):
+        a, b = ledger_pf.get(db_ticker), user_pf.get(db_ticker)
+        if (a or {}).get("qty", 0) != (b or {}).get("qty", 0) or \
+                round((a or {}).get("avg_price", 0)) != round((b or {}).get("avg_price", 0)):
+            diffs.append({"field": f"portfolio.{db_ticker}", "ledger": a, "users_esc": b})
+    return diffs
+
+class PortfolioLedger:
+    """
+    # 설명 : PortfolioLedger - 사용자별 주문/체결 이벤트 원장(추가 전용) + 주기적 스냅샷
+    #        이벤트 순번(seq)은 users_esc.ledger_seq 를 잔액/보유수량 갱신과 같은 원자적 update 에서
+    #        $inc 해 부여하므로 원장 순서 = 실제 상태 변경 순서
+    #        상태 복원 = 가장 가까운 이전 스냅샷 + 그 이후 이벤트 (최대 in_snapshot_every 건 재생)
+    #        ts 는 모의투자 시계 기준 발생시각(리플레이 중이면 과거 시각), recorded_at 은 실제 기록시각
+    #        → 시점 복원은 recorded_at 기준 (리플레이 체결이 과거 ts 로 끼어들어도 순번 순서가 깨지지 않음)
+    #        잔액/보유수량의 기준은 여전히 users_esc 이고 원장은 같은 순번으로 뒤따라 기록되는 감사 로그
+    # 입력 : in_events - 이벤트 컬렉션, in_snapshots - 스냅샷 컬렉션, in_users - users_esc 컬렉션
+    #       in_snapshot_every - 스냅샷 주기(이벤트 건수)
+    # 출력 : 원장 객체
+    # 소스 : 몽고DB ykpark.ledger_events_esc, ykpark.ledger_snapshots_esc, ykpark.users_esc
+    """
+    def __init__(self, in_events, in_snapshots, in_users, in_snapshot_every=200):
+        self.events = in_events
+        self.snapshots = in_snapshots
+        self.users = in_users
+        self.snapshot_every = max(1, int(in_snapshot_every))
+
+    def set_indexes(self):
+        """
+        # 설명 : 원장/스냅샷 컬렉션 인덱스 생성 ((user_id, seq) 유니크 → 같은 순번 중복 기록 방지)
+        """
+        self.events.create_index([("user_id", ASCENDING), ("seq", ASCENDING)], unique=True)
+        self.events.create_index([("user_id", ASCENDING), ("ts", ASCENDING)])
+        self.events.create_index([("user_id", ASCENDING), ("recorded_at", ASCENDING)])
+        self.snapshots.create_index([("user_id", ASCENDING), ("seq", ASCENDING)], unique=True)
+        self.snapshots.create_index([("user_id", ASCENDING), ("ts", ASCENDING)])
+
+    def set_open(self, in_userId, in_ts=None, in_projection=None):
+        """
+        # 설명 : set_open - 원장이 없는 사용자의 현재 상태를 기준 이벤트(seq 0)로 기록 (최초 1회)
+        #        신규 계좌는 초기 예수금, 원장 도입 이전 계좌는 그 시점의 예수금/보유종목이 기준
+        # 입력 : in_userId - 사용자id, in_ts - 기록시각, in_projection - 반환 문서 projection
+        # 출력 : ledger_seq 가 설정된 유저 문서 또는 None (다른 요청이 먼저 기록한 경우)
+        """
+        user = self.users.find_one_and_update(
+            {"user_id": in_userId, "ledger_seq": {"$exists": False}},
+            {"$set": {"ledger_seq": 0}},
+            projection=in_projection,
+            return_document=ReturnDocument.AFTER
+        )
+        if user:
+            self.set_append(in_userId, 0, "open", in_ts, cash_esc=user.get("cash_esc", 0),
+                            portfolio=user.get("portfolio") or {})
+        return user
+
+    def set_append(self, in_userId, in_seq, in_type, in_ts=None, **in_fields):
+        """
+        # 설명 : set_append - 이벤트 1건 기록, 스냅샷 주기가 되면 스냅샷 저장
+        # 입력 : in_userId - 사용자id, in_seq - 순번(users_esc.ledger_seq), in_type - 이벤트 구분
+        #       in_ts - 발생시각(모의투자 시계), in_fields - ticker, quantity, price, avg_price, order_id 등
+        # 출력 : 기록 여부
+        """
+        now = datetime.now()
+        event = {"user_id": in_userId, "seq": int(in_seq), "type": in_type, "ts": in_ts or now, "recorded_at": now}
+        event.update(in_fields)
+        try:
+            self.events.insert_one(event)
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            print(f"❌ 원장 기록 실패 ({in_userId}, seq {in_seq}): {e}")
+            return False
+        if in_seq and in_seq % self.snapshot_every == 0:
+            try:
+                self.set_snapshot(in_userId, in_seq)
+            except Exception as e:
+                print(f"❌ 원장 스냅샷 실패 ({in_userId}, seq {in_seq}): {e}")
+        return True
+
+    def set_audit(self, in_userId, in_type, in_ts=None, **in_fields):
+        """
+        # 설명 : set_audit - 상태를 바꾸지 않는 이벤트(대기주문 접수/취소) 기록 (순번만 발급)
+        # 입력 : in_userId - 사용자id, in_type - order/cancel, in_ts - 발생시각, in_fields - 주문 정보
+        # 출력 : 기록 여부
+        """
+        user = self.users.find_one_and_update(
+            {"user_id": in_userId, "ledger_seq": {"$exists": True}},
+            {"$inc": {"ledger_seq": 1}},
+            projection={"_id": 0, "ledger_seq": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not user:
+            return False
+        return self.set_append(in_userId, user["ledger_seq"], in_type, in_ts, **in_fields)
+
+    def set_snapshot(self, in_userId, in_seq=None):
+        """
+        # 설명 : set_snapshot - in_seq 시점 상태를 스냅샷으로 저장
+        # 입력 : in_userId - 사용자id, in_seq - 순번 (없으면 마지막 이벤트)
+        # 출력 : 저장한 상태 또는 None (이벤트 없음)
+        """
+        state = self.get_state(in_userId, in_seq=in_seq)
+        if state is None:
+            return None
+        self.snapshots.update_one(
+            {"user_id": in_userId, "seq": state["seq"]},
+            {"$setOnInsert": {"ts": state["ts"], "recorded_at": state["recorded_at"], "cash_esc": state["cash_esc"],
+                              "portfolio": state["portfolio"]}},
+            upsert=True
+        )
+        return state
+
+    def get_state(self, in_userId, in_at=None, in_seq=None, in_use_snapshot=True):
+        """
+        # 설명 : get_state - 현재 또는 특정 시점의 예수금/보유종목 복원
+        # 입력 : in_userId - 사용자id, in_at - 기준 실제시각(이때까지 기록된 이벤트), in_seq - 기준순번(이하까지)
+        #       in_use_snapshot - False 면 처음부터 전체 재생 (검증용)
+        # 출력 : {user_id, seq, ts, recorded_at, cash_esc, portfolio, replayed} 또는 None (원장 없음)
+        """
+        if in_at is not None:
+            # 기준시각까지 기록된 마지막 순번으로 환산 (recorded_at 도입 이전 이벤트는 ts 로 판단)
+            head = self.events.find_one(
+                {"user_id": in_userId, "$or": [{"recorded_at": {"$lte": in_at}},
+                                               {"recorded_at": {"$exists": False}, "ts": {"$lte": in_at}}]},
+                {"_id": 0, "seq": 1}, sort=[("seq", DESCENDING)])
+            if head is None:
+                return None
+            in_seq = head["seq"] if in_seq is None else min(int(in_seq), head["seq"])
+        cond = {"user_id": in_userId}
+        if in_seq is not None:
+            cond["seq"] = {"$lte": int(in_seq)}
+
+        state = {"user_id": in_userId, "seq": -1, "ts": None, "recorded_at": None, "cash_esc": 0, "portfolio": {}}
+        if in_use_snapshot:
+            snap = self.snapshots.find_one(cond, {"_id": 0}, sort=[("seq", DESCENDING)])
+            if snap:
+                state.update(snap)
+
+        event_cond = dict(cond)
+        event_cond["seq"] = {**cond.get("seq", {}), "$gt": state["seq"]}
+        event_cond["type"] = {"$in": list(STATE_EVENT_TYPES)}
+        replayed = 0
+        for event in self.events.find(event_cond, {"_id": 0}).sort("seq", ASCENDING):
+            get_applied_state(state, event)
+            replayed += 1
+        if state["seq"] < 0:
+            return None
+        state["replayed"] = replayed
+        return state
+
+    def get_events(self, in_userId, in_after_seq=-1, in_limit=100):
+        """
+        # 설명 : get_events - 사용자 이벤트 목록 (순번 오름차순)
+        # 입력 : in_userId - 사용자id, in_after_seq - 이 순번 이후부터, in_limit - 최대 건수
+        # 출력 : 이벤트 리스트
+        """
+        cursor = self.events.find({"user_id": in_userId, "seq": {"$gt": in_after_seq}}, {"_id": 0})
+        return list(cursor.sort("seq", ASCENDING).limit(in_limit))
+
+    def get_verify(self, in_userId=None):
+        """
+        # 설명 : get_verify - 원장을 처음부터 재생해 users_esc 와 비교
+        #        (1) 순번 누락/중복  (2) 마지막 순번 = users_esc.ledger_seq
+        #        (3) 전체 재생 상태 = 스냅샷 기반 상태  (4) 재생 상태 = users_esc 예수금/보유종목
+        # 입력 : in_userId - 사용자id (없으면 원장이 있는 전체 사용자)
+        # 출력 : {checked, ok, missing_ledger, mismatches: [{user_id, reason, ...}]}
+        """
+        cond = {"ledger_seq": {"$exists": True}}
+        if in_userId:
+            cond["user_id"] = in_userId
+        result = {"checked": 0, "ok": 0, "missing_ledger": 0, "mismatches": []}
+        result["missing_ledger"] = self.users.count_documents(
+            {"ledger_seq": {"$exists": False}, **({"user_id": in_userId} if in_userId else {})})
+
+        for user in self.users.find(cond, {"history": 0}):
+            user_id = user["user_id"]
+            result["checked"] += 1
+            problems = []
+
+            # 1) 전체 재생 (순번 연속성 확인 겸용)
+            state = {"user_id": user_id, "seq": -1, "ts": None, "recorded_at": None, "cash_esc": 0, "portfolio": {}}
+            expected, gaps = 0, []
+            for event in self.events.find({"user_id": user_id}, {"_id": 0}).sort("seq", ASCENDING):
+                if event["seq"] != expected:
+                    gaps.append([expected, event["seq"] - 1])
+                expected = event["seq"] + 1
+                if event["type"] in STATE_EVENT_TYPES:
+                    get_applied_state(state, event)
+                else:
+                    state["seq"] = event["seq"]
+            if gaps:
+                problems.append({"reason": "seq_gap", "gaps": gaps[:20]})
+            if expected - 1 != user.get("ledger_seq"):
+                problems.append({"reason": "seq_head", "ledger": expected - 1, "users_esc": user.get("ledger_seq")})
+
+            # 2) 스냅샷 경로와 전체 재생 비교
+            snap_state = self.get_state(user_id)
+            if snap_state is not None and get_state_diff(snap_state, state):
+                problems.append({"reason": "snapshot", "diffs": get_state_diff(snap_state, state)})
+
+            # 3) users_esc 와 비교
+            diffs = get_state_diff(state, user)
+            if diffs:
+                problems.append({"reason": "state", "diffs": diffs})
+
+            if problems:
+                result["mismatches"].append({"user_id": user_id, "problems": problems})
+            else:
+                result["ok"] += 1
+        return result
+
+if __name__ == "__main__":
+    # 실행 예) cd app && python -m esc.ledger --verify
+    #         cd app && python -m esc.ledger --state user01 --at "2025-03-05 13:00:00"
+    from pymongo import MongoClient
+    from cmm.config import MONGO_URI
+
+    parser = argparse.ArgumentParser(description="모의투자 원장 검증/조회")
+    parser.add_argument("--verify", action="store_true", help="원장 전체 재생 후 users_esc 와 비교")
+    parser.add_argument("--user", default=None, help="대상 사용자id (없으면 전체)")
+    parser.add_argument("--state", default=None, help="사용자id 의 상태 복원")
+    parser.add_argument("--at", default=None, help="복원 기준 실제시각 (YYYY-MM-DD HH:MM:SS)")
+    parser.add_argument("--snapshot-all", action="store_true", help="전체 사용자 현재 상태 스냅샷 저장")
+    args = parser.parse_args()
+
+    db = MongoClient(MONGO_URI).ykpark
+    ledger = PortfolioLedger(db.ledger_events_esc, db.ledger_snapshots_esc, db.users_esc)
+    ledger.set_indexes()
+
+    if args.state:
+        at = datetime.strptime(args.at, "%Y-%m-%d %H:%M:%S") if args.at else None
+        print(ledger.get_state(args.state, in_at=at))
+    if args.snapshot_all:
+        count = sum(1 for u in db.users_esc.find({"ledger_seq": {"$exists": True}}, {"user_id": 1})
+                    if ledger.set_snapshot(u["user_id"]))
+        print(f"✅ 스냅샷 {count}건 저장")
+    if args.verify:
+        report = ledger.get_verify(args.user)
+        for item in report["mismatches"]:
+            print(f"❌ {item['user_id']}: {item['problems']}")
+        print(f"✅ 검증 {report['checked']}명 / 일치 {report['ok']}명 / 불일치 {len(report['mismatches'])}명 "
+              f"/ 원장 없음 {report['missing_ledger']}명")
@@ -0,0 +1,245 @@
+import asyncio
+import threading
+
+class LiveValuationHub:
+    """
+    # 설명 : LiveValuationHub - 구독 중인 사용자에게 평가금액/순위 변화를 푸시 (SSE)
+    #        시세는 공용 QuoteService 폴러가 종목당 1번 받아 on_quote 로 전달하고,
+    #        허브는 그 종목을 가진 구독자의 평가금액만 증분 갱신한 뒤 in_flush_sec 마다 바뀐 사용자에게만 전송
+    #        → 외부 시세 조회 비용은 구독자 수가 아니라 구독자 보유 종목 수(중복 제거)에 비례
+    # 입력 : in_leaderboard - 순위표 (get_rank/get_top), in_price_source - ticker → 최근 시세 함수
+    #       in_queue_size - 구독자별 대기 이벤트 최대 수 (넘치면 비우고 전체 스냅샷 재전송)
+    # 출력 : 허브 객체
+    """
+    def __init__(self, in_leaderboard=None, in_price_source=None, in_queue_size=100):
+        self.leaderboard = in_leaderboard
+        self.price_source = in_price_source
+        self.queue_size = in_queue_size
+        self._lock = threading.Lock()
+        self._subs = {}           # user_id → [(loop, queue)]
+        self._holdings = {}       # user_id → {ticker: [수량, 평균단가]}
+        self._cash = {}           # user_id → 예수금
+        self._values = {}         # user_id → 보유주식 평가금액 (증분 갱신)
+        self._ticker_users = {}   # ticker → {user_id} (구독자 보유 종목 역색인)
+        self._prices = {}         # ticker → 허브가 반영한 시세
+        self._dirty = {}          # user_id → {시세가 바뀐 ticker}
+        self._last_rank = {}      # user_id → 마지막으로 보낸 순위
+        self._last_top = None
+        self.quote_count = 0
+        self.push_count = 0
+
+    @staticmethod
+    def _get_ticker(in_db_ticker):
+        # users_esc.portfolio 키(005930_KS) → 티커(005930.KS)
+        return in_db_ticker.replace("_", ".")
+
+    def _get_price(self, in_ticker, in_fallback):
+        price = self._prices.get(in_ticker)
+        if price is None and self.price_source is not None:
+            price = self.price_source(in_ticker)
+        return float(price) if price else float(in_fallback or 0)
+
+    def _set_holdings(self, in_userId, in_portfolio, in_cash):
+        """ 구독자 보유종목 교체 (lock 보유 상태에서 호출) """
+        for ticker in self._holdings.get(in_userId, {}):
+            users = self._ticker_users.get(ticker)
+            if users is not None:
+                users.discard(in_userId)
+                if not users:
+                    self._ticker_users.pop(ticker, None)
+        holdings, value = {}, 0.0
+        for db_ticker, stock in (in_portfolio or {}).items():
+            ticker = self._get_ticker(db_ticker)
+            qty, avg = stock.get("qty", 0), stock.get("avg_price", 0)
+            if not qty:
+                continue
+            holdings[ticker] = [qty, avg]
+            price = self._get_price(ticker, avg)
+            self._prices.setdefault(ticker, price)
+            value += qty * self._prices[ticker]
+            self._ticker_users.setdefault(ticker, set()).add(in_userId)
+        self._holdings[in_userId] = holdings
+        self._cash[in_userId] = float(in_cash or 0)
+        self._values[in_userId] = value
+
+    def set_subscribe(self, in_userId, in_portfolio, in_cash, in_loop):
+        """
+        # 설명 : set_subscribe - 구독 등록 (같은 사용자가 여러 창을 열어도 보유종목은 1벌만 관리)
+        # 입력 : in_userId - 사용자id, in_portfolio - users_esc.portfolio, in_cash - 예수금, in_loop - 이벤트 루프
+        # 출력 : asyncio.Queue (이벤트 dict 수신)
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if in_userId not in self._subs:
+                self._set_holdings(in_userId, in_portfolio, in_cash)
+            self._subs.setdefault(in_userId, []).append((in_loop, queue))
+        return queue
+
+    def set_unsubscribe(self, in_userId, in_queue):
+        """
+        # 설명 : set_unsubscribe - 구독 해제 (마지막 구독이면 보유종목 역색인에서도 제거)
+        """
+        with self._lock:
+            subs = [s for s in self._subs.get(in_userId, []) if s[1] is not in_queue]
+            if subs:
+                self._subs[in_userId] = subs
+                return
+            self._subs.pop(in_userId, None)
+            self._set_holdings(in_userId, {}, 0)
+            for store in (self._holdings, self._cash, self._values, self._dirty, self._last_rank):
+                store.pop(in_userId, None)
+
+    def set_portfolio(self, in_userId, in_portfolio, in_cash):
+        """
+        # 설명 : set_portfolio - 체결로 바뀐 보유종목/예수금 반영 (구독 중인 사용자만)
+        """
+        with self._lock:
+            if in_userId not in self._subs:
+                return
+            self._set_holdings(in_userId, in_portfolio, in_cash)
+            self._dirty.setdefault(in_userId, set()).update(self._holdings[in_userId])
+
+    def on_quote(self, in_ticker, in_price):
+        """
+        # 설명 : on_quote - QuoteService 시세 콜백 (해당 종목을 가진 구독자 평가금액만 증분 갱신)
+        # 입력 : in_ticker - 티커, in_price - 현재가
+        """
+        with self._lock:
+            self.quote_count += 1
+            users = self._ticker_users.get(in_ticker)
+            if not users:
+                return
+            old = self._prices.get(in_ticker, in_price)
+            self._prices[in_ticker] = float(in_price)
+            diff = float(in_price) - old
+            if not diff:
+                return
+            for user_id in users:
+                self._values[user_id] += self._holdings[user_id][in_ticker][0] * diff
+                self._dirty.setdefault(user_id, set()).add(in_ticker)
+
+    def set_reprice(self, in_tickers):
+        """
+        # 설명 : set_reprice - 허브가 반영한 시세를 버리고 가격 공급 함수 기준으로 평가금액 재계산
+        #        (리플레이 종료 후 과거 시세로 남은 평가금액을 되돌림, 바뀐 구독자는 다음 전송에 포함)
+        # 입력 : in_tickers - 티커 리스트
+        """
+        with self._lock:
+            users = set()
+            for ticker in in_tickers:
+                self._prices.pop(ticker, None)
+                users.update(self._ticker_users.get(ticker, ()))
+            for user_id in users:
+                holdings = self._holdings[user_id]
+                for ticker, (_, avg) in holdings.items():
+                    self._prices.setdefault(ticker, self._get_price(ticker, avg))
+                self._values[user_id] = sum(q * self._prices[t] for t, (q, _) in holdings.items())
+                self._dirty.setdefault(user_id, set()).update(holdings)
+
+    def get_watch_tickers(self):
+        """
+        # 설명 : 구독자 보유 종목 (QuoteService 폴링 대상)
+        """
+        with self._lock:
+            return list(self._ticker_users)
+
+    def _get_position(self, in_ticker, in_qty, in_avg):
+        price = self._prices.get(in_ticker, in_avg)
+        profit = (price - in_avg) * in_qty
+        return {"ticker": in_ticker, "qty": in_qty, "avg_price": in_avg, "price": price,
+                "value": round(price * in_qty), "profit": round(profit),
+                "rate": round((price - in_avg) / in_avg * 100, 2) if in_avg else 0.0}
+
+    def _get_totals(self, in_userId):
+        holdings = self._holdings.get(in_userId, {})
+        cost = sum(q * a for q, a in holdings.values())
+        value = self._values.get(in_userId, 0.0)
+        return {"cash": round(self._cash.get(in_userId, 0.0)), "stock_value": round(value),
+                "total_value": round(self._cash.get(in_userId, 0.0) + value), "total_profit": round(value - cost)}
+
+    def _get_rank(self, in_userId):
+        if self.leaderboard is None:
+            return None
+        info = self.leaderboard.get_rank(in_userId)
+        return {"rank": info["rank"], "total_users": info["total_users"]} if info else None
+
+    def get_snapshot(self, in_userId):
+        """
+        # 설명 : get_snapshot - 구독 직후/재동기화용 전체 평가 현황
+        # 출력 : {type: snapshot, positions, cash, stock_value, total_value, total_profit, rank, top1}
+        """
+        with self._lock:
+            positions = [self._get_position(t, q, a) for t, (q, a) in self._holdings.get(in_userId, {}).items()]
+            event = {"type": "snapshot", "user_id": in_userId, "positions": positions, **self._get_totals(in_userId)}
+        event["rank"] = self._get_rank(in_userId)
+        top = self.leaderboard.get_top(1) if self.leaderboard is not None else []
+        event["top1"] = top[0] if top else None
+        return event
+
+    def _set_push(self, in_userId, in_event):
+        """ 구독자 큐에 이벤트 전달 (각 구독의 이벤트 루프 스레드에서 실행) """
+        with self._lock:
+            subs = list(self._subs.get(in_userId, []))
+        for loop, queue in subs:
+            loop.call_soon_threadsafe(self._set_put, in_userId, queue, in_event)
+
+    def _set_put(self, in_userId, in_queue, in_event):
+        if in_queue.full():
+            # 느린 구독자: 밀린 증분은 버리고 전체 스냅샷 1건으로 대체
+            while not in_queue.empty():
+                in_queue.get_nowait()
+            in_event = self.get_snapshot(in_userId)
+        in_queue.put_nowait(in_event)
+        self.push_count += 1
+
+    def set_flush(self):
+        """
+        # 설명 : set_flush - 바뀐 구독자에게 증분 평가(바뀐 종목 + 합계)와 순위 변화, 1위 변경을 전송
+        # 출력 : 전송한 사용자 수
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            events = {}
+            for user_id, tickers in dirty.items():
+                holdings = self._holdings.get(user_id, {})
+                positions = [self._get_position(t, *holdings[t]) for t in tickers if t in holdings]
+                events[user_id] = {"type": "valuation", "user_id": user_id, "positions": positions,
+                                   **self._get_totals(user_id)}
+            subscribers = list(self._subs)
+
+        # 순위는 다른 사용자 때문에도 바뀌므로 구독자 전체를 확인 (메모리 순위표 조회 O(log n), 외부 조회 없음)
+        for user_id in subscribers:
+            rank = self._get_rank(user_id)
+            if rank != self._last_rank.get(user_id):
+                self._last_rank[user_id] = rank
+                events.setdefault(user_id, {"type": "rank", "user_id": user_id})["rank"] = rank
+        for user_id, event in events.items():
+            self._set_push(user_id, event)
+
+        top = self.leaderboard.get_top(1) if self.leaderboard is not None else []
+        top = top[0] if top else None
+        if top and (self._last_top is None or top["user_id"] != self._last_top["user_id"]
+                    or round(top["total_profit"]) != round(self._last_top["total_profit"])):
+            self._last_top = top
+            for user_id in subscribers:
+                self._set_push(user_id, {"type": "top1", **top})
+        return len(events)
+
+    async def run_flusher(self, in_interval_sec=1.0):
+        """
+        # 설명 : 백그라운드 전송 루프 (시세가 아무리 자주 들어와도 구독자당 in_interval_sec 에 최대 1건)
+        """
+        while True:
+            try:
+                self.set_flush()
+            except Exception as e:
+                print(f"❌ 실시간 평가 전송 실패: {e}")
+            await asyncio.sleep(in_interval_sec)
+
+    def get_stats(self):
+        """
+        # 설명 : 구독자 수, 감시 종목 수, 시세/푸시 건수
+        """
+        with self._lock:
+            return {"users": len(self._subs), "connections": sum(len(v) for v in self._subs.values()),
+                    "tickers": len(self._ticker_users), "quotes": self.quote_count, "pushes": self.push_count}
@@ -0,0 +1,379 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import contextlib
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 부하 시나리오 (이름 → 기본 비중)
+SCENARIO_WEIGHTS = {"chat": 3, "buy": 2, "sell": 2, "balance": 2, "popup": 0.5, "rank": 0.5}
+STOCKS = [("005930", "삼성전자", 70000), ("000660", "SK하이닉스", 180000), ("035420", "NAVER", 200000),
+          ("035720", "카카오", 45000), ("005380", "현대차", 240000), ("051910", "LG화학", 380000),
+          ("068270", "셀트리온", 180000), ("015760", "한국전력", 21000)]
+# 로컬 해석기가 처리하는 단순 주문 / LLM 으로 넘어가는 조건부 주문
+CHAT_SIMPLE = ["{name} {qty}주 매수", "{name} {qty}주 사줘", "{code} {qty}주 팔아줘", "{name} {qty}주 매도"]
+CHAT_COMPLEX = ["{name} {price}원 이하면 {qty}주 사줘", "{name} 절반 팔아줘", "{name} 지금 살까?"]
+ERROR_MARKERS = ("처리 중 오류가 발생했습니다",)
+
+class FakeQuoteSource:
+    """
+    # 설명 : FakeQuoteSource - 종목별 랜덤워크 시세 (야후 파이낸스 대체)
+    # 입력 : in_stocks - [(code, name, 기준가)], in_seed - 난수 시드, in_latency_ms - 조회 지연(ms)
+    # 출력 : 시세 객체
+    """
+    def __init__(self, in_stocks, in_seed=7, in_latency_ms=0.0):
+        self._rnd = random.Random(in_seed)
+        self.prices = {f"{c}.KS": float(p) for c, _, p in in_stocks}
+        self.names = {f"{c}.KS": n for c, n, _ in in_stocks}
+        self.latency_sec = in_latency_ms / 1000.0
+
+    def get_price(self, in_ticker):
+        ticker = in_ticker if "." in in_ticker else f"{in_ticker}.KS"
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+        price = self.prices.get(ticker)
+        if price is None:
+            return None
+        price = max(1.0, round(price * (1 + self._rnd.uniform(-0.003, 0.003))))
+        self.prices[ticker] = price
+        return price
+
+    def get_price_with_name(self, in_ticker):
+        price = self.get_price(in_ticker)
+        return {"name": self.names.get(in_ticker, in_ticker), "price": price or 0}
+
+class FakeLLM:
+    """
+    # 설명 : FakeLLM - OpenAI chat.completions 대체 (메시지에서 종목/수량/매수·매도를 찾아 정해진 function_call 반환)
+    #        실제 호출처럼 in_latency_ms 만큼 동기 대기 (async 엔드포인트에서 이벤트 루프를 막는 영향도 재현)
+    # 입력 : in_stocks - [(code, name, 기준가)], in_latency_ms - 응답 지연(ms)
+    # 출력 : OpenAI 클라이언트와 같은 모양의 객체 (client.chat.completions.create)
+    """
+    def __init__(self, in_stocks, in_latency_ms=300.0):
+        self.stocks = in_stocks
+        self.latency_sec = in_latency_ms / 1000.0
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **in_kwargs):
+        self.calls += 1
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+        text = in_kwargs["messages"][-1]["content"]
+        code = next((c for c, n, _ in self.stocks if n in text or c in text), None)
+        if code is None or "살까" in text:
+            message = SimpleNamespace(function_call=None, content="현재 시장 상황을 고려해 분할 매수를 권합니다.")
+        else:
+            qty = next((int(w.rstrip("주")) for w in text.split() if w.endswith("주") and w[:-1].isdigit()), 1)
+            name = "set_sell_stock_api" if "팔" in text or "매도" in text else "set_buy_stock_api"
+            call = SimpleNamespace(name=name, arguments=json.dumps({"in_ticker": f"{code}.KS", "in_quantity": qty}))
+            message = SimpleNamespace(function_call=call, content=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+class FakeSearch:
+    """
+    # 설명 : FakeSearch - Elasticsearch 클라이언트 대체 (메모리 인덱스, search/index/count 만 지원)
+    #        query: match_all / exists / term / match / match_phrase / bool.must, sort 1개 필드, size
+    #        aggs: terms(하위 집계 기준 정렬) + max / sum / top_hits 만 지원, 그 외는 빈 결과
+    # 입력 : in_latency_ms - 검색 1회 지연(ms, 실제 클러스터 왕복 재현)
+    # 출력 : 검색 클라이언트 객체
+    """
+    def __init__(self, in_latency_ms=0.0):
+        self.indices_docs = {}
+        self.search_count = 0
+        self.latency_sec = in_latency_ms / 1000.0
+
+    def index(self, index, body=None, document=None, id=None, **in_kwargs):
+        docs = self.indices_docs.setdefault(index, {})
+        doc_id = id or str(len(docs) + 1)
+        docs[doc_id] = dict(body or document or {})
+        return {"_id": doc_id, "result": "created"}
+
+    @classmethod
+    def _is_match(cls, in_query, in_doc):
+        if not in_query or "match_all" in in_query:
+            return True
+        kind, cond = next(iter(in_query.items()))
+        if kind == "exists":
+            return in_doc.get(cond["field"]) is not None
+        if kind in ("term", "match", "match_phrase"):
+            field, value = next(iter(cond.items()))
+            value = value.get("value", value.get("query")) if isinstance(value, dict) else value
+            return in_doc.get(field) == value
+        if kind == "bool":
+            return all(cls._is_match(q, in_doc) for q in cond.get("must", []) + cond.get("filter", []))
+        return True
+
+    @classmethod
+    def _get_aggs(cls, in_aggs, in_docs):
+        out = {}
+        for name, agg in (in_aggs or {}).items():
+            if "terms" in agg:
+                field = agg["terms"]["field"]
+                groups = {}
+                for doc in in_docs:
+                    if doc["_source"].get(field) is not None:
+                        groups.setdefault(doc["_source"][field], []).append(doc)
+                buckets = [{"key": k, "doc_count": len(v), **cls._get_aggs(agg.get("aggs"), v)} for k, v in groups.items()]
+                order_key, order = next(iter(agg["terms"].get("order", {"_count": "desc"}).items()))
+                def sort_key(b):
+                    value = b["doc_count"] if order_key == "_count" else b[order_key].get("value")
+                    return float("-inf") if value is None else value
+                buckets.sort(key=sort_key, reverse=order == "desc")
+                out[name] = {"buckets": buckets[:agg["terms"].get("size", 10)]}
+            elif "max" in agg or "sum" in agg:
+                kind = "max" if "max" in agg else "sum"
+                values = [d["_source"][agg[kind]["field"]] for d in in_docs if d["_source"].get(agg[kind]["field"]) is not None]
+                out[name] = {"value": (max(values) if kind == "max" else sum(values)) if values else None}
+            elif "top_hits" in agg:
+                out[name] = {"hits": {"total": {"value": len(in_docs)}, "hits": in_docs[:agg["top_hits"].get("size", 3)]}}
+        return out
+
+    def search(self, index=None, body=None, **in_kwargs):
+        self.search_count += 1
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+        body = body or {}
+        hits = [{"_id": k, "_source": v} for k, v in self.indices_docs.get(index, {}).items()
+                if self._is_match(body.get("query"), v)]
+        for sort in reversed(body.get("sort", [])):
+            field, order = next(iter(sort.items()))
+            desc = (order.get("order") if isinstance(order, dict) else order) == "desc"
+            hits.sort(key=lambda h: (h["_source"].get(field) is None, h["_source"].get(field) or 0), reverse=desc)
+        return {"hits": {"total": {"value": len(hits)}, "hits": hits[:body.get("size", 10)]},
+                "aggregations": self._get_aggs(body.get("aggs"), hits)}
+
+    def count(self, index=None, body=None, **in_kwargs):
+        return {"count": len(self.search(index=index, body={**(body or {}), "size": 0})["hits"]["hits"])}
+
+    def ping(self):
+        return True
+
+def get_fake_app(in_users=100, in_llm_ms=300.0, in_quote_ms=0.0, in_mongo_uri=None, in_seed=7, in_keep_limits=False,
+                 in_search_ms=0.0):
+    """
+    # 설명 : get_fake_app - 외부 의존성을 로컬 대역으로 바꾼 APP_ESC 적재 및 테스트 데이터 준비
+    #        몽고DB: in_mongo_uri 가 없으면 mongomock(메모리), ES: FakeSearch, OpenAI: FakeLLM, 시세: FakeQuoteSource
+    # 입력 : in_users - 가상 사용자 수, in_llm_ms - LLM 응답 지연, in_quote_ms - 시세 조회 지연,
+    #       in_mongo_uri - 로컬 몽고DB 주소, in_seed - 난수 시드, in_keep_limits - 채팅 요청 제한/외부 호출 예산 유지,
+    #       in_search_ms - ES 검색 지연
+    # 출력 : (app_stock 모듈, 대역 dict)
+    """
+    os.environ.setdefault("OPENAI_API_KEY", "loadtest")
+    if not in_keep_limits:
+        # 엔드포인트 자체 성능을 재기 위해 요청 제한/외부 호출 예산은 끔 (--keep-limits 로 유지)
+        for name in ("ESC_CHAT_RATE_PER_MIN", "ESC_LLM_CALLS_PER_MIN", "ESC_YAHOO_CALLS_PER_MIN"):
+            os.environ.setdefault(name, "0")
+    os.environ.setdefault("OPENSEARCH_URL", "http://127.0.0.1:9200")
+    if in_mongo_uri:
+        os.environ["MONGO_URI"] = in_mongo_uri
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("❌ 메모리 몽고DB 대역에 mongomock 이 필요합니다. (pip install -r requirements-dev.txt 또는 --mongo-uri 지정)")
+        import pymongo
+        os.environ["MONGO_URI"] = "mongodb://loadtest.local"
+        pymongo.MongoClient = mongomock.MongoClient
+
+    import esc.app_stock as app_stock
+
+    quotes = FakeQuoteSource(STOCKS, in_seed, in_quote_ms)
+    llm = FakeLLM(STOCKS, in_llm_ms)
+    search = FakeSearch(in_search_ms)
+    app_stock.AI_CLIENT_ESC = llm
+    app_stock.es = search
+    app_stock.get_stock_info_esc = quotes.get_price
+    app_stock.get_stock_info_with_name = quotes.get_price_with_name
+    app_stock.QUOTE_SERVICE_ESC.fetcher = quotes.get_price
+
+    # 테스트 데이터: 공용 사용자, 종목 마스터, 팝업용 거래이력 인덱스
+    user_ids = [f"lt{i:05d}" for i in range(in_users)]
+    app_stock.USERS_COMM.delete_many({"user_id": {"$in": user_ids}})
+    app_stock.USERS_COMM.insert_many([{"user_id": u} for u in user_ids])
+    app_stock.DB_COMM.stock_master.delete_many({"code": {"$in": [f"{c}.KS" for c, _, _ in STOCKS]}})
+    app_stock.DB_COMM.stock_master.insert_many(
+        [{"code": f"{c}.KS", "name": n, "market": "KOSPI", "close": p} for c, n, p in STOCKS])
+    rnd = random.Random(in_seed)
+    for i in range(500):
+        code, name, price = rnd.choice(STOCKS)
+        search.index("trade_esc_history", {"uid": rnd.choice(user_ids), "sn": name, "ticker": f"{code}.KS",
+                                           "buy_dt": "2025-01-02", "buy_p": price, "qty": rnd.randint(1, 20),
+                                           "sell_p": price * rnd.uniform(0.8, 1.3), "rate": rnd.uniform(-20, 30)})
+    return app_stock, {"quotes": quotes, "llm": llm, "search": search, "users": user_ids}
+
+def get_request(in_scenario, in_userId, in_rnd):
+    """
+    # 설명 : get_request - 시나리오 1회에 해당하는 요청 (method, path, 엔드포인트명, form/params)
+    """
+    code, name, price = in_rnd.choice(STOCKS)
+    qty = in_rnd.randint(1, 5)
+    if in_scenario == "chat":
+        templates = CHAT_SIMPLE if in_rnd.random() < 0.6 else CHAT_COMPLEX
+        message = in_rnd.choice(templates).format(name=name, code=code, qty=qty, price=price)
+        return "POST", "/esc/chatEsc", "chatEsc", {"data": {"in_message": message, "in_user_id": in_userId}}
+    if in_scenario in ("buy", "sell"):
+        return "POST", "/esc/order", f"order.{in_scenario}", {"data": {
+            "in_user_id": in_userId, "in_ticker": code, "in_side": in_scenario,
+            "in_quantity": str(qty), "in_order_type": "market"}}
+    if in_scenario == "balance":
+        return "POST", "/esc/chatEsc", "chatEsc.balance", {"data": {"in_message": "잔고", "in_user_id": in_userId}}
+    if in_scenario == "popup":
+        return "GET", "/apiEsc/popup-status", "popup-status", {"params": {"in_userId": in_userId}}
+    return "GET", "/apiEsc/total-rank-top1", "total-rank-top1", {"params": {"t": str(time.time())}}
+
+def get_summary(in_samples, in_elapsed_sec):
+    """
+    # 설명 : get_summary - 엔드포인트별 지연시간 백분위수(p50/p95/p99)와 처리량
+    # 입력 : in_samples - {엔드포인트: [(지연초, 성공여부)]}, in_elapsed_sec - 전체 측정 시간
+    # 출력 : {엔드포인트: {count, errors, rps, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}
+    """
+    import numpy as np
+    out = {}
+    rows = list(in_samples.items()) + [("ALL", [s for v in in_samples.values() for s in v])]
+    for name, samples in rows:
+        if not samples:
+            continue
+        lat = np.array([s[0] for s in samples]) * 1000
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        out[name] = {
+            "count": len(samples),
+            "errors": sum(1 for s in samples if not s[1]),
+            "rps": round(len(samples) / in_elapsed_sec, 1),
+            "mean_ms": round(float(lat.mean()), 2),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+            "max_ms": round(float(lat.max()), 2)
+        }
+    return out
+
+async def get_load_result(in_client, in_users, in_concurrency=20, in_duration_sec=10.0, in_requests=None,
+                          in_weights=None, in_seed=7, in_think_ms=0.0):
+    """
+    # 설명 : get_load_result - 가상 사용자 in_concurrency 명이 시나리오 비중대로 요청을 반복
+    # 입력 : in_client - httpx.AsyncClient, in_users - 사용자id 목록, in_concurrency - 동시 사용자 수,
+    #       in_duration_sec - 측정 시간, in_requests - 총 요청 수(있으면 시간 대신 사용),
+    #       in_weights - {시나리오: 비중}, in_seed - 난수 시드, in_think_ms - 요청 사이 대기(ms)
+    # 출력 : (엔드포인트별 요약, 전체 측정 시간)
+    """
+    weights = in_weights or SCENARIO_WEIGHTS
+    names, cum = list(weights), list(weights.values())
+    samples = {}
+    counter = {"left": in_requests}
+    deadline = time.perf_counter() + in_duration_sec
+
+    async def worker(in_no):
+        rnd = random.Random(in_seed * 1000 + in_no)
+        user_id = in_users[in_no % len(in_users)]
+        while True:
+            if in_requests is not None:
+                if counter["left"] <= 0:
+                    return
+                counter["left"] -= 1
+            elif time.perf_counter() >= deadline:
+                return
+            scenario = rnd.choices(names, cum)[0]
+            method, path, label, kwargs = get_request(scenario, user_id, rnd)
+            start = time.perf_counter()
+            try:
+                res = await in_client.request(method, path, **kwargs)
+                ok = res.status_code < 400 and not any(m in res.text for m in ERROR_MARKERS)
+            except Exception:
+                ok = False
+            samples.setdefault(label, []).append((time.perf_counter() - start, ok))
+            if in_think_ms:
+                await asyncio.sleep(in_think_ms / 1000.0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(in_concurrency)))
+    elapsed = time.perf_counter() - start
+    return get_summary(samples, elapsed), elapsed
+
+def get_weights(in_text):
+    """ "chat=3,buy=2" → {"chat": 3, "buy": 2} """
+    weights = {}
+    for part in filter(None, (in_text or "").split(",")):
+        name, _, value = part.partition("=")
+        if name.strip() not in SCENARIO_WEIGHTS:
+            raise SystemExit(f"❌ 알 수 없는 시나리오: {name} (가능: {', '.join(SCENARIO_WEIGHTS)})")
+        weights[name.strip()] = float(value or 1)
+    return {k: v for k, v in weights.items() if v > 0} or SCENARIO_WEIGHTS
+
+def print_report(in_summary, in_elapsed_sec):
+    print(f"\n{'endpoint':<18}{'count':>8}{'err':>6}{'rps':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, s in in_summary.items():
+        print(f"{name:<18}{s['count']:>8}{s['errors']:>6}{s['rps']:>9}{s['mean_ms']:>9}"
+              f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+    print(f"측정 시간: {in_elapsed_sec:.2f}s")
+
+async def main(in_args):
+    import httpx
+    weights = get_weights(in_args.mix)
+    if in_args.url:
+        # 실제 서버 대상 (대역 없이 그대로 호출, 사용자는 미리 가입되어 있어야 함)
+        users = [f"lt{i:05d}" for i in range(in_args.users)]
+        client = httpx.AsyncClient(base_url=in_args.url, timeout=in_args.timeout)
+        fakes = None
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            app_stock, fakes = get_fake_app(in_args.users, in_args.llm_ms, in_args.quote_ms, in_args.mongo_uri, in_args.seed,
+                                         in_args.keep_limits, in_args.search_ms)
+        users = fakes["users"]
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app_stock.APP_ESC),
+                                   base_url="http://loadtest", timeout=in_args.timeout)
+    async with client:
+        # 앱 로그(print)는 측정 중 숨김
+        with contextlib.redirect_stdout(io.StringIO()) if not in_args.verbose else contextlib.nullcontext():
+            summary, elapsed = await get_load_result(client, users, in_args.concurrency, in_args.duration,
+                                                     in_args.requests, weights, in_args.seed, in_args.think_ms)
+    print_report(summary, elapsed)
+    if fakes:
+        print(f"LLM 대역 호출: {fakes['llm'].calls}건, ES 대역 검색: {fakes['search'].search_count}건")
+    if in_args.json:
+        with open(in_args.json, "w", encoding="utf-8") as f:
+            json.dump({"elapsed_sec": round(elapsed, 3), "args": vars(in_args), "endpoints": summary}, f,
+                      ensure_ascii=False, indent=2)
+
+    # CI 판정: 오류율 / p95 예산 초과 시 종료코드 1
+    total = summary.get("ALL", {"count": 0, "errors": 0, "p95_ms": 0})
+    error_rate = total["errors"] / total["count"] if total["count"] else 1.0
+    failed = error_rate > in_args.max_error_rate
+    if in_args.p95_budget_ms and total["p95_ms"] > in_args.p95_budget_ms:
+        failed = True
+    if failed:
+        print(f"❌ 기준 미달: 오류율 {error_rate:.2%} (허용 {in_args.max_error_rate:.2%}), "
+              f"p95 {total['p95_ms']}ms (예산 {in_args.p95_budget_ms or '-'}ms)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    # 실행 예) python app/esc/loadtest.py --concurrency 50 --duration 20 --llm-ms 300
+    #         python app/esc/loadtest.py --requests 2000 --mix chat=1,buy=1 --json loadtest.json --p95-budget-ms 500
+    #         python app/esc/loadtest.py --url http://localhost:8000/stock --users 20 (실서버)
+    #         python app/esc/loadtest.py --mix popup=1 --search-ms 30 (팝업 캐시 효과, ESC_POPUP_CACHE_TTL=0 과 비교)
+    parser = argparse.ArgumentParser(description="모의투자 채팅/주문/팝업 엔드포인트 부하 테스트 (네트워크 없이 로컬 대역 사용)")
+    parser.add_argument("--concurrency", type=int, default=20, help="동시 가상 사용자 수")
+    parser.add_argument("--users", type=int, default=100, help="계정 수 (동시 사용자가 나눠 씀)")
+    parser.add_argument("--duration", type=float, default=10.0, help="측정 시간(초)")
+    parser.add_argument("--requests", type=int, default=None, help="총 요청 수 (지정 시 --duration 무시)")
+    parser.add_argument("--mix", default="", help="시나리오 비중 예) chat=3,buy=2,sell=2,balance=2,popup=0.5,rank=0.5")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="가상 사용자 요청 간 대기(ms)")
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="LLM 대역 응답 지연(ms)")
+    parser.add_argument("--quote-ms", type=float, default=0.0, help="시세 대역 조회 지연(ms)")
+    parser.add_argument("--search-ms", type=float, default=0.0, help="ES 대역 검색 지연(ms)")
+    parser.add_argument("--mongo-uri", default=None, help="로컬 몽고DB (없으면 mongomock 메모리 DB)")
+    parser.add_argument("--url", default=None, help="실서버 주소 (지정 시 대역 없이 HTTP 호출)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default=None, help="결과 JSON 저장 경로")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="허용 오류율 (초과 시 종료코드 1)")
+    parser.add_argument("--p95-budget-ms", type=float, default=None, help="전체 p95 예산(ms) (초과 시 종료코드 1)")
+    parser.add_argument("--keep-limits", action="store_true", help="채팅 요청 제한/외부 호출 예산 유지 (429 는 오류로 집계)")
+    parser.add_argument("--verbose", action="store_true", help="측정 중 앱 로그 출력")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,41 +1,270 @@
-from pymongo import MongoClient
-from cmm.config import MONGO_URI, es
-from elasticsearch import helpers
 import os
+import sys
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from datetime import datetime
+from pymongo import MongoClient, ASCENDING
+from elasticsearch import helpers
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from esc.es_sync import get_summary_source, get_plain_source
+
 # .env 로드
 load_dotenv()
 
-# MongoDB 연결
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client.mock_trading_db
+# 기본 매핑: 테이블(컬렉션) → 인덱스
+MIGRATION_TARGETS = [
+    ("trade_esc_history", "trade_esc_history"),
+    ("trade_summary_esc", "trade_summary"),  # 이름 맞춤
+    ("stock_master", "stock_master"),
+]
+CHECKPOINT_COLLECTION = "migration_checkpoints"
 
-# .env 로드
-load_dotenv()
+# 인덱스 매핑은 esc.es_templates 의 인덱스 템플릿으로 관리
+
+def get_clients():
+    """
+    # 설명 : get_clients - 몽고DB/ES 클라이언트 (프로세스마다 새로 생성, fork 후 공유 금지)
+    # 출력 : (mock_trading_db, es)
+    """
+    from cmm.config import MONGO_URI, es
+    return MongoClient(MONGO_URI).mock_trading_db, es
+
+def get_shard_ranges(in_collection, in_shards):
+    """
+    # 설명 : get_shard_ranges - _id 기준으로 문서 수가 비슷한 구간 in_shards 개 ($bucketAuto)
+    # 입력 : in_collection - 컬렉션, in_shards - 구간 수
+    # 출력 : [(하한 포함, 상한 미포함)] (처음/끝 구간은 None 으로 열어 둠)
+    """
+    if in_shards <= 1:
+        return [(None, None)]
+    buckets = list(in_collection.aggregate([{"$bucketAuto": {"groupBy": "$_id", "buckets": in_shards}}]))
+    bounds = [b["_id"]["min"] for b in buckets[1:]]
+    lows = [None] + bounds
+    highs = bounds + [None]
+    return list(zip(lows, highs))
+
+def get_docs(in_collection, in_after_id=None, in_low=None, in_high=None, in_batch_size=1000):
+    """
+    # 설명 : get_docs - _id 오름차순 스트리밍 커서 (메모리에는 커서 배치 1개만)
+    # 입력 : in_collection - 컬렉션, in_after_id - 체크포인트(이 _id 다음부터), in_low/in_high - 샤드 구간
+    # 출력 : 문서 제너레이터
+    """
+    cond = {}
+    if in_low is not None:
+        cond["$gte"] = in_low
+    if in_high is not None:
+        cond["$lt"] = in_high
+    if in_after_id is not None:
+        cond["$gt"] = in_after_id
+        cond.pop("$gte", None)
+    query = {"_id": cond} if cond else {}
+    return in_collection.find(query, no_cursor_timeout=True).sort("_id", ASCENDING).batch_size(in_batch_size)
+
+class CollectionMigrator:
+    """
+    # 설명 : CollectionMigrator - 컬렉션 1개(또는 _id 구간 1개)를 ES 인덱스로 스트리밍 색인
+    #        문서 → action 제너레이터 → parallel_bulk(스레드, 결과는 입력 순서대로 반환) 구조라
+    #        응답이 돌아온 마지막 _id 까지는 모두 처리된 것 → 그 _id 를 체크포인트로 저장하고 재시작 시 이어감
+    #        429(과부하) 응답 문서는 지수 백오프로 재전송한 뒤에만 체크포인트를 전진
+    #        trade_summary_esc 는 변경 스트림 동기화와 같은 변환(get_summary_source, _id={user_id}_{code}, 현재가 역정규화)으로 색인
+    # 입력 : in_db - 원본 DB, in_es - ES 클라이언트, in_collection - 컬렉션명, in_index - 인덱스명,
+    #       in_shard - (샤드번호, 하한, 상한), in_chunk_size - bulk 1회 문서 수, in_threads - 전송 스레드 수,
+    #       in_checkpoint_every - 체크포인트 저장 주기(문서 수), in_max_retries - 429 재시도 횟수
+    # 출력 : 이관 객체
+    # 소스 : 몽고DB mock_trading_db.<컬렉션>, mock_trading_db.migration_checkpoints
+    """
+    def __init__(self, in_db, in_es, in_collection, in_index, in_shard=(0, None, None), in_chunk_size=500,
+                 in_threads=4, in_checkpoint_every=5000, in_max_retries=8, in_initial_backoff=1.0,
+                 in_max_backoff=60.0, in_progress_sec=5.0):
+        self.db = in_db
+        self.es = in_es
+        self.collection = in_collection
+        self.index = in_index
+        self.shard_no, self.low, self.high = in_shard
+        self.chunk_size = in_chunk_size
+        self.threads = in_threads
+        self.checkpoint_every = in_checkpoint_every
+        self.max_retries = in_max_retries
+        self.initial_backoff = in_initial_backoff
+        self.max_backoff = in_max_backoff
+        self.progress_sec = in_progress_sec
+        self.checkpoints = in_db[CHECKPOINT_COLLECTION]
+        self.key = f"{in_collection}->{in_index}:{self.shard_no}"
+        self.count = 0
+        self.errors = 0
+        self.retried = 0
+        self.prices = None       # code → 현재가 (trade_summary 역정규화용, 첫 문서에서 1회 로드)
+
+    def get_checkpoint(self):
+        return self.checkpoints.find_one({"_id": self.key}) or {}
+
+    def set_checkpoint(self, in_last_id, in_done=False):
+        self.checkpoints.update_one({"_id": self.key}, {"$set": {
+            "last_id": in_last_id, "low": self.low, "high": self.high, "done": in_done,
+            "updated_at": datetime.now()}, "$inc": {"count": self.count, "errors": self.errors}}, upsert=True)
+        self.count, self.errors = 0, 0
+
+    def _get_source(self, in_doc):
+        """ 원본 문서 → (ES _id, _source) - es_sync 와 같은 변환을 써야 이관 후 증분 동기화가 같은 문서를 갱신 """
+        if self.collection != "trade_summary_esc":
+            return get_plain_source(in_doc)  # _id는 문자열로 변환 (ES ID 제한)
+        if self.prices is None:
+            self.prices = {s['code']: s.get('close', 0) for s in self.db.stock_master.find({}, {"code": 1, "close": 1})}
+        return get_summary_source(in_doc, self.prices.get(in_doc['code'], 0))
+
+    def _get_actions(self, in_docs, in_pending):
+        for doc in in_docs:
+            es_id, source = self._get_source(doc)
+            action = {"_index": self.index, "_id": es_id, "_source": source}
+            in_pending.append((doc['_id'], action))
+            yield action
+
+    def _set_retry(self, in_actions):
+        """ 429 로 거절된 문서 재전송 (지수 백오프) """
+        backoff = self.initial_backoff
+        for attempt in range(1, self.max_retries + 1):
+            time.sleep(min(backoff, self.max_backoff))
+            backoff *= 2
+            failed = []
+            for ok, item in helpers.streaming_bulk(self.es, in_actions, chunk_size=self.chunk_size,
+                                                   raise_on_error=False, raise_on_exception=False):
+                info = next(iter(item.values()))
+                if not ok and info.get("status") == 429:
+                    failed.append(next(a for a in in_actions if a["_id"] == info.get("_id")))
+                elif not ok:
+                    self.errors += 1
+            self.retried += len(in_actions) - len(failed)
+            if not failed:
+                return
+            print(f"⚠️ [{self.key}] 429 재시도 {attempt}/{self.max_retries}: {len(failed)}건 남음")
+            in_actions = failed
+        raise RuntimeError(f"[{self.key}] 429 재시도 한도 초과 ({len(in_actions)}건) - 체크포인트부터 다시 실행하세요.")
+
+    def run(self, in_restart=False):
+        """
+        # 설명 : run - 체크포인트부터 이관 (in_restart 면 처음부터)
+        # 출력 : 이번 실행에서 색인한 문서 수
+        """
+        checkpoint = {} if in_restart else self.get_checkpoint()
+        if checkpoint.get("done"):
+            print(f"⏭️ [{self.key}] 이미 완료됨 ({checkpoint.get('count', 0)}건)")
+            return 0
+        if in_restart:
+            self.checkpoints.delete_one({"_id": self.key})
+        last_id = checkpoint.get("last_id")
+        docs = get_docs(self.db[self.collection], last_id, self.low, self.high, self.chunk_size)
+
+        pending = deque()       # 전송했지만 결과를 아직 못 받은 (원본 _id, action) - 입력 순서
+        retry = []
+        total, since_checkpoint = 0, 0
+        start = last_report = time.monotonic()
+        results = helpers.parallel_bulk(self.es, self._get_actions(docs, pending), thread_count=self.threads,
+                                        chunk_size=self.chunk_size, queue_size=self.threads * 2,
+                                        raise_on_error=False, raise_on_exception=False)
+        try:
+            for ok, item in results:
+                doc_id, action = pending.popleft()
+                if not ok:
+                    info = next(iter(item.values()))
+                    if info.get("status") == 429:
+                        retry.append(action)
+                    else:
+                        self.errors += 1
+                        if self.errors <= 5:
+                            print(f"❌ [{self.key}] 색인 실패 {action['_id']}: {info.get('error')}")
+                total += 1
+                self.count += 1
+                since_checkpoint += 1
+                if since_checkpoint >= self.checkpoint_every:
+                    if retry:
+                        self._set_retry(retry)
+                        retry = []
+                    self.set_checkpoint(doc_id)
+                    last_id, since_checkpoint = doc_id, 0
+                now = time.monotonic()
+                if now - last_report >= self.progress_sec:
+                    rate = total / (now - start)
+                    print(f"   > [{self.key}] {total:,}건 ({rate:,.0f}건/초, 마지막 _id {doc_id})")
+                    last_report = now
+                last_id = doc_id
+            if retry:
+                self._set_retry(retry)
+            self.set_checkpoint(last_id, in_done=True)
+        finally:
+            docs.close()
+        elapsed = time.monotonic() - start
+        print(f"✅ [{self.key}] {total:,}건 이관 완료 ({elapsed:.1f}초, 429 재전송 {self.retried}건)")
+        return total
+
+def get_plan(in_db, in_collection, in_index, in_shards):
+    """
+    # 설명 : get_plan - 샤드 구간 계획 (최초 계산 후 저장 → 재시작해도 같은 구간 사용)
+    # 출력 : [(샤드번호, 하한, 상한)]
+    """
+    plans = in_db[CHECKPOINT_COLLECTION]
+    key = f"{in_collection}->{in_index}:plan:{in_shards}"
+    plan = plans.find_one({"_id": key})
+    if plan is None:
+        ranges = get_shard_ranges(in_db[in_collection], in_shards)
+        plans.update_one({"_id": key}, {"$setOnInsert": {"ranges": [list(r) for r in ranges],
+                                                         "created_at": datetime.now()}}, upsert=True)
+        plan = plans.find_one({"_id": key})
+    return [(i, low, high) for i, (low, high) in enumerate(plan["ranges"])]
+
+def run_shard(in_collection, in_index, in_shard, in_options):
+    """ 샤드 1개 이관 (별도 프로세스 진입점) """
+    db, es = get_clients()
+    restart = in_options.pop("in_restart", False)
+    return CollectionMigrator(db, es, in_collection, in_index, tuple(in_shard), **in_options).run(restart)
+
+def migrate_collection(collection_name, index_name, in_shards=1, in_processes=1, in_only_shard=None, **in_options):
+    """
+    # 설명 : migrate_collection - 컬렉션 → 인덱스 이관 (스트리밍 + 체크포인트, 선택적으로 _id 구간 샤딩)
+    # 입력 : collection_name - 컬렉션명, index_name - 인덱스명, in_shards - _id 구간 수,
+    #       in_processes - 동시 실행 프로세스 수, in_only_shard - 이 샤드만 실행 (여러 서버 분산용),
+    #       in_options - CollectionMigrator 옵션 (in_chunk_size, in_threads, ...) + in_restart
+    # 출력 : 이관 문서 수
+    """
+    db, es = get_clients()
+    plan = get_plan(db, collection_name, index_name, in_shards)
+    if in_only_shard is not None:
+        plan = [p for p in plan if p[0] == in_only_shard]
+    print(f"📦 {collection_name} → {index_name}: 샤드 {len(plan)}개, 예상 {db[collection_name].estimated_document_count():,}건")
+    if in_processes <= 1 or len(plan) == 1:
+        return sum(run_shard(collection_name, index_name, shard, dict(in_options)) for shard in plan)
+    # 몽고/ES 클라이언트는 fork 후 공유하면 안 되므로 spawn 으로 새 프로세스 생성
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(min(in_processes, len(plan))) as pool:
+        counts = pool.starmap(run_shard, [(collection_name, index_name, shard, dict(in_options)) for shard in plan])
+    return sum(counts)
+
+if __name__ == "__main__":
+    # 실행 예) cd app && python -m esc.migration                                   (기본 3개 매핑, 이어서 실행)
+    #         cd app && python -m esc.migration --collection trade_esc_history --shards 8 --processes 4
+    #         cd app && python -m esc.migration --collection trade_esc_history --shards 8 --only-shard 3
+    parser = argparse.ArgumentParser(description="몽고DB → ES 스트리밍 이관 (체크포인트 재개)")
+    parser.add_argument("--collection", default=None, help="컬렉션 (없으면 기본 매핑 전체)")
+    parser.add_argument("--index", default=None, help="인덱스 (없으면 기본 매핑 또는 컬렉션명)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="bulk 1회 문서 수")
+    parser.add_argument("--threads", type=int, default=4, help="프로세스당 전송 스레드 수")
+    parser.add_argument("--shards", type=int, default=1, help="_id 구간 수")
+    parser.add_argument("--processes", type=int, default=1, help="동시에 실행할 샤드 프로세스 수")
+    parser.add_argument("--only-shard", type=int, default=None, help="지정 샤드만 실행 (여러 서버 분산)")
+    parser.add_argument("--checkpoint-every", type=int, default=5000, help="체크포인트 저장 주기(문서 수)")
+    parser.add_argument("--max-retries", type=int, default=8, help="429 재시도 횟수")
+    parser.add_argument("--restart", action="store_true", help="체크포인트를 지우고 처음부터")
+    args = parser.parse_args()
 
-# 컬렉션 → 인덱스 마이그레이션 함수
-def migrate_collection(collection_name, index_name):
-    collection = db[collection_name]
-    actions = []
-    for doc in collection.find():
-        # _id는 문자열로 변환 (ES ID 제한)
-        doc_id = str(doc.pop('_id')) if '_id' in doc else None
-        action = {
-            '_index': index_name,
-            '_id': doc_id,
-            '_source': doc
-        }
-        actions.append(action)
-    
-    if actions:
-        helpers.bulk(es, actions)
-        print(f"✅ {collection_name} → {index_name}로 {len(actions)}개 문서 마이그레이션 완료")
-
-# 실행: 테이블(컬렉션) 매핑
-migrate_collection('trade_esc_history', 'trade_esc_history')
-migrate_collection('trade_summary_esc', 'trade_summary')  # 이름 맞춤
-migrate_collection('stock_master', 'stock_master')
-
-# 옵션: 인덱스 매핑 사전 설정 (성능 최적화, 실제 필드에 맞게)
-# es.indices.create(index='trade_esc_history', body={'mappings': {'properties': {'timestamp': {'type': 'date'}, 'profit': {'type': 'float'}}}})
\ No newline at end of file
+    # 대상 인덱스가 없으면 첫 bulk 때 자동 생성되므로, 그 전에 템플릿/파이프라인 등록
+    from esc.es_templates import set_install
+    set_install(get_clients()[1])
+    targets = MIGRATION_TARGETS if not args.collection else \
+        [(args.collection, args.index or dict(MIGRATION_TARGETS).get(args.collection, args.collection))]
+    options = {"in_chunk_size": args.chunk_size, "in_threads": args.threads, "in_checkpoint_every": args.checkpoint_every,
+               "in_max_retries": args.max_retries, "in_restart": args.restart}
+    for collection_name, index_name in targets:
+        migrate_collection(collection_name, index_name, args.shards, args.processes, args.only_shard, **options)
@@ -0,0 +1,292 @@
+import heapq
+import uuid
+import threading
+from datetime import datetime
+
+# 주문 구분
+ORDER_SIDES = ("buy", "sell")
+ORDER_TYPES = ("limit", "stop")
+
+class TickerOrderBook:
+    """
+    # 설명 : TickerOrderBook - 종목 하나의 대기 주문장 (가격 우선순위 힙 4개)
+    #        매수지정가: 시세 <= 지정가 → 지정가 높은 순 (max-heap)
+    #        매도지정가: 시세 >= 지정가 → 지정가 낮은 순 (min-heap)
+    #        매수스탑  : 시세 >= 스탑가 → 스탑가 낮은 순 (min-heap)
+    #        매도스탑  : 시세 <= 스탑가 → 스탑가 높은 순 (max-heap)
+    #        시세가 들어오면 각 힙의 top 만 보고 조건을 만족하는 동안 pop → 체결 1건당 O(log n)
+    #        취소는 live 에서만 지우고 힙에서는 pop 시점에 건너뜀 (lazy deletion)
+    # 입력 : in_ticker - 종목 티커
+    # 출력 : 주문장 객체
+    """
+    def __init__(self, in_ticker):
+        self.ticker = in_ticker
+        self.heaps = {("buy", "limit"): [], ("sell", "limit"): [], ("buy", "stop"): [], ("sell", "stop"): []}
+        self.live = {}
+        self._seq = 0
+
+    @staticmethod
+    def _get_sign(in_side, in_type):
+        # 가격이 높은 주문이 먼저 체결돼야 하는 힙은 음수 키 사용
+        return -1 if (in_side, in_type) in (("buy", "limit"), ("sell", "stop")) else 1
+
+    def add(self, in_order):
+        """
+        # 설명 : 대기 주문 등록
+        # 입력 : in_order - 주문 dict (order_id, side, order_type, price 필수)
+        # 출력 : None
+        """
+        side, otype = in_order["side"], in_order["order_type"]
+        self._seq += 1
+        key = self._get_sign(side, otype) * float(in_order["price"])
+        heapq.heappush(self.heaps[(side, otype)], (key, self._seq, in_order["order_id"]))
+        self.live[in_order["order_id"]] = in_order
+
+    def cancel(self, in_order_id):
+        """
+        # 설명 : 대기 주문 취소 (힙 정리는 pop 시점에 수행)
+        # 입력 : in_order_id - 주문번호
+        # 출력 : 취소된 주문 dict 또는 None
+        """
+        return self.live.pop(in_order_id, None)
+
+    def get_triggered(self, in_price):
+        """
+        # 설명 : 시세 in_price 에서 조건을 만족하는 주문을 모두 꺼냄
+        # 입력 : in_price - 현재 시세
+        # 출력 : 체결 대상 주문 리스트 (가격 우선, 같은 가격은 접수 순)
+        """
+        out = []
+        for (side, otype), heap in self.heaps.items():
+            sign = self._get_sign(side, otype)
+            while heap:
+                key, _, order_id = heap[0]
+                if order_id not in self.live:
+                    heapq.heappop(heap)  # 취소/체결된 주문 정리
+                    continue
+                trigger = sign * key
+                # max-heap(매수지정가/매도스탑)은 시세 <= 기준가, min-heap(매도지정가/매수스탑)은 시세 >= 기준가
+                hit = in_price <= trigger if sign < 0 else in_price >= trigger
+                if not hit:
+                    break
+                heapq.heappop(heap)
+                out.append(self.live.pop(order_id))
+        return out
+
+    def __len__(self):
+        return len(self.live)
+
+class OrderBookManager:
+    """
+    # 설명 : OrderBookManager - 종목별 대기 주문장 관리 + 몽고DB 영속화 + 시세 기반 체결
+    # 입력 : in_collection - 대기주문 컬렉션 (None 이면 메모리 전용, 벤치마크용)
+    #       in_executor - (order, price) → (성공여부, 메시지) 체결 함수
+    # 출력 : 관리자 객체
+    # 소스 : 몽고DB ykpark.pending_orders_esc
+    """
+    def __init__(self, in_collection=None, in_executor=None):
+        self.collection = in_collection
+        self.executor = in_executor
+        self.books = {}
+        self.user_orders = {}   # user_id → {order_id: ticker}
+        self._lock = threading.Lock()
+        self.filled_count = 0
+        self.rejected_count = 0
+
+    def set_indexes(self):
+        """
+        # 설명 : 대기주문 컬렉션 인덱스 생성
+        """
+        if self.collection is None:
+            return
+        self.collection.create_index("order_id", unique=True)
+        self.collection.create_index([("status", 1), ("ticker", 1)])
+        self.collection.create_index([("user_id", 1), ("status", 1)])
+
+    def _add_memory(self, in_order):
+        book = self.books.get(in_order["ticker"])
+        if book is None:
+            book = self.books[in_order["ticker"]] = TickerOrderBook(in_order["ticker"])
+        book.add(in_order)
+        self.user_orders.setdefault(in_order["user_id"], {})[in_order["order_id"]] = in_order["ticker"]
+
+    def _remove_user_index(self, in_order):
+        orders = self.user_orders.get(in_order["user_id"])
+        if orders is not None:
+            orders.pop(in_order["order_id"], None)
+            if not orders:
+                self.user_orders.pop(in_order["user_id"], None)
+
+    def set_order(self, in_userId, in_ticker, in_side, in_order_type, in_quantity, in_price, in_now=None):
+        """
+        # 설명 : set_order - 지정가/스탑 대기 주문 접수 (DB 저장 후 주문장 등록)
+        # 입력 : in_userId-사용자id, in_ticker-티커, in_side-buy/sell, in_order_type-limit/stop,
+        #       in_quantity-수량, in_price-지정가/스탑가, in_now-접수시각
+        # 출력 : order - 주문 dict
+        """
+        if in_side not in ORDER_SIDES or in_order_type not in ORDER_TYPES:
+            raise ValueError(f"지원하지 않는 주문입니다: {in_side}/{in_order_type}")
+        if int(in_quantity) <= 0 or float(in_price) <= 0:
+            raise ValueError("수량과 가격은 0보다 커야 합니다.")
+        order = {
+            "order_id": uuid.uuid4().hex,
+            "user_id": in_userId,
+            "ticker": in_ticker,
+            "side": in_side,
+            "order_type": in_order_type,
+            "quantity": int(in_quantity),
+            "price": float(in_price),
+            "status": "open",
+            "created_at": in_now or datetime.now()
+        }
+        if self.collection is not None:
+            self.collection.insert_one(dict(order))
+        with self._lock:
+            self._add_memory(order)
+        return order
+
+    def set_cancel(self, in_userId, in_order_id):
+        """
+        # 설명 : set_cancel - 대기 주문 취소 (본인 주문만)
+        # 입력 : in_userId-사용자id, in_order_id-주문번호
+        # 출력 : 취소된 주문 dict 또는 None
+        """
+        with self._lock:
+            ticker = self.user_orders.get(in_userId, {}).get(in_order_id)
+            if ticker is None:
+                return None
+            order = self.books[ticker].cancel(in_order_id)
+            if order is None:
+                return None
+            self._remove_user_index(order)
+        if self.collection is not None:
+            self.collection.update_one(
+                {"order_id": in_order_id, "status": "open"},
+                {"$set": {"status": "cancelled", "updated_at": datetime.now()}}
+            )
+        return order
+
+    def get_user_orders(self, in_userId):
+        """
+        # 설명 : 사용자의 대기 주문 목록
+        # 입력 : in_userId-사용자id
+        # 출력 : 주문 dict 리스트 (접수순)
+        """
+        with self._lock:
+            orders = [self.books[t].live[oid] for oid, t in self.user_orders.get(in_userId, {}).items()
+                      if oid in self.books[t].live]
+        return sorted(orders, key=lambda o: o["created_at"])
+
+    def get_watch_tickers(self):
+        """
+        # 설명 : 대기 주문이 남아 있는 종목 목록 (시세 폴링 대상)
+        """
+        with self._lock:
+            return [t for t, book in self.books.items() if len(book)]
+
+    def on_quote(self, in_ticker, in_price):
+        """
+        # 설명 : on_quote - 시세 수신 시 해당 종목 주문장에서 조건 충족 주문만 꺼내 체결
+        # 입력 : in_ticker-티커, in_price-시세
+        # 출력 : 체결 처리 결과 리스트 [(order, 성공여부, 메시지)]
+        #       한 주문의 체결이 예외로 실패해도 나머지 주문은 계속 처리
+        """
+        if not in_price:
+            return []
+        with self._lock:
+            book = self.books.get(in_ticker)
+            if book is None or not len(book):
+                return []
+            triggered = book.get_triggered(float(in_price))
+            for order in triggered:
+                self._remove_user_index(order)
+        results = []
+        for order in triggered:
+            try:
+                results.append(self._set_fill(order, float(in_price)))
+            except Exception as e:
+                # 선점/결과 기록 단계의 DB 오류 (선점 전이면 _set_fill 이 주문장에 되돌려 둠)
+                print(f"❌ 대기주문 체결 처리 오류 ({order['order_id']}): {e}")
+                results.append((order, False, f"체결 처리 중 오류가 발생했습니다: {e}"))
+        return results
+
+    def _set_reopen(self, in_order):
+        """ 선점하지 못한 주문을 주문장에 되돌림 (다음 시세에서 다시 체결 시도) """
+        with self._lock:
+            self._add_memory(in_order)
+
+    def _set_fill(self, in_order, in_price):
+        """ 체결 실행: DB 상태를 open → filling 으로 선점한 프로세스만 실제 주문 실행 """
+        if self.collection is not None:
+            try:
+                claimed = self.collection.find_one_and_update(
+                    {"order_id": in_order["order_id"], "status": "open"},
+                    {"$set": {"status": "filling", "trigger_price": in_price, "updated_at": datetime.now()}}
+                )
+            except Exception:
+                # DB 상태는 그대로 open → 메모리 주문장에도 되돌려 놓아야 유실되지 않음
+                self._set_reopen(in_order)
+                raise
+            if claimed is None:
+                return in_order, False, "이미 처리된 주문입니다."
+        try:
+            ok, msg = self.executor(in_order, in_price) if self.executor else (True, "")
+        except Exception as e:
+            # 선점 후 실행 중 예외 → filling 에 묶어 두지 않고 거부로 확정
+            print(f"❌ 대기주문 실행 오류 ({in_order['order_id']}): {e}")
+            ok, msg = False, f"체결 처리 중 오류가 발생했습니다: {e}"
+        if ok:
+            self.filled_count += 1
+        else:
+            self.rejected_count += 1
+        if self.collection is not None:
+            self.collection.update_one(
+                {"order_id": in_order["order_id"]},
+                {"$set": {"status": "filled" if ok else "rejected", "fill_price": in_price,
+                          "message": msg, "updated_at": datetime.now()}}
+            )
+        return in_order, ok, msg
+
+    def set_recover(self):
+        """
+        # 설명 : set_recover - 재시작 시 DB 의 open 주문을 주문장으로 복구
+        # 입력 : None
+        # 출력 : 복구된 주문 수
+        """
+        if self.collection is None:
+            return 0
+        count = 0
+        with self._lock:
+            self.books.clear()
+            self.user_orders.clear()
+            for doc in self.collection.find({"status": "open"}, {"_id": 0}).sort("created_at", 1):
+                self._add_memory(doc)
+                count += 1
+        # 체결 도중 중단된 주문은 자동 재실행하지 않고 확인 대상으로 남김
+        stuck = self.collection.count_documents({"status": "filling"})
+        if stuck:
+            print(f"⚠️ 체결 처리 중 중단된 주문 {stuck}건이 있습니다. (status=filling 확인 필요)")
+        return count
+
+    def set_clear(self):
+        """
+        # 설명 : set_clear - 메모리 주문장 전체 폐기 (DB 는 건드리지 않음, 리플레이 전용 주문장 정리용)
+        # 출력 : 폐기된 주문 수
+        """
+        with self._lock:
+            count = sum(len(b) for b in self.books.values())
+            self.books.clear()
+            self.user_orders.clear()
+        return count
+
+    def get_stats(self):
+        """
+        # 설명 : 주문장 통계
+        """
+        with self._lock:
+            return {
+                "tickers": sum(1 for b in self.books.values() if len(b)),
+                "open_orders": sum(len(b) for b in self.books.values()),
+                "filled": self.filled_count,
+                "rejected": self.rejected_count
+            }
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from esc.rate_limit import BudgetExceededError
+
+class QuoteService:
+    """
+    # 설명 : QuoteService - 시세 배포 서비스 (종목별 최신가 보관 + 구독자 콜백 호출)
+    #        폴러가 종목당 1번 시세를 받아 publish 하면 주문장 등 구독자가 같은 값을 공유한다.
+    # 입력 : in_fetcher - ticker → 현재가 함수 (실패 시 None)
+    # 출력 : 시세 서비스 객체
+    """
+    def __init__(self, in_fetcher):
+        self.fetcher = in_fetcher
+        self.last_prices = {}      # ticker → (price, 수신시각)
+        self._subscribers = []     # (ticker, price) 콜백
+        self._watch_sources = []   # 폴링 대상 티커 목록을 돌려주는 함수들
+        self._lock = threading.Lock()
+        self.publish_count = 0
+        self.budget_skipped = 0    # 호출 예산 초과로 이번 회차에 건너뛴 종목 수 (누적)
+        self.paused = False        # True 면 폴링 중지 (리플레이가 시세를 대신 공급)
+
+    def subscribe(self, in_callback):
+        """
+        # 설명 : 시세 수신 콜백 등록
+        # 입력 : in_callback - (ticker, price) 함수
+        """
+        with self._lock:
+            self._subscribers.append(in_callback)
+
+    def add_watch_source(self, in_source):
+        """
+        # 설명 : 폴링 대상 티커 공급 함수 등록 (예: 대기 주문이 있는 종목)
+        # 입력 : in_source - () → 티커 리스트 함수
+        """
+        with self._lock:
+            self._watch_sources.append(in_source)
+
+    def get_watch_tickers(self):
+        """
+        # 설명 : 모든 공급 함수의 티커를 합친 폴링 대상 (중복 제거)
+        """
+        with self._lock:
+            sources = list(self._watch_sources)
+        tickers = set()
+        for source in sources:
+            tickers.update(source())
+        return sorted(tickers)
+
+    def publish(self, in_ticker, in_price):
+        """
+        # 설명 : 시세 반영 후 구독자에게 전달 (구독자 예외는 다른 구독자에 영향 없음)
+        # 입력 : in_ticker - 티커, in_price - 현재가
+        """
+        if not in_price:
+            return
+        with self._lock:
+            self.last_prices[in_ticker] = (float(in_price), time.time())
+            subscribers = list(self._subscribers)
+            self.publish_count += 1
+        for callback in subscribers:
+            try:
+                callback(in_ticker, float(in_price))
+            except Exception as e:
+                print(f"❌ 시세 구독자 처리 실패 ({in_ticker}): {e}")
+
+    def get_last_price(self, in_ticker):
+        """
+        # 설명 : 마지막으로 받은 시세
+        # 출력 : 가격 또는 None
+        """
+        item = self.last_prices.get(in_ticker)
+        return item[0] if item else None
+
+    def set_forget(self, in_tickers):
+        """
+        # 설명 : 보관 중인 최신가 제거 (리플레이가 남긴 과거 시세를 실시간 조회 전까지 쓰지 않도록)
+        # 입력 : in_tickers - 티커 리스트
+        """
+        with self._lock:
+            for ticker in in_tickers:
+                self.last_prices.pop(ticker, None)
+
+    def set_poll_once(self):
+        """
+        # 설명 : 폴링 대상 종목의 시세를 1번씩 받아 배포 (예산 초과 종목은 건너뛰고 다음 회차에 다시 조회)
+        # 출력 : 배포한 종목 수
+        """
+        if self.paused:
+            return 0
+        count = 0
+        for ticker in self.get_watch_tickers():
+            try:
+                price = self.fetcher(ticker)
+            except BudgetExceededError:
+                self.budget_skipped += 1
+                continue
+            if price:
+                self.publish(ticker, price)
+                count += 1
+        return count
+
+    async def run_poller(self, in_interval_sec=10):
+        """
+        # 설명 : 백그라운드 시세 폴링 루프 (블로킹 조회는 스레드에서 실행)
+        # 입력 : in_interval_sec - 폴링 주기(초)
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.set_poll_once)
+            except Exception as e:
+                print(f"❌ 시세 폴링 실패: {e}")
+            await asyncio.sleep(in_interval_sec)
@@ -0,0 +1,177 @@
+import time
+import threading
+
+class BudgetExceededError(Exception):
+    """
+    # 설명 : BudgetExceededError - 외부 호출 예산(OpenAI/야후 등) 소진
+    # 입력 : in_name - 예산 이름, in_retry_after - 다시 시도 가능한 시간(초)
+    """
+    def __init__(self, in_name, in_retry_after):
+        super().__init__(f"{in_name} 호출 한도 초과 ({in_retry_after:.1f}초 후 재시도)")
+        self.name = in_name
+        self.retry_after = in_retry_after
+
+class TokenBucket:
+    """
+    # 설명 : TokenBucket - 초당 in_rate 개씩 최대 in_capacity 개까지 채워지는 토큰 버킷
+    # 입력 : in_rate - 초당 충전 토큰 수, in_capacity - 최대 토큰 수(순간 허용량)
+    # 출력 : 버킷 객체 (스레드 안전하지 않음, 호출 측에서 lock)
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, in_rate, in_capacity):
+        self.rate = float(in_rate)
+        self.capacity = float(in_capacity)
+        self.tokens = float(in_capacity)
+        self.updated = time.monotonic()
+
+    def _set_refill(self, in_now):
+        self.tokens = min(self.capacity, self.tokens + (in_now - self.updated) * self.rate)
+        self.updated = in_now
+
+    def try_take(self, in_count=1.0):
+        """
+        # 설명 : 토큰 in_count 개 사용 시도
+        # 출력 : (성공여부, 부족할 때 토큰이 찰 때까지 기다릴 시간(초))
+        """
+        now = time.monotonic()
+        self._set_refill(now)
+        if self.tokens >= in_count:
+            self.tokens -= in_count
+            return True, 0.0
+        return False, (in_count - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def is_full(self):
+        self._set_refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+class UserRequestLimiter:
+    """
+    # 설명 : UserRequestLimiter - 사용자별 요청 속도(토큰 버킷) + 동시 처리 수 제한
+    #        한 사용자가 연속으로 보내도 분당 in_rate_per_min 건(순간 in_burst 건)까지만 처리하고,
+    #        처리 중인 요청이 in_max_concurrent 건이면 다음 요청은 바로 거절
+    # 입력 : in_rate_per_min - 분당 허용 요청 수, in_burst - 순간 허용 요청 수,
+    #       in_max_concurrent - 사용자당 동시 처리 수, in_max_users - 버킷 보관 최대 사용자 수
+    #       (in_rate_per_min 0 이하면 속도 제한 없이 동시 처리 수만 제한)
+    # 출력 : 제한기 객체
+    """
+    def __init__(self, in_rate_per_min=20, in_burst=5, in_max_concurrent=1, in_max_users=100000):
+        self.enabled = in_rate_per_min > 0
+        self.rate = in_rate_per_min / 60.0
+        self.burst = max(1, in_burst)
+        self.max_concurrent = max(1, in_max_concurrent)
+        self.max_users = in_max_users
+        self._buckets = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled_rate = 0
+        self.throttled_concurrency = 0
+
+    def _set_prune(self):
+        """ 버킷이 가득 찬(오래 쉬고 있는) 사용자는 기본 상태와 같으므로 제거 (lock 보유 상태에서 호출) """
+        for user_id in [u for u, b in self._buckets.items() if u not in self._inflight and b.is_full()]:
+            del self._buckets[user_id]
+
+    def try_acquire(self, in_userId):
+        """
+        # 설명 : 요청 1건 처리 허가 (허가되면 처리 후 반드시 release)
+        # 입력 : in_userId - 사용자id
+        # 출력 : (허가여부, 거절사유 rate/concurrency, 재시도 대기시간(초))
+        """
+        with self._lock:
+            if self._inflight.get(in_userId, 0) >= self.max_concurrent:
+                self.throttled_concurrency += 1
+                return False, "concurrency", 1.0
+            bucket = self._buckets.get(in_userId) if self.enabled else None
+            if bucket is None and self.enabled:
+                if len(self._buckets) >= self.max_users:
+                    self._set_prune()
+                bucket = self._buckets[in_userId] = TokenBucket(self.rate, self.burst)
+            ok, wait = bucket.try_take() if self.enabled else (True, 0.0)
+            if not ok:
+                self.throttled_rate += 1
+                return False, "rate", wait
+            self._inflight[in_userId] = self._inflight.get(in_userId, 0) + 1
+            self.allowed += 1
+            return True, None, 0.0
+
+    def release(self, in_userId):
+        """
+        # 설명 : 처리 완료 (동시 처리 수 반환)
+        """
+        with self._lock:
+            count = self._inflight.get(in_userId, 0) - 1
+            if count > 0:
+                self._inflight[in_userId] = count
+            else:
+                self._inflight.pop(in_userId, None)
+
+    def get_stats(self):
+        with self._lock:
+            total = self.allowed + self.throttled_rate + self.throttled_concurrency
+            return {
+                "allowed": self.allowed,
+                "throttled_rate": self.throttled_rate,
+                "throttled_concurrency": self.throttled_concurrency,
+                "throttle_ratio": round((total - self.allowed) / total, 4) if total else 0.0,
+                "inflight": sum(self._inflight.values()),
+                "tracked_users": len(self._buckets),
+                "rate_per_min": round(self.rate * 60, 2) if self.enabled else None,
+                "burst": self.burst, "max_concurrent": self.max_concurrent
+            }
+
+class OutboundBudget:
+    """
+    # 설명 : OutboundBudget - 외부 API(OpenAI, 야후 파이낸스) 전체 호출 예산 (프로세스 공용 토큰 버킷)
+    #        토큰이 없으면 in_max_wait_sec 안에 찰 때만 기다렸다가 호출(대기열), 그보다 오래 걸리면 BudgetExceededError
+    #        대기는 time.sleep 이므로 워커 스레드에서 호출할 것 (이벤트 루프에서 직접 호출 금지)
+    # 입력 : in_name - 예산 이름, in_rate_per_min - 분당 호출 수 (0 이하면 제한 없음),
+    #       in_burst - 순간 허용 호출 수, in_max_wait_sec - 최대 대기 시간(초)
+    # 출력 : 예산 객체
+    """
+    def __init__(self, in_name, in_rate_per_min=60, in_burst=10, in_max_wait_sec=3.0):
+        self.name = in_name
+        self.enabled = in_rate_per_min > 0
+        self.bucket = TokenBucket(in_rate_per_min / 60.0, max(1, in_burst)) if self.enabled else None
+        self.max_wait_sec = in_max_wait_sec
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.waited = 0
+        self.waited_sec = 0.0
+        self.denied = 0
+
+    def acquire(self):
+        """
+        # 설명 : 호출 1건 예산 확보 (필요하면 최대 in_max_wait_sec 대기)
+        # 출력 : None (예산 초과 시 BudgetExceededError)
+        """
+        if not self.enabled:
+            with self._lock:
+                self.calls += 1
+            return
+        with self._lock:
+            ok, wait = self.bucket.try_take()
+            if not ok and wait <= self.max_wait_sec:
+                # 토큰을 미리 빌려 두고(음수 허용) 그만큼 기다림 → 대기자끼리 순서대로 분산
+                self.bucket.tokens -= 1
+                self.waited += 1
+                self.waited_sec += wait
+            elif not ok:
+                self.denied += 1
+                raise BudgetExceededError(self.name, wait)
+            self.calls += 1
+        if not ok:
+            time.sleep(wait)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "calls": self.calls,
+                "waited": self.waited,
+                "avg_wait_ms": round(self.waited_sec / self.waited * 1000, 1) if self.waited else 0.0,
+                "denied": self.denied,
+                "rate_per_min": round(self.bucket.rate * 60, 2) if self.enabled else None,
+                "burst": self.bucket.capacity if self.enabled else None
+            }
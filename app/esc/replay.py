@@ -0,0 +1,275 @@
+import os
+import time
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# 일봉 1개를 장중 4개 시세(시가 → 고가/저가 → 저가/고가 → 종가)로 펼칠 때의 시각 (장 시작 기준 초)
+DAILY_TICK_OFFSETS = np.array([0, 2 * 3600, 4 * 3600, 6 * 3600 + 30 * 60], dtype="timedelta64[s]")
+MARKET_OPEN = np.timedelta64(9 * 3600, "s")
+
+# 증권사 차트 TR 내보내기(CSV) 컬럼 후보 (영문/키움 한글 컬럼)
+CSV_TIME_COLUMNS = ("datetime", "date", "time", "체결시간", "일자", "날짜")
+CSV_PRICE_COLUMNS = {"open": ("open", "시가"), "high": ("high", "고가"), "low": ("low", "저가"), "close": ("close", "현재가", "종가")}
+
+class SimClock:
+    """
+    # 설명 : SimClock - 모의투자 시계 (리플레이 중에는 재생 중인 과거 시각, 아니면 현재 시각)
+    # 입력 : None
+    # 출력 : 시계 객체
+    """
+    def __init__(self):
+        self._sim_now = None
+        self._lock = threading.Lock()
+
+    def get_now(self):
+        """
+        # 설명 : 현재 시각 (리플레이 중이면 시뮬레이션 시각)
+        """
+        with self._lock:
+            return self._sim_now or datetime.now()
+
+    def set_now(self, in_now):
+        """
+        # 설명 : 시뮬레이션 시각 설정 (None 이면 실제 시각으로 복귀)
+        """
+        with self._lock:
+            self._sim_now = in_now
+
+    def is_simulated(self):
+        return self._sim_now is not None
+
+def get_store_ticks(in_store, in_ticker, in_start, in_end, in_intrabar=True):
+    """
+    # 설명 : get_store_ticks - 일봉 저장소의 일봉을 재생용 시세열로 변환
+    # 입력 : in_store - BarStore, in_ticker - 티커, in_start/in_end - 재생 구간(YYYY-MM-DD),
+    #       in_intrabar - True 면 일봉 1개를 시가/고가/저가/종가 4개 시세로 펼침 (지정가/스탑 체결 재현)
+    # 출력 : (시각 datetime64[s] 배열, 가격 배열)
+    # 소스 : 일봉 로컬 저장소 (esc.bar_store)
+    """
+    bars = in_store.get_bars(in_ticker, "10y", in_refresh=False)
+    lo = np.searchsorted(bars["date"], np.datetime64(in_start, "D"), side="left")
+    hi = np.searchsorted(bars["date"], np.datetime64(in_end, "D"), side="right")
+    bars = bars[lo:hi]
+    day_open = bars["date"].astype("datetime64[s]") + MARKET_OPEN
+    if not in_intrabar:
+        return day_open + DAILY_TICK_OFFSETS[-1], bars["close"].astype("f8")
+    # 양봉은 시가 → 저가 → 고가 → 종가, 음봉은 시가 → 고가 → 저가 → 종가 순서로 가정
+    up = bars["close"] >= bars["open"]
+    path = np.stack([bars["open"], np.where(up, bars["low"], bars["high"]),
+                     np.where(up, bars["high"], bars["low"]), bars["close"]], axis=1)
+    times = day_open[:, None] + DAILY_TICK_OFFSETS[None, :]
+    return times.ravel(), path.ravel().astype("f8")
+
+def get_csv_ticks(in_path, in_start=None, in_end=None):
+    """
+    # 설명 : get_csv_ticks - 증권사 차트 TR 내보내기(분봉/일봉 CSV)를 재생용 시세열로 변환
+    #        키움 형식의 부호 붙은 가격("-70000")은 절댓값, 시각은 YYYYMMDDHHMMSS / YYYY-MM-DD HH:MM 모두 허용
+    # 입력 : in_path - CSV 경로 (파일명이 티커, 예: 005930.KS.csv / 005930.csv), in_start/in_end - 재생 구간
+    # 출력 : (티커, 시각 datetime64[s] 배열, 가격 배열)
+    # 소스 : 증권사 차트 TR 내보내기 파일
+    """
+    df = pd.read_csv(in_path, dtype=str)
+    cols = {c.strip().lower(): c for c in df.columns}
+    time_col = next((cols[c] for c in CSV_TIME_COLUMNS if c in cols), None)
+    close_col = next((cols[c] for c in CSV_PRICE_COLUMNS["close"] if c in cols), None)
+    if time_col is None or close_col is None:
+        raise ValueError(f"시각/종가 컬럼을 찾을 수 없습니다: {in_path}")
+    raw_time = df[time_col].str.replace(r"[^0-9]", "", regex=True)
+    fmt = {8: "%Y%m%d", 12: "%Y%m%d%H%M", 14: "%Y%m%d%H%M%S"}.get(int(raw_time.str.len().max()))
+    times = pd.to_datetime(raw_time, format=fmt) if fmt else pd.to_datetime(df[time_col])
+    if fmt == "%Y%m%d":
+        times = times + pd.Timedelta(hours=15, minutes=30)  # 일봉은 장 마감 시각으로
+    prices = df[close_col].str.replace(",", "").astype(float).abs()
+    frame = pd.DataFrame({"t": times, "p": prices}).dropna().sort_values("t")
+    if in_start:
+        frame = frame[frame["t"] >= pd.Timestamp(in_start)]
+    if in_end:
+        frame = frame[frame["t"] < pd.Timestamp(in_end) + pd.Timedelta(days=1)]
+    stem = os.path.basename(in_path).rsplit(".csv", 1)[0].upper()
+    ticker = f"{stem}.KS" if stem.isdigit() else stem
+    return ticker, frame["t"].to_numpy().astype("datetime64[s]"), frame["p"].to_numpy(dtype="f8")
+
+def get_merged_ticks(in_series):
+    """
+    # 설명 : get_merged_ticks - 종목별 시세열을 하나의 시간순 이벤트열로 병합
+    # 입력 : in_series - [(티커, 시각 배열, 가격 배열)]
+    # 출력 : (tickers 리스트, 시각 배열, 종목 인덱스 배열, 가격 배열) - 같은 시각은 종목 순서 유지
+    """
+    tickers = [s[0] for s in in_series]
+    if not tickers:
+        return [], np.empty(0, dtype="datetime64[s]"), np.empty(0, dtype=np.int32), np.empty(0)
+    times = np.concatenate([s[1] for s in in_series])
+    idx = np.concatenate([np.full(len(s[1]), i, dtype=np.int32) for i, s in enumerate(in_series)])
+    prices = np.concatenate([s[2] for s in in_series])
+    order = np.lexsort((idx, times))
+    return tickers, times[order], idx[order], prices[order]
+
+class ReplayEngine:
+    """
+    # 설명 : ReplayEngine - 과거 시세를 시세 서비스로 흘려보내는 재생기 (별도 스레드)
+    #        같은 시각의 시세를 한 번에 배포한 뒤, 다음 시각까지 (시뮬레이션 간격 / 배속) 만큼 대기
+    #        배속 0 은 대기 없이 최대 속도 (파이프라인 부하 시험용)
+    # 입력 : in_quote_service - QuoteService, in_clock - SimClock,
+    #       in_on_finish - 재생이 끝나면(중지/완료/오류) 실시간 폴링 재개 전에 호출할 (재생 티커 리스트) 함수
+    # 출력 : 재생기 객체
+    """
+    def __init__(self, in_quote_service, in_clock, in_on_finish=None):
+        self.quotes = in_quote_service
+        self.clock = in_clock
+        self.on_finish = in_on_finish
+        self._active = False
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.status = {"state": "idle"}
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_active(self):
+        """
+        # 설명 : 재생 세션 진행 여부 (시작 ~ 종료 정리 직전까지, 주문 라우팅 판단용)
+        """
+        return self._active
+
+    def set_start(self, in_series, in_speed=60.0, in_max_gap_sec=3600):
+        """
+        # 설명 : set_start - 재생 시작 (실행 중이면 ValueError)
+        # 입력 : in_series - [(티커, 시각 배열, 가격 배열)], in_speed - 배속 (0 이면 최대 속도),
+        #       in_max_gap_sec - 이보다 긴 시뮬레이션 공백(장 마감~다음 장)은 대기 없이 건너뜀
+        # 출력 : 재생 상태 dict
+        """
+        with self._lock:
+            if self.is_running():
+                raise ValueError("이미 리플레이가 실행 중입니다.")
+            tickers, times, idx, prices = get_merged_ticks(in_series)
+            if not len(times):
+                raise ValueError("재생할 시세가 없습니다.")
+            self._stop.clear()
+            self.status = {
+                "state": "running", "speed": in_speed, "tickers": len(tickers), "events": int(len(times)),
+                "published": 0, "sim_start": str(times[0]), "sim_end": str(times[-1]), "sim_now": str(times[0]),
+                "started_at": time.time(), "events_per_sec": 0.0, "max_lag_sec": 0.0
+            }
+            self.quotes.paused = True  # 실시간 폴링이 과거 시세를 덮어쓰지 않도록 정지
+            self._active = True
+            self._thread = threading.Thread(
+                target=self._run, args=(tickers, times, idx, prices, float(in_speed), in_max_gap_sec), daemon=True)
+            self._thread.start()
+            return dict(self.status)
+
+    def set_stop(self):
+        """
+        # 설명 : set_stop - 재생 중지 요청 (스레드 종료까지 대기)
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        return self.get_status()
+
+    def _run(self, in_tickers, in_times, in_idx, in_prices, in_speed, in_max_gap_sec):
+        # 같은 시각 이벤트 구간 경계
+        bounds = np.flatnonzero(np.diff(in_times.astype(np.int64))) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(in_times)]])
+        wall_start = time.perf_counter()
+        sim_elapsed = 0.0   # 공백을 건너뛴 누적 시뮬레이션 시간
+        prev_t = in_times[0]
+        published = 0
+        try:
+            for s, e in zip(starts, ends):
+                if self._stop.is_set():
+                    break
+                t = in_times[s]
+                gap = float((t - prev_t) / np.timedelta64(1, "s"))
+                prev_t = t
+                if gap <= in_max_gap_sec:
+                    sim_elapsed += gap
+                if in_speed > 0:
+                    # 목표 실제 시각까지 대기 (늦어졌으면 바로 진행하고 지연 기록)
+                    lag = (time.perf_counter() - wall_start) - sim_elapsed / in_speed
+                    if lag < 0:
+                        self._stop.wait(-lag)
+                    elif lag > self.status["max_lag_sec"]:
+                        self.status["max_lag_sec"] = round(lag, 3)
+                self.clock.set_now(pd.Timestamp(t).to_pydatetime())
+                for j in range(s, e):
+                    self.quotes.publish(in_tickers[in_idx[j]], in_prices[j])
+                published += e - s
+                wall = time.perf_counter() - wall_start
+                self.status.update({"published": int(published), "sim_now": str(t),
+                                    "events_per_sec": round(published / wall, 1) if wall > 0 else 0.0})
+            self.status["state"] = "stopped" if self._stop.is_set() else "finished"
+        except Exception as e:
+            print(f"❌ 리플레이 중단: {e}")
+            self.status["state"] = "error"
+            self.status["error"] = str(e)
+        finally:
+            self.status["elapsed_sec"] = round(time.perf_counter() - wall_start, 3)
+            self.clock.set_now(None)
+            self._active = False
+            if self.on_finish is not None:
+                try:
+                    self.on_finish(in_tickers)
+                except Exception as e:
+                    print(f"❌ 리플레이 종료 정리 실패: {e}")
+            self.quotes.paused = False
+
+    def get_status(self):
+        """
+        # 설명 : 재생 상태 (진행 이벤트 수, 시뮬레이션 시각, 실제 처리율, 최대 지연)
+        """
+        return dict(self.status)
+
+def get_bench_result(in_tickers=200, in_minutes=390, in_orders=20000, in_seed=42):
+    """
+    # 설명 : get_bench_result - 메모리 파이프라인(시세 서비스 → 대기 주문장 + 순위표) 최대 속도 재생 측정
+    # 입력 : in_tickers-종목 수, in_minutes-분봉 수(하루 390분), in_orders-대기 주문 수, in_seed-난수 시드
+    # 출력 : 측정 결과 dict (실제 장 속도 = 종목 수 × 분당 1건 대비 배속 포함)
+    """
+    from esc.quote_service import QuoteService
+    from esc.order_book import OrderBookManager
+    from esc.leaderboard import Leaderboard
+
+    rnd = np.random.default_rng(in_seed)
+    tickers = [f"{i:06d}.KS" for i in range(in_tickers)]
+    start = np.datetime64("2025-01-02T09:00:00")
+    times = start + np.arange(in_minutes).astype("timedelta64[m]")
+    closes = 10000 * np.exp(np.cumsum(rnd.normal(0, 0.002, (in_minutes, in_tickers)), axis=0))
+    series = [(t, times.astype("datetime64[s]"), closes[:, i]) for i, t in enumerate(tickers)]
+
+    board = Leaderboard()
+    book = OrderBookManager(in_executor=lambda o, p: (board.on_trade(o["user_id"], o["ticker"].split(".")[0],
+                                                                     o["side"], o["quantity"], p), (True, ""))[1])
+    for k in range(in_orders):
+        j = int(rnd.integers(in_tickers))
+        book.set_order(f"user_{k % 1000:04d}", tickers[j], str(rnd.choice(["buy", "sell"])),
+                       str(rnd.choice(["limit", "stop"])), 1, 10000 * rnd.uniform(0.97, 1.03))
+    quotes = QuoteService(lambda t: None)
+    quotes.subscribe(book.on_quote)
+    quotes.subscribe(lambda t, p: board.on_price(t.split(".")[0], p))
+    engine = ReplayEngine(quotes, SimClock())
+    engine.set_start(series, in_speed=0)
+    engine._thread.join()
+    status = engine.get_status()
+    live_rate = in_tickers / 60.0  # 실제 장: 종목당 분당 1건
+    return {
+        "events": status["published"], "elapsed_sec": status["elapsed_sec"],
+        "events_per_sec": status["events_per_sec"], "x_real_time": round(status["events_per_sec"] / live_rate, 1),
+        "filled": book.get_stats()["filled"], "ranked_users": len(board)
+    }
+
+if __name__ == "__main__":
+    # 실행 예) python app/esc/replay.py --tickers 200 --orders 20000
+    import sys
+    import argparse
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description="시세 리플레이 파이프라인 부하 측정")
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--minutes", type=int, default=390)
+    parser.add_argument("--orders", type=int, default=20000)
+    args = parser.parse_args()
+    for k, v in get_bench_result(args.tickers, args.minutes, args.orders).items():
+        print(f"{k:>16}: {v}")
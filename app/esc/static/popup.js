@@ -6,6 +6,7 @@ window.currentFilter = 'winners';
 let currentSortCol = 'profit';
 let isAsc = false;
 let SELECTEDROWELEMENT_ESC = null;
+let LIVESOURCE_ESC = null;   // 실시간 평가/순위 푸시 연결 (EventSource)
 
 const stockColorMap = {};
 const colorPalette = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899', '#06b6d4', '#f43f5e', '#84cc16', '#a855f7'];
@@ -31,9 +32,8 @@ async function getStockModalDOM(in_userId) {
     if (titleElem) titleElem.innerText = `📊 ${in_userId} 유저 자산 상세 분석 리포트`;
     
     try {
-        // 1. [로그 확인용] 랭킹 API를 강제로 다시 호출합니다. (주석 해제)
-        // 이 코드가 실행되어야 백엔드 터미널에 로그가 찍힙니다.
-        loadGlobalTopRanker(in_userId); 
+        // 1. 1위/내 평가금액은 서버 푸시로 받고, 푸시를 쓸 수 없는 브라우저만 랭킹 API 1회 호출
+        if (!startLiveValuation(in_userId)) loadGlobalTopRanker(in_userId);
 
         // 2. 현재 유저 상세 데이터 로드
         const res = await fetch(`/apiEsc/popup-status?in_userId=${in_userId}`);
@@ -47,6 +47,80 @@ async function getStockModalDOM(in_userId) {
         console.error("데이터 로드 실패:", e);
     }
 }
+/**
+ * 실시간 평가금액/순위 구독 (서버가 시세 변경분만 푸시하므로 주기적 재조회가 필요 없음)
+ * 이벤트: snapshot(접속 직후 전체), valuation(바뀐 종목 + 합계), rank(내 순위 변경), top1(1위 변경)
+ * @returns {boolean} 구독 시작 여부
+ */
+function startLiveValuation(in_userId) {
+    stopLiveValuation();
+    if (!window.EventSource) return false;
+
+    LIVESOURCE_ESC = new EventSource(`/apiEsc/live-stream?in_userId=${encodeURIComponent(in_userId)}`);
+    const onValuation = (e) => {
+        const data = JSON.parse(e.data);
+        renderLiveValuation(data);
+        if (data.top1) renderTopRanker(in_userId, data.top1);
+    };
+    LIVESOURCE_ESC.addEventListener('snapshot', onValuation);
+    LIVESOURCE_ESC.addEventListener('valuation', onValuation);
+    LIVESOURCE_ESC.addEventListener('rank', onValuation);
+    LIVESOURCE_ESC.addEventListener('top1', (e) => renderTopRanker(in_userId, JSON.parse(e.data)));
+    // 연결이 끊기면 EventSource 가 자동 재접속하고, 서버가 snapshot 을 다시 보내 상태를 맞춤
+    return true;
+}
+
+function stopLiveValuation() {
+    if (LIVESOURCE_ESC) {
+        LIVESOURCE_ESC.close();
+        LIVESOURCE_ESC = null;
+    }
+}
+
+function closeStockModal() {
+    stopLiveValuation();
+    const modal = document.getElementById('stockModal');
+    const overlay = document.getElementById('modalOverlay');
+    if (modal) modal.remove();
+    if (overlay) overlay.remove();
+}
+
+/**
+ * 내 평가금액/순위 표시 (푸시 이벤트의 합계 필드만 사용)
+ */
+function renderLiveValuation(in_data) {
+    const elem = document.getElementById('liveValuation');
+    if (!elem) return;
+    if (in_data.total_value !== undefined) {
+        const color = in_data.total_profit >= 0 ? '#ef4444' : '#3b82f6';
+        elem.dataset.value = `💼 내 평가자산 <b>${Math.floor(in_data.total_value).toLocaleString()}원</b>
+            (<span style="color:${color};">${Math.floor(in_data.total_profit).toLocaleString()}원</span>)`;
+    }
+    if (in_data.rank !== undefined) {
+        elem.dataset.rank = in_data.rank ? ` · 🏅 ${in_data.rank.rank.toLocaleString()}위 / ${in_data.rank.total_users.toLocaleString()}명` : '';
+    }
+    elem.innerHTML = (elem.dataset.value || '') + (elem.dataset.rank || '');
+}
+
+/**
+ * 전체 1위 표시 (푸시/랭킹 API 공용)
+ */
+function renderTopRanker(in_targetId, in_top) {
+    const infoElem = document.getElementById('bestUserInfo');
+    const rateElem = document.getElementById('bestUserRate');
+    if (!infoElem || !rateElem || !in_top) return;
+    infoElem.innerHTML = `
+        <div style="color: #94a3b8; font-size: 11px;">분석 중: <strong>${in_targetId}</strong></div>
+        <div style="color: #fbbf24; font-size: 11px; margin-top: 4px;">🏆 전체 1위: ${in_top.user_name || in_top.user_id}</div>
+    `;
+    rateElem.innerHTML = `
+        <div style="text-align: right;">
+            <div style="font-size: 11px; color: #94a3b8;">1위 누적 수익</div>
+            <div style="color: #ef4444; font-size: 20px; font-weight: 800;">${Math.floor(in_top.total_profit).toLocaleString()}원</div>
+        </div>
+    `;
+}
+
 /**
  * 상단 파란 박스 영역에 현재 조회 유저 정보를 표시하는 함수 (신설)
  */
@@ -91,18 +165,7 @@ async function loadGlobalTopRanker(targetId = "Unknown") {
             return;
         }
 
-        if (infoElem && rateElem) {
-            infoElem.innerHTML = `
-                <div style="color: #94a3b8; font-size: 11px;">분석 중: <strong>${targetId}</strong></div>
-                <div style="color: #fbbf24; font-size: 11px; margin-top: 4px;">🏆 전체 1위: ${topData.user_name || topData.user_id}</div>
-            `;
-            rateElem.innerHTML = `
-                <div style="text-align: right;">
-                    <div style="font-size: 11px; color: #94a3b8;">1위 누적 수익</div>
-                    <div style="color: #ef4444; font-size: 20px; font-weight: 800;">${Math.floor(topData.total_profit).toLocaleString()}원</div>
-                </div>
-            `;
-        }
+        renderTopRanker(targetId, topData);
     } catch (e) {
         console.error("네트워크 에러:", e);
         if(infoElem) infoElem.innerHTML = `<div style="color: #f87171; font-size: 11px;">⚠️ 서버 연결 확인 필요</div>`;
@@ -154,9 +217,10 @@ async function renderCombinedChartWithProgress(in_tickers, in_allData, in_clicke
     if (!chartElement) return;
 
     try {
-        const results = await Promise.all(in_tickers.map(t => 
-            fetch(`/apiEsc/stock-chart-data?in_code=${t}&t=${new Date().getTime()}`).then(r => r.json())
-        ));
+        // 보유 종목 전체를 한 번에 요청 (서버 캐시 + Cache-Control 로 재요청 비용 최소화)
+        const query = in_tickers.map(t => `in_codes=${encodeURIComponent(t)}`).join('&');
+        const batch = await fetch(`/apiEsc/stock-chart-batch?${query}`).then(r => r.json());
+        const results = in_tickers.map(t => (batch.series && batch.series[t]) || {error: '데이터가 없습니다.'});
         
         const traces = results.map((json, idx) => {
             if (json.error || !json.dates) return null;
@@ -187,6 +251,41 @@ async function renderCombinedChartWithProgress(in_tickers, in_allData, in_clicke
     } catch (e) { console.error(e); }
 }
 
+/**
+ * 종목 시세 캔들 차트 (서버는 컬럼형 JSON 만 내려주고 렌더링은 브라우저 Plotly 가 담당)
+ * 같은 (종목, 기간)은 서버 캐시 + ETag 로 재전송 없이 304 처리됩니다.
+ * 종목 목록에서 행을 클릭하면 해당 종목 캔들 차트를 mainDynamicChart 에 그립니다.
+ */
+async function renderStockSeriesChart(in_elemId, in_code, in_period = '3mo', in_points = 200, in_name = null) {
+    const chartElement = document.getElementById(in_elemId);
+    if (!chartElement) return;
+
+    try {
+        let url = `/apiEsc/chart-series?in_code=${encodeURIComponent(in_code)}&in_period=${in_period}`;
+        if (in_points) url += `&in_points=${in_points}`;
+        const json = await fetch(url).then(r => r.json());
+        if (!json.dates || json.dates.length === 0) {
+            chartElement.innerHTML = "<div style='padding:20px; text-align:center;'>차트 데이터를 불러올 수 없습니다. (종목코드 확인 필요)</div>";
+            return;
+        }
+        Plotly.newPlot(chartElement, [{
+            x: json.dates,
+            open: json.open, high: json.high, low: json.low, close: json.close,
+            type: 'candlestick',
+            increasing: { line: { color: '#ff4d4d' } },
+            decreasing: { line: { color: '#3b82f6' } }
+        }], {
+            title: { text: `📊 ${in_name || json.ticker} 시세 (${json.period})`, font: { size: 13 } },
+            paper_bgcolor: 'rgba(0,0,0,0)',
+            plot_bgcolor: 'rgba(0,0,0,0)',
+            font: { color: '#94a3b8', size: 11 },
+            margin: { t: 40, b: 50, l: 30, r: 50 },
+            xaxis: { type: 'date', tickformat: '%m-%d', gridcolor: '#1e293b', rangeslider: { visible: false } },
+            yaxis: { gridcolor: '#1e293b', side: 'right' }
+        }, {responsive: true, displayModeBar: false});
+    } catch (e) { console.error(e); }
+}
+
 function renderStockList(in_stocks) {
     const listContainer = document.getElementById('stockListContainer');
     if(!listContainer) return;
@@ -205,8 +304,8 @@ function renderStockList(in_stocks) {
 
     in_stocks.forEach(s => {
         const color = s.profit >= 0 ? '#ff4d4d' : '#3b82f6';
-        // 클릭 시 리스트의 데이터를 참고하여 해당 종목만 차트에 그림
-        html += `<tr class="stock-row" onclick="renderCombinedChartWithProgress(['${s.code}'], cachedAllData, this)" 
+        // 클릭 시 해당 종목의 캔들 차트를 그림
+        html += `<tr class="stock-row" onclick="renderStockSeriesChart('mainDynamicChart', '${s.code}', '3mo', 200, '${String(s.name).replace(/['"\\]/g, '')}')" 
                      style="border-bottom:1px solid #1e293b; cursor:pointer;">
             <td style="padding:10px 2px; text-align:center; color:#64748b;">${s.date}</td>
             <td style="font-weight:bold; color:#f8fafc; padding-left:5px; white-space:nowrap; overflow:hidden; text-overflow:ellipsis;">${s.name}</td>
@@ -250,7 +349,7 @@ function renderTotalSummary(in_data) {
             <div style="text-align:center;"><div style="font-size:10px; color:#94a3b8;">총 투자원금</div><div style="font-size:14px; font-weight:bold;">${Math.floor(totalInvest).toLocaleString()}원</div></div>
             <div style="text-align:center;"><div style="font-size:10px; color:#94a3b8;">총 평가손익</div><div style="font-size:14px; font-weight:bold; color:${color};">${Math.floor(totalProfit).toLocaleString()}원</div></div>
             <div style="text-align:center;"><div style="font-size:10px; color:#94a3b8;">누적 수익률</div><div style="font-size:14px; font-weight:bold; color:${color};">${totalRate.toFixed(2)}%</div></div>
-            <button onclick="document.getElementById('stockModal').remove();document.getElementById('modalOverlay').remove();" style="background:#334155; color:white; border:none; padding:8px 20px; border-radius:6px; cursor:pointer;">닫기</button>
+            <button onclick="closeStockModal();" style="background:#334155; color:white; border:none; padding:8px 20px; border-radius:6px; cursor:pointer;">닫기</button>
         </div>`;
 }
 
@@ -277,7 +376,7 @@ function injectModalHTML() {
         <div id="stockModal" style="position:fixed;top:50%;left:50%;transform:translate(-50%,-50%);width:98%;max-width:1300px;height:90vh;background:#0f172a;z-index:9999;display:flex;flex-direction:column;color:#f8fafc;border-radius:12px;border:1px solid #334155;overflow:hidden;">
             <div style="display:flex; justify-content:space-between; align-items:center; padding:12px 15px; border-bottom:1px solid #1e293b;">
                 <h2 style="margin:0; font-size:16px;">🏆 모의투자 자산 분석 리포트</h2>
-                <button onclick="document.getElementById('stockModal').remove();document.getElementById('modalOverlay').remove();" style="background:transparent; border:none; color:#94a3b8; font-size:24px; cursor:pointer;">&times;</button>
+                <button onclick="closeStockModal();" style="background:transparent; border:none; color:#94a3b8; font-size:24px; cursor:pointer;">&times;</button>
             </div>
             <div style="flex:1; display:flex; flex-direction:column; padding:12px; overflow:hidden; position:relative;">
                 <div id="globalBestUser" style="background: rgba(30, 41, 59, 0.5); border: 1px dashed #3b82f6; padding: 12px; margin-bottom: 15px; border-radius: 8px; display: flex; align-items: center; justify-content: center; gap: 40px;">
@@ -288,6 +387,7 @@ function injectModalHTML() {
                     <div style="width:1px; height:30px; background:#334155;"></div>
                     <div id="bestUserRate" style="font-size: 20px; font-weight: 800; color: #ef4444;">0원</div>
                 </div>
+                <div id="liveValuation" style="margin:-8px 0 12px; font-size:12px; color:#cbd5e1; text-align:center;"></div>
 
                 <div style="display:flex; gap:15px; margin-bottom:10px; font-size:12px;">
                     <label style="cursor:pointer;"><input type="radio" name="filter" value="winners" checked onclick="window.currentFilter='winners'; renderStockList(applyFilterAndSort(cachedAllData))"> 수익종목 TOP</label>
@@ -1,10 +1,13 @@
 import os
+import argparse
 import certifi
 from elasticsearch import Elasticsearch, helpers
 from dotenv import load_dotenv
 from pathlib import Path
 from pymongo import MongoClient
 from cmm.config import MONGO_URI
+from esc.es_sync import ChangeStreamSync, get_summary_source, set_backfill_summary
+from esc.es_templates import set_install
 
 ###last 2026-01-06
 # 환경 변수 로드
@@ -42,24 +45,9 @@ def sync_data():
     
     count = 0
     for doc in cursor:
-        code = doc['code']
-        current_price = stocks.get(code, 0)
-        
-        # ES에 저장할 문서 구조 (역정규화: 모든 정보를 한곳에!)
-        action = {
-            "_index": "trade_summary",
-            "_id": f"{doc['user_id']}_{code}", # 유저ID와 종목코드로 유니크 키 설정
-            "_source": {
-                "user_id": doc['user_id'],
-                "code": code,
-                "total_buy_qty": doc.get('total_buy_qty', 0),
-                "total_buy_amt": doc.get('total_buy_amt', 0),
-                "total_sell_qty": doc.get('total_sell_qty', 0),
-                "total_sell_amt": doc.get('total_sell_amt', 0),
-                "current_price": current_price
-            }
-        }
-        actions.append(action)
+        # ES에 저장할 문서 구조 (역정규화: 모든 정보를 한곳에!), 유저ID와 종목코드로 유니크 키 설정
+        doc_id, source = get_summary_source(doc, stocks.get(doc['code'], 0))
+        actions.append({"_index": "trade_summary", "_id": doc_id, "_source": source})
         
         # 1000건씩 묶어서 대량 전송 (Bulk)
         if len(actions) >= 1000:
@@ -75,7 +63,24 @@ def sync_data():
     print("✅ 모든 데이터 동기화가 완료되었습니다!")
 
 if __name__ == "__main__":
-    if es.ping():
-        sync_data()
+    # 실행 예) cd app && python -m esc.sync_to_es            (1회 전체 동기화)
+    #         cd app && python -m esc.sync_to_es --watch    (변경 스트림 상주 동기화, 재개 토큰 유지)
+    #         cd app && python -m esc.sync_to_es --backfill-summary   (보유수량/원가/실현손익 필드 1회 보정 후 동기화)
+    parser = argparse.ArgumentParser(description="몽고DB → ES 동기화")
+    parser.add_argument("--watch", action="store_true", help="변경 스트림을 따라가며 증분 동기화 (상주)")
+    parser.add_argument("--full", action="store_true", help="--watch 시작 시 재개 토큰을 무시하고 전체 재동기화")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("ESC_SYNC_BATCH_SIZE", "500")))
+    parser.add_argument("--flush-sec", type=float, default=float(os.getenv("ESC_SYNC_FLUSH_SEC", "1")))
+    parser.add_argument("--backfill-summary", action="store_true", help="trade_summary_esc 보유수량/원가/실현손익 필드 보정 먼저 실행")
+    args = parser.parse_args()
+    if args.backfill_summary:
+        print(f"✅ 거래 요약 보정 {set_backfill_summary(db.trade_summary_esc)}건")
+    if not es.ping():
+        print("❌ Elasticsearch에 연결할 수 없습니다. URL을 확인하세요.")
+        raise SystemExit(1)
+    # 인덱스가 새로 만들어질 때 명시 매핑/평가손익 파이프라인이 적용되도록 먼저 등록
+    set_install(es)
+    if args.watch:
+        ChangeStreamSync(db, es, db.es_sync_state, args.batch_size, args.flush_sec).run(in_force_full=args.full)
     else:
-        print("❌ Elasticsearch에 연결할 수 없습니다. URL을 확인하세요.")
\ No newline at end of file
+        sync_data()
\ No newline at end of file
@@ -0,0 +1,78 @@
+import copy
+import time
+import threading
+
+class UserStateCache:
+    """
+    # 설명 : UserStateCache - 모의투자 유저 상태(예수금, 포트폴리오) 프로세스 내 캐시 (write-through)
+    # 입력 : in_ttl_sec - 캐시 유지 시간(초), in_max_size - 최대 보관 유저 수
+    # 출력 : 캐시 객체
+    # 소스 : 몽고DB ykpark.users_esc (history 필드 제외)
+    """
+    def __init__(self, in_ttl_sec=30, in_max_size=10000):
+        self.ttl_sec = in_ttl_sec
+        self.max_size = in_max_size
+        self._store = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, in_userId):
+        """
+        # 설명 : 캐시에서 유저 상태 조회 (만료된 항목은 미스 처리)
+        # 입력 : in_userId - 사용자id
+        # 출력 : user dict 또는 None (중첩 portfolio 까지 복사본 → 호출 측 수정이 캐시에 새지 않음)
+        """
+        with self._lock:
+            item = self._store.get(in_userId)
+            if item and item[0] > time.monotonic():
+                self.hits += 1
+                return copy.deepcopy(item[1])
+            if item:
+                self._store.pop(in_userId, None)
+            self.misses += 1
+            return None
+
+    def put(self, in_userId, in_user):
+        """
+        # 설명 : 유저 상태를 캐시에 기록 (DB 반영 직후 호출 = write-through)
+        # 입력 : in_userId - 사용자id, in_user - 유저 문서
+        # 출력 : None
+        """
+        if not in_user:
+            return
+        user = copy.deepcopy({k: v for k, v in in_user.items() if k not in ("_id", "history")})
+        with self._lock:
+            if len(self._store) >= self.max_size and in_userId not in self._store:
+                # 가장 먼저 만료되는 항목부터 제거
+                oldest = min(self._store, key=lambda k: self._store[k][0])
+                self._store.pop(oldest, None)
+            self._store[in_userId] = (time.monotonic() + self.ttl_sec, user)
+
+    def invalidate(self, in_userId):
+        """
+        # 설명 : 주문 체결 등으로 상태가 바뀐 유저의 캐시 제거
+        # 입력 : in_userId - 사용자id
+        # 출력 : None
+        """
+        with self._lock:
+            if self._store.pop(in_userId, None) is not None:
+                self.invalidations += 1
+
+    def get_stats(self):
+        """
+        # 설명 : 캐시 적중률 통계
+        # 입력 : None
+        # 출력 : 통계 dict
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._store),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "ttl_sec": self.ttl_sec
+            }
@@ -0,0 +1,376 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import ConnectionError as EsConnectionError
+
+# 프로젝트 루트 (app.esc.es_templates 사용)
+project_root = str(Path(__file__).resolve().parent.parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from app.esc.es_templates import get_ranking_body, get_valuation_fields
+
+SUMMARY_INDEX = "trade_summary"
+MASTER_INDEX = "stock_master"
+SUMMARY_MAX_ROWS = 1000          # 사용자 요약 최대 건수 (ES size 와 동일)
+HISTOGRAM_MIN_INTERVAL = 100     # 가격 히스토그램 최소 구간 (원)
+HISTOGRAM_MAX_BUCKETS = 2000     # 가격 히스토그램 최대 구간 수 (넘으면 ValueError → 400)
+SUMMARY_COLUMNS = ["user_id", "code", "total_buy_qty", "total_buy_amt", "total_sell_qty", "total_sell_amt",
+                   "current_price", "holdings", "realized_pnl", "total_valuation"]
+MASTER_COLUMNS = ["code", "name", "close", "market"]
+
+class EsAnalytics:
+    """
+    # 설명 : EsAnalytics - 리포트 집계 조회 (엘라스틱서치 구현)
+    # 입력 : in_es - ES 클라이언트
+    # 소스 : 엘라스틱서치 trade_summary, stock_master
+    """
+    name = "es"
+
+    def __init__(self, in_es):
+        self.es = in_es
+
+    def get_top_earners(self, in_size=1):
+        """
+        # 설명 : get_top_earners - 총평가손익(total_valuation 합계) 상위 사용자 (동점이면 사용자id 순)
+        # 입력 : in_size - 인원
+        # 출력 : [{user_id, total_valuation}]
+        """
+        res = self.es.search(index=SUMMARY_INDEX, body=get_ranking_body(in_size=in_size))
+        buckets = res.get("aggregations", {}).get("top_earner", {}).get("buckets", [])
+        return [{"user_id": b["key"], "total_valuation": b["total_valuation"]["value"]} for b in buckets]
+
+    def get_user_summary(self, in_userId):
+        """
+        # 설명 : get_user_summary - 사용자 종목별 누적 매매 요약
+        # 입력 : in_userId - 사용자id
+        # 출력 : [trade_summary 문서]
+        """
+        res = self.es.search(index=SUMMARY_INDEX, query={"term": {"user_id": str(in_userId)}}, size=SUMMARY_MAX_ROWS)
+        return [hit["_source"] for hit in res["hits"]["hits"]]
+
+    def get_price_histogram(self, in_interval=10000, in_field="close"):
+        """
+        # 설명 : get_price_histogram - 종목 가격 분포 (in_interval 원 단위 구간, 최소~최대 사이 빈 구간 포함)
+        # 입력 : in_interval - 구간 크기, in_field - 가격 필드
+        # 출력 : [{key, count}]
+        """
+        res = self.es.search(index=MASTER_INDEX, body={
+            "size": 0, "aggs": {"price_buckets": {"histogram": {"field": in_field, "interval": in_interval}}}
+        })
+        buckets = res.get("aggregations", {}).get("price_buckets", {}).get("buckets", [])
+        if len(buckets) > HISTOGRAM_MAX_BUCKETS:
+            raise ValueError(f"구간 수가 {HISTOGRAM_MAX_BUCKETS:,}개를 넘습니다. 구간 크기를 늘려주세요.")
+        return [{"key": b["key"], "count": b["doc_count"]} for b in buckets]
+
+    def get_version(self):
+        """ trade_summary 누적 색인 횟수 (바뀌면 체결/동기화가 있었던 것) """
+        stats = self.es.indices.stats(index=SUMMARY_INDEX, metric="indexing")
+        return ("es", stats["_all"]["primaries"]["indexing"]["index_total"])
+
+class LocalAnalytics:
+    """
+    # 설명 : LocalAnalytics - 리포트 집계 조회 (내장 SQLite 구현, ES 장애 시 대체)
+    #        몽고DB trade_summary_esc/stock_master 를 주기적으로 SQLite 파일로 내보내고(set_export) 같은 질의를 SQL 로 수행
+    #        현재가/평가손익은 ES 동기화(es_sync)와 같은 식(get_valuation_fields)으로 내보낼 때 계산
+    # 입력 : in_path - SQLite 파일 경로
+    # 소스 : 몽고DB mock_trading_db 스냅샷
+    """
+    name = "local"
+
+    def __init__(self, in_path):
+        self.path = Path(in_path)
+        self._lock = threading.Lock()
+
+    def _query(self, in_sql, in_params=()):
+        # 조회마다 읽기 전용으로 열고 바로 닫음 (윈도우에서 스냅샷 파일 교체가 막히지 않도록)
+        conn = sqlite3.connect(f"file:{self.path.as_posix()}?mode=ro", uri=True)
+        try:
+            return conn.execute(in_sql, in_params).fetchall()
+        finally:
+            conn.close()
+
+    def is_ready(self):
+        return self.path.exists()
+
+    def set_export(self, in_db):
+        """
+        # 설명 : set_export - 몽고DB 스냅샷을 새 SQLite 파일로 만든 뒤 교체 (조회 중인 파일은 건드리지 않음)
+        # 입력 : in_db - mock_trading_db
+        # 출력 : {summary, master} 건수
+        """
+        with self._lock:
+            tmp = self.path.with_suffix(".tmp")
+            if tmp.exists():
+                tmp.unlink()
+            prices, masters = {}, []
+            for doc in in_db.stock_master.find({}, {"_id": 0, "code": 1, "name": 1, "close": 1, "market": 1}):
+                if not doc.get("code"):
+                    continue
+                prices[doc["code"]] = doc.get("close", 0)
+                masters.append((doc["code"], doc.get("name", "알수없음"), doc.get("close", 0), doc.get("market", "")))
+            summaries = []
+            for doc in in_db.trade_summary_esc.find({}, {"_id": 0}):
+                source = {
+                    "user_id": doc["user_id"], "code": doc["code"],
+                    "total_buy_qty": doc.get("total_buy_qty", 0), "total_buy_amt": doc.get("total_buy_amt", 0),
+                    "total_sell_qty": doc.get("total_sell_qty", 0), "total_sell_amt": doc.get("total_sell_amt", 0),
+                    "realized_pnl": doc.get("realized_pnl"), "current_price": prices.get(doc["code"], 0)
+                }
+                source.update(get_valuation_fields(source))
+                summaries.append(tuple(source[c] for c in SUMMARY_COLUMNS))
+
+            conn = sqlite3.connect(tmp)
+            try:
+                conn.executescript("""
+                    CREATE TABLE trade_summary (user_id TEXT, code TEXT, total_buy_qty INTEGER, total_buy_amt REAL,
+                        total_sell_qty INTEGER, total_sell_amt REAL, current_price REAL, holdings INTEGER,
+                        realized_pnl REAL, total_valuation REAL);
+                    CREATE TABLE stock_master (code TEXT PRIMARY KEY, name TEXT, close REAL, market TEXT);
+                    CREATE TABLE export_meta (key TEXT PRIMARY KEY, value TEXT);
+                """)
+                conn.executemany(f"INSERT INTO trade_summary VALUES ({','.join('?' * len(SUMMARY_COLUMNS))})", summaries)
+                conn.executemany("INSERT OR REPLACE INTO stock_master VALUES (?, ?, ?, ?)", masters)
+                conn.execute("CREATE INDEX ix_summary_user ON trade_summary (user_id)")
+                conn.execute("INSERT INTO export_meta VALUES ('exported_at', ?)",
+                             (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+                conn.commit()
+            finally:
+                conn.close()
+            os.replace(tmp, self.path)
+        return {"summary": len(summaries), "master": len(masters)}
+
+    def get_top_earners(self, in_size=1):
+        rows = self._query("""
+            SELECT user_id, SUM(total_valuation) AS total FROM trade_summary WHERE user_id IS NOT NULL
+            GROUP BY user_id ORDER BY total DESC, user_id ASC LIMIT ?
+        """, (in_size,))
+        return [{"user_id": u, "total_valuation": v} for u, v in rows]
+
+    def get_user_summary(self, in_userId):
+        rows = self._query(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM trade_summary WHERE user_id = ? LIMIT ?",
+                           (str(in_userId), SUMMARY_MAX_ROWS))
+        return [dict(zip(SUMMARY_COLUMNS, row)) for row in rows]
+
+    def get_price_histogram(self, in_interval=10000, in_field="close"):
+        if in_field not in MASTER_COLUMNS:
+            raise ValueError(f"지원하지 않는 필드입니다: {in_field}")
+        values = [v for (v,) in self._query(f"SELECT {in_field} FROM stock_master WHERE {in_field} IS NOT NULL")]
+        if not values:
+            return []
+        # ES histogram 과 같이 floor(값 / 구간) * 구간 키, 최소~최대 사이 빈 구간도 0 건으로 채움
+        keys = np.floor(np.asarray(values, dtype="f8") / in_interval).astype("i8")
+        if keys.max() - keys.min() + 1 > HISTOGRAM_MAX_BUCKETS:
+            raise ValueError(f"구간 수가 {HISTOGRAM_MAX_BUCKETS:,}개를 넘습니다. 구간 크기를 늘려주세요.")
+        counts = np.bincount(keys - keys.min())
+        return [{"key": float((keys.min() + i) * in_interval), "count": int(c)} for i, c in enumerate(counts)]
+
+    def get_version(self):
+        return ("local", self.get_exported_at())
+
+    def get_exported_at(self):
+        if not self.is_ready():
+            return None
+        rows = self._query("SELECT value FROM export_meta WHERE key = 'exported_at'")
+        return rows[0][0] if rows else None
+
+class AnalyticsRouter:
+    """
+    # 설명 : AnalyticsRouter - ES 와 내장 SQLite 중 사용 가능한 쪽으로 리포트 집계를 보내는 공통 조회 객체
+    #        백그라운드에서 in_check_sec 마다 ES ping(끊겼으면 재연결), in_export_sec 마다 몽고DB → SQLite 내보내기
+    #        ES 가 살아 있으면 ES, 연결 오류가 나면 즉시 로컬로 전환하고 다음 확인에서 ES 가 돌아오면 다시 ES 사용
+    # 입력 : in_es_factory - () → ES 클라이언트, in_local - LocalAnalytics, in_mongo_getter - () → mock_trading_db (없으면 None),
+    #       in_es - 이미 연결된 ES 클라이언트 (없으면 None), in_check_sec - ES 확인 주기(초), in_export_sec - 내보내기 주기(초)
+    # 출력 : 조회 객체 (get_top_earners / get_user_summary / get_price_histogram 은 (결과, 사용한 백엔드) 반환)
+    """
+    def __init__(self, in_es_factory, in_local, in_mongo_getter, in_es=None, in_check_sec=15, in_export_sec=300):
+        self.es_factory = in_es_factory
+        self.local = in_local
+        self.mongo_getter = in_mongo_getter
+        self.check_sec = in_check_sec
+        self.export_sec = in_export_sec
+        self._es = in_es
+        self.es_up = in_es is not None
+        self._exported_mono = 0.0
+        self._thread = None
+        self.calls = {"es": 0, "local": 0}
+        self.fallbacks = 0
+        self.export_errors = 0
+
+    def set_check(self):
+        """ ES 연결 확인 (끊긴 상태면 새 클라이언트로 재연결 시도) """
+        try:
+            es = self._es or self.es_factory()
+            up = bool(es.ping())
+        except Exception:
+            es, up = None, False
+        if up != self.es_up:
+            print(f"🔀 리포트 집계 백엔드 전환: {'ES' if up else '로컬 SQLite'}")
+        self._es = es if up else self._es
+        self.es_up = up
+        return up
+
+    def set_export(self):
+        """ 몽고DB → 로컬 SQLite 스냅샷 (몽고DB 미설정 시 건너뜀) """
+        db = self.mongo_getter()
+        if db is None:
+            return None
+        try:
+            result = self.local.set_export(db)
+            self._exported_mono = time.monotonic()
+            return result
+        except Exception as e:
+            self.export_errors += 1
+            print(f"❌ 로컬 집계 스냅샷 내보내기 실패: {e}")
+            return None
+
+    def _call(self, in_method, *args):
+        if self.es_up and self._es is not None:
+            try:
+                result = getattr(EsAnalytics(self._es), in_method)(*args)
+                self.calls["es"] += 1
+                return result, "es"
+            except ValueError:
+                raise   # 요청 값 오류 (구간 수 초과 등) 는 백엔드 장애가 아니므로 로컬로 넘기지 않음
+            except EsConnectionError as e:
+                # 연결 오류만 장애로 보고 다음 확인 때까지 로컬 사용 (인덱스 없음 등은 이번 호출만 로컬)
+                self.es_up = False
+                print(f"⚠️ ES 연결 오류, 로컬 집계로 전환: {e}")
+            except Exception as e:
+                print(f"⚠️ ES 집계 실패, 로컬 집계 사용: {e}")
+            self.fallbacks += 1
+        if not self.local.is_ready():
+            # ES 도 로컬 스냅샷도 없으면 한 번만 즉시 내보내기
+            self.set_export()
+        if not self.local.is_ready():
+            return None, None
+        result = getattr(self.local, in_method)(*args)
+        self.calls["local"] += 1
+        return result, "local"
+
+    def get_top_earners(self, in_size=1):
+        return self._call("get_top_earners", in_size)
+
+    def get_user_summary(self, in_userId):
+        return self._call("get_user_summary", in_userId)
+
+    def get_price_histogram(self, in_interval=10000, in_field="close"):
+        return self._call("get_price_histogram", in_interval, in_field)
+
+    def get_version(self):
+        """ 리포트 변경 감지값 (백엔드가 바뀌어도 값이 바뀌어 리포트가 다시 계산됨) """
+        result, _ = self._call("get_version")
+        return result
+
+    def _run(self):
+        while True:
+            self.set_check()
+            if time.monotonic() - self._exported_mono >= self.export_sec:
+                self.set_export()
+            time.sleep(self.check_sec)
+
+    def start(self):
+        """
+        # 설명 : start - ES 확인/스냅샷 내보내기 스레드 시작 (여러 번 호출해도 1개만)
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="analytics-router", daemon=True)
+            self._thread.start()
+
+    def get_stats(self):
+        return {"backend": "es" if self.es_up else "local", "es_up": self.es_up, "calls": dict(self.calls),
+                "fallbacks": self.fallbacks, "local_exported_at": self.local.get_exported_at(),
+                "export_errors": self.export_errors, "check_sec": self.check_sec, "export_sec": self.export_sec}
+
+MONGO_CLIENT_ESC = None
+
+def get_mongo_db():
+    """
+    # 설명 : get_mongo_db - mock_trading_db (MONGO_URL 환경변수, 최초 호출 시 1회 연결)
+    # 출력 : DB 객체 또는 None (MONGO_URL 미설정)
+    """
+    global MONGO_CLIENT_ESC
+    if not os.getenv("MONGO_URL"):
+        return None
+    if MONGO_CLIENT_ESC is None:
+        import certifi
+        from pymongo import MongoClient
+        MONGO_CLIENT_ESC = MongoClient(os.getenv("MONGO_URL"), tlsCAFile=certifi.where())
+    return MONGO_CLIENT_ESC["mock_trading_db"]
+
+def get_parity(in_es_backend, in_local_backend, in_users=20, in_interval=10000, in_tol=1.0):
+    """
+    # 설명 : get_parity - 두 백엔드의 같은 질의 결과 비교 (TOP N 순위, 상위 사용자 요약, 가격 히스토그램)
+    #        ES 는 scaled_float(소수 2자리) 로 저장하므로 금액은 in_tol 원 이내 차이를 같은 값으로 봄
+    # 입력 : in_es_backend/in_local_backend - EsAnalytics/LocalAnalytics, in_users - 비교 인원, in_interval - 히스토그램 구간
+    # 출력 : 불일치 목록 (비어 있으면 일치)
+    """
+    def same(a, b):
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+            return abs(a - b) <= in_tol + abs(b) * 1e-9
+        return a == b
+
+    diffs = []
+    es_top, local_top = in_es_backend.get_top_earners(in_users), in_local_backend.get_top_earners(in_users)
+    for i, (e, l) in enumerate(zip(es_top, local_top)):
+        if e["user_id"] != l["user_id"] or not same(e["total_valuation"], l["total_valuation"]):
+            diffs.append(("top", i + 1, e, l))
+    if len(es_top) != len(local_top):
+        diffs.append(("top_count", len(es_top), len(local_top)))
+
+    keys = ["total_buy_qty", "total_buy_amt", "total_sell_qty", "total_sell_amt", "current_price", "total_valuation"]
+    for user in [t["user_id"] for t in es_top]:
+        es_rows = {r["code"]: r for r in in_es_backend.get_user_summary(user)}
+        local_rows = {r["code"]: r for r in in_local_backend.get_user_summary(user)}
+        if set(es_rows) != set(local_rows):
+            diffs.append(("summary_codes", user, sorted(set(es_rows) ^ set(local_rows))))
+        for code in set(es_rows) & set(local_rows):
+            bad = [k for k in keys if not same(es_rows[code].get(k), local_rows[code].get(k))]
+            if bad:
+                diffs.append(("summary", user, code, {k: (es_rows[code].get(k), local_rows[code].get(k)) for k in bad}))
+
+    es_hist = {b["key"]: b["count"] for b in in_es_backend.get_price_histogram(in_interval)}
+    local_hist = {b["key"]: b["count"] for b in in_local_backend.get_price_histogram(in_interval)}
+    if es_hist != local_hist:
+        diffs.append(("histogram", {k: (es_hist.get(k), local_hist.get(k))
+                                    for k in set(es_hist) | set(local_hist) if es_hist.get(k) != local_hist.get(k)}))
+    return diffs
+
+if __name__ == "__main__":
+    # 실행 예) python -m pyk.lzegg.analytics_backend --parity   (프로젝트 루트에서, .env 의 MONGO_URL/ES_URL 사용)
+    from dotenv import load_dotenv
+    load_dotenv(dotenv_path=Path(project_root) / ".env")
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="리포트 집계 로컬 스냅샷 내보내기 / ES 와 결과 비교")
+    parser.add_argument("--export", action="store_true", help="몽고DB → 로컬 SQLite 스냅샷")
+    parser.add_argument("--parity", action="store_true", help="스냅샷 후 ES 와 같은 질의 결과 비교 (불일치 시 종료코드 1)")
+    parser.add_argument("--path", default=os.getenv("ESC_ANALYTICS_DB", str(Path(__file__).resolve().parent / "analytics_local.sqlite")))
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--interval", type=int, default=10000)
+    args = parser.parse_args()
+
+    local = LocalAnalytics(args.path)
+    if not (args.export or args.parity):
+        parser.error("--export 또는 --parity 를 지정하세요.")
+    db = get_mongo_db()
+    if db is None:
+        sys.exit("❌ MONGO_URL 이 설정되지 않았습니다.")
+    t0 = time.perf_counter()
+    print(f"📦 로컬 스냅샷 내보내기: {local.set_export(db)} ({time.perf_counter() - t0:.1f}초)")
+    if args.parity:
+        es_client = Elasticsearch([os.getenv("ES_URL", "http://172.26.117.88:9200")],
+                                  headers={"Accept": "application/vnd.elasticsearch+json; compatible-with=7"})
+        if not es_client.ping():
+            sys.exit("❌ Elasticsearch 연결 실패: 비교할 수 없습니다.")
+        diffs = get_parity(EsAnalytics(es_client), local, args.users, args.interval)
+        for diff in diffs:
+            print(f"   ≠ {diff}")
+        # ES 는 동기화 지연만큼 몽고DB 보다 늦을 수 있으므로 불일치 시 동기화 상태도 확인할 것
+        print("✅ ES / 로컬 결과 일치" if not diffs else f"❌ 불일치 {len(diffs)}건 (ES 동기화 지연 여부 확인)")
+        sys.exit(1 if diffs else 0)
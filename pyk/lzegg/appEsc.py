@@ -1,11 +1,13 @@
 import os
-import json
+import time
+import asyncio
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from plotly.offline import plot
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse
 from pathlib import Path
 from typing import List, Optional
@@ -25,6 +27,21 @@ project_root = os.path.abspath(os.path.join(current_dir, "../../"))
 if project_root not in sys.path:
     sys.path.append(project_root)
 
+from pyk.lzegg.portfolio_analytics import get_profit_rate, get_ledger_trades, get_portfolio_analytics
+from pyk.lzegg.stock_names import StockNameCache
+from pyk.lzegg.report_service import ReportDataService
+from pyk.lzegg.ledger_store import LedgerStore
+from pyk.lzegg.report_cache import ReportArtifactCache
+from pyk.lzegg.analytics_backend import AnalyticsRouter, LocalAnalytics, get_mongo_db, HISTOGRAM_MIN_INTERVAL
+
+# 일봉 로컬 저장소 (모의투자 앱과 같은 파일 캐시 공유, 없으면 체결가/현재가로만 평가)
+try:
+    from app.esc.bar_store import BarStore, PERIOD_DAYS
+    BAR_STORE = BarStore()
+except Exception as e:
+    print(f"⚠️ 일봉 저장소를 사용할 수 없습니다: {e}")
+    BAR_STORE = None
+
 templates = Jinja2Templates(directory="templates")
 
 # 1. FastAPI 앱 및 경로 설정
@@ -32,6 +49,8 @@ APP_ESC = FastAPI()
 BASE_PATH = Path(__file__).resolve().parent
 DATA_FILE_PATH = BASE_PATH / "trd_04chart_data.json"
 MASTER_FILE_PATH = BASE_PATH / "stock_master.json"
+LEDGER_DIR_PATH = Path(os.getenv("ESC_LEDGER_DIR", BASE_PATH / "ledger_cache"))
+ANALYTICS_DB_PATH = Path(os.getenv("ESC_ANALYTICS_DB", BASE_PATH / "analytics_local.sqlite"))
 OPENBANK_CLIENT_ID = os.getenv("OPENBANK_CLIENT_ID")
 OPENBANK_CLIENT_SECRET = os.getenv("OPENBANK_CLIENT_SECRET")
 OPEN_BANKING_URL = "https://openapi.openbanking.or.kr"
@@ -41,13 +60,16 @@ OPENBANK_REDIRECT_URI = "http://localhost:5050/auth/callback/"
 ACCESS_TOKEN = f"{OPEN_BANKING_URL}/oauth/2.0/token"
 
 # 엘라스틱서치 연결 설정
-try:
-    es = Elasticsearch(
+def get_es_client():
+    return Elasticsearch(
         ["http://172.26.117.88:9200"],
         headers={"Accept": "application/vnd.elasticsearch+json; compatible-with=7"},
         verify_certs=False,
         request_timeout=3 # 연결 시도 시간 제한 (무한 대기 방지)
     )
+
+try:
+    es = get_es_client()
     # 실제 연결이 유효한지 핑(ping)으로 확인
     if not es.ping():
         print("⚠️ ES 서버에 응답이 없습니다. 관련 기능을 비활성화합니다.")
@@ -56,6 +78,11 @@ except Exception as e:
     print(f"❌ ES 연결 중 예외 발생: {e}")
     es = None
 
+# 리포트 집계 (ES 가 안 되면 몽고DB 스냅샷 내장 SQLite 로 자동 전환, ES 가 돌아오면 다시 ES)
+ANALYTICS_ESC = AnalyticsRouter(get_es_client, LocalAnalytics(ANALYTICS_DB_PATH), get_mongo_db, in_es=es,
+                                in_check_sec=int(os.getenv("ESC_ANALYTICS_CHECK_SEC", "15")),
+                                in_export_sec=int(os.getenv("ESC_ANALYTICS_EXPORT_SEC", "300")))
+
 # --- [추가] 오픈뱅킹 API 호출 함수 ---
 async def fetch_openbank_transactions(user_id: str, start_date: str, end_date: str):
     """
@@ -111,151 +138,81 @@ async def fetch_openbank_transactions(user_id: str, start_date: str, end_date: s
         print(f"❌ 오픈뱅킹 호출 중 예외 발생: {e}")
         return pd.DataFrame()
     
+# 종목명 맵 캐시 (프로세스 공용, ES 변경 확인 후 재적재, ES 장애 시 stock_master.json 스냅샷 사용)
+STOCK_NAMES_ESC = StockNameCache(lambda: es, MASTER_FILE_PATH,
+                                 in_check_sec=int(os.getenv("ESC_STOCK_NAMES_CHECK_SEC", "60")),
+                                 in_max_age_sec=int(os.getenv("ESC_STOCK_NAMES_MAX_AGE_SEC", "3600")))
+
 def get_stock_name_map():
     """
-    # 설명 : get_stock_name_map - 엘라스틱서치의 stock_master 인덱스에서 종목명 맵을 생성
+    # 설명 : get_stock_name_map - 종목코드:종목명 맵 (캐시, 호출마다 stock_master 를 조회하지 않음)
     # 입력 : 없음
     # 출력 : name_map - 종목코드:종목명 딕셔너리
-    # 소스 : 엘라스틱서치 stock_master
+    # 소스 : 엘라스틱서치 stock_master (미연결 시 로컬 스냅샷, 둘 다 없으면 빈 딕셔너리)
     """
-    """ ES 연결이 없어도 에러 없이 빈 딕셔너리 반환 """
-    if es is None:
-        print("⚠️ ES 미연결 상태: 종목명 매핑을 건너뜁니다.")
-        return {}
-    try:
-        if not es.indices.exists(index="stock_master"):
-            return {}
-        res = es.search(index="stock_master", query={"match_all": {}}, size=5000)
-        return {hit['_source']['code']: hit['_source']['name'] for hit in res['hits']['hits']}
-    except Exception as e:
-        print(f"ES stock_master 조회 중 오류: {e}")
-        return {}
+    return STOCK_NAMES_ESC.get_map()
+
+# 원장 컬럼 파일 (trd_04chart_data.json 이 바뀔 때만 변환, 조회는 메모리 매핑 + 일자/사용자 인덱스 구간)
+LEDGER_STORE_ESC = LedgerStore(DATA_FILE_PATH, LEDGER_DIR_PATH)
 
 def get_merged_df_from_json(user_ids, stock_codes, start_date, end_date):
     """
-    # 설명 : get_merged_df_from_json - JSON 데이터 로드 및 ES 마스터 정보 병합
+    # 설명 : get_merged_df_from_json - 원장 데이터 조회 및 ES 마스터 정보 병합
     # 입력 : user_ids - 사용자ID리스트
     #       stock_codes - 종목코드리스트
     #       start_date - 시작일자
     #       end_date - 종료일자
     # 출력 : df - 필터링 및 병합된 데이터프레임
-    # 소스 : 로컬 JSON 파일 및 엘라스틱서치
+    # 소스 : 로컬 JSON 원장(컬럼 파일로 변환해 매핑) 및 엘라스틱서치
     """
-    if not os.path.exists(DATA_FILE_PATH):
-        return pd.DataFrame()
-        
-    with open(DATA_FILE_PATH, 'r', encoding='utf-8') as f:
-        ledger_data = json.load(f)
-    
-    df = pd.DataFrame(ledger_data)
-    df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
-    
-    filtered_user_ids = [uid for uid in user_ids if uid and uid.strip()] if user_ids else []
-    if filtered_user_ids:
-        df = df[df['user_id'].isin(filtered_user_ids)]
-        
-    if stock_codes:
-        df = df[df['code'].isin(stock_codes)]
-    
+    df = LEDGER_STORE_ESC.get_frame(user_ids, stock_codes, start_date, end_date)
     if df.empty: return pd.DataFrame()
 
     name_map = get_stock_name_map()
     df['name'] = df['code'].map(name_map).fillna(df['code'])
     return df.sort_values(["date", "name"])
 
+def get_summary_df(in_rows):
+    """
+    # 설명 : get_summary_df - trade_summary 요약 행을 리포트용 데이터프레임으로 가공 (보유주식 가치 포함)
+    # 입력 : in_rows - 종목별 요약 dict 리스트
+    # 출력 : df - holdings/profit/profit_rate/name 을 더한 수익순 데이터프레임
+    """
+    df = pd.DataFrame(in_rows)
+    df['holdings'] = df['total_buy_qty'] - df['total_sell_qty']
+    df['profit'] = (df['total_sell_amt'] - df['total_buy_amt']) + (df['holdings'] * df['current_price'])
+    df['profit_rate'] = get_profit_rate(df['profit'], df['total_buy_amt'])
+
+    name_map = get_stock_name_map()
+    df['name'] = df['code'].map(name_map).fillna(df['code'])
+    return df.sort_values(by='profit', ascending=False)
+
 def get_top_user_data():
     """
     # 설명 : get_top_user_data - 실현손익 + 미실현손익 합계가 가장 높은 유저 추출
     # 입력 : 없음
     # 출력 : top_user_id - 1위 사용자ID, df - 해당 유저의 상세 데이터프레임
-    # 소스 : 엘라스틱서치 trade_summary
+    # 소스 : 엘라스틱서치 trade_summary (장애 시 로컬 SQLite 스냅샷)
     """
-    """ ES 연결 실패 시 None과 빈 DF 반환 """
-    if es is None:
-        print("⚠️ ES 미연결 상태: TOP 유저 조회가 불가능합니다.")
-        return None, pd.DataFrame()
-    
-    TARGET_INDEX = "trade_summary"
+    """ 두 백엔드 모두 조회 실패 시 None과 빈 DF 반환 """
     try:
-        if not es.indices.exists(index=TARGET_INDEX):
-            print(f"❌ [DEBUG] 인덱스 '{TARGET_INDEX}'가 ES에 없습니다.")
+        # 1. 집계 (total_valuation 합계 1위, 동점이면 사용자ID 순)
+        top, source = ANALYTICS_ESC.get_top_earners(1)
+        if not top:
+            print(f"❌ [DEBUG] 유저 집계 실패: 데이터가 비어있거나 조회 가능한 백엔드 없음 ({source})")
             return None, pd.DataFrame()
-        
-        es.indices.refresh(index=TARGET_INDEX)
 
-        # 1. 집계 시도 (필드명 후보군을 순회)
-        field_candidates = ["user_id.keyword", "user_id"]
-        buckets = []
-        
-        for field in field_candidates:
-            agg_query = {
-                "size": 0,
-                "aggs": {
-                    "top_users": {
-                        "terms": {
-                            "field": field, 
-                            "size": 1, 
-                            "order": {"total_valuation_profit": "desc"}
-                        },
-                        "aggs": {
-                            "total_valuation_profit": {
-                                "sum": {
-                                    "script": {
-                                        "source": """
-                                            double realized = doc['total_sell_amt'].value - doc['total_buy_amt'].value;
-                                            double holdings = doc['total_buy_qty'].value - doc['total_sell_qty'].value;
-                                            double unrealized = holdings * doc['current_price'].value;
-                                            return realized + unrealized;
-                                        """
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-            try:
-                res = es.search(index=TARGET_INDEX, body=agg_query)
-                buckets = res.get('aggregations', {}).get('top_users', {}).get('buckets', [])
-                if buckets: break # 유저를 찾으면 중단
-            except Exception:
-                continue # 필드 에러 시 다음 후보로 진행
-
-        if not buckets:
-            print("❌ [DEBUG] 유저 집계 실패: 데이터가 비어있거나 필드 계산 오류")
-            return None, pd.DataFrame()
-            
-        top_user_id = buckets[0]['key']
-        print(f"✅ [DEBUG] 발견된 TOP 유저: {top_user_id}")
-        
-        # 2. 상세 데이터 검색 (유연한 쿼리 사용)
-        detail_query = {
-            "query": {
-                "multi_match": {
-                    "query": top_user_id,
-                    "fields": ["user_id", "user_id.keyword"]
-                }
-            }
-        }
-        details = es.search(index=TARGET_INDEX, body=detail_query, size=1000)
-        raw_hits = details['hits']['hits']
-        
-        if not raw_hits:
+        top_user_id = top[0]['user_id']
+        print(f"✅ [DEBUG] 발견된 TOP 유저: {top_user_id} ({source})")
+
+        # 2. 상세 데이터 검색
+        rows, _ = ANALYTICS_ESC.get_user_summary(top_user_id)
+        if not rows:
             print(f"❌ [DEBUG] 유저 {top_user_id}의 상세 데이터를 찾지 못함")
             return top_user_id, pd.DataFrame()
 
-        df = pd.DataFrame([hit['_source'] for hit in raw_hits])
-        
         # 3. 데이터 가공 (보유주식 가치 포함)
-        df['holdings'] = df['total_buy_qty'] - df['total_sell_qty']
-        df['profit'] = (df['total_sell_amt'] - df['total_buy_amt']) + (df['holdings'] * df['current_price'])
-        df['profit_rate'] = df.apply(lambda x: round((x['profit'] / x['total_buy_amt'] * 100), 2) if x['total_buy_amt'] > 0 else 0, axis=1)
-        
-        name_map = get_stock_name_map()
-        df['name'] = df['code'].map(name_map).fillna(df['code'])
-        df = df.sort_values(by='profit', ascending=False)
-        
-        return top_user_id, df
+        return top_user_id, get_summary_df(rows)
 
     except Exception as e:
         print(f"❌ [DEBUG] 최종 에러: {str(e)}")
@@ -266,57 +223,115 @@ def get_user_report_data(target_user_id):
     # 설명 : get_user_report_data - 특정 유저의 상세 리포트 데이터 조회
     # 입력 : target_user_id - 조회 대상 사용자ID
     # 출력 : df - 가공된 상세 거래 데이터프레임
-    # 소스 : 엘라스틱서치 trade_summary
+    # 소스 : 엘라스틱서치 trade_summary (장애 시 로컬 SQLite 스냅샷)
     """
-    """ ES 연결 실패 시 None과 빈 DF 반환 """
-    if es is None:
-        print("⚠️ ES 미연결 상태: TOP 유저 조회가 불가능합니다.")
-        return None, pd.DataFrame()
-    
-    TARGET_INDEX = "trade_summary"
     try:
         # [중요] 만약 target_user_id가 Request 객체인 경우를 대비해 문자열로 강제 변환
         if not isinstance(target_user_id, str):
             target_user_id = str(target_user_id)
 
         # 특정 유저의 상세 데이터 검색
-        detail_query = {
-            "query": {
-                "multi_match": {
-                    "query": target_user_id,
-                    "fields": ["user_id", "user_id.keyword"]
-                }
-            }
-        }
-        # body=detail_query 대신 query=detail_query["query"] 사용 권장 (ES 버전에 따라)
-        details = es.search(index=TARGET_INDEX, query=detail_query["query"], size=1000)
-        raw_hits = details['hits']['hits']
-        
-        if not raw_hits:
+        rows, _ = ANALYTICS_ESC.get_user_summary(target_user_id)
+        if not rows:
             return pd.DataFrame()
-
-        df = pd.DataFrame([hit['_source'] for hit in raw_hits])
-        
-        # 데이터 가공
-        df['holdings'] = df['total_buy_qty'] - df['total_sell_qty']
-        df['profit'] = (df['total_sell_amt'] - df['total_buy_amt']) + (df['holdings'] * df['current_price'])
-        df['profit_rate'] = df.apply(lambda x: round((x['profit'] / x['total_buy_amt'] * 100), 2) if x['total_buy_amt'] > 0 else 0, axis=1)
-        
-        name_map = get_stock_name_map()
-        df['name'] = df['code'].map(name_map).fillna(df['code'])
-        df = df.sort_values(by='profit', ascending=False)
-        
-        return df
+        return get_summary_df(rows)
     except Exception as e:
-        print(f"❌ ES 조회 에러 발생: {e}")
+        print(f"❌ 리포트 조회 에러 발생: {e}")
         return pd.DataFrame()
 
-def render_report_html(user_id, df, title_label):
+def get_top_report_data():
+    """
+    # 설명 : get_top_report_data - TOP1 리포트 데이터셋 (리포트 서비스 백그라운드 계산용)
+    # 출력 : {user_id, df, analytics} 또는 None
+    """
+    top_user_id, df = get_top_user_data()
+    if not top_user_id or df.empty:
+        return None
+    return {"user_id": top_user_id, "df": df, "analytics": get_user_analytics(top_user_id)}
+
+def get_my_report_data(in_userId):
+    """
+    # 설명 : get_my_report_data - 사용자 리포트 데이터셋 (리포트 서비스 백그라운드 계산용)
+    # 출력 : {user_id, df, analytics} 또는 None
+    """
+    df = get_user_report_data(in_userId)
+    if df.empty:
+        return None
+    return {"user_id": in_userId, "df": df, "analytics": get_user_analytics(in_userId)}
+
+def get_summary_index_version():
+    """ trade_summary 누적 색인 횟수 또는 로컬 스냅샷 시각 (바뀌면 체결/동기화/백엔드 전환이 있었던 것) """
+    return ANALYTICS_ESC.get_version()
+
+# 리포트 데이터 서비스 (요청마다 ES refresh/집계하지 않고 백그라운드 계산 결과를 메모리에서 제공)
+REPORT_SERVICE_ESC = ReportDataService(
+    get_top_report_data, get_my_report_data, get_summary_index_version,
+    in_refresh_sec=int(os.getenv("ESC_REPORT_REFRESH_SEC", "60")),
+    in_check_sec=int(os.getenv("ESC_REPORT_CHECK_SEC", "5"))
+)
+
+# 렌더링된 리포트/차트 HTML 캐시 (사용자·차트유형·기간별, 해당 사용자 체결 시 무효화, ETag 조건부 GET)
+REPORT_ARTIFACTS_ESC = ReportArtifactCache(in_ttl_sec=int(os.getenv("ESC_REPORT_ARTIFACT_TTL", "300")),
+                                           in_max_size=int(os.getenv("ESC_REPORT_ARTIFACT_MAX", "500")))
+
+@APP_ESC.on_event("startup")
+async def set_startup_report_service():
+    ANALYTICS_ESC.start()
+    REPORT_SERVICE_ESC.start()
+
+def get_close_frame(in_codes, in_start):
+    """
+    # 설명 : get_close_frame - 종목별 일봉 종가를 (일자 × 종목코드) DataFrame 으로 조회
+    # 입력 : in_codes - 종목코드 리스트, in_start - 시작일자(YYYY-MM-DD)
+    # 출력 : 종가 DataFrame (저장소가 없거나 조회 실패한 종목은 제외)
+    # 소스 : 일봉 로컬 저장소 (app.esc.bar_store)
+    """
+    if BAR_STORE is None:
+        return pd.DataFrame()
+    days = (datetime.now() - pd.Timestamp(in_start)).days
+    period = next((p for p, d in sorted(PERIOD_DAYS.items(), key=lambda x: x[1]) if d >= days), "10y")
+    closes = {}
+    for code in in_codes:
+        try:
+            _, bars = BAR_STORE.get_history_df(code, period)
+            if not bars.empty:
+                closes[code] = bars['Close']
+        except Exception as e:
+            print(f"⚠️ {code} 일봉 조회 실패: {e}")
+    return pd.DataFrame(closes)
+
+def get_user_analytics(in_userId, in_start=None, in_end=None):
+    """
+    # 설명 : get_user_analytics - 사용자 원장 체결내역으로 자산곡선/TWR/MWR/MDD/변동성/종목기여도 계산
+    # 입력 : in_userId - 사용자ID, in_start - 시작일자, in_end - 종료일자 (없으면 최근 1년)
+    # 출력 : 분석 결과 dict (체결이 없으면 빈 dict)
+    # 소스 : 로컬 JSON 원장, 일봉 로컬 저장소
+    """
+    end = in_end or datetime.now().strftime('%Y-%m-%d')
+    start = in_start or (datetime.now() - relativedelta(years=1)).strftime('%Y-%m-%d')
+    ledger = get_merged_df_from_json([in_userId], None, start, end)
+    if ledger.empty:
+        return {}
+    trades = get_ledger_trades(ledger)
+    close = get_close_frame(trades['code'].unique().tolist(), start)
+    if close.empty and 'currentPrice' in ledger.columns:
+        # 일봉이 없으면 원장의 현재가를 종료일 종가로 사용
+        last = ledger.groupby('code')['currentPrice'].last()
+        close = pd.DataFrame([last.to_numpy()], index=[pd.Timestamp(end)], columns=last.index.astype(str))
+    result = get_portfolio_analytics(trades, close, in_end=end)
+    name_map = get_stock_name_map()
+    for pos in result.get("positions", []):
+        pos["name"] = name_map.get(pos["code"], pos["code"])
+    return result
+
+def render_report_html(user_id, df, title_label, analytics=None, in_meta=None):
     """
     # 설명 : render_report_html - TOP1 유저와 내 리포트에서 공통으로 사용할 HTML 렌더링 함수
     # 입력 : user_id - 사용자ID
     #       df - 거래 데이터프레임
     #       title_label - 리포트 제목
+    #       analytics - get_user_analytics 결과 (있으면 TWR/MWR/MDD/변동성 카드 표시)
+    #       in_meta - 리포트 서비스 기준 시각/지연 정보 (있으면 헤더에 표시)
     # 출력 : HTML - 렌더링된 HTML 문자열
     # 소스 : Jinja2 Template
     """
@@ -345,6 +360,8 @@ def render_report_html(user_id, df, title_label):
             .header { display: flex; justify-content: space-between; align-items: center; border-bottom: 1px solid #334155; padding-bottom: 15px; margin-bottom: 25px; }
             .title { font-size: 24px; font-weight: bold; color: #f1f5f9; }
             .user-badge { background: #334155; color: #94a3b8; padding: 5px 15px; border-radius: 20px; font-size: 14px; }
+            .asof-badge { color: #94a3b8; font-size: 12px; margin-left: 10px; }
+            .asof-badge.stale { color: #feca57; }
             
             .stats-grid { display: grid; grid-template-columns: repeat(3, 1fr); gap: 20px; margin-bottom: 30px; }
             .stat-card { background: #0f172a; padding: 20px; border-radius: 12px; border: 1px solid #334155; text-align: center; }
@@ -404,7 +421,14 @@ def render_report_html(user_id, df, title_label):
         <div class="container">
             <div class="header">
                 <div class="title">{{ title_label }}</div>
-                <div class="user-badge">Investor: {{ user_id }}</div>
+                <div>
+                    <span class="user-badge">Investor: {{ user_id }}</span>
+                    {% if meta %}
+                    <span class="asof-badge{% if meta.stale %} stale{% endif %}">
+                        기준 {{ meta.as_of }} ({{ meta.age_sec|int }}초 전{% if meta.refreshing %}, 갱신 중{% elif meta.stale %}, 지연{% endif %})
+                    </span>
+                    {% endif %}
+                </div>
             </div>
 
             <div class="stats-grid">
@@ -422,6 +446,27 @@ def render_report_html(user_id, df, title_label):
                 </div>
             </div>
 
+            {% if analytics %}
+            <div class="stats-grid" style="grid-template-columns: repeat(4, 1fr);">
+                <div class="stat-card">
+                    <div class="stat-label">시간가중수익률 (TWR)</div>
+                    <div class="stat-value">{{ "%+.2f"|format(analytics['twr'] * 100) }}%</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-label">금액가중수익률 (연, MWR)</div>
+                    <div class="stat-value">{{ "%+.2f"|format(analytics['mwr'] * 100) ~ "%" if analytics['mwr'] is not none else "-" }}</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-label">최대낙폭 (MDD)</div>
+                    <div class="stat-value neg">{{ "%.2f"|format(analytics['mdd'] * 100) }}%</div>
+                </div>
+                <div class="stat-card">
+                    <div class="stat-label">변동성 (연)</div>
+                    <div class="stat-value">{{ "%.2f"|format(analytics['volatility'] * 100) }}%</div>
+                </div>
+            </div>
+            {% endif %}
+
             <div id="profitChart"></div>
 
             <table class="display-table">
@@ -476,11 +521,12 @@ def render_report_html(user_id, df, title_label):
         user_id=user_id, df=df, title_label=title_label,
         total_buy_amt=total_buy_amt, total_profit=total_profit,
         avg_profit_rate=avg_profit_rate, summary_color=summary_color,
-        chart_data=chart_data
+        chart_data=chart_data, analytics=analytics, meta=in_meta
     )
   
 @APP_ESC.get("/apiEsc/get_chartHtml", response_class=HTMLResponse)
 async def get_chart_html(
+    request: Request,
     in_chartType: str = Query(..., description="차트 타입 (01~04)"),
     in_userIds: Optional[List[str]] = Query(None), 
     in_stockCodes: Optional[List[str]] = Query(None),
@@ -488,7 +534,7 @@ async def get_chart_html(
     in_endDate: Optional[str] = Query(None)
 ):
     """
-    # 설명 : get_chartHtml - 차트 구현
+    # 설명 : get_chartHtml - 차트 구현 (렌더링 결과는 사용자·차트유형·기간별 캐시, ETag 가 같으면 304)
     # 입력 : in_chartType - 차트유형코드 # VOL_CHART, DIST_CHART, COMPLETED_CHART, UNIT_CHART
     #       in_userIds - 사용자ID리스트
     #       in_stockCodes - 종목코드리스트
@@ -513,6 +559,16 @@ async def get_chart_html(
     print('----------fintech_use_num')
     print(fintech_use_num)
 
+    # 렌더링 캐시 조회 (모의투자는 원장 파일 버전도 키에 포함 → 원장이 바뀌면 다시 렌더링)
+    source_version = "openbank" if fintech_use_num else await asyncio.to_thread(LEDGER_STORE_ESC.set_refresh)
+    cache_key = ("chart", in_chartType, tuple(active_user_ids), tuple(sorted(in_stockCodes or [])),
+                 target_start, target_end, source_version)
+    item = REPORT_ARTIFACTS_ESC.get(cache_key, active_user_ids)
+    if item is not None:
+        return REPORT_ARTIFACTS_ESC.get_html_response(request, item, True)
+    token = REPORT_ARTIFACTS_ESC.get_token(active_user_ids)
+    t0 = time.perf_counter()
+
     # 2. 데이터 확보 (분기 로직 수정)
     if fintech_use_num:
         # [중요] fetch_openbank_transactions가 async이므로 반드시 await 사용
@@ -522,9 +578,21 @@ async def get_chart_html(
         source_label = "오픈뱅킹 실거래"
     else:
         # 모의투자 데이터 (JSON/ES 기반)
-        df = get_merged_df_from_json(active_user_ids, in_stockCodes, target_start, target_end)
+        df = await asyncio.to_thread(get_merged_df_from_json, active_user_ids, in_stockCodes, target_start, target_end)
         source_label = "모의투자"
 
+    html = await asyncio.to_thread(render_chart_html, in_chartType, df, source_label, main_user_id,
+                                   target_start, target_end)
+    item = REPORT_ARTIFACTS_ESC.set(cache_key, active_user_ids, html, (time.perf_counter() - t0) * 1000, token)
+    return REPORT_ARTIFACTS_ESC.get_html_response(request, item, False)
+
+def render_chart_html(in_chartType, df, source_label, main_user_id, target_start, target_end):
+    """
+    # 설명 : render_chart_html - 차트(01~04) + 체결 테이블 HTML 렌더링
+    # 입력 : in_chartType - 차트유형코드, df - 원장/오픈뱅킹 데이터프레임, source_label - 데이터 출처 표시,
+    #       main_user_id - 대표 사용자ID, target_start/target_end - 조회 기간
+    # 출력 : HTML 문자열
+    """
     # 3. 데이터 유무 확인 (데이터가 비어있으면 조기 리턴)
     if df is None or df.empty:
         return f"""
@@ -560,7 +628,7 @@ async def get_chart_html(
     elif in_chartType == "02":
         # 현재가와 매수가가 있을 경우 수익률 계산 (없으면 0 처리)
         if 'buyPrice' in df.columns and 'currentPrice' in df.columns:
-            df['profit_rate'] = df.apply(lambda x: round(((x['currentPrice'] - x['buyPrice']) / x['buyPrice'] * 100), 2) if x.get('buyPrice', 0) > 0 else 0, axis=1)
+            df['profit_rate'] = get_profit_rate(df['currentPrice'] - df['buyPrice'], df['buyPrice'])
         elif 'profit' in df.columns:
             # 매수가가 없을 경우 실현손익 기반의 가상 수익률 (예시)
             df['profit_rate'] = df['profit'] / 1000  # 비중 확인용
@@ -611,14 +679,12 @@ async def get_chart_html(
     df_table = df_table[cols]
     df_table.columns = ['거래일자', '종목명', '체결수량', '실현손익']
 
-    def format_cells(row):
-        qty = f"{int(row['체결수량']):,}"
-        val = int(row['실현손익'])
-        color = "#ff4d4d" if val > 0 else "#4d94ff" if val < 0 else "#ffffff"
-        profit = f'<span style="color:{color}; font-weight:bold;">{val:+,}</span>'
-        return pd.Series([qty, profit])
-
-    df_table[['체결수량', '실현손익']] = df_table.apply(format_cells, axis=1)
+    # 셀 서식 (행 단위 apply 대신 컬럼 단위로 변환)
+    qty = df_table['체결수량'].astype('int64')
+    val = df_table['실현손익'].astype('int64')
+    color = np.where(val > 0, "#ff4d4d", np.where(val < 0, "#4d94ff", "#ffffff"))
+    df_table['체결수량'] = [f"{q:,}" for q in qty]
+    df_table['실현손익'] = [f'<span style="color:{c}; font-weight:bold;">{v:+,}</span>' for c, v in zip(color, val)]
     table_html = df_table.to_html(classes="display-table", index=False, escape=False)
 
     return f"""
@@ -642,39 +708,131 @@ async def get_chart_html(
     </html>
     """
 
+def get_staleness_headers(in_meta):
+    """ 리포트 기준 시각/지연 여부 응답 헤더 """
+    return {"X-Data-As-Of": in_meta["as_of"], "X-Data-Age": str(in_meta["age_sec"]),
+            "X-Data-Stale": "1" if in_meta["stale"] else "0", "Cache-Control": "no-cache"}
+
 @APP_ESC.get("/apiEsc/get_topReport", response_class=HTMLResponse)
-async def get_top_report():
+async def get_top_report(request: Request):
     """
     # 설명 : get_top_report - 수익률 TOP 1 투자자의 상세 리포트 조회
     # 입력 : 없음
     # 출력 : HTML - 렌더링된 리포트 페이지
     # 소스 : 엘라스틱서치 trade_summary
     """
-    top_user_id, _ = get_top_user_data()
-    if not top_user_id:
+    data, meta = await asyncio.to_thread(REPORT_SERVICE_ESC.get_top)
+    if not data:
         return HTMLResponse(content="데이터를 찾을 수 없습니다.", status_code=404)
-        
-    df = get_user_report_data(top_user_id)
-    return render_report_html(top_user_id, df, "수익률 TOP 1 투자자 리포트")
+    # 리포트 데이터셋이 다시 계산되거나(as_of) 누군가 체결하면 다시 렌더링
+    cache_key = ("report", "top", data["user_id"], meta["as_of"], meta["stale"], meta["refreshing"], meta["error"])
+    item, hit = await asyncio.to_thread(
+        REPORT_ARTIFACTS_ESC.get_or_render, cache_key, None,
+        lambda: render_report_html(data["user_id"], data["df"], "수익률 TOP 1 투자자 리포트", data["analytics"], meta))
+    return REPORT_ARTIFACTS_ESC.get_html_response(request, item, hit, get_staleness_headers(meta))
 
 # 2. 새로운 나의 리포트
 @APP_ESC.get("/apiEsc/get_myReport", response_class=HTMLResponse)
-async def get_my_report(in_userId: Optional[str] = Query("user_0007")): 
+async def get_my_report(request: Request, in_userId: Optional[str] = Query("user_0007")): 
     """
     # 설명 : get_my_report - 로그인한 나의 상세 투자 리포트 조회
     # 입력 : in_userId - 사용자ID (기본값: user_0007)
     # 출력 : HTML - 렌더링된 리포트 페이지
     # 소스 : 엘라스틱서치 trade_summary
     """
-    # 1. 데이터 가져오기
-    df = get_user_report_data(in_userId)
+    # 1. 데이터 가져오기 (리포트 서비스 메모리, 처음 조회하는 사용자만 즉시 계산)
+    data, meta = await asyncio.to_thread(REPORT_SERVICE_ESC.get_user, in_userId)
     
-    if df.empty:
+    if not data:
         # FastAPI에서 에러 메시지는 HTMLResponse 객체로 감싸서 반환해야 함
         return HTMLResponse(
             content=f"<h3>{in_userId}님의 데이터가 없습니다.</h3>", 
             status_code=404
         )
         
-    # 2. 공통 렌더링 함수 호출
-    return render_report_html(in_userId, df, "📊 나의 모의투자 리포트")
\ No newline at end of file
+    # 2. 공통 렌더링 함수 호출 (렌더링 결과는 데이터 기준 시각별 캐시, 이 사용자가 체결하면 다시 렌더링)
+    cache_key = ("report", "user", in_userId, meta["as_of"], meta["stale"], meta["refreshing"], meta["error"])
+    item, hit = await asyncio.to_thread(
+        REPORT_ARTIFACTS_ESC.get_or_render, cache_key, [in_userId],
+        lambda: render_report_html(in_userId, data["df"], "📊 나의 모의투자 리포트", data["analytics"], meta))
+    return REPORT_ARTIFACTS_ESC.get_html_response(request, item, hit, get_staleness_headers(meta))
+
+@APP_ESC.post("/apiEsc/report_tradeEvent")
+async def set_report_trade_event(in_userId: Optional[str] = Query(None)):
+    """
+    # 설명 : set_report_trade_event - 체결 알림 (해당 사용자/TOP1 리포트를 백그라운드에서 바로 재계산, 렌더링 캐시 무효화)
+    #        호출: 모의투자 앱(app.esc.app_stock) 체결 시 run_report_notifier (ESC_REPORT_EVENT_URL 에 이 주소 설정)
+    # 입력 : in_userId - 체결한 사용자ID (없으면 전체)
+    # 출력 : {"queued": True}
+    """
+    REPORT_SERVICE_ESC.on_trade(in_userId)
+    REPORT_ARTIFACTS_ESC.on_trade(in_userId)
+    return {"queued": True}
+
+@APP_ESC.get("/apiEsc/report_status")
+async def get_report_status():
+    """
+    # 설명 : get_report_status - 리포트 데이터셋별 기준 시각/지연 여부, 렌더링 캐시 적중률/렌더링 시간
+    """
+    return {**REPORT_SERVICE_ESC.get_stats(), "artifacts": REPORT_ARTIFACTS_ESC.get_stats()}
+
+@APP_ESC.get("/apiEsc/rank_top")
+async def get_rank_top(in_n: int = Query(10, ge=1, le=100)):
+    """
+    # 설명 : get_rank_top - 전체 수익금(총평가손익) 상위 N 명
+    # 입력 : in_n - 조회 인원
+    # 출력 : {source: es/local, items: [{rank, user_id, total_profit}]}
+    # 소스 : 엘라스틱서치 trade_summary (장애 시 로컬 SQLite 스냅샷)
+    """
+    top, source = await asyncio.to_thread(ANALYTICS_ESC.get_top_earners, in_n)
+    return {"source": source, "items": [{"rank": i + 1, "user_id": t["user_id"], "total_profit": int(t["total_valuation"])}
+                                        for i, t in enumerate(top or [])]}
+
+@APP_ESC.get("/apiEsc/price_histogram")
+async def get_price_histogram(in_interval: int = Query(10000, ge=HISTOGRAM_MIN_INTERVAL)):
+    """
+    # 설명 : get_price_histogram - 종목 가격(종가) 분포 히스토그램 데이터
+    # 입력 : in_interval - 구간 크기(원, 100 이상)
+    # 출력 : {source: es/local, keys, counts} (구간 수가 HISTOGRAM_MAX_BUCKETS 를 넘으면 400)
+    # 소스 : 엘라스틱서치 stock_master (장애 시 로컬 SQLite 스냅샷)
+    """
+    try:
+        buckets, source = await asyncio.to_thread(ANALYTICS_ESC.get_price_histogram, in_interval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    buckets = buckets or []
+    return {"source": source, "keys": [b["key"] for b in buckets], "counts": [b["count"] for b in buckets]}
+
+@APP_ESC.get("/apiEsc/analytics_status")
+async def get_analytics_status():
+    """
+    # 설명 : get_analytics_status - 리포트 집계 백엔드 상태 (ES 연결 여부, 로컬 스냅샷 시각, 백엔드별 호출 수)
+    """
+    return ANALYTICS_ESC.get_stats()
+
+@APP_ESC.post("/apiEsc/refresh_stockNames")
+async def set_refresh_stock_names():
+    """
+    # 설명 : set_refresh_stock_names - 종목 마스터 동기화 후 종목명 캐시 즉시 재적재 (변경 신호)
+    # 출력 : 캐시 상태
+    """
+    await asyncio.to_thread(STOCK_NAMES_ESC.set_refresh, True)
+    return STOCK_NAMES_ESC.get_stats()
+
+@APP_ESC.get("/apiEsc/get_analytics")
+async def get_analytics(
+    in_userId: str = Query(...),
+    in_startDate: Optional[str] = Query(None),
+    in_endDate: Optional[str] = Query(None)
+):
+    """
+    # 설명 : get_analytics - 사용자 포트폴리오 성과 분석 (자산곡선, TWR, MWR, MDD, 변동성, 종목별 기여도)
+    # 입력 : in_userId - 사용자ID, in_startDate - 시작일자, in_endDate - 종료일자
+    # 출력 : 분석 결과 json
+    # 소스 : 로컬 JSON 원장, 일봉 로컬 저장소
+    """
+    # 원장 mmap 조회 + 종목별 일봉 조회(야후)라 이벤트 루프 밖에서 실행
+    result = await asyncio.to_thread(get_user_analytics, in_userId, in_startDate, in_endDate)
+    if not result:
+        return {"error": True, "message": f"{in_userId}님의 체결 데이터가 없습니다."}
+    return result
\ No newline at end of file
@@ -0,0 +1,355 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+LEDGER_KEYS = ("user_id", "code", "date")
+
+def get_columns_from_df(in_df):
+    """
+    # 설명 : get_columns_from_df - 원장 DataFrame 을 컬럼 배열로 변환 (일자·사용자·종목 순 정렬, 문자열은 사전 + 정수id)
+    # 입력 : in_df - user_id, code, date(YYYY-MM-DD) 컬럼을 가진 원장 DataFrame
+    # 출력 : (columns {이름: 배열}, meta {columns, dicts, dtypes, rows})
+    """
+    dicts, ids, dtypes = {}, {}, {}
+    for name in in_df.columns:
+        if name == "date":
+            continue
+        series = in_df[name]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            ids[name] = series.to_numpy()
+            dtypes[name] = str(ids[name].dtype)
+            continue
+        # 문자열(그 외) 컬럼은 정렬된 사전 + int32 id (없는 값은 -1)
+        codes, uniques = pd.factorize(series.astype(object).where(series.notna(), None), sort=True)
+        ids[name] = codes.astype("i4")
+        dicts[name] = [str(v) for v in uniques]
+        dtypes[name] = "dict"
+
+    date = pd.to_datetime(in_df["date"], errors="coerce").to_numpy().astype("datetime64[D]")
+    user = ids["user_id"]
+    code = ids["code"]
+    # 일자 → 사용자 → 종목 순 정렬 (NaT 는 맨 뒤)
+    order = np.lexsort((code, user, date))
+    columns = {name: np.ascontiguousarray(values[order]) for name, values in ids.items()}
+    columns["date"] = date[order]
+    columns["row"] = order.astype("i8")         # 원본 JSON 행 번호 (DataFrame 인덱스로 복원)
+
+    # 사용자 인덱스: 사용자 → 일자 순 행 번호와 사용자별 구간 [user_off[u], user_off[u+1])
+    by_user = np.lexsort((np.arange(len(order)), columns["user_id"])).astype("i8")
+    user_sorted = columns["user_id"][by_user]
+    columns["by_user"] = by_user
+    columns["by_user_date"] = columns["date"][by_user]
+    columns["user_off"] = np.searchsorted(user_sorted, np.arange(len(dicts["user_id"]) + 1)).astype("i8")
+    meta = {"columns": [c for c in in_df.columns], "dicts": dicts, "dtypes": dtypes, "rows": int(len(order))}
+    return columns, meta
+
+def set_save_columns(in_dir, in_columns, in_meta):
+    """
+    # 설명 : set_save_columns - 컬럼 배열을 컬럼별 .npy 파일로 저장 (meta.json 은 마지막에 기록)
+    # 입력 : in_dir - 저장 폴더, in_columns/in_meta - get_columns_from_df 결과
+    """
+    os.makedirs(in_dir, exist_ok=True)
+    for name, values in in_columns.items():
+        np.save(os.path.join(in_dir, f"{name}.npy"), values)
+    with open(os.path.join(in_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(in_meta, f, ensure_ascii=False)
+
+class LedgerStore:
+    """
+    # 설명 : LedgerStore - 원장 JSON 을 컬럼형 .npy 파일로 변환해 메모리 매핑(mmap)으로 조회
+    #        JSON 수정시각/크기가 바뀔 때만 다시 변환·매핑하고, 조회 때는 os.stat 1회만 확인
+    #        행은 일자순으로 저장하고 사용자 → 일자순 보조 인덱스를 두어 기간/사용자 필터를 이진 탐색 구간으로 처리
+    #        (윈도우는 매핑 중인 파일을 교체할 수 없으므로 원본 버전마다 새 폴더에 만들고 이전 폴더는 가능할 때 삭제)
+    # 입력 : in_source_path - 원장 JSON (trd_04chart_data.json), in_dir - 컬럼 파일 폴더
+    # 출력 : 저장소 객체
+    # 소스 : 로컬 JSON 원장
+    """
+    def __init__(self, in_source_path, in_dir):
+        self.source_path = Path(in_source_path)
+        self.dir = Path(in_dir)
+        self._lock = threading.Lock()
+        self._version = None
+        self._cols = None
+        self._meta = None
+        self._lookup = {}
+        self.builds = 0
+        self.loads = 0
+
+    def _get_source_version(self):
+        try:
+            st = os.stat(self.source_path)
+        except OSError:
+            return None
+        return f"{st.st_mtime_ns}_{st.st_size}"
+
+    def _set_build(self, in_version):
+        """ 원장 JSON → 컬럼 파일 (다른 프로세스가 같은 버전을 이미 만들었으면 그대로 사용) """
+        target = self.dir / in_version
+        if (target / "meta.json").exists():
+            return target
+        with open(self.source_path, "r", encoding="utf-8") as f:
+            df = pd.DataFrame(json.load(f))
+        if df.empty or not set(LEDGER_KEYS) <= set(df.columns):
+            df = pd.DataFrame(columns=list(LEDGER_KEYS)).astype(object)
+        columns, meta = get_columns_from_df(df)
+        meta["source"] = in_version
+        tmp = self.dir / f"{in_version}.{os.getpid()}.tmp"
+        set_save_columns(tmp, columns, meta)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not (target / "meta.json").exists():
+                raise
+        self.builds += 1
+        return target
+
+    def _set_open(self, in_dir):
+        with open(in_dir / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        cols = {p.stem: np.load(p, mmap_mode="r") for p in in_dir.glob("*.npy")}
+        self._cols, self._meta = cols, meta
+        self._lookup = {name: {v: i for i, v in enumerate(values)} for name, values in meta["dicts"].items()}
+        self.loads += 1
+
+    def _set_cleanup(self, in_keep):
+        """ 현재 버전과 직전 버전은 남기고 그보다 오래된 버전 폴더만 삭제 (직전 버전은 다른 워커가 아직 매핑 중일 수 있음) """
+        versions = []
+        for path in self.dir.glob("*"):
+            stamp = path.name.split("_")[0]
+            if path.is_dir() and stamp.isdigit() and not path.name.endswith(".tmp"):
+                versions.append((int(stamp), path))
+        keep_stamp = int(in_keep.split("_")[0])
+        older = sorted((v for v in versions if v[0] < keep_stamp), key=lambda v: v[0])
+        for _, path in older[:-1]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def set_refresh(self):
+        """
+        # 설명 : set_refresh - 원본 JSON 이 바뀌었으면 컬럼 파일을 다시 만들고 매핑 교체
+        # 출력 : 현재 매핑된 버전 (원본이 없으면 None)
+        """
+        version = self._get_source_version()
+        if version == self._version:
+            return version
+        with self._lock:
+            if version == self._version:
+                return version
+            if version is None:
+                self._version, self._cols, self._meta = None, None, None
+                return None
+            self._set_open(self._set_build(version))
+            self._version = version
+            self._set_cleanup(version)
+            print(f"📦 원장 컬럼 파일 적재: {self._meta['rows']:,}행 ({version})")
+        return version
+
+    def _get_ids(self, in_name, in_values):
+        lookup = self._lookup.get(in_name, {})
+        return np.array(sorted({lookup[v] for v in in_values if v in lookup}), dtype="i4")
+
+    def get_rows(self, in_userIds=None, in_codes=None, in_start=None, in_end=None):
+        """
+        # 설명 : get_rows - 조건에 맞는 행 위치 (저장 순서 = 일자순)
+        # 입력 : in_userIds - 사용자ID 리스트 (없으면 전체), in_codes - 종목코드 리스트 (없으면 전체),
+        #       in_start/in_end - "YYYY-MM-DD" (양끝 포함, 없으면 제한 없음)
+        # 출력 : 행 위치 배열 (int64)
+        """
+        cols = self._cols
+        lo_day = np.datetime64(in_start[:10], "D") if in_start else None
+        hi_day = np.datetime64(in_end[:10], "D") if in_end else None
+
+        def get_span(in_dates, in_lo=0, in_hi=None):
+            # 일자순 구간 안에서 [lo_day, hi_day] 이진 탐색 (NaT 는 항상 제외)
+            part = in_dates[in_lo:in_hi]
+            a = np.searchsorted(part, lo_day, "left") if lo_day is not None else 0
+            b = np.searchsorted(part, hi_day, "right") if hi_day is not None else np.searchsorted(part, np.datetime64("NaT"), "left")
+            return in_lo + a, in_lo + b
+
+        users = [u for u in in_userIds if u and u.strip()] if in_userIds else []
+        if users:
+            off = cols["user_off"]
+            parts = []
+            for uid in self._get_ids("user_id", users):
+                a, b = get_span(cols["by_user_date"], int(off[uid]), int(off[uid + 1]))
+                parts.append(cols["by_user"][a:b])
+            rows = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype="i8")
+        else:
+            a, b = get_span(cols["date"])
+            rows = np.arange(a, b, dtype="i8")
+
+        if in_codes and len(rows):
+            rows = rows[np.isin(cols["code"][rows], self._get_ids("code", in_codes))]
+        return rows
+
+    def get_frame(self, in_userIds=None, in_codes=None, in_start=None, in_end=None):
+        """
+        # 설명 : get_frame - 기간/사용자/종목으로 거른 원장 DataFrame (선택된 행만 매핑 파일에서 읽음)
+        # 입력 : get_rows 와 같음
+        # 출력 : 원본 JSON 과 같은 컬럼의 DataFrame (date 는 "YYYY-MM-DD" 문자열, 인덱스는 원본 행 번호)
+        """
+        self.set_refresh()
+        return self._get_frame(in_userIds, in_codes, in_start, in_end)
+
+    def _get_frame(self, in_userIds, in_codes, in_start, in_end):
+        cols, meta = self._cols, self._meta
+        if cols is None or not meta["rows"]:
+            return pd.DataFrame()
+        rows = self.get_rows(in_userIds, in_codes, in_start, in_end)
+        if not len(rows):
+            return pd.DataFrame()
+        data = {}
+        for name in meta["columns"]:
+            values = cols[name][rows]
+            if name == "date":
+                data[name] = np.datetime_as_string(values, unit="D").astype(object)
+            elif meta["dtypes"][name] == "dict":
+                # -1(없는 값) 은 사전 끝에 붙인 None 으로
+                data[name] = np.array(meta["dicts"][name] + [None], dtype=object)[values]
+            else:
+                data[name] = np.asarray(values)
+        return pd.DataFrame(data, index=pd.Index(np.asarray(cols["row"][rows])))
+
+    def get_stats(self):
+        return {"version": self._version, "rows": self._meta["rows"] if self._meta else 0,
+                "builds": self.builds, "loads": self.loads, "dir": str(self.dir)}
+
+def get_bench_df(in_rows, in_users=1000, in_codes=2000, in_days=1095, in_seed=0):
+    """
+    # 설명 : get_bench_df - 벤치마크용 가상 원장 (문자열은 JSON 로드 결과처럼 object 컬럼)
+    # 입력 : in_rows - 행 수, in_users/in_codes - 사용자/종목 수, in_days - 기간(일)
+    # 출력 : 원장 DataFrame
+    """
+    rng = np.random.default_rng(in_seed)
+    users = np.array([f"user{i}" for i in range(in_users)], dtype=object)
+    codes = np.array([f"{i:06d}" for i in range(in_codes)], dtype=object)
+    days = np.datetime_as_string(np.datetime64("2024-01-01") + np.arange(in_days), unit="D").astype(object)
+    qty = rng.integers(1, 100, in_rows)
+    buy = rng.integers(1000, 300000, in_rows)
+    cur = (buy * rng.uniform(0.8, 1.2, in_rows)).astype("i8")
+    return pd.DataFrame({
+        "user_id": users[rng.integers(0, in_users, in_rows)],
+        "code": codes[rng.integers(0, in_codes, in_rows)],
+        "date": days[rng.integers(0, in_days, in_rows)],
+        "quantity": qty, "buyPrice": buy, "currentPrice": cur,
+        "invest_amount": qty * buy * 1.0, "profit": (cur - buy) * qty
+    })
+
+def get_mask_frame(in_df, in_userIds, in_codes, in_start, in_end):
+    """ 기존 get_merged_df_from_json 의 불리언 마스크 필터 (비교용) """
+    df = in_df[(in_df['date'] >= in_start) & (in_df['date'] <= in_end)]
+    if in_userIds:
+        df = df[df['user_id'].isin(in_userIds)]
+    if in_codes:
+        df = df[df['code'].isin(in_codes)]
+    return df
+
+def get_benchmark(in_rows, in_dir, in_repeat=5, in_json_rows=200000):
+    """
+    # 설명 : get_benchmark - 불리언 마스크(기존) vs 매핑 컬럼 파일 + 구간 조회 비교
+    #        기존 방식은 호출마다 json.load 도 하므로 in_json_rows 행으로 로드 시간을 재서 in_rows 기준으로 환산
+    # 입력 : in_rows - 원장 행 수, in_dir - 임시 컬럼 파일 폴더, in_repeat - 반복 횟수, in_json_rows - JSON 로드 측정 행 수
+    # 출력 : 결과 dict
+    """
+    def timed(in_fn):
+        best = None
+        for _ in range(in_repeat):
+            t0 = time.perf_counter()
+            out = in_fn()
+            took = (time.perf_counter() - t0) * 1000
+            best = took if best is None else min(best, took)
+        return best, out
+
+    t0 = time.perf_counter()
+    df = get_bench_df(in_rows)
+    gen_sec = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    columns, meta = get_columns_from_df(df)
+    meta["source"] = "bench"
+    target = Path(in_dir) / "bench"
+    shutil.rmtree(target, ignore_errors=True)
+    set_save_columns(target, columns, meta)
+    del columns
+    build_sec = time.perf_counter() - t0
+
+    store = LedgerStore(Path(in_dir) / "missing.json", in_dir)
+    t0 = time.perf_counter()
+    store._set_open(target)
+    open_ms = (time.perf_counter() - t0) * 1000
+
+    queries = {
+        "사용자1 · 1개월": (["user7"], None, "2025-03-01", "2025-03-31"),
+        "사용자1 · 1년": (["user7"], None, "2025-01-01", "2025-12-31"),
+        "사용자3 · 종목5 · 3개월": (["user1", "user2", "user3"], [f"{i:06d}" for i in range(5)], "2025-01-01", "2025-03-31"),
+        "전체 · 1주": (None, None, "2025-06-01", "2025-06-07"),
+    }
+    results = []
+    for label, (users, codes, start, end) in queries.items():
+        mask_ms, expect = timed(lambda in_df=df: get_mask_frame(in_df, users, codes, start, end))
+
+        def run_store():
+            rows = store.get_rows(users, codes, start, end)
+            return rows, store._cols["row"][rows]
+        store_ms, (rows, origin) = timed(run_store)
+        frame_ms, _ = timed(lambda: store._get_frame(users, codes, start, end))
+        same = len(rows) == len(expect) and set(np.asarray(origin).tolist()) == set(expect.index.tolist())
+        results.append({"query": label, "rows": int(len(rows)), "mask_ms": round(mask_ms, 2),
+                        "index_ms": round(store_ms, 3), "frame_ms": round(frame_ms, 2), "same": bool(same)})
+
+    # 기존 방식의 호출당 json.load + DataFrame 비용 (in_json_rows 행 측정 후 선형 환산)
+    sample = df.head(min(in_json_rows, in_rows))
+    json_path = Path(in_dir) / "bench.json"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(sample.to_dict("records"), f, ensure_ascii=False)
+    del df
+    t0 = time.perf_counter()
+    with open(json_path, "r", encoding="utf-8") as f:
+        pd.DataFrame(json.load(f))
+    json_ms = (time.perf_counter() - t0) * 1000 * in_rows / len(sample)
+    json_path.unlink()
+
+    size_mb = sum(p.stat().st_size for p in target.glob("*.npy")) / 1e6
+    return {"rows": in_rows, "gen_sec": round(gen_sec, 1), "build_sec": round(build_sec, 1),
+            "open_ms": round(open_ms, 2), "disk_mb": round(size_mb, 1), "json_load_ms_est": round(json_ms, 0),
+            "queries": results}
+
+if __name__ == "__main__":
+    # 실행 예) python -m pyk.lzegg.ledger_store --bench --rows 10000000   (프로젝트 루트에서)
+    sys.stdout.reconfigure(encoding="utf-8")
+    parser = argparse.ArgumentParser(description="원장 컬럼 파일 변환/벤치마크")
+    parser.add_argument("--build", action="store_true", help="trd_04chart_data.json 을 컬럼 파일로 변환")
+    parser.add_argument("--bench", action="store_true", help="불리언 마스크 vs 컬럼 파일 구간 조회 비교")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json-rows", type=int, default=200_000, help="json.load 시간 측정 행 수 (환산용)")
+    parser.add_argument("--dir", default=None, help="컬럼 파일 폴더 (기본: ESC_LEDGER_DIR 또는 pyk/lzegg/ledger_cache)")
+    args = parser.parse_args()
+
+    base = Path(__file__).resolve().parent
+    out_dir = Path(args.dir or os.getenv("ESC_LEDGER_DIR", base / "ledger_cache"))
+    if args.build:
+        store = LedgerStore(base / "trd_04chart_data.json", out_dir)
+        store.set_refresh()
+        print(json.dumps(store.get_stats(), ensure_ascii=False))
+    elif args.bench:
+        bench_dir = out_dir / "bench_tmp"
+        print(f"⏱️ 원장 {args.rows:,}행 벤치마크 시작")
+        try:
+            result = get_benchmark(args.rows, bench_dir, args.repeat, args.json_rows)
+        finally:
+            shutil.rmtree(bench_dir, ignore_errors=True)
+        print(f"   생성 {result['gen_sec']}초 / 변환·저장 {result['build_sec']}초 / 디스크 {result['disk_mb']}MB / "
+              f"매핑 {result['open_ms']}ms / 기존 json.load 환산 {result['json_load_ms_est']:,.0f}ms")
+        for q in result["queries"]:
+            print(f"   {q['query']:<16} {q['rows']:>9,}행  마스크 {q['mask_ms']:>9.2f}ms  "
+                  f"인덱스 {q['index_ms']:>8.3f}ms  DataFrame {q['frame_ms']:>8.2f}ms  일치 {q['same']}")
+    else:
+        parser.error("--build 또는 --bench 를 지정하세요.")
@@ -0,0 +1,212 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+def get_profit_rate(in_profit, in_base):
+    """
+    # 설명 : get_profit_rate - 수익률(%) 벡터 계산 (기준금액이 0 이하이면 0)
+    # 입력 : in_profit - 손익 배열/Series, in_base - 기준금액(매수금액 등) 배열/Series
+    # 출력 : 소수 둘째 자리 수익률 배열
+    """
+    profit = np.asarray(in_profit, dtype="f8")
+    base = np.asarray(in_base, dtype="f8")
+    safe = np.where(base > 0, base, 1.0)
+    return np.where(base > 0, np.round(profit / safe * 100, 2), 0.0)
+
+def get_ledger_trades(in_df):
+    """
+    # 설명 : get_ledger_trades - 원장(trd_04chart_data.json) 행을 체결 DataFrame 으로 변환
+    #        원장 1행 = buyPrice 로 quantity 만큼 매수 (매도는 quantity 음수 또는 side=sell 로 표기)
+    # 입력 : in_df - date, code, quantity, buyPrice (선택: side, price) 컬럼
+    # 출력 : date, code, qty(매수 +, 매도 -), price 컬럼 DataFrame
+    """
+    if in_df is None or in_df.empty:
+        return pd.DataFrame(columns=["date", "code", "qty", "price"])
+    qty = in_df["quantity"].to_numpy(dtype="f8")
+    if "side" in in_df.columns:
+        qty = np.where(in_df["side"].astype(str).str.lower().isin(["sell", "매도"]), -np.abs(qty), qty)
+    price = in_df["price"] if "price" in in_df.columns else in_df["buyPrice"]
+    return pd.DataFrame({
+        "date": pd.to_datetime(in_df["date"]).dt.normalize(),
+        "code": in_df["code"].astype(str),
+        "qty": qty,
+        "price": price.to_numpy(dtype="f8")
+    })
+
+def get_irr(in_times, in_flows, in_iter=100):
+    """
+    # 설명 : get_irr - 현금흐름 내부수익률(연율) - 뉴턴법, 실패 시 이분법
+    # 입력 : in_times - 시작일 기준 경과 연수 배열, in_flows - 현금흐름 배열 (투자 -, 회수 +)
+    # 출력 : 연 수익률 또는 None (부호 변화가 없어 해가 없을 때)
+    """
+    times = np.asarray(in_times, dtype="f8")
+    flows = np.asarray(in_flows, dtype="f8")
+    if not (flows > 0).any() or not (flows < 0).any():
+        return None
+
+    def npv(in_rate):
+        return (flows / np.power(1 + in_rate, times)).sum()
+
+    rate = 0.1
+    for _ in range(in_iter):
+        disc = np.power(1 + rate, times)
+        value = (flows / disc).sum()
+        deriv = (-times * flows / (disc * (1 + rate))).sum()
+        if deriv == 0:
+            break
+        step = value / deriv
+        rate -= step
+        if rate <= -0.9999 or not np.isfinite(rate):
+            break
+        if abs(step) < 1e-10:
+            return float(rate)
+    # 이분법 (-99.99% ~ 10000%)
+    low, high = -0.9999, 100.0
+    if np.sign(npv(low)) == np.sign(npv(high)):
+        return None
+    for _ in range(200):
+        mid = (low + high) / 2
+        if np.sign(npv(mid)) == np.sign(npv(low)):
+            low = mid
+        else:
+            high = mid
+    return float((low + high) / 2)
+
+def get_portfolio_analytics(in_trades, in_close=None, in_initial_cash=None, in_end=None):
+    """
+    # 설명 : get_portfolio_analytics - 체결내역 + 일봉 종가로 일별 자산곡선과 성과지표 계산
+    #        보유주식 계좌를 기준으로 매수금액은 유입, 매도금액은 유출로 보고
+    #        일별수익률 r[t] = Σ손익[t] / (전일평가액 + 당일매수액)  (매수는 장초 유입, 매도는 장마감 유출 가정)
+    # 입력 : in_trades - date, code, qty(매수 +, 매도 -), price 컬럼 DataFrame
+    #       in_close - 일자 인덱스 × 종목코드 컬럼 종가 DataFrame (없는 구간은 체결가로 평가)
+    #       in_initial_cash - 초기 예수금 (있으면 예수금 포함 계좌 자산곡선도 계산)
+    #       in_end - 평가 종료일 (없으면 마지막 체결일/종가일)
+    # 출력 : dict - twr, twr_annual, mwr, mdd, volatility, total_pnl, curve, positions
+    """
+    trades = in_trades.sort_values("date", kind="stable")
+    if trades.empty:
+        return {}
+    close = in_close if in_close is not None else pd.DataFrame()
+    dates = pd.DatetimeIndex(trades["date"].unique())
+    if not close.empty:
+        dates = dates.union(close.index[close.index >= dates.min()])
+    if in_end is not None:
+        end = pd.Timestamp(in_end).normalize()
+        dates = dates[dates <= end].union(pd.DatetimeIndex([end]))
+    dates = dates.sort_values()
+    codes = pd.Index(sorted(trades["code"].unique()))
+    n_days, n_codes = len(dates), len(codes)
+
+    # 1. 체결을 (일자, 종목) 격자에 누적 (np.add.at: 같은 칸 여러 건 합산)
+    t_idx = dates.searchsorted(trades["date"].to_numpy())
+    c_idx = codes.get_indexer(trades["code"])
+    qty = trades["qty"].to_numpy(dtype="f8")
+    amt = qty * trades["price"].to_numpy(dtype="f8")
+    qty_delta = np.zeros((n_days, n_codes))
+    flow = np.zeros((n_days, n_codes))
+    np.add.at(qty_delta, (t_idx, c_idx), qty)
+    np.add.at(flow, (t_idx, c_idx), amt)
+    buy = np.bincount(t_idx, weights=np.where(amt > 0, amt, 0.0), minlength=n_days)
+    sell = np.bincount(t_idx, weights=np.where(amt < 0, -amt, 0.0), minlength=n_days)
+    holding = np.cumsum(qty_delta, axis=0)
+
+    # 2. 평가가격: 일봉 종가 우선, 없으면 마지막 체결가로 앞 채움
+    trade_px = np.full((n_days, n_codes), np.nan)
+    trade_px[t_idx, c_idx] = trades["price"].to_numpy(dtype="f8")  # 같은 날 여러 건이면 마지막 체결가
+    price = pd.DataFrame(trade_px, index=dates, columns=codes)
+    if not close.empty:
+        bars = close.reindex(columns=codes).reindex(dates).ffill()
+        price = bars.where(bars.notna(), price)
+    price = price.ffill().to_numpy(dtype="f8")
+    value_by_code = np.nan_to_num(holding * price)
+    value = value_by_code.sum(axis=1)
+
+    # 3. 종목별 일손익과 일별 수익률 (TWR 연결)
+    prev_value = np.vstack([np.zeros((1, n_codes)), value_by_code[:-1]])
+    pnl = value_by_code - prev_value - flow
+    denom = np.concatenate([[0.0], value[:-1]]) + buy
+    safe = np.where(denom > 0, denom, 1.0)
+    contrib_daily = np.where(denom[:, None] > 0, pnl / safe[:, None], 0.0)
+    daily = contrib_daily.sum(axis=1)
+    twr_index = np.cumprod(1 + daily)
+    twr = float(twr_index[-1] - 1)
+    years = max((dates[-1] - dates[0]).days, 1) / 365.0
+    active = denom > 0
+    volatility = float(daily[active].std() * np.sqrt(TRADING_DAYS)) if active.sum() > 1 else 0.0
+    mdd = float((twr_index / np.maximum.accumulate(twr_index) - 1).min())
+
+    # 4. 금액가중수익률(MWR): 매수 -, 매도 +, 마지막 날 평가액 + 를 현금흐름으로 보는 IRR
+    cash_flow = sell - buy
+    cash_flow[-1] += value[-1]
+    elapsed = (dates - dates[0]).days.to_numpy(dtype="f8") / 365.0
+    mwr = get_irr(elapsed, cash_flow)
+
+    invested = np.cumsum(buy - sell)
+    total_pnl = pnl.sum(axis=0)
+    positions = pd.DataFrame({
+        "code": codes,
+        "qty": holding[-1],
+        "value": np.round(value_by_code[-1]),
+        "pnl": np.round(total_pnl),
+        "contribution": np.round(contrib_daily.sum(axis=0), 6)
+    }).sort_values("contribution", ascending=False)
+
+    curve = {
+        "dates": dates.strftime("%Y-%m-%d").tolist(),
+        "value": np.round(value).tolist(),
+        "invested": np.round(invested).tolist(),
+        "twr_index": np.round(twr_index, 6).tolist()
+    }
+    if in_initial_cash is not None:
+        curve["equity"] = np.round(in_initial_cash - invested + value).tolist()
+
+    return {
+        "start": curve["dates"][0],
+        "end": curve["dates"][-1],
+        "days": n_days,
+        "trades": len(trades),
+        "twr": round(twr, 6),
+        "twr_annual": round(float((1 + twr) ** (1 / years) - 1), 6) if twr > -1 else -1.0,
+        "mwr": round(mwr, 6) if mwr is not None else None,
+        "mdd": round(mdd, 6),
+        "volatility": round(volatility, 6),
+        "total_pnl": round(float(total_pnl.sum())),
+        "curve": curve,
+        "positions": positions.to_dict(orient="records")
+    }
+
+def get_bench_result(in_trades=100000, in_codes=200, in_days=750, in_seed=42):
+    """
+    # 설명 : get_bench_result - 체결 in_trades 건 사용자의 분석 소요시간 측정 (랜덤워크 종가)
+    # 출력 : 측정 결과 dict
+    """
+    rnd = np.random.default_rng(in_seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=in_days)
+    codes = [f"{i:06d}" for i in range(in_codes)]
+    close = pd.DataFrame(10000 * np.exp(np.cumsum(rnd.normal(0, 0.02, (in_days, in_codes)), axis=0)),
+                         index=dates, columns=codes)
+    t = rnd.integers(0, in_days, in_trades)
+    c = rnd.integers(0, in_codes, in_trades)
+    trades = pd.DataFrame({
+        "date": dates[t], "code": np.array(codes)[c],
+        "qty": rnd.integers(1, 50, in_trades) * np.where(rnd.random(in_trades) < 0.6, 1, -1),
+        "price": close.to_numpy()[t, c]
+    })
+    t0 = time.perf_counter()
+    result = get_portfolio_analytics(trades, close, in_initial_cash=1e9)
+    sec = time.perf_counter() - t0
+    return {"trades": in_trades, "codes": in_codes, "days": in_days, "elapsed_ms": round(sec * 1000, 1),
+            "twr": result["twr"], "mwr": result["mwr"], "mdd": result["mdd"]}
+
+if __name__ == "__main__":
+    # 실행 예) python pyk/lzegg/portfolio_analytics.py --trades 100000
+    parser = argparse.ArgumentParser(description="포트폴리오 성과 분석 벤치마크")
+    parser.add_argument("--trades", type=int, default=100000)
+    parser.add_argument("--codes", type=int, default=200)
+    parser.add_argument("--days", type=int, default=750)
+    args = parser.parse_args()
+    for k, v in get_bench_result(args.trades, args.codes, args.days).items():
+        print(f"{k:>12}: {v}")
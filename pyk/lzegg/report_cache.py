@@ -0,0 +1,128 @@
+import time
+import hashlib
+import threading
+from fastapi import Response
+from fastapi.responses import HTMLResponse
+
+class ReportArtifactCache:
+    """
+    # 설명 : ReportArtifactCache - 렌더링이 끝난 리포트/차트 HTML 조각과 ETag 를 키별로 보관하는 서버 캐시
+    #        키는 호출 측에서 (종류, 사용자, 차트유형 01~04, 기간, 데이터 버전) 으로 구성하고,
+    #        항목마다 관련 사용자의 체결 세대를 함께 저장해 그 사용자가 체결하면(on_trade) 다음 조회 때 다시 렌더링
+    #        사용자 구분이 없는 항목(TOP1 등, in_users=None)은 어느 사용자의 체결이든 무효화
+    # 입력 : in_ttl_sec - 최대 유지 시간(초), in_max_size - 최대 보관 개수
+    # 출력 : 캐시 객체
+    """
+    def __init__(self, in_ttl_sec=300, in_max_size=500):
+        self.ttl_sec = in_ttl_sec
+        self.max_size = in_max_size
+        self._store = {}        # key → {"html", "etag", "token", "expires", "render_ms", "built_at"}
+        self._lock = threading.Lock()
+        self._gens = {}         # 사용자id → 체결 세대
+        self._gen_all = 0       # 모든 체결마다 증가 (사용자 구분 없는 항목용)
+        self._gen_reset = 0     # 전체 무효화(on_trade(None))마다 증가
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.renders = 0
+        self.render_ms_total = 0.0
+        self.render_ms_max = 0.0
+
+    def get_token(self, in_users):
+        """
+        # 설명 : get_token - 항목이 기대는 체결 세대 (렌더링 전에 받아 두었다가 set 에 넘김)
+        # 입력 : in_users - 관련 사용자id 리스트 (None 이면 전체 사용자)
+        """
+        with self._lock:
+            if in_users is None:
+                return ("all", self._gen_all)
+            return (self._gen_reset,) + tuple(self._gens.get(u, 0) for u in in_users)
+
+    def get(self, in_key, in_users):
+        """
+        # 설명 : get - 유효한 항목 조회 (만료되었거나 관련 사용자가 그 뒤에 체결했으면 None)
+        # 입력 : in_key - 캐시 키, in_users - get_token 과 같음
+        # 출력 : 항목 dict 또는 None
+        """
+        token = self.get_token(in_users)
+        with self._lock:
+            item = self._store.get(in_key)
+            if item and item["expires"] > time.monotonic() and item["token"] == token:
+                self.hits += 1
+                return item
+            self.misses += 1
+            return None
+
+    def set(self, in_key, in_users, in_html, in_render_ms, in_token):
+        """
+        # 설명 : set - 렌더링 결과 저장 (렌더링 중에 체결이 들어왔으면 저장하지 않고 결과만 반환)
+        # 입력 : in_key/in_users - get 과 같음, in_html - 렌더링 HTML, in_render_ms - 렌더링 시간(ms),
+        #       in_token - 렌더링 전에 받은 get_token 값
+        # 출력 : 항목 dict
+        """
+        body = in_html.encode("utf-8")
+        item = {"html": in_html, "etag": '"' + hashlib.sha1(body).hexdigest()[:20] + '"', "token": in_token,
+                "expires": time.monotonic() + self.ttl_sec, "render_ms": round(in_render_ms, 1),
+                "built_at": time.time()}
+        current = self.get_token(in_users)
+        with self._lock:
+            self.renders += 1
+            self.render_ms_total += in_render_ms
+            self.render_ms_max = max(self.render_ms_max, in_render_ms)
+            if in_token != current:
+                return item
+            if len(self._store) >= self.max_size and in_key not in self._store:
+                # 가장 먼저 만료될 항목 제거
+                del self._store[min(self._store, key=lambda k: self._store[k]["expires"])]
+            self._store[in_key] = item
+        return item
+
+    def get_or_render(self, in_key, in_users, in_render):
+        """
+        # 설명 : get_or_render - 캐시에 있으면 그대로, 없으면 in_render() 로 HTML 을 만들어 저장
+        # 입력 : in_key/in_users - get 과 같음, in_render - () → HTML 문자열
+        # 출력 : (항목 dict, 캐시 적중 여부)
+        """
+        item = self.get(in_key, in_users)
+        if item is not None:
+            return item, True
+        token = self.get_token(in_users)
+        t0 = time.perf_counter()
+        html = in_render()
+        return self.set(in_key, in_users, html, (time.perf_counter() - t0) * 1000, token), False
+
+    def on_trade(self, in_userId=None):
+        """
+        # 설명 : on_trade - 체결 이벤트 (해당 사용자 항목과 사용자 구분 없는 항목 무효화, None 이면 전체)
+        # 입력 : in_userId - 체결한 사용자id
+        """
+        with self._lock:
+            self._gen_all += 1
+            if in_userId is None:
+                self._gen_reset += 1
+            else:
+                self._gens[in_userId] = self._gens.get(in_userId, 0) + 1
+
+    def get_html_response(self, in_request, in_item, in_hit, in_headers=None):
+        """
+        # 설명 : get_html_response - If-None-Match 가 같으면 304, 아니면 HTML 응답 (체결 즉시 반영되도록 매번 재검증)
+        # 입력 : in_request - FastAPI Request, in_item - 캐시 항목, in_hit - 캐시 적중 여부, in_headers - 추가 헤더
+        # 출력 : Response
+        """
+        headers = {**(in_headers or {}), "ETag": in_item["etag"], "Cache-Control": "no-cache",
+                   "X-Cache": "HIT" if in_hit else "MISS", "X-Render-Ms": str(in_item["render_ms"])}
+        if_none_match = in_request.headers.get("if-none-match", "")
+        if in_item["etag"] in [tag.strip() for tag in if_none_match.split(",")]:
+            with self._lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(content=in_item["html"], headers=headers)
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._store), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                    "not_modified": self.not_modified, "renders": self.renders,
+                    "render_ms_avg": round(self.render_ms_total / self.renders, 1) if self.renders else None,
+                    "render_ms_max": round(self.render_ms_max, 1), "ttl_sec": self.ttl_sec}
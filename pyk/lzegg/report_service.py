@@ -0,0 +1,158 @@
+import time
+import threading
+from datetime import datetime
+
+TOP_KEY = ("top",)
+
+class ReportDataService:
+    """
+    # 설명 : ReportDataService - TOP1/사용자 리포트 데이터셋을 백그라운드에서 다시 계산해 메모리에서 제공
+    #        요청 경로에서는 ES 를 조회하지 않고(최초 1회 제외) 마지막 계산 결과와 기준 시각만 돌려줌
+    #        재계산 조건: in_refresh_sec 경과 / 체결 이벤트(on_trade) / 변경 감지(in_change_probe 값이 바뀜)
+    #        최근 in_idle_sec 동안 조회되지 않은 사용자 리포트는 더 이상 갱신하지 않고 제거
+    # 입력 : in_top_builder - () → TOP1 데이터 (없으면 None), in_user_builder - (user_id) → 사용자 데이터 (없으면 None),
+    #       in_change_probe - () → 변경 감지값 (예: trade_summary 색인 횟수, 실패 시 None), in_refresh_sec - 최대 유지 시간(초),
+    #       in_check_sec - 변경 확인 주기(초), in_idle_sec - 사용자 리포트 유지 시간(초), in_max_users - 최대 사용자 수
+    # 출력 : 서비스 객체
+    """
+    def __init__(self, in_top_builder, in_user_builder, in_change_probe=None, in_refresh_sec=60, in_check_sec=5,
+                 in_idle_sec=600, in_max_users=200):
+        self.top_builder = in_top_builder
+        self.user_builder = in_user_builder
+        self.change_probe = in_change_probe
+        self.refresh_sec = in_refresh_sec
+        self.check_sec = in_check_sec
+        self.idle_sec = in_idle_sec
+        self.max_users = in_max_users
+        self._entries = {}       # key → {"data", "built_at"(epoch), "dirty", "error", "last_access"(monotonic)}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._probe_value = None
+        self._thread = None
+        self.builds = 0
+        self.errors = 0
+
+    def _set_build(self, in_key):
+        """ 데이터셋 1개 계산 (빈 결과는 저장하지 않아 다음 확인 주기에 다시 계산) """
+        try:
+            data = self.top_builder() if in_key == TOP_KEY else self.user_builder(in_key[1])
+            error = None
+        except Exception as e:
+            data, error = None, str(e)
+            self.errors += 1
+            print(f"❌ 리포트 데이터 계산 실패 {in_key}: {e}")
+        with self._lock:
+            self.builds += 1
+            entry = self._entries.get(in_key)
+            if data is None:
+                if entry is not None:
+                    # 이전 결과는 유지하고 오류만 표시 (오래된 데이터로 계속 응답)
+                    entry["error"] = error or "empty"
+                    entry["dirty"] = False
+                return data
+            self._entries[in_key] = {"data": data, "built_at": time.time(), "dirty": False, "error": None,
+                                     "last_access": entry["last_access"] if entry else time.monotonic()}
+        return data
+
+    def _get_meta(self, in_entry):
+        age = time.time() - in_entry["built_at"]
+        return {"as_of": datetime.fromtimestamp(in_entry["built_at"]).strftime("%Y-%m-%d %H:%M:%S"),
+                "age_sec": round(age, 1),
+                "stale": bool(age > self.refresh_sec or in_entry["dirty"] or in_entry["error"]),
+                "refreshing": in_entry["dirty"], "error": in_entry["error"]}
+
+    def get(self, in_key):
+        """
+        # 설명 : get - 데이터셋 조회 (메모리에 있으면 그대로, 처음 보는 키만 그 자리에서 계산)
+        # 입력 : in_key - TOP_KEY 또는 ("user", 사용자id)
+        # 출력 : (data 또는 None, meta {as_of, age_sec, stale, refreshing, error})
+        """
+        with self._lock:
+            entry = self._entries.get(in_key)
+            if entry is not None:
+                entry["last_access"] = time.monotonic()
+                return entry["data"], self._get_meta(entry)
+        data = self._set_build(in_key)
+        with self._lock:
+            entry = self._entries.get(in_key)
+            return (data, self._get_meta(entry)) if entry else (None, None)
+
+    def get_top(self):
+        return self.get(TOP_KEY)
+
+    def get_user(self, in_userId):
+        return self.get(("user", in_userId))
+
+    def on_trade(self, in_userId=None):
+        """
+        # 설명 : on_trade - 체결 이벤트 (해당 사용자와 TOP1 을 재계산 대상으로 표시하고 백그라운드 작업을 깨움)
+        # 입력 : in_userId - 체결한 사용자id (None 이면 전체)
+        """
+        with self._lock:
+            for key, entry in self._entries.items():
+                if in_userId is None or key == TOP_KEY or key == ("user", in_userId):
+                    entry["dirty"] = True
+        self._wake.set()
+
+    def _get_due_keys(self):
+        """ 재계산할 키 (dirty / 오래됨) 선정, 오래 조회되지 않은 사용자 제거 """
+        now, mono = time.time(), time.monotonic()
+        with self._lock:
+            idle = [k for k, e in self._entries.items()
+                    if k != TOP_KEY and mono - e["last_access"] > self.idle_sec]
+            for key in idle:
+                del self._entries[key]
+            users = sorted((k for k in self._entries if k != TOP_KEY), key=lambda k: self._entries[k]["last_access"])
+            for key in users[:max(0, len(users) - self.max_users)]:
+                del self._entries[key]
+            due = [k for k, e in self._entries.items()
+                   if e["dirty"] or e["error"] or now - e["built_at"] >= self.refresh_sec]
+        # TOP1 먼저
+        return sorted(due, key=lambda k: k != TOP_KEY)
+
+    def set_check_changes(self):
+        """ 변경 감지값이 바뀌었으면 전체를 재계산 대상으로 표시 """
+        if self.change_probe is None:
+            return
+        try:
+            value = self.change_probe()
+        except Exception:
+            value = None
+        if value is not None and value != self._probe_value:
+            first = self._probe_value is None
+            self._probe_value = value
+            if not first:
+                self.on_trade(None)
+
+    def run_once(self):
+        """
+        # 설명 : run_once - 변경 확인 후 재계산 대상 데이터셋 계산
+        # 출력 : 계산한 데이터셋 수
+        """
+        self.set_check_changes()
+        keys = self._get_due_keys()
+        for key in keys:
+            self._set_build(key)
+        return len(keys)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.check_sec)
+            self._wake.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"❌ 리포트 백그라운드 계산 오류: {e}")
+
+    def start(self):
+        """
+        # 설명 : start - 백그라운드 재계산 스레드 시작 (여러 번 호출해도 1개만)
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="report-data-service", daemon=True)
+            self._thread.start()
+
+    def get_stats(self):
+        with self._lock:
+            entries = {("top" if k == TOP_KEY else k[1]): self._get_meta(e) for k, e in self._entries.items()}
+        return {"builds": self.builds, "errors": self.errors, "refresh_sec": self.refresh_sec, "entries": entries}
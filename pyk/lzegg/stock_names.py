@@ -0,0 +1,133 @@
+import json
+import time
+import threading
+from pathlib import Path
+from elasticsearch import helpers
+
+class StockNameCache:
+    """
+    # 설명 : StockNameCache - 종목코드:종목명 맵 프로세스 공용 캐시
+    #        최초 1회 stock_master 전체를 scroll(helpers.scan) 로 적재하고, 이후에는 in_check_sec 마다
+    #        인덱스 통계(문서 수/색인 횟수)만 확인해 바뀌었거나 in_max_age_sec 가 지났을 때만 백그라운드로 재적재
+    #        (재적재 중에도 기존 맵을 그대로 반환), 적재할 때마다 로컬 JSON 스냅샷을 남겨 ES 장애 시 그 파일로 응답
+    # 입력 : in_es_getter - ES 클라이언트를 돌려주는 함수 (None 이면 미연결), in_snapshot_path - 스냅샷 파일,
+    #       in_index - 종목 마스터 인덱스, in_check_sec - 변경 확인 주기(초), in_max_age_sec - 강제 재적재 주기(초)
+    # 출력 : 캐시 객체
+    # 소스 : 엘라스틱서치 stock_master
+    """
+    def __init__(self, in_es_getter, in_snapshot_path, in_index="stock_master", in_check_sec=60, in_max_age_sec=3600):
+        self.es_getter = in_es_getter
+        self.snapshot_path = Path(in_snapshot_path)
+        self.index = in_index
+        self.check_sec = in_check_sec
+        self.max_age_sec = in_max_age_sec
+        self._map = None
+        self._fingerprint = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._source = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.loads = 0
+        self.errors = 0
+
+    def _get_fingerprint(self, in_es):
+        """ 인덱스 통계 (문서 수, 삭제 수, 누적 색인 횟수) - 재색인/종목 추가·수정 시 바뀜 """
+        stats = in_es.indices.stats(index=self.index, metric="docs,indexing")["_all"]["primaries"]
+        return (stats["docs"]["count"], stats["docs"]["deleted"], stats["indexing"]["index_total"])
+
+    def _set_load_es(self, in_es):
+        fingerprint = self._get_fingerprint(in_es)
+        name_map = {}
+        for hit in helpers.scan(in_es, index=self.index, query={"query": {"match_all": {}}},
+                                _source=["code", "name"], size=1000):
+            src = hit["_source"]
+            if src.get("code"):
+                name_map[src["code"]] = src.get("name") or src["code"]
+        with self._lock:
+            self._map, self._fingerprint, self._source = name_map, fingerprint, "es"
+            self._loaded_at = self._checked_at = time.monotonic()
+            self.loads += 1
+        try:
+            tmp = self.snapshot_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(name_map, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self.snapshot_path)
+        except OSError as e:
+            print(f"⚠️ 종목명 스냅샷 저장 실패: {e}")
+
+    def _set_load_snapshot(self):
+        try:
+            name_map = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            name_map = {}
+        with self._lock:
+            if self._map is None or self._source != "es":
+                self._map, self._source = name_map, "snapshot"
+            self._checked_at = time.monotonic()
+
+    def set_refresh(self, in_force=False):
+        """
+        # 설명 : set_refresh - 변경 확인 후 필요 시 재적재 (in_force 면 확인 없이 재적재)
+        # 출력 : 재적재 여부
+        """
+        es = self.es_getter()
+        if es is None:
+            self._set_load_snapshot()
+            return False
+        try:
+            expired = time.monotonic() - self._loaded_at >= self.max_age_sec
+            if in_force or self._map is None or expired or self._get_fingerprint(es) != self._fingerprint:
+                self._set_load_es(es)
+                return True
+            with self._lock:
+                self._checked_at = time.monotonic()
+            return False
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ ES stock_master 적재 실패, 스냅샷 사용: {e}")
+            self._set_load_snapshot()
+            return False
+
+    def _run_refresh(self):
+        try:
+            self.set_refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get_map(self):
+        """
+        # 설명 : get_map - 종목코드:종목명 맵 (최초 호출만 적재를 기다리고, 이후 확인/재적재는 백그라운드)
+        # 출력 : dict (호출 측에서 수정하지 말 것)
+        """
+        if self._map is None:
+            with self._lock:
+                first = self._map is None and not self._refreshing
+                if first:
+                    self._refreshing = True
+            if first:
+                self._run_refresh()
+            else:
+                # 다른 요청이 최초 적재 중이면 스냅샷으로 먼저 응답
+                self._set_load_snapshot()
+            return self._map or {}
+        with self._lock:
+            due = not self._refreshing and time.monotonic() - self._checked_at >= self.check_sec
+            if due:
+                self._refreshing = True
+        if due:
+            threading.Thread(target=self._run_refresh, daemon=True).start()
+        return self._map
+
+    def invalidate(self):
+        """
+        # 설명 : invalidate - 다음 조회 때 변경 확인을 바로 하도록 표시 (종목 마스터 동기화 직후 호출)
+        """
+        with self._lock:
+            self._checked_at = 0.0
+            self._loaded_at = 0.0
+
+    def get_stats(self):
+        with self._lock:
+            return {"size": len(self._map or {}), "source": self._source, "loads": self.loads, "errors": self.errors,
+                    "age_sec": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None}
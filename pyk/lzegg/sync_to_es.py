@@ -1,4 +1,5 @@
 import os
+import sys
 import certifi
 from pymongo import MongoClient
 from elasticsearch import Elasticsearch, helpers
@@ -9,6 +10,12 @@ from pathlib import Path
 env_path = Path(__file__).resolve().parent.parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# 프로젝트 루트 (app.esc.es_templates 사용)
+project_root = str(Path(__file__).resolve().parent.parent.parent)
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from app.esc.es_templates import set_install
+
 # 1. DB 연결 설정
 mongo_client = MongoClient(os.getenv("MONGO_URL"), tlsCAFile=certifi.where())
 db = mongo_client['mock_trading_db']
@@ -22,6 +29,8 @@ es = Elasticsearch(
 def sync_data():
     # stock_master 동기화 로직# 동기화 전에 기존 인덱스를 삭제하여 과거의 오염된 데이터를 완전히 제거합니다.
     indices_to_reset = ["stock_master", "trade_summary"]
+    # 재생성되는 인덱스에 명시 매핑(keyword id, scaled_float 가격)과 평가손익 계산 파이프라인 적용
+    set_install(es)
     for idx in indices_to_reset:
         if es.indices.exists(index=idx):
             es.indices.delete(index=idx)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 프로젝트 루트(pyk.lzegg.*, app.esc.*) 와 app 폴더(esc.*, cmm.*) 를 모두 import 경로에 추가
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "app")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
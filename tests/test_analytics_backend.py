@@ -0,0 +1,86 @@
+import math
+import mongomock
+import pytest
+from esc.es_sync import get_summary_source
+from pyk.lzegg.analytics_backend import EsAnalytics, LocalAnalytics, get_parity
+
+class FakeEs:
+    """ trade_summary/stock_master 질의만 ES 방식(scaled_float 2자리, histogram 빈 구간 채움, terms 정렬)으로 흉내 """
+    def __init__(self, in_db):
+        prices = {m["code"]: m.get("close", 0) for m in in_db.stock_master.find()}
+        self.summary = [get_summary_source(d, prices.get(d["code"], 0))[1] for d in in_db.trade_summary_esc.find()]
+        for source in self.summary:
+            source["total_valuation"] = round(source["total_valuation"], 2)
+        self.master = list(in_db.stock_master.find({}, {"_id": 0}))
+
+    def search(self, index, body=None, query=None, size=10):
+        if index == "trade_summary" and body:
+            terms = body["aggs"]["top_earner"]["terms"]
+            totals = {}
+            for s in self.summary:
+                totals[s["user_id"]] = totals.get(s["user_id"], 0) + s["total_valuation"]
+            buckets = list(totals.items())
+            for order in reversed(terms["order"]):
+                (key, direction), = order.items()
+                buckets.sort(key=lambda b: b[0] if key == "_key" else b[1], reverse=direction == "desc")
+            return {"aggregations": {"top_earner": {"buckets": [
+                {"key": u, "total_valuation": {"value": v}} for u, v in buckets[:terms["size"]]]}}}
+        if index == "trade_summary":
+            user = query["term"]["user_id"]
+            return {"hits": {"hits": [{"_source": s} for s in self.summary if s["user_id"] == user][:size]}}
+        histogram = body["aggs"]["price_buckets"]["histogram"]
+        interval = histogram["interval"]
+        keys = [math.floor(m[histogram["field"]] / interval) * interval for m in self.master]
+        span = range(int(min(keys)), int(max(keys)) + interval, interval) if keys else []
+        return {"aggregations": {"price_buckets": {"buckets": [
+            {"key": float(k), "doc_count": keys.count(k)} for k in span]}}}
+
+def get_summary(in_user, in_code, in_buy_qty, in_buy_amt, in_sell_qty=0, in_sell_amt=0):
+    return {"user_id": in_user, "code": in_code, "total_buy_qty": in_buy_qty, "total_buy_amt": in_buy_amt,
+            "total_sell_qty": in_sell_qty, "total_sell_amt": in_sell_amt}
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().mock_trading_db
+    db.stock_master.insert_many([
+        {"code": "005930", "name": "삼성전자", "close": 71000, "market": "KOSPI"},
+        {"code": "000660", "name": "SK하이닉스", "close": 15500, "market": "KOSPI"},
+        {"code": "035720", "name": "카카오", "close": 42000, "market": "KOSPI"},   # 20000/30000 구간은 비어 있음
+    ])
+    db.trade_summary_esc.insert_many([
+        get_summary("u_b", "005930", 10, 700000),               # +10000
+        get_summary("u_a", "005930", 10, 700000),               # +10000 (u_b 와 동점)
+        get_summary("u_c", "005930", 10, 700000),               # +10000 (동점 3명)
+        get_summary("u_d", "000660", 4, 60000, 2, 33000),       # 잔량 2주, +4000
+        get_summary("u_a", "035720", 1, 42000),                 # 0
+    ])
+    return db
+
+@pytest.fixture
+def local(db, tmp_path):
+    backend = LocalAnalytics(tmp_path / "analytics.sqlite")
+    assert backend.set_export(db) == {"summary": 5, "master": 3}
+    return backend
+
+def test_parity_with_es(db, local):
+    assert get_parity(EsAnalytics(FakeEs(db)), local, in_users=2) == []
+    assert get_parity(EsAnalytics(FakeEs(db)), local, in_users=10) == []
+
+def test_top_earners_tie_break(local):
+    # 동점이면 사용자id 오름차순 → 상위 2명 경계에서 잘리는 사용자가 정해짐
+    assert [t["user_id"] for t in local.get_top_earners(2)] == ["u_a", "u_b"]
+    assert [t["user_id"] for t in local.get_top_earners(10)] == ["u_a", "u_b", "u_c", "u_d"]
+
+def test_histogram_fills_gaps(local):
+    assert local.get_price_histogram(10000) == [
+        {"key": 10000.0, "count": 1}, {"key": 20000.0, "count": 0}, {"key": 30000.0, "count": 0},
+        {"key": 40000.0, "count": 1}, {"key": 50000.0, "count": 0}, {"key": 60000.0, "count": 0},
+        {"key": 70000.0, "count": 1},
+    ]
+
+def test_histogram_rejects_too_many_buckets(db, local):
+    # 15,500 ~ 71,000 원을 1원 단위로 나누면 구간 수 한도를 넘음 → 두 백엔드 모두 ValueError
+    with pytest.raises(ValueError):
+        local.get_price_histogram(1)
+    with pytest.raises(ValueError):
+        EsAnalytics(FakeEs(db)).get_price_histogram(1)
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+from esc.backtest import get_param_grid, get_rebalance_account, get_rebalance_equity
+
+@pytest.mark.parametrize("strategy, grid", [
+    ("ma_cross", {"fast": [0, 5], "slow": [20]}),
+    ("ma_cross", {"fast": [5], "slow": [-20]}),
+    ("rsi", {"period": [0], "low": [30], "high": [70]}),
+    ("rebalance", {"every": [0]}),
+    ("rebalance", {"every": [2.5]}),
+    ("rebalance", {"every": 5}),
+])
+def test_invalid_window_rejected(strategy, grid):
+    with pytest.raises(ValueError):
+        get_param_grid(strategy, grid)
+
+def test_rebalance_account_tracks_equity():
+    rnd = np.random.default_rng(0)
+    close = 10000 * np.exp(np.cumsum(rnd.normal(0, 0.02, (120, 4)), axis=0))
+    close[:30, 3] = np.nan   # 중간 상장
+    dates = pd.bdate_range("2024-01-01", periods=120)
+    tickers = ["A.KS", "B.KS", "C.KS", "D.KS"]
+    cash = 100_000_000
+    account = get_rebalance_account(dates, tickers, close, 20, 0.001, cash)
+    equity, _ = get_rebalance_equity(close, 20, 0.001)
+    # 정수 주식수 반올림 오차 수준에서 같은 자산곡선
+    assert account["total_valuation"] == pytest.approx(cash * equity[-1], rel=2e-3)
+    assert account["cash_esc"] >= 0 and set(account["portfolio"]) == {"A_KS", "B_KS", "C_KS", "D_KS"}
+    assert {h["type"] for h in account["history"]} == {"매수", "매도"}
@@ -0,0 +1,44 @@
+import threading
+import time
+from esc.chart_cache import ChartPayloadCache, UncacheablePayload, get_no_store_response
+
+def test_hit_does_not_wait_for_build_lock():
+    cache = ChartPayloadCache()
+    lock = threading.Lock()
+    cache.get_or_build(("popup_status",), lambda: [1], None, lock)
+    with lock:   # 다른 요청이 생성 중이어도 적중은 바로 반환
+        assert cache.get_or_build(("popup_status",), lambda: [2], None, lock)[0] == b"[1]"
+
+def test_concurrent_misses_build_once():
+    cache = ChartPayloadCache()
+    lock = threading.Lock()
+    calls = []
+    def build():
+        calls.append(1)
+        time.sleep(0.05)
+        return [len(calls)]
+    threads = [threading.Thread(target=cache.get_or_build, args=(("popup_status",), build, None, lock))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+
+def test_short_ttl_expires():
+    cache = ChartPayloadCache(in_ttl_sec=300)
+    cache.get_or_build(("popup_status",), lambda: [1], 0.01)
+    time.sleep(0.02)
+    assert cache.get_or_build(("popup_status",), lambda: [2])[0] == b"[2]"
+
+def test_uncacheable_payload_is_not_stored():
+    cache = ChartPayloadCache()
+    def build():
+        raise UncacheablePayload({"error": "데이터가 없습니다."})
+    try:
+        cache.get_or_build(("closes", "XXX", "1y"), build)
+        assert False, "UncacheablePayload 가 전달되지 않음"
+    except UncacheablePayload as e:
+        assert e.payload == {"error": "데이터가 없습니다."}
+    assert cache.get_or_build(("closes", "XXX", "1y"), lambda: {"dates": []})[0] == b'{"dates":[]}'
+    assert get_no_store_response({"error": "x"}).headers["cache-control"] == "no-store"
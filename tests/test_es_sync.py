@@ -0,0 +1,37 @@
+import mongomock
+from esc.es_sync import get_summary_source, set_backfill_summary
+
+def test_backfill_summary_fields():
+    coll = mongomock.MongoClient().db.trade_summary_esc
+    coll.insert_many([
+        # 필드 도입 전 문서
+        {"user_id": "u1", "code": "005930", "total_buy_qty": 10, "total_buy_amt": 1000, "total_sell_qty": 4,
+         "total_sell_amt": 500},
+        # 도입 전 문서에 체결이 $inc 로 더해진 문서 (holding_qty/realized_pnl 이 일부만 반영)
+        {"user_id": "u2", "code": "005930", "total_buy_qty": 12, "total_buy_amt": 1300, "total_sell_qty": 2,
+         "total_sell_amt": 300, "holding_qty": -2, "cost_basis": -200, "avg_cost": 110, "realized_pnl": 80},
+        # 정상 문서
+        {"user_id": "u3", "code": "005930", "total_buy_qty": 5, "total_buy_amt": 500, "total_sell_qty": 0,
+         "total_sell_amt": 0, "holding_qty": 5, "cost_basis": 500, "avg_cost": 100, "realized_pnl": 0},
+        # 보유수량은 맞지만 실현손익이 없는 문서
+        {"user_id": "u4", "code": "005930", "total_buy_qty": 10, "total_buy_amt": 1000, "total_sell_qty": 5,
+         "total_sell_amt": 600, "holding_qty": 5, "cost_basis": 510, "avg_cost": 102},
+    ])
+    assert set_backfill_summary(coll) == 3
+    u1 = coll.find_one({"user_id": "u1"})
+    assert (u1["holding_qty"], u1["cost_basis"], u1["avg_cost"]) == (6, 600, 100)
+    assert u1["realized_pnl"] == 500 - 4 * 100
+    u2 = coll.find_one({"user_id": "u2"})
+    assert (u2["holding_qty"], u2["cost_basis"]) == (10, 1100)
+    assert u2["realized_pnl"] == 300 - 2 * (1300 / 12)
+    assert coll.find_one({"user_id": "u3"})["cost_basis"] == 500
+    u4 = coll.find_one({"user_id": "u4"})
+    assert (u4["cost_basis"], u4["realized_pnl"]) == (510, 600 - 5 * 100)
+    assert set_backfill_summary(coll) == 0
+
+def test_missing_realized_pnl_is_estimated():
+    doc = {"user_id": "u1", "code": "005930", "total_buy_qty": 10, "total_buy_amt": 1000,
+           "total_sell_qty": 4, "total_sell_amt": 500}
+    doc_id, source = get_summary_source(doc, 120)
+    assert doc_id == "u1_005930"
+    assert source["realized_pnl"] == 500 - 4 * 100
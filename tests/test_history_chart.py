@@ -0,0 +1,48 @@
+import pytest
+from elasticsearch.exceptions import NotFoundError
+from esc.history_chart import get_history_page
+
+class FakeEs:
+    """ PIT 열기/검색/닫기만 흉내 (timestamp, _shard_doc 순 search_after) """
+    def __init__(self, in_count):
+        self.docs = [{"timestamp": "2024-01-01 09:00:00", "uid": f"u{i}"} for i in range(in_count)]
+        self.open_pits = set()
+        self.bodies = []
+
+    def open_point_in_time(self, index, keep_alive):
+        self.open_pits.add("pit-1")
+        return {"id": "pit-1"}
+
+    def close_point_in_time(self, body):
+        self.open_pits.discard(body["id"])
+
+    def search(self, body):
+        self.bodies.append(body)
+        if body["pit"]["id"] not in self.open_pits:
+            raise NotFoundError(404, "search_context_missing_exception", {})
+        start = body.get("search_after", [None, -1])[1] + 1
+        hits = [{"_source": d, "sort": [d["timestamp"], start + i]}
+                for i, d in enumerate(self.docs[start:start + body["size"]])]
+        return {"pit_id": "pit-1", "hits": {"hits": hits}}
+
+def test_pages_through_pit_and_closes_it():
+    es = FakeEs(5)
+    pages, cursor = [], None
+    while True:
+        page = get_history_page(es, in_size=2, in_after=cursor)
+        pages.append([d["uid"] for d in page["items"]])
+        cursor = page["next"]
+        if cursor is None:
+            break
+    assert pages == [["u0", "u1"], ["u2", "u3"], ["u4"]]
+    assert all(b["sort"] == [{"timestamp": "asc"}, {"_shard_doc": "asc"}] for b in es.bodies)
+    assert not es.open_pits
+
+def test_expired_or_old_cursor_is_value_error():
+    es = FakeEs(5)
+    cursor = get_history_page(es, in_size=2)["next"]
+    es.open_pits.clear()
+    with pytest.raises(ValueError):
+        get_history_page(es, in_size=2, in_after=cursor)
+    with pytest.raises(ValueError):
+        get_history_page(es, in_size=2, in_after="WyIyMDI0LTAxLTAxIiwgImFiYyJd")   # 예전 [timestamp, _id] 커서
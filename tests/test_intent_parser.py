@@ -0,0 +1,56 @@
+import pytest
+from esc.intent_parser import IntentParser
+
+MASTER = [
+    {"code": "005930", "name": "삼성전자", "market": "KOSPI"},
+    {"code": "000660", "name": "SK하이닉스", "market": "KOSPI"},
+    {"code": "035720", "name": "카카오", "market": "KOSPI"},
+    {"code": "247540", "name": "에코프로비엠", "market": "KOSDAQ"},
+]
+
+@pytest.fixture(scope="module")
+def parser():
+    p = IntentParser()
+    p.set_names(MASTER)
+    return p
+
+@pytest.mark.parametrize("message, side, ticker, quantity", [
+    ("삼성전자 10주 매수", "buy", "005930.KS", 10),
+    ("삼성전자 10주 매수해줘", "buy", "005930.KS", 10),
+    ("삼성전자를 1,000주 사줘", "buy", "005930.KS", 1000),
+    ("카카오 삼십주만 사주세요", "buy", "035720.KS", 30),
+    ("005930 5주 팔아줘", "sell", "005930.KS", 5),
+    ("sk하이닉스 열 주 매도", "sell", "000660.KS", 10),
+    ("에코프로비엠 3주 매도해주세요.", "sell", "247540.KQ", 3),
+])
+def test_order_commands(parser, message, side, ticker, quantity):
+    assert parser.get_intent(message) == {"side": side, "ticker": ticker, "quantity": quantity}
+
+@pytest.mark.parametrize("message", [
+    # 취소/대기/주문 관리
+    "삼성전자 10주 매수 취소해줘",
+    "삼성전자 10주 매도 취소",
+    "삼성전자 10주 매수 대기",
+    "삼성전자 10주 매수 주문 넣어줘",
+    # 과거형/회상
+    "어제 삼성전자 10주 매수했는데 어때",
+    "삼성전자 10주 매도했었지",
+    "삼성전자 10주 샀어",
+    "삼성전자 10주 팔았어",
+    # 동사가 끝에 있지 않음 / 동사 외 다른 말이 남음
+    "삼성전자 10주 매수 어때",
+    "매수 삼성전자 10주 하면 어떨지",
+    "삼성전자 10주 사고 싶은데 괜찮을지",
+    # 질문/조건/비율
+    "삼성전자 10주 살까",
+    "삼성전자 10주 사도 돼?",
+    "삼성전자 7만원 이하면 10주 매수",
+    "삼성전자 절반 매도",
+    # 종목/수량이 1개가 아님, 매수/매도가 모호
+    "삼성전자 카카오 10주 매수",
+    "삼성전자 10주 5주 매수",
+    "삼성전자 매수",
+    "삼성전자 10주 매수 매도",
+])
+def test_not_orders(parser, message):
+    assert parser.get_intent(message) is None
@@ -0,0 +1,86 @@
+import bisect
+import random
+import pytest
+from esc.leaderboard import IndexableSkipList, Leaderboard
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_skiplist_matches_sorted_list(seed):
+    rnd = random.Random(seed)
+    skip, ref = IndexableSkipList(in_seed=seed), []
+    for _ in range(3000):
+        # 점수 범위를 좁게 잡아 동점(-점수 같고 user_id 다른 키)이 자주 생기게 함
+        key = (-rnd.randint(0, 20), f"u{rnd.randint(0, 60):03d}")
+        if key in ref and rnd.random() < 0.5:
+            assert skip.remove(key)
+            ref.remove(key)
+        elif key not in ref:
+            skip.insert(key)
+            bisect.insort(ref, key)
+        else:
+            assert not skip.remove((1, "none"))
+        assert len(skip) == len(ref)
+        probe = rnd.choice(ref) if ref else key
+        assert skip.get_rank(probe) == (ref.index(probe) if probe in ref else None)
+        start, count = rnd.randint(-1, len(ref) + 1), rnd.randint(0, 10)
+        assert skip.get_range(start, count) == (ref[start:start + count] if 0 <= start else [])
+    assert skip.get_range(0, len(ref)) == ref
+
+def test_skiplist_remove_all_and_reuse():
+    skip = IndexableSkipList(in_seed=7)
+    keys = [(-5, f"u{i:02d}") for i in range(50)]   # 모두 동점 → user_id 순
+    for key in reversed(keys):
+        skip.insert(key)
+    assert skip.get_range(0, 50) == keys
+    for key in keys:
+        assert skip.remove(key)
+    assert len(skip) == 0 and skip.get_range(0, 1) == [] and skip.get_rank(keys[0]) is None
+    skip.insert((0, "a"))
+    assert skip.get_rank((0, "a")) == 0
+
+def get_reference(in_positions, in_prices):
+    """ 보유/현금흐름으로 직접 계산한 (-평가손익, user_id) 정렬 목록 """
+    scores = {u: sum(cash + qty * in_prices.get(c, 0) for c, (qty, cash) in pos.items())
+              for u, pos in in_positions.items()}
+    return sorted((-s, u) for u, s in scores.items())
+
+def test_leaderboard_matches_reference_with_ties():
+    rnd = random.Random(11)
+    board, positions, prices = Leaderboard(), {}, {}
+    codes, users = ["005930", "000660", "035720"], [f"u{i:02d}" for i in range(30)]
+    for step in range(1500):
+        if rnd.random() < 0.3:
+            code = rnd.choice(codes)
+            prices[code] = rnd.randint(90, 110)
+            board.on_price(code, prices[code])
+        else:
+            user, code = rnd.choice(users), rnd.choice(codes)
+            price = prices.setdefault(code, 100)
+            held = positions.get(user, {}).get(code, [0, 0])[0]
+            side = "sell" if held and rnd.random() < 0.4 else "buy"
+            qty = rnd.randint(1, held) if side == "sell" else rnd.randint(1, 5)
+            board.on_trade(user, code, side, qty, price)
+            pos = positions.setdefault(user, {}).setdefault(code, [0, 0])
+            sign = 1 if side == "buy" else -1
+            pos[0] += sign * qty
+            pos[1] -= sign * qty * price
+        if step % 50 == 0:
+            ref = get_reference(positions, prices)
+            assert [(r["user_id"], r["total_profit"]) for r in board.get_top(len(ref))] == [(u, -s) for s, u in ref]
+            user = rnd.choice(list(positions))
+            rank = ref.index((-board.scores[user], user)) + 1
+            assert board.get_rank(user)["rank"] == rank
+            around = board.get_around(rank, 2)
+            start = max(0, rank - 3)   # 앞쪽이 모자라면 창을 뒤로 채움 (항상 최대 5명)
+            assert [a["user_id"] for a in around] == [u for _, u in ref[start:start + 5]]
+            assert around[0]["rank"] == start + 1
+    assert board.get_rank("nobody") is None
+
+def test_leaderboard_rebuild_ties_by_user_id():
+    board = Leaderboard()
+    summaries = [{"user_id": u, "code": "005930", "total_buy_qty": 10, "total_buy_amt": 1000,
+                  "total_sell_qty": 0, "total_sell_amt": 0} for u in ("c", "a", "b")]
+    assert board.set_rebuild(summaries, {"005930": 120}) == 3
+    assert [r["user_id"] for r in board.get_top(3)] == ["a", "b", "c"]
+    board.on_trade("c", "005930", "buy", 1, 100)   # c 만 +20 → 단독 1위
+    assert [r["user_id"] for r in board.get_top(3)] == ["c", "a", "b"]
+    assert board.get_rank("b") == {"rank": 3, "user_id": "b", "total_profit": 200.0, "total_users": 3}
@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+import mongomock
+from esc.ledger import PortfolioLedger
+
+def _get_ledger():
+    db = mongomock.MongoClient().ykpark
+    db.users_esc.insert_one({"user_id": "u1", "cash_esc": 1000000, "portfolio": {}})
+    ledger = PortfolioLedger(db.ledger_events_esc, db.ledger_snapshots_esc, db.users_esc, in_snapshot_every=2)
+    ledger.set_open("u1", datetime.now())
+    return ledger, db
+
+def test_replay_fill_with_past_ts_keeps_open_event():
+    ledger, db = _get_ledger()
+    past = datetime(2024, 3, 5, 10, 0)
+    db.users_esc.update_one({"user_id": "u1"}, {"$inc": {"cash_esc": -10000, "ledger_seq": 1},
+                                                "$set": {"portfolio.005930_KS": {"qty": 1, "avg_price": 10000}}})
+    ledger.set_append("u1", 1, "buy", past, ticker="005930.KS", quantity=1, price=10000, avg_price=10000)
+    state = ledger.get_state("u1", in_at=datetime.now() + timedelta(seconds=1))
+    assert state["seq"] == 1 and state["ts"] == past
+    assert state["cash_esc"] == 990000 and state["portfolio"]["005930_KS"]["qty"] == 1
+    assert ledger.get_verify("u1")["ok"] == 1
+
+def test_point_in_time_before_first_record_is_empty():
+    ledger, _ = _get_ledger()
+    assert ledger.get_state("u1", in_at=datetime.now() - timedelta(days=1)) is None
@@ -0,0 +1,32 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+LOADTEST = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "esc", "loadtest.py")
+P95_BUDGET_MS = 2000   # CI 장비 편차를 감안한 여유 예산 (로컬에서는 수십 ms)
+
+def get_run(in_tmp_path, in_budget_ms):
+    """ 대역(mongomock/FakeSearch/FakeLLM)으로 요청 수를 줄여 별도 프로세스에서 실행 (pymongo 교체가 테스트 프로세스에 새지 않도록) """
+    out = in_tmp_path / "loadtest.json"
+    proc = subprocess.run([sys.executable, LOADTEST, "--requests", "60", "--concurrency", "5", "--users", "10",
+                           "--llm-ms", "5", "--json", str(out), "--p95-budget-ms", str(in_budget_ms)],
+                          capture_output=True, text=True, encoding="utf-8", timeout=300)
+    return proc, json.loads(out.read_text(encoding="utf-8")) if out.exists() else None
+
+def test_loadtest_passes_gate(tmp_path):
+    pytest.importorskip("mongomock")
+    pytest.importorskip("httpx")
+    proc, result = get_run(tmp_path, P95_BUDGET_MS)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    total = result["endpoints"]["ALL"]
+    assert total["count"] == 60 and total["errors"] == 0
+    assert total["p95_ms"] <= P95_BUDGET_MS
+
+def test_loadtest_fails_over_budget(tmp_path):
+    pytest.importorskip("mongomock")
+    pytest.importorskip("httpx")
+    proc, _ = get_run(tmp_path, 0.001)
+    assert proc.returncode == 1
+    assert "기준 미달" in proc.stdout
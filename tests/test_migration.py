@@ -0,0 +1,29 @@
+import mongomock
+from collections import deque
+from esc.migration import CollectionMigrator
+
+def get_actions(in_db, in_collection, in_index):
+    migrator = CollectionMigrator(in_db, None, in_collection, in_index)
+    pending = deque()
+    actions = list(migrator._get_actions(in_db[in_collection].find().sort("_id", 1), pending))
+    return actions, pending
+
+def test_summary_uses_sync_ids_and_prices():
+    db = mongomock.MongoClient().db
+    db.stock_master.insert_one({"code": "005930", "close": 120})
+    db.trade_summary_esc.insert_one({"user_id": "u1", "code": "005930", "total_buy_qty": 10, "total_buy_amt": 1000,
+                                     "total_sell_qty": 0, "total_sell_amt": 0, "holding_qty": 10,
+                                     "avg_cost": 100, "realized_pnl": 0})
+    actions, pending = get_actions(db, "trade_summary_esc", "trade_summary")
+    assert actions[0]["_id"] == "u1_005930"
+    source = actions[0]["_source"]
+    assert source["current_price"] == 120 and source["mongo_id"] == str(pending[0][0])
+    # 체크포인트는 몽고 _id 기준 그대로
+    assert pending[0][0] == db.trade_summary_esc.find_one()["_id"]
+
+def test_plain_collection_keeps_mongo_id():
+    db = mongomock.MongoClient().db
+    db.stock_master.insert_one({"code": "005930", "close": 120})
+    actions, _ = get_actions(db, "stock_master", "stock_master")
+    assert actions[0]["_id"] == str(db.stock_master.find_one()["_id"])
+    assert "_id" not in actions[0]["_source"]
@@ -0,0 +1,32 @@
+import mongomock
+from esc.order_book import OrderBookManager
+
+def _get_manager(in_executor):
+    coll = mongomock.MongoClient().db.pending_orders_esc
+    return OrderBookManager(coll, in_executor), coll
+
+def test_fill_error_rejects_order_and_continues():
+    def executor(in_order, in_price):
+        if in_order["quantity"] == 1:
+            raise RuntimeError("boom")
+        return True, "ok"
+    mgr, coll = _get_manager(executor)
+    bad = mgr.set_order("u1", "005930.KS", "buy", "limit", 1, 100)
+    good = mgr.set_order("u2", "005930.KS", "buy", "limit", 2, 100)
+    results = mgr.on_quote("005930.KS", 90)
+    assert [(o["order_id"], ok) for o, ok, _ in results] == [(bad["order_id"], False), (good["order_id"], True)]
+    assert coll.find_one({"order_id": bad["order_id"]})["status"] == "rejected"
+    assert coll.find_one({"order_id": good["order_id"]})["status"] == "filled"
+    assert mgr.get_stats()["rejected"] == 1 and mgr.get_stats()["filled"] == 1
+
+def test_claim_error_reopens_order():
+    mgr, coll = _get_manager(lambda o, p: (True, "ok"))
+    order = mgr.set_order("u1", "005930.KS", "sell", "limit", 3, 100)
+    real = coll.find_one_and_update
+    coll.find_one_and_update = lambda *a, **k: (_ for _ in ()).throw(ConnectionError("db down"))
+    results = mgr.on_quote("005930.KS", 110)
+    assert results[0][1] is False
+    assert [o["order_id"] for o in mgr.get_user_orders("u1")] == [order["order_id"]]
+    coll.find_one_and_update = real
+    assert mgr.on_quote("005930.KS", 110)[0][1] is True
+    assert mgr.get_user_orders("u1") == []
@@ -0,0 +1,14 @@
+from esc.quote_service import QuoteService
+from esc.rate_limit import BudgetExceededError
+
+def test_poll_skips_tickers_over_budget():
+    def fetcher(in_ticker):
+        if in_ticker == "000660.KS":
+            raise BudgetExceededError("야후 시세(폴링)", 2.0)
+        return 100.0
+    quotes = QuoteService(fetcher)
+    quotes.add_watch_source(lambda: ["000660.KS", "005930.KS", "035720.KS"])
+    got = []
+    quotes.subscribe(lambda t, p: got.append(t))
+    assert quotes.set_poll_once() == 2
+    assert got == ["005930.KS", "035720.KS"] and quotes.budget_skipped == 1
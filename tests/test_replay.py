@@ -0,0 +1,36 @@
+import asyncio
+import numpy as np
+from esc.replay import ReplayEngine, SimClock
+from esc.quote_service import QuoteService
+from esc.order_book import OrderBookManager
+from esc.live_push import LiveValuationHub
+
+def test_finish_hook_runs_before_polling_resumes():
+    quotes = QuoteService(lambda t: None)
+    seen = []
+    engine = ReplayEngine(quotes, SimClock(),
+                          lambda tickers: seen.append((list(tickers), engine.is_active(), quotes.paused)))
+    times = np.array(["2025-01-02T09:00:00", "2025-01-02T09:01:00"], dtype="datetime64[s]")
+    engine.set_start([("005930.KS", times, np.array([100.0, 101.0]))], in_speed=0)
+    engine._thread.join()
+    assert seen == [(["005930.KS"], False, True)]
+    assert not engine.is_active() and not quotes.paused and not engine.clock.is_simulated()
+
+def test_set_clear_drops_memory_orders():
+    book = OrderBookManager()
+    book.set_order("replay_1", "005930.KS", "buy", "limit", 1, 100)
+    assert book.set_clear() == 1
+    assert book.get_user_orders("replay_1") == [] and book.on_quote("005930.KS", 50) == []
+
+def test_hub_reprice_discards_replayed_prices():
+    live = {"005930.KS": 70000.0}
+    hub = LiveValuationHub(in_price_source=live.get)
+    loop = asyncio.new_event_loop()
+    try:
+        hub.set_subscribe("u1", {"005930_KS": {"qty": 2, "avg_price": 60000}}, 0, loop)
+        hub.on_quote("005930.KS", 50000.0)   # 재생 시세
+        assert hub.get_snapshot("u1")["stock_value"] == 100000
+        hub.set_reprice(["005930.KS"])
+        assert hub.get_snapshot("u1")["stock_value"] == 140000
+    finally:
+        loop.close()
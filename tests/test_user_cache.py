@@ -0,0 +1,18 @@
+from esc.user_cache import UserStateCache
+
+def test_get_returns_deep_copy():
+    cache = UserStateCache()
+    cache.put("u1", {"user_id": "u1", "cash_esc": 100, "portfolio": {"005930_KS": {"qty": 1, "avg_price": 10}}})
+    user = cache.get("u1")
+    user["portfolio"]["005930_KS"]["qty"] = 99
+    user["portfolio"]["000660_KS"] = {"qty": 1, "avg_price": 1}
+    assert cache.get("u1")["portfolio"] == {"005930_KS": {"qty": 1, "avg_price": 10}}
+
+def test_put_does_not_alias_caller_document():
+    cache = UserStateCache()
+    doc = {"user_id": "u1", "portfolio": {"005930_KS": {"qty": 1, "avg_price": 10}}, "history": [1]}
+    cache.put("u1", doc)
+    doc["portfolio"]["005930_KS"]["qty"] = 5
+    cached = cache.get("u1")
+    assert cached["portfolio"]["005930_KS"]["qty"] == 1
+    assert "history" not in cached